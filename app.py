@@ -1,36 +1,41 @@
-from flask_jwt_extended import JWTManager, create_access_token
-from flask import Flask, jsonify, request, send_file
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, get_jwt, get_jwt_identity, jwt_required
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, send_file, stream_with_context
 from models import db, Usuario, Documento, Servidor
-from flasgger import Swagger
-from werkzeug.utils import secure_filename
-from datetime import datetime
-import secrets
+from config import Config, configurar_sqlite, opcoes_engine
+import armazenamento
+import autorizacao
+import busca
+import busca_documentos
+import cache
+import camadas
+import carga
+import chaves
+import compressao
+import downloads
+import estatisticas
+import metricas
+import migracoes
+import mudancas
+import openapi
+import senhas
+import serializacao
+import servidores_lote
+import tarefas
+import uploads
+from parametros import (
+    ParametroInvalido, codificar_cursor, decodificar_cursor, ler_booleano, ler_campos, ler_cpf, ler_data, ler_limite
+)
+import click
+import json
+import pstats
+import signal
 import os
 from flask_cors import CORS
+from sqlalchemy.exc import IntegrityError
 
-app = Flask(__name__)
-CORS(app)  # Habilita o CORS para todas as rotas
+bp = Blueprint('api', __name__, cli_group=None)  # Rotas e comandos; a aplicação é montada por create_app()
 
-# Configuração do banco de dados (exemplo com SQLite)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///meu_banco.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-UPLOAD_FOLDER = 'uploads/documentos'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # Garante que a pasta exista
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-db.init_app(app)
-
-with app.app_context():
-    db.create_all()  # Cria as tabelas no banco de dados
-
-
-# Configuração do JWT
-app.config['JWT_SECRET_KEY'] = secrets.token_hex(32)  # Substitua por uma chave secreta segura
-jwt = JWTManager(app)
-
-swagger = Swagger(app)
-
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
     """
     Realiza o login do usuário.
@@ -58,6 +63,10 @@ def login():
         description: Erro de validação, falta email ou senha
       401:
         description: Credenciais inválidas
+      403:
+        description: Usuário desativado
+      503:
+        description: Muitas verificações de senha em andamento; tente novamente
     """
     dados = request.json
     email = dados.get('email')
@@ -66,20 +75,98 @@ def login():
     if not email or not senha:
         return jsonify({'erro': 'Email e senha são obrigatórios.'}), 400
 
-    usuario = Usuario.query.filter_by(email=email).first()
+    # Busca pelo índice único de email, só com as colunas necessárias
+    usuario = db.session.execute(
+        db.select(Usuario.id, Usuario.tipo, Usuario.senha_hash, Usuario.ativo).where(Usuario.email == email)
+    ).first()
+
+    # O hash roda no pool de processos, fora da thread da requisição
+    pool_senhas = current_app.extensions['senhas']
+    try:
+        if not usuario or not pool_senhas.verificar(usuario.senha_hash, senha):
+            return jsonify({'erro': 'Credenciais inválidas.'}), 401
+        if not usuario.ativo:
+            return jsonify({'erro': 'Usuário desativado.'}), 403
+
+        # Hash antigo (método ou custo diferente do configurado): regrava com a senha já conferida
+        if pool_senhas.precisa_rehash(usuario.senha_hash):
+            db.session.execute(
+                db.update(Usuario).where(Usuario.id == usuario.id).values(senha_hash=pool_senhas.gerar(senha))
+            )
+            db.session.commit()
+            pool_senhas.rehash_realizado()
+    except senhas.SobrecargaSenhas as e:
+        return jsonify({'erro': str(e)}), 503, {'Retry-After': '1'}
+
+    # Cria o token de acesso (curto) e o de renovação, para não reenviar a senha
+    claims = {'tipo': usuario.tipo}
+    token = create_access_token(identity=str(usuario.id), additional_claims=claims)
+    token_renovacao = create_refresh_token(identity=str(usuario.id), additional_claims=claims)
+    return jsonify({
+        'mensagem': 'Login bem-sucedido.',
+        'token': token,
+        'token_renovacao': token_renovacao
+    }), 200
+
+
+@bp.route('/token/renovar', methods=['POST'])
+@jwt_required(refresh=True)
+def renovar_token():
+    """
+    Gera um novo token de acesso a partir do token de renovação, sem reenviar a senha.
+    ---
+    parameters:
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: "Bearer <token_renovacao>"
+    responses:
+      200:
+        description: Novo token de acesso
+        schema:
+          type: object
+          properties:
+            token:
+              type: string
+      401:
+        description: Token de renovação ausente, inválido ou expirado
+    """
+    token = create_access_token(identity=get_jwt_identity(), additional_claims={'tipo': get_jwt()['tipo']})
+    return jsonify({'token': token}), 200
+
+
+@bp.route('/.well-known/jwks.json', methods=['GET'])
+def jwks():
+    """
+    Chaves públicas que verificam os tokens emitidos (JWKS), para outros nós validarem localmente.
+    ---
+    responses:
+      200:
+        description: "Conjunto de chaves JWK, identificadas pelo kid do cabeçalho dos tokens"
+    """
+    resposta = jsonify(chaves.obter().jwks())
+    resposta.headers['Cache-Control'] = f"public, max-age={current_app.config['JWT_CHAVES_RECARGA']}"
+    return resposta, 200
 
-    if not usuario or not usuario.verificar_senha(senha):
-        return jsonify({'erro': 'Credenciais inválidas.'}), 401
 
-    # Cria o token de acesso
-    token = create_access_token(identity={'id': usuario.id, 'tipo': usuario.tipo})
-    return jsonify({'mensagem': 'Login bem-sucedido.', 'token': token}), 200
+@bp.route('/senhas/estatisticas', methods=['GET'])
+@autorizacao.exigir('administracao')
+def senhas_estatisticas():
+    """
+    Ocupação do pool de verificação de senhas deste worker.
+    ---
+    responses:
+      200:
+        description: Verificações em andamento (profundidade da fila), capacidade e contadores
+    """
+    return jsonify(current_app.extensions['senhas'].estatisticas()), 200
 
 
-@app.route('/cadastro', methods=['POST'])
+@bp.route('/cadastro', methods=['POST'])
 def cadastro():
     """
-    Realiza o cadastro de um novo usuário.
+    Realiza o cadastro de um novo usuário. Exige token de gestor, exceto para o primeiro usuário.
     ---
     parameters:
       - in: body
@@ -110,9 +197,21 @@ def cadastro():
         description: Usuário cadastrado com sucesso
       400:
         description: Dados obrigatórios não fornecidos
+      401:
+        description: Token ausente ou inválido
+      403:
+        description: Apenas gestores cadastram usuários
       409:
         description: Email já cadastrado
+      503:
+        description: Muitas operações de senha em andamento; tente novamente
     """
+    # Sem nenhum usuário, o cadastro é livre para criar o primeiro gestor
+    if db.session.scalar(db.select(Usuario.id).limit(1)) is not None:
+        erro = autorizacao.autorizar('administracao')
+        if erro is not None:
+            return erro
+
     dados = request.json
     nome = dados.get('nome')
     email = dados.get('email')
@@ -131,9 +230,12 @@ def cadastro():
     if Usuario.query.filter_by(email=email).first():
         return jsonify({'erro': 'Este email já está cadastrado.'}), 409
 
-    # Criar o novo usuário
+    # Criar o novo usuário (hash calculado no pool de processos)
     novo_usuario = Usuario(nome=nome, email=email, tipo=tipo)
-    novo_usuario.set_senha(senha)
+    try:
+        novo_usuario.senha_hash = current_app.extensions['senhas'].gerar(senha)
+    except senhas.SobrecargaSenhas as e:
+        return jsonify({'erro': str(e)}), 503, {'Retry-After': '1'}
 
     # Salvar no banco de dados
     db.session.add(novo_usuario)
@@ -142,7 +244,8 @@ def cadastro():
     return jsonify({'mensagem': 'Usuário cadastrado com sucesso!'}), 201
 
 
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
+@autorizacao.exigir('escrita')
 def upload_documento():
     """
     Realiza o upload de um documento.
@@ -155,7 +258,7 @@ def upload_documento():
       - in: formData
         name: cpf_servidor
         type: string
-        description: CPF do servidor
+        description: CPF do servidor, com ou sem pontuação
       - in: formData
         name: tipo_documento
         type: string
@@ -165,6 +268,8 @@ def upload_documento():
         description: Documento enviado com sucesso
       400:
         description: Erro de validação, falta de arquivo, CPF ou tipo de documento
+      413:
+        description: O arquivo excede o tamanho máximo permitido
     """
     if 'arquivo' not in request.files:
         return jsonify({'erro': 'Nenhum arquivo enviado.'}), 400
@@ -175,25 +280,255 @@ def upload_documento():
 
     if not arquivo or not cpf_servidor or not tipo_documento:
         return jsonify({'erro': 'Arquivo, CPF e tipo do documento são obrigatórios.'}), 400
+    try:
+        cpf_servidor = ler_cpf(cpf_servidor)
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
 
-    # Salvar o arquivo
-    nome_arquivo = secure_filename(f"{cpf_servidor}_{tipo_documento}_{datetime.now().isoformat()}.pdf")
-    caminho_arquivo = os.path.join(app.config['UPLOAD_FOLDER'], nome_arquivo)
-    arquivo.save(caminho_arquivo)
-
-    # Salvar registro no banco
-    novo_documento = Documento(
-        cpf_servidor=cpf_servidor,
-        hora_cadastro=datetime.now(),
-        tipo=tipo_documento,
-        caminho_arquivo=caminho_arquivo
-    )
-    db.session.add(novo_documento)
-    db.session.commit()
+    # Salvar o arquivo (SHA-256 e tamanho calculados durante a cópia)
+    try:
+        documento = uploads.salvar_documento(
+            arquivo.stream,
+            current_app.config['UPLOAD_FOLDER'],
+            cpf_servidor,
+            tipo_documento,
+            current_app.config['MAX_TAMANHO_DOCUMENTO']
+        )
+    except uploads.TamanhoExcedido as e:
+        return jsonify({'erro': str(e)}), 413
+
+    cache.invalidar_documentos(cpf_servidor)
+
+    return jsonify({
+        'mensagem': 'Documento enviado com sucesso!',
+        'id_documento': documento.id,
+        'sha256': documento.sha256,
+        'tamanho': documento.tamanho,
+        'status_processamento': 'pendente'
+    }), 201
+
+@bp.route('/upload/iniciar', methods=['POST'])
+@autorizacao.exigir('escrita')
+def upload_iniciar():
+    """
+    Inicia um upload de documento em partes (retomável).
+    ---
+    parameters:
+      - in: body
+        name: body
+        description: Dados do documento
+        schema:
+          type: object
+          required:
+            - cpf_servidor
+            - tipo_documento
+          properties:
+            cpf_servidor:
+              type: string
+              description: CPF do servidor, com ou sem pontuação
+            tipo_documento:
+              type: string
+              description: Tipo do documento
+            tamanho:
+              type: integer
+              description: Tamanho total previsto em bytes (opcional, verificado contra o máximo permitido)
+    responses:
+      201:
+        description: Upload iniciado; envie as partes em ordem para /upload/<upload_id>/partes/<numero>, começando em 0
+        schema:
+          type: object
+          properties:
+            upload_id:
+              type: string
+            proxima_parte:
+              type: integer
+            tamanho_maximo:
+              type: integer
+      400:
+        description: CPF ou tipo do documento ausentes, ou CPF inválido
+      413:
+        description: Tamanho previsto excede o máximo permitido
+    """
+    dados = request.get_json(silent=True) or {}
+    cpf_servidor = dados.get('cpf_servidor')
+    tipo_documento = dados.get('tipo_documento')
+    tamanho = dados.get('tamanho')
+
+    if not cpf_servidor or not tipo_documento:
+        return jsonify({'erro': 'CPF e tipo do documento são obrigatórios.'}), 400
+    if tamanho is not None and not isinstance(tamanho, int):
+        return jsonify({'erro': "O campo 'tamanho' deve ser um número inteiro."}), 400
+    try:
+        cpf_servidor = ler_cpf(cpf_servidor)
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+
+    try:
+        upload = uploads.iniciar(
+            current_app.config['UPLOAD_FOLDER'],
+            cpf_servidor,
+            tipo_documento,
+            tamanho,
+            current_app.config['MAX_TAMANHO_DOCUMENTO']
+        )
+    except uploads.TamanhoExcedido as e:
+        return jsonify({'erro': str(e)}), 413
+
+    return jsonify({
+        'upload_id': upload.id,
+        'proxima_parte': upload.proxima_parte,
+        'tamanho_maximo': current_app.config['MAX_TAMANHO_DOCUMENTO']
+    }), 201
+
+@bp.route('/upload/<upload_id>', methods=['GET'])
+@autorizacao.exigir('escrita')
+def upload_status(upload_id):
+    """
+    Consulta o andamento de um upload em partes, para retomá-lo após uma queda.
+    ---
+    parameters:
+      - in: path
+        name: upload_id
+        type: string
+        description: Identificador retornado por /upload/iniciar
+    responses:
+      200:
+        description: Próxima parte esperada e bytes já recebidos
+        schema:
+          type: object
+          properties:
+            upload_id:
+              type: string
+            proxima_parte:
+              type: integer
+            recebido:
+              type: integer
+      404:
+        description: Upload não encontrado
+    """
+    try:
+        upload = uploads.buscar(upload_id)
+    except uploads.UploadNaoEncontrado as e:
+        return jsonify({'erro': str(e)}), 404
+
+    return jsonify({
+        'upload_id': upload.id,
+        'proxima_parte': upload.proxima_parte,
+        'recebido': upload.recebido
+    }), 200
+
+@bp.route('/upload/<upload_id>/partes/<int:numero>', methods=['PUT'])
+@autorizacao.exigir('escrita')
+def upload_parte(upload_id, numero):
+    """
+    Envia uma parte de um upload. O corpo da requisição é o conteúdo binário da parte.
+    ---
+    consumes:
+      - application/octet-stream
+    parameters:
+      - in: path
+        name: upload_id
+        type: string
+        description: Identificador retornado por /upload/iniciar
+      - in: path
+        name: numero
+        type: integer
+        description: Número da parte, começando em 0. Reenviar uma parte já confirmada não tem efeito
+    responses:
+      200:
+        description: Parte gravada
+        schema:
+          type: object
+          properties:
+            upload_id:
+              type: string
+            proxima_parte:
+              type: integer
+            recebido:
+              type: integer
+      404:
+        description: Upload não encontrado
+      409:
+        description: Parte fora de ordem; a resposta informa a parte esperada
+      413:
+        description: O documento excederia o tamanho máximo permitido
+    """
+    try:
+        upload = uploads.gravar_parte(upload_id, numero, request.stream, current_app.config['MAX_TAMANHO_DOCUMENTO'])
+    except uploads.UploadNaoEncontrado as e:
+        return jsonify({'erro': str(e)}), 404
+    except uploads.ParteForaDeOrdem as e:
+        return jsonify({'erro': str(e), 'proxima_parte': uploads.buscar(upload_id).proxima_parte}), 409
+    except uploads.TamanhoExcedido as e:
+        return jsonify({'erro': str(e)}), 413
+
+    return jsonify({
+        'upload_id': upload.id,
+        'proxima_parte': upload.proxima_parte,
+        'recebido': upload.recebido
+    }), 200
+
+@bp.route('/upload/<upload_id>/finalizar', methods=['POST'])
+@autorizacao.exigir('escrita')
+def upload_finalizar(upload_id):
+    """
+    Finaliza um upload em partes e cadastra o documento.
+    ---
+    parameters:
+      - in: path
+        name: upload_id
+        type: string
+        description: Identificador retornado por /upload/iniciar
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            sha256:
+              type: string
+              description: Hash esperado do arquivo completo; se informado, é conferido antes de cadastrar
+    responses:
+      201:
+        description: Documento cadastrado
+        schema:
+          type: object
+          properties:
+            id_documento:
+              type: integer
+            sha256:
+              type: string
+            tamanho:
+              type: integer
+            status_processamento:
+              type: string
+              description: "'pendente': validação, páginas, miniatura e texto são feitos em segundo plano (ver /documento/{id}/processamento)"
+      404:
+        description: Upload não encontrado
+      422:
+        description: O SHA-256 informado não confere com o conteúdo recebido
+    """
+    dados = request.get_json(silent=True) or {}
 
-    return jsonify({'mensagem': 'Documento enviado com sucesso!'}), 201
+    try:
+        documento = uploads.finalizar(upload_id, current_app.config['UPLOAD_FOLDER'], dados.get('sha256'))
+    except uploads.UploadNaoEncontrado as e:
+        return jsonify({'erro': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 422
+
+    cache.invalidar_documentos(documento.cpf_servidor)
 
-@app.route('/download/<int:id>', methods=['GET'])
+    return jsonify({
+        'mensagem': 'Documento enviado com sucesso!',
+        'id_documento': documento.id,
+        'sha256': documento.sha256,
+        'tamanho': documento.tamanho,
+        'status_processamento': 'pendente'
+    }), 201
+
+@bp.route('/download/<int:id>', methods=['GET'])
+@autorizacao.exigir('leitura')
 def download_documento(id):
     """
     Realiza o download de um documento.
@@ -203,23 +538,190 @@ def download_documento(id):
         name: id
         type: integer
         description: ID do documento
+      - in: header
+        name: If-None-Match
+        type: string
+        description: ETag (SHA-256 do conteúdo) de uma cópia já baixada
+      - in: header
+        name: Range
+        type: string
+        description: "Intervalos de bytes, ex.: 'bytes=0-1023' ou 'bytes=0-99,5000-5999'"
     responses:
       200:
         description: Documento encontrado e enviado para download
+      206:
+        description: Conteúdo parcial (um intervalo, ou multipart/byteranges para vários)
+      304:
+        description: Documento não modificado desde a cópia do cliente
       404:
         description: Documento não encontrado
+      416:
+        description: Nenhum dos intervalos pedidos existe no arquivo
     """
-    documento = Documento.query.get(id)
+    documento = downloads.buscar(id)
     if not documento:
         return jsonify({'erro': 'Documento não encontrado.'}), 404
+    downloads.registrar_acesso(documento)  # Base da migração entre camadas (flask armazenamento camadas)
+
+    # Cliente já tem esta versão: responde só com o registro do banco, sem tocar no arquivo
+    if downloads.nao_modificado(documento, request.headers):
+        return downloads.resposta_304(documento)
 
-    caminho_arquivo = documento.caminho_arquivo
-    if not os.path.exists(caminho_arquivo):
+    if not os.path.exists(documento.caminho_arquivo):
         return jsonify({'erro': 'Arquivo não encontrado no servidor.'}), 404
 
-    return send_file(caminho_arquivo, as_attachment=True)
+    return downloads.responder(documento, request.headers, current_app.config)
+
+@bp.route('/download_lote', methods=['GET'])
+@autorizacao.exigir('leitura')
+def download_lote():
+    """
+    Baixa vários documentos num único ZIP, montado e enviado em fluxo.
+    ---
+    produces:
+      - application/zip
+    parameters:
+      - in: query
+        name: cpf
+        type: string
+        description: CPF do servidor, com ou sem pontuação (todos os documentos dele, sujeitos aos filtros)
+      - in: query
+        name: ids
+        type: string
+        description: "IDs dos documentos separados por vírgula, ex.: '10,11,42'"
+      - in: query
+        name: tipo
+        type: string
+        description: Tipo do documento
+      - in: query
+        name: desde
+        type: string
+        format: date-time
+        description: Documentos cadastrados a partir desta data/hora (ISO 8601)
+      - in: query
+        name: ate
+        type: string
+        format: date-time
+        description: Documentos cadastrados antes desta data/hora (ISO 8601)
+    responses:
+      200:
+        description: "ZIP com um PDF por documento (nome: <cpf>_<tipo>_<id>.pdf)"
+      400:
+        description: Sem CPF nem ids, parâmetro inválido ou documentos acima de DOWNLOAD_LOTE_MAXIMO
+      404:
+        description: Nenhum documento encontrado
+    """
+    cpf_servidor = request.args.get('cpf')
+    maximo = current_app.config['DOWNLOAD_LOTE_MAXIMO']
+    try:
+        cpf_servidor = ler_cpf(cpf_servidor) if cpf_servidor else None
+        ids = [int(id) for id in request.args.get('ids', '').split(',') if id.strip()]
+        desde = ler_data(request.args.get('desde'), 'desde')
+        ate = ler_data(request.args.get('ate'), 'ate')
+    except ValueError as e:
+        mensagem = str(e) if isinstance(e, ParametroInvalido) else "O parâmetro 'ids' deve ser uma lista de inteiros."
+        return jsonify({'erro': mensagem}), 400
+    if not cpf_servidor and not ids:
+        return jsonify({'erro': "Informe 'cpf' ou 'ids'."}), 400
+    if len(ids) > maximo:
+        return jsonify({'erro': f'No máximo {maximo} documentos por lote.'}), 400
+
+    # Uma única consulta traz caminho, tamanho e camada de todos os documentos
+    documentos = db.session.execute(downloads.consulta_lote(
+        cpf=cpf_servidor, ids=ids, tipo=request.args.get('tipo'), desde=desde, ate=ate, limite=maximo
+    )).all()
+    if not documentos:
+        return jsonify({'erro': 'Nenhum documento encontrado.'}), 404
+    if len(documentos) > maximo:
+        return jsonify({'erro': f'O lote passa de {maximo} documentos. Use os filtros tipo, desde e ate.'}), 400
+    downloads.registrar_acessos(documentos)
+
+    nome = f"documentos_{serializacao.formatar_cpf(cpf_servidor) if cpf_servidor else 'lote'}.zip"
+    resposta = Response(downloads.gerar_zip(documentos, current_app.logger), mimetype='application/zip')
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome}"'
+    resposta.headers['Cache-Control'] = 'private, no-store'
+    resposta.headers['X-Documentos'] = str(len(documentos))
+    return resposta
+
+@bp.route('/documento/<int:id>/processamento', methods=['GET'])
+@autorizacao.exigir('leitura')
+def processamento_documento(id):
+    """
+    Situação do processamento em segundo plano de um documento.
+    ---
+    parameters:
+      - in: path
+        name: id
+        type: integer
+        description: ID do documento
+    responses:
+      200:
+        description: Status do processamento
+        schema:
+          type: object
+          properties:
+            id_documento:
+              type: integer
+            status:
+              type: string
+              enum: [pendente, processando, concluido, invalido, falhou]
+            paginas:
+              type: integer
+            miniatura_disponivel:
+              type: boolean
+            tentativas:
+              type: integer
+            erro:
+              type: string
+              description: Último erro, se houve
+            proxima_tentativa:
+              type: string
+              format: date-time
+              description: Quando a tarefa volta a ser executada (após uma falha)
+      404:
+        description: Documento não encontrado
+    """
+    situacao = tarefas.situacao(id)
+    if situacao is None:
+        return jsonify({'erro': 'Documento não encontrado.'}), 404
+    return jsonify(situacao), 200
+
+@bp.route('/documento/<int:id>/miniatura', methods=['GET'])
+@autorizacao.exigir('leitura')
+def miniatura_documento(id):
+    """
+    Miniatura (PNG) da primeira página do documento.
+    ---
+    parameters:
+      - in: path
+        name: id
+        type: integer
+        description: ID do documento
+    responses:
+      200:
+        description: Imagem PNG
+      404:
+        description: Documento não encontrado ou miniatura ainda não gerada
+    """
+    caminho = db.session.scalar(db.select(Documento.caminho_miniatura).where(Documento.id == id))
+    if not caminho or not os.path.exists(caminho):
+        return jsonify({'erro': 'Miniatura não disponível.'}), 404
+    return send_file(caminho, mimetype='image/png', max_age=3600, conditional=True)
+
+@bp.route('/tarefas/estatisticas', methods=['GET'])
+@autorizacao.exigir('administracao')
+def tarefas_estatisticas():
+    """
+    Situação da fila de processamento de documentos.
+    ---
+    responses:
+      200:
+        description: Tarefas por estado e espera da mais antiga disponível, em segundos
+    """
+    return jsonify(tarefas.estatisticas()), 200
 
-@app.route('/cadastro_servidor', methods=['POST'])
+@bp.route('/cadastro_servidor', methods=['POST'])
+@autorizacao.exigir('escrita')
 def cadastro_servidor():
     """
     Realiza o cadastro de um servidor.
@@ -244,7 +746,7 @@ def cadastro_servidor():
               description: Nome do servidor
             cpf:
               type: string
-              description: CPF do servidor
+              description: CPF do servidor, com ou sem pontuação
             matricula:
               type: string
               description: Matrícula do servidor
@@ -264,37 +766,143 @@ def cadastro_servidor():
       201:
         description: Servidor cadastrado com sucesso
       400:
-        description: Erro de validação, campos obrigatórios ausentes
+        description: Erro de validação, campos obrigatórios ausentes ou CPF inválido
+      409:
+        description: CPF ou matrícula já cadastrados
     """
     data = request.get_json()
 
     # Verificar se todos os campos foram preenchidos
-    if not data or not all(key in data for key in ['nome', 'cpf', 'matricula', 'codigo_orgao', 'ativo', 'cargo', 'lotacao']):
+    if not data or not all(key in data for key in carga.CAMPOS_SERVIDOR):
         return jsonify({'erro': 'Todos os campos são obrigatórios.'}), 400
+    try:
+        # Mesma validação da carga em lote: textos sem espaços nas pontas, ativo como booleano, CPF como inteiro
+        dados = carga.validar_registro(data)
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
 
     try:
-        # Criar o servidor a partir dos dados recebidos
-        novo_servidor = Servidor(
-            nome=data['nome'],
-            cpf=data['cpf'],
-            matricula=data['matricula'],
-            codigo_orgao=data['codigo_orgao'],
-            ativo=data['ativo'],
-            cargo=data['cargo'],
-            lotacao=data['lotacao']
-        )
+        # Criar o servidor a partir dos dados validados
+        novo_servidor = Servidor(**dados)
 
-        # Adicionar e salvar o servidor no banco de dados
+        # Adicionar e salvar o servidor no banco de dados; um duplicado falha no flush, antes dos resumos.
+        # Os resumos recebem os mesmos valores gravados na linha
         db.session.add(novo_servidor)
+        db.session.flush()
+        estatisticas.contar_servidores([dados])
         db.session.commit()
+        cache.invalidar_servidor(novo_servidor.cpf, novo_servidor.matricula)
 
         return jsonify({'mensagem': 'Servidor cadastrado com sucesso!'}), 201
-    
+
+    except IntegrityError:
+        db.session.rollback()
+        # Mesmas mensagens da carga em lote
+        if db.session.scalar(db.select(Servidor.id).where(Servidor.cpf == dados['cpf'])) is not None:
+            return jsonify({'erro': 'CPF já cadastrado.'}), 409
+        if db.session.scalar(db.select(Servidor.id).where(Servidor.matricula == dados['matricula'])) is not None:
+            return jsonify({'erro': 'Matrícula já cadastrada.'}), 409
+        return jsonify({'erro': 'Os campos não podem ser nulos.'}), 400
+
     except Exception as e:
         # Tratar outros erros
+        db.session.rollback()
         return jsonify({'erro': str(e)}), 500
     
-@app.route('/consulta_servidor', methods=['GET'])
+@bp.route('/cadastro_servidor/lote', methods=['POST'])
+@autorizacao.exigir('escrita')
+def cadastro_servidor_lote():
+    """
+    Cadastra servidores em lote.
+    ---
+    consumes:
+      - application/json
+      - application/x-ndjson
+      - text/csv
+    parameters:
+      - in: body
+        name: body
+        description: "Array JSON de servidores, um servidor JSON por linha (NDJSON) ou CSV com cabeçalho (nome,cpf,matricula,codigo_orgao,ativo,cargo,lotacao)"
+        schema:
+          type: array
+          items:
+            type: object
+      - in: query
+        name: tamanho_lote
+        type: integer
+        description: Quantidade de servidores inseridos por transação (padrão 1000, máximo 10000)
+    responses:
+      200:
+        description: Carga processada; linhas rejeitadas (CPF/matrícula duplicados, campos ausentes) são listadas em 'erros'
+        schema:
+          type: object
+          properties:
+            recebidos:
+              type: integer
+            inseridos:
+              type: integer
+            erros:
+              type: array
+              items:
+                type: object
+                properties:
+                  linha:
+                    type: integer
+                  cpf:
+                    type: string
+                  erro:
+                    type: string
+      400:
+        description: Content-Type não suportado, corpo malformado ou tamanho_lote inválido
+    """
+    try:
+        tamanho_lote = ler_limite(
+            request.args.get('tamanho_lote'),
+            padrao=carga.TAMANHO_LOTE_PADRAO,
+            maximo=carga.TAMANHO_LOTE_MAXIMO,
+            nome='tamanho_lote'
+        )
+        registros = carga.ler_registros(request.stream, request.content_type)
+        resumo = carga.inserir_em_lotes(registros, tamanho_lote)
+    except ParametroInvalido as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 400
+    finally:
+        # Lotes já gravados antes de um erro também invalidam o cache
+        cache.invalidar_servidores()
+
+    return jsonify(resumo), 200
+
+# Colunas retornadas nas consultas de servidores (projeção sem instanciar objetos ORM)
+COLUNAS_SERVIDOR = (
+    Servidor.id,
+    Servidor.nome,
+    Servidor.cpf,
+    Servidor.matricula,
+    Servidor.codigo_orgao,
+    Servidor.ativo,
+    Servidor.cargo,
+    Servidor.lotacao,
+)
+
+def _chave_cpf(prefixo, cpf):
+    # Chave pelo CPF normalizado: '52998224725' e '529.982.247-25' usam a mesma entrada
+    try:
+        return cache.chave(prefixo, cpf=ler_cpf(cpf))
+    except ParametroInvalido:
+        return None  # A view responde 400
+
+def chave_consulta_servidor(args):
+    # Só as consultas exatas por CPF ou por matrícula (sem paginação) entram no cache
+    if set(args) == {'cpf'}:
+        return _chave_cpf('servidor', args['cpf'])
+    if set(args) == {'matricula'}:
+        return cache.chave('servidor', matricula=args['matricula'])
+    return None
+
+@bp.route('/consulta_servidor', methods=['GET'])
+@autorizacao.exigir('leitura')
+@cache.em_cache(chave_consulta_servidor)
 def consulta_servidor():
     """
     Consulta servidores de acordo com os parâmetros fornecidos.
@@ -303,11 +911,11 @@ def consulta_servidor():
       - in: query
         name: nome
         type: string
-        description: Nome do servidor (parcial ou completo)
+        description: "Nome do servidor: cada termo casa por prefixo e sem acentos ('claud sant' encontra 'Cláudia Santos'). Resultados ordenados por relevância"
       - in: query
         name: cpf
         type: string
-        description: CPF do servidor
+        description: CPF do servidor, com ou sem pontuação
       - in: query
         name: matricula
         type: string
@@ -316,6 +924,31 @@ def consulta_servidor():
         name: codigo_orgao
         type: string
         description: Código do órgão do servidor
+      - in: query
+        name: ativo
+        type: boolean
+        description: Filtra servidores ativos (true) ou inativos (false)
+      - in: query
+        name: lotacao
+        type: string
+        description: Lotação do servidor
+      - in: query
+        name: limit
+        type: integer
+        description: Quantidade máxima de servidores por página (padrão 50, máximo 500)
+      - in: query
+        name: cursor
+        type: string
+        description: Cursor opaco retornado em 'proximo_cursor' pela página anterior
+      - in: query
+        name: formato
+        type: string
+        enum: [json, ndjson]
+        description: "'ndjson' transmite um servidor por linha à medida que são lidos do banco"
+      - in: query
+        name: diagnostico
+        type: boolean
+        description: Inclui na resposta quantas linhas a busca por nome examinou e quantas encontrou
     responses:
       200:
         description: Lista de servidores encontrados
@@ -343,6 +976,17 @@ def consulta_servidor():
                     type: string
                   lotacao:
                     type: string
+                  relevancia:
+                    type: number
+                    description: Presente apenas na busca por nome (menor = mais relevante)
+            proximo_cursor:
+              type: string
+              description: Cursor da próxima página (nulo na última página)
+            busca:
+              type: object
+              description: "Com diagnostico=true: índice usado, linhas examinadas e linhas encontradas"
+      400:
+        description: Parâmetro de paginação ou filtro inválido
       404:
         description: Nenhum servidor encontrado com os parâmetros fornecidos
     """
@@ -351,41 +995,177 @@ def consulta_servidor():
     cpf = request.args.get('cpf')
     matricula = request.args.get('matricula')
     codigo_orgao = request.args.get('codigo_orgao')
+    lotacao = request.args.get('lotacao')
+    cursor = request.args.get('cursor')
+    streaming = request.args.get('formato') == 'ndjson' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+
+    try:
+        cpf = ler_cpf(cpf) if cpf else None
+        ativo = ler_booleano(request.args.get('ativo'))
+        # No modo streaming o limite só é aplicado se informado explicitamente
+        limite = ler_limite(request.args.get('limit')) if not streaming or request.args.get('limit') else None
+        chave_cursor = decodificar_cursor(cursor) if cursor else None
+        diagnostico = ler_booleano(request.args.get('diagnostico'))
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
 
     # Construindo a consulta de acordo com os parâmetros passados
-    query = Servidor.query
+    query = db.select(*COLUNAS_SERVIDOR)
+    relevancia = None
 
     if nome:
-        query = query.filter(Servidor.nome.ilike(f'%{nome}%'))  # Filtra pelo nome (case-insensitive)
+        query, relevancia = busca.aplicar_filtro_nome(query, nome)  # Índice de texto, sem acentos
     if cpf:
-        query = query.filter(Servidor.cpf == cpf)  # Filtra pelo CPF exato
+        query = query.where(Servidor.cpf == cpf)  # Filtra pelo CPF exato
     if matricula:
-        query = query.filter(Servidor.matricula == matricula)  # Filtra pela matrícula exata
+        query = query.where(Servidor.matricula == matricula)  # Filtra pela matrícula exata
     if codigo_orgao:
-        query = query.filter(Servidor.codigo_orgao == codigo_orgao)  # Filtra pelo código do órgão exato
+        query = query.where(Servidor.codigo_orgao == codigo_orgao)  # Filtra pelo código do órgão exato
+    if ativo is not None:
+        query = query.where(Servidor.ativo == ativo)
+    if lotacao:
+        query = query.where(Servidor.lotacao == lotacao)
+
+    # Keyset: continua depois do último registro entregue (relevância, id) ou (id)
+    if relevancia is not None:
+        if chave_cursor:
+            ultima_relevancia = chave_cursor.get('relevancia', 0)
+            query = query.where(db.or_(
+                relevancia > ultima_relevancia,
+                db.and_(relevancia == ultima_relevancia, Servidor.id > chave_cursor['id'])
+            ))
+        query = query.order_by(relevancia, Servidor.id)
+    else:
+        if chave_cursor:
+            query = query.where(Servidor.id > chave_cursor['id'])
+        query = query.order_by(Servidor.id)
+
+    # Tuplas direto para JSON, sem entidades ORM
+    serializador = serializacao.SerializadorLinhas.da_consulta(query)
 
-    # Executa a consulta
-    servidores = query.all()
+    if streaming:
+        if limite is not None:
+            query = query.limit(limite)
+
+        def gerar_linhas():
+            # stream_results usa cursor do lado do servidor; yield_per busca as linhas em lotes
+            resultado = db.session.execute(query.execution_options(stream_results=True, yield_per=500))
+            yield from serializador.ndjson(resultado)
+
+        return Response(stream_with_context(gerar_linhas()), mimetype='application/x-ndjson')
+
+    # Busca um registro a mais para saber se existe próxima página
+    linhas = db.session.execute(query.limit(limite + 1)).all()
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        if relevancia is not None:
+            proximo_cursor = codificar_cursor(id=linhas[-1].id, relevancia=linhas[-1].relevancia)
+        else:
+            proximo_cursor = codificar_cursor(id=linhas[-1].id)
 
     # Verifica se algum servidor foi encontrado
-    if servidores:
-        # Retorna a lista de servidores encontrados
-        servidores_list = [{
-            'id': servidor.id,
-            'nome': servidor.nome,
-            'cpf': servidor.cpf,
-            'matricula': servidor.matricula,
-            'codigo_orgao': servidor.codigo_orgao,
-            'ativo': servidor.ativo,
-            'cargo': servidor.cargo,
-            'lotacao': servidor.lotacao
-        } for servidor in servidores]
-        
-        return jsonify({'servidores': servidores_list}), 200
+    if linhas or cursor:
+        # Retorna a página de servidores encontrados
+        servidores_list = serializador.lista(linhas)
+        resposta = {'servidores': servidores_list, 'proximo_cursor': proximo_cursor}
+
+        if diagnostico and relevancia is not None:
+            resposta['busca'] = {
+                'indice': busca.backend(),
+                'linhas_examinadas': busca.contar_candidatos(nome),
+                'linhas_encontradas': db.session.scalar(
+                    db.select(db.func.count()).select_from(query.order_by(None).subquery())
+                ),
+            }
+
+        return jsonify(resposta), 200
     else:
         return jsonify({'mensagem': 'Nenhum servidor encontrado para os parâmetros fornecidos.'}), 404
     
-@app.route('/consulta_documentos', methods=['GET'])
+@bp.route('/consulta_servidor/lote', methods=['POST'])
+@autorizacao.exigir('leitura')
+def consulta_servidor_lote():
+    """
+    Consulta muitos servidores de uma vez, por CPF ou por matrícula.
+    ---
+    parameters:
+      - in: body
+        name: body
+        description: "Lista de CPFs ou de matrículas (apenas uma das duas). CPFs são aceitos com ou sem pontuação"
+        schema:
+          type: object
+          properties:
+            cpfs:
+              type: array
+              items:
+                type: string
+            matriculas:
+              type: array
+              items:
+                type: string
+            incluir_documentos:
+              type: boolean
+              description: Inclui a quantidade de documentos de cada servidor encontrado
+    responses:
+      200:
+        description: "Um resultado por identificador, na ordem recebida; os não encontrados vêm com encontrado=false"
+        schema:
+          type: object
+          properties:
+            resultados:
+              type: array
+              items:
+                type: object
+                properties:
+                  entrada:
+                    type: string
+                  encontrado:
+                    type: boolean
+                  servidor:
+                    type: object
+                  erro:
+                    type: string
+                    description: Identificador malformado (CPF sem 11 dígitos, matrícula vazia)
+            recebidos:
+              type: integer
+            encontrados:
+              type: integer
+      400:
+        description: Corpo inválido ou mais identificadores que o permitido (CONSULTA_LOTE_MAXIMO)
+    """
+    try:
+        campo, valores, incluir_documentos = servidores_lote.ler_pedido(
+            request.get_json(silent=True), current_app.config['CONSULTA_LOTE_MAXIMO']
+        )
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+
+    resultados = servidores_lote.resolver(campo, valores, incluir_documentos)
+    return jsonify({
+        'resultados': resultados,
+        'recebidos': len(resultados),
+        'encontrados': sum(1 for resultado in resultados if resultado['encontrado']),
+    }), 200
+
+# Colunas de /consulta_documentos, já com os nomes usados na resposta
+COLUNAS_CONSULTA_DOCUMENTOS = (
+    Documento.id.label('id_documento'),
+    Documento.cpf_servidor,
+    Documento.hora_cadastro.label('hora_cadastro_documento'),
+    Documento.tipo.label('tipo_documento'),
+    Documento.caminho_arquivo,
+)
+
+def chave_consulta_documentos(args):
+    if set(args) == {'cpf'}:
+        return _chave_cpf('documentos', args['cpf'])
+    return None
+
+@bp.route('/consulta_documentos', methods=['GET'])
+@autorizacao.exigir('leitura')
+@cache.em_cache(chave_consulta_documentos)
 def consulta_documentos():
     """
     Consulta documentos vinculados a um servidor pelo CPF.
@@ -394,7 +1174,7 @@ def consulta_documentos():
       - in: query
         name: cpf
         type: string
-        description: CPF do servidor, utilizado para buscar os documentos
+        description: CPF do servidor (com ou sem pontuação), utilizado para buscar os documentos
     responses:
       200:
         description: Lista de documentos encontrados para o servidor
@@ -416,7 +1196,7 @@ def consulta_documentos():
                   tipo_documento:
                     type: string
       400:
-        description: CPF do servidor é obrigatório
+        description: CPF do servidor ausente ou inválido (dígitos verificadores)
       404:
         description: Nenhum documento encontrado para o CPF do servidor fornecido
     """
@@ -424,37 +1204,82 @@ def consulta_documentos():
     
     if not cpf_servidor:
         return jsonify({'mensagem': 'CPF do servidor é obrigatório.'}), 400
+    try:
+        cpf_servidor = ler_cpf(cpf_servidor)
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
     
-    # Consultando documentos vinculados ao servidor
-    documentos = Documento.query.filter(Documento.cpf_servidor == cpf_servidor).all()
+    # Consultando documentos vinculados ao servidor (só as colunas da resposta, sem objetos ORM)
+    query = db.select(*COLUNAS_CONSULTA_DOCUMENTOS) \
+        .where(Documento.cpf_servidor == cpf_servidor) \
+        .order_by(Documento.id)
+    documentos = db.session.execute(query).all()
     
     if documentos:
         # Montando a resposta com os dados dos documentos
-        documentos_list = [{
-            'id_documento': documento.id,
-            'cpf_servidor': documento.cpf_servidor,
-            'hora_cadastro_documento': documento.hora_cadastro,
-            'tipo_documento': documento.tipo,
-            'caminho_arquivo': documento.caminho_arquivo
-        } for documento in documentos]
+        documentos_list = serializacao.SerializadorLinhas.da_consulta(query).lista(documentos)
         
         return jsonify({'documentos': documentos_list}), 200
     else:
         return jsonify({'mensagem': 'Nenhum documento encontrado para o servidor com CPF fornecido.'}), 404
     
-@app.route('/consulta_documentos_', methods=['GET'])
+# Campos que a listagem de documentos pode projetar (nome na resposta -> coluna)
+CAMPOS_LISTAGEM_DOCUMENTOS = {
+    'id_documento': Documento.id,
+    'cpf_servidor': Documento.cpf_servidor,
+    'hora_cadastro_documento': Documento.hora_cadastro,
+    'tipo_documento': Documento.tipo,
+    'caminho_arquivo': Documento.caminho_arquivo,
+    'sha256': Documento.sha256,
+    'tamanho': Documento.tamanho,
+    # Campos do servidor, obtidos por JOIN na mesma consulta
+    'nome_servidor': Servidor.nome,
+    'matricula_servidor': Servidor.matricula,
+    'codigo_orgao_servidor': Servidor.codigo_orgao,
+    'lotacao_servidor': Servidor.lotacao,
+}
+CAMPOS_LISTAGEM_PADRAO = ['id_documento', 'cpf_servidor', 'hora_cadastro_documento', 'tipo_documento']
+
+@bp.route('/consulta_documentos_', methods=['GET'])
+@autorizacao.exigir('leitura')
 def consulta_documentos_():
     """
-    Consulta documentos vinculados a um servidor pelo CPF.
+    Lista documentos (administração), com projeção de campos, filtros e paginação por cursor.
     ---
     parameters:
+      - in: query
+        name: campos
+        type: string
+        description: "Campos separados por vírgula. Documento: id_documento, cpf_servidor, hora_cadastro_documento, tipo_documento, caminho_arquivo, sha256, tamanho. Servidor (via JOIN): nome_servidor, matricula_servidor, codigo_orgao_servidor, lotacao_servidor. Padrão: id_documento, cpf_servidor, hora_cadastro_documento, tipo_documento"
       - in: query
         name: cpf
         type: string
-        description: CPF do servidor, utilizado para buscar os documentos
+        description: CPF do servidor, com ou sem pontuação
+      - in: query
+        name: tipo
+        type: string
+        description: Tipo do documento
+      - in: query
+        name: desde
+        type: string
+        format: date-time
+        description: Documentos cadastrados a partir desta data/hora (ISO 8601)
+      - in: query
+        name: ate
+        type: string
+        format: date-time
+        description: Documentos cadastrados antes desta data/hora (ISO 8601)
+      - in: query
+        name: limit
+        type: integer
+        description: Quantidade máxima de documentos por página (padrão 50, máximo 500)
+      - in: query
+        name: cursor
+        type: string
+        description: Cursor opaco retornado em 'proximo_cursor' pela página anterior
     responses:
       200:
-        description: Lista de documentos encontrados para o servidor
+        description: Página de documentos, apenas com os campos pedidos (id_documento sempre incluído)
         schema:
           type: object
           properties:
@@ -472,23 +1297,651 @@ def consulta_documentos_():
                     format: date-time
                   tipo_documento:
                     type: string
+            proximo_cursor:
+              type: string
+              description: Cursor da próxima página (nulo na última página)
       400:
-        description: CPF do servidor é obrigatório
+        description: Campo, filtro ou parâmetro de paginação inválido
       404:
-        description: Nenhum documento encontrado para o CPF do servidor fornecido
+        description: Nenhum documento encontrado
     """
-    
-    
-    # Consultando documentos vinculados ao servidor
-    documentos = Documento.query.all()
-    
-    if documentos:
+    cpf_servidor = request.args.get('cpf')
+    tipo = request.args.get('tipo')
+    cursor = request.args.get('cursor')
+
+    try:
+        cpf_servidor = ler_cpf(cpf_servidor) if cpf_servidor else None
+        campos = ler_campos(request.args.get('campos'), CAMPOS_LISTAGEM_DOCUMENTOS, CAMPOS_LISTAGEM_PADRAO)
+        desde = ler_data(request.args.get('desde'), 'desde')
+        ate = ler_data(request.args.get('ate'), 'ate')
+        limite = ler_limite(request.args.get('limit'))
+        chave_cursor = decodificar_cursor(cursor) if cursor else None
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+
+    # O id é necessário para o cursor da próxima página
+    if 'id_documento' not in campos:
+        campos.insert(0, 'id_documento')
+
+    # Seleciona só as colunas pedidas; as linhas vêm como tuplas, sem objetos ORM
+    query = db.select(*(CAMPOS_LISTAGEM_DOCUMENTOS[campo].label(campo) for campo in campos))
+    if any(CAMPOS_LISTAGEM_DOCUMENTOS[campo].class_ is Servidor for campo in campos):
+        query = query.join(Servidor, Servidor.cpf == Documento.cpf_servidor)
+    else:
+        query = query.select_from(Documento)
+
+    if cpf_servidor:
+        query = query.where(Documento.cpf_servidor == cpf_servidor)
+    if tipo:
+        query = query.where(Documento.tipo == tipo)
+    if desde:
+        query = query.where(Documento.hora_cadastro >= desde)
+    if ate:
+        query = query.where(Documento.hora_cadastro < ate)
+    if chave_cursor:
+        query = query.where(Documento.id > chave_cursor['id'])
+
+    # Busca um registro a mais para saber se existe próxima página
+    linhas = db.session.execute(query.order_by(Documento.id).limit(limite + 1)).all()
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = codificar_cursor(id=linhas[-1].id_documento)
+
+    if linhas or cursor:
         # Montando a resposta com os dados dos documentos
-        documentos_list = [documento.__dict__ for documento in documentos]
-        
-        return {'documentos': documentos_list}, 200
+        documentos_list = serializacao.SerializadorLinhas.da_consulta(query).lista(linhas)
+
+        return jsonify({'documentos': documentos_list, 'proximo_cursor': proximo_cursor}), 200
     else:
         return jsonify({'mensagem': 'Nenhum documento encontrado .'}), 404
 
+# Colunas de cada resultado da busca no texto dos documentos
+COLUNAS_BUSCA_DOCUMENTOS = (
+    Documento.id.label('id_documento'),
+    Documento.cpf_servidor,
+    Documento.tipo.label('tipo_documento'),
+    Documento.hora_cadastro.label('hora_cadastro_documento'),
+    Documento.paginas,
+)
+
+@bp.route('/busca_documentos', methods=['GET'])
+@autorizacao.exigir('leitura')
+def busca_documentos_():
+    """
+    Busca documentos pelo conteúdo (texto extraído dos PDFs), ordenados por relevância.
+    ---
+    parameters:
+      - in: query
+        name: q
+        type: string
+        required: true
+        description: 'Termos que devem aparecer no documento, sem distinção de acentos. Frases entre aspas; termo terminado em * casa por prefixo. Ex.: nascimento "maria da silva" matr*'
+      - in: query
+        name: tipo
+        type: string
+        description: "Tipo do documento (ex.: Certidão)"
+      - in: query
+        name: cpf
+        type: string
+        description: CPF do servidor, com ou sem pontuação
+      - in: query
+        name: limit
+        type: integer
+        description: Quantidade máxima de documentos por página (padrão 50, máximo 500)
+      - in: query
+        name: cursor
+        type: string
+        description: Cursor opaco retornado em 'proximo_cursor' pela página anterior
+    responses:
+      200:
+        description: Documentos encontrados, do mais para o menos relevante
+        schema:
+          type: object
+          properties:
+            documentos:
+              type: array
+              items:
+                type: object
+                properties:
+                  id_documento:
+                    type: integer
+                  cpf_servidor:
+                    type: string
+                  tipo_documento:
+                    type: string
+                  hora_cadastro_documento:
+                    type: string
+                    format: date-time
+                  paginas:
+                    type: integer
+                  trecho:
+                    type: string
+                    description: Trecho do texto com os termos entre <mark> e </mark>
+                  relevancia:
+                    type: number
+                    description: Menor = mais relevante
+            proximo_cursor:
+              type: string
+              description: Cursor da próxima página (nulo na última página)
+      400:
+        description: Consulta ausente ou sem termos pesquisáveis, ou parâmetro de paginação inválido
+      404:
+        description: Nenhum documento encontrado
+    """
+    consulta = request.args.get('q', '')
+    cpf_servidor = request.args.get('cpf')
+    tipo = request.args.get('tipo')
+    cursor = request.args.get('cursor')
+
+    try:
+        cpf_servidor = ler_cpf(cpf_servidor) if cpf_servidor else None
+        limite = ler_limite(request.args.get('limit'))
+        chave_cursor = decodificar_cursor(cursor) if cursor else None
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+
+    query, relevancia = busca_documentos.consultar(consulta, COLUNAS_BUSCA_DOCUMENTOS)
+    if query is None:
+        return jsonify({'erro': "O parâmetro 'q' deve ter ao menos um termo."}), 400
+
+    if cpf_servidor:
+        query = query.where(Documento.cpf_servidor == cpf_servidor)
+    if tipo:
+        query = query.where(Documento.tipo == tipo)
+
+    # Keyset por (relevância, id), como na busca de servidores por nome
+    if chave_cursor:
+        ultima_relevancia = chave_cursor.get('relevancia', 0)
+        query = query.where(db.or_(
+            relevancia > ultima_relevancia,
+            db.and_(relevancia == ultima_relevancia, Documento.id > chave_cursor['id'])
+        ))
+
+    linhas = db.session.execute(query.order_by(relevancia, Documento.id).limit(limite + 1)).all()
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = codificar_cursor(id=linhas[-1].id_documento, relevancia=linhas[-1].relevancia)
+
+    if linhas or cursor:
+        documentos_list = serializacao.SerializadorLinhas.da_consulta(query).lista(linhas)
+        return jsonify({'documentos': documentos_list, 'proximo_cursor': proximo_cursor}), 200
+    else:
+        return jsonify({'mensagem': 'Nenhum documento encontrado para a consulta.'}), 404
+
+@bp.route('/mudancas', methods=['GET'])
+@autorizacao.exigir('leitura')
+def listar_mudancas():
+    """
+    Inserções, alterações e remoções de servidores e documentos depois de um cursor, para sincronização incremental.
+    Sem 'desde', devolve só o cursor atual: guarde-o, faça a carga completa (consulta_servidor,
+    consulta_documentos_) e depois acompanhe por aqui.
+    ---
+    parameters:
+      - in: query
+        name: desde
+        type: string
+        description: Cursor opaco retornado em 'proximo_cursor' pela chamada anterior
+      - in: query
+        name: entidade
+        type: string
+        enum: [servidor, documento]
+        description: Só mudanças desta entidade
+      - in: query
+        name: limit
+        type: integer
+        description: Quantidade máxima de mudanças lidas por página (padrão 500, máximo 5000)
+    responses:
+      200:
+        description: "Mudanças em ordem, com o estado atual de cada linha (várias alterações da mesma linha na página viram uma)"
+        schema:
+          type: object
+          properties:
+            mudancas:
+              type: array
+              items:
+                type: object
+                properties:
+                  entidade:
+                    type: string
+                  id:
+                    type: integer
+                  operacao:
+                    type: string
+                    enum: [insercao, atualizacao, remocao]
+                  registrado_em:
+                    type: string
+                    format: date-time
+                  dados:
+                    type: object
+                    description: Linha atual (nulo nas remoções)
+            proximo_cursor:
+              type: string
+              description: Cursor para a próxima chamada (sempre presente)
+            tem_mais:
+              type: boolean
+              description: Há mais mudanças depois desta página; chame de novo sem esperar
+      400:
+        description: Cursor, entidade ou limite inválido
+      410:
+        description: Cursor anterior à retenção do registro (MUDANCAS_RETENCAO_DIAS); refaça a carga completa
+    """
+    desde = request.args.get('desde')
+    entidade = request.args.get('entidade')
+    try:
+        chave_cursor = decodificar_cursor(desde) if desde else None
+        limite = ler_limite(request.args.get('limit'), mudancas.LIMITE_PADRAO, mudancas.LIMITE_MAXIMO)
+        if entidade and entidade not in mudancas.ENTIDADES:
+            raise ParametroInvalido(f"Entidade inválida. Use: {', '.join(mudancas.ENTIDADES)}.")
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+
+    if chave_cursor is None:
+        # Ponto de partida; pego antes da carga completa, as mudanças feitas durante ela vêm na primeira página
+        return jsonify({'mudancas': [], 'proximo_cursor': codificar_cursor(id=mudancas.ultimo_id()), 'tem_mais': False}), 200
+
+    try:
+        lista, ultimo_lido, tem_mais = mudancas.listar(
+            chave_cursor['id'], limite, entidade, current_app.config['MUDANCAS_ATRASO']
+        )
+    except mudancas.CursorExpirado as e:
+        return jsonify({'erro': f'{e} Refaça a carga completa e recomece sem o parâmetro desde.'}), 410
+
+    return jsonify({'mudancas': lista, 'proximo_cursor': codificar_cursor(id=ultimo_lido), 'tem_mais': tem_mais}), 200
+
+@bp.route('/estatisticas', methods=['GET'])
+@autorizacao.exigir('leitura')
+def estatisticas_gerais():
+    """
+    Contagens para os painéis: servidores por órgão, lotação e cargo (ativos e inativos) e documentos por tipo e dia.
+    ---
+    parameters:
+      - in: query
+        name: codigo_orgao
+        type: string
+        description: Restringe as contagens de servidores a um órgão
+      - in: query
+        name: tipo
+        type: string
+        description: Restringe as contagens de documentos a um tipo
+      - in: query
+        name: desde
+        type: string
+        format: date
+        description: Primeiro dia da série diária de documentos (padrão 29 dias antes de 'ate')
+      - in: query
+        name: ate
+        type: string
+        format: date
+        description: Último dia da série diária de documentos (padrão hoje); no máximo 366 dias de série
+    responses:
+      200:
+        description: "Lidas das tabelas de resumo, mantidas a cada cadastro e upload: o custo não depende do número de registros"
+        schema:
+          type: object
+          properties:
+            servidores:
+              type: object
+              properties:
+                total:
+                  type: integer
+                ativos:
+                  type: integer
+                inativos:
+                  type: integer
+                por_orgao:
+                  type: array
+                  items:
+                    type: object
+                por_lotacao:
+                  type: array
+                  items:
+                    type: object
+                por_cargo:
+                  type: array
+                  items:
+                    type: object
+            documentos:
+              type: object
+              properties:
+                total:
+                  type: integer
+                bytes:
+                  type: integer
+                por_tipo:
+                  type: array
+                  items:
+                    type: object
+                por_dia:
+                  type: array
+                  items:
+                    type: object
+      400:
+        description: Data inválida ou período maior que 366 dias
+    """
+    try:
+        desde = ler_data(request.args.get('desde'), 'desde')
+        ate = ler_data(request.args.get('ate'), 'ate')
+        documentos = estatisticas.documentos(desde and desde.date(), ate and ate.date(), request.args.get('tipo'))
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+
+    return jsonify({
+        'servidores': estatisticas.servidores(request.args.get('codigo_orgao')),
+        'documentos': documentos,
+    }), 200
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Métricas deste worker no formato texto do Prometheus.
+    Exige token de gestor ou o token de coleta METRICAS_TOKEN (Authorization: Bearer <token>).
+    ---
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: "Requisições, latência, tamanho das respostas, consultas SQL e tempo de banco por rota"
+      401:
+        description: Token ausente ou inválido
+      403:
+        description: Permissão insuficiente
+    """
+    if not metricas.coleta_autorizada(current_app.config):
+        erro = autorizacao.autorizar('administracao')
+        if erro is not None:
+            return erro
+    return metricas.resposta_metricas()
+
+@bp.route('/cache/estatisticas', methods=['GET'])
+@autorizacao.exigir('administracao')
+def cache_estatisticas():
+    """
+    Contadores do cache de consultas.
+    ---
+    responses:
+      200:
+        description: Acertos, falhas, despejos, expirações e invalidações do cache deste worker
+    """
+    return jsonify(cache.obter().estatisticas()), 200
+
+@bp.route('/limites/estatisticas', methods=['GET'])
+@autorizacao.exigir('administracao')
+def limites_estatisticas():
+    """
+    Limites de requisições por usuário e por IP e quantas foram recusadas neste worker.
+    ---
+    responses:
+      200:
+        description: Taxas, rajadas e contadores de requisições recusadas (429)
+    """
+    return jsonify(current_app.extensions['autorizacao']['limitador'].estatisticas()), 200
+
+@bp.cli.group('usuarios')
+def usuarios_cli():
+    """Acesso dos usuários."""
+
+
+def _id_usuario(email):
+    id_usuario = db.session.scalar(db.select(Usuario.id).where(Usuario.email == email))
+    if id_usuario is None:
+        raise click.ClickException(f'Usuário {email} não encontrado.')
+    return id_usuario
+
+
+@usuarios_cli.command('revogar')
+@click.argument('email')
+def usuarios_revogar(email):
+    """Invalida os tokens já emitidos do usuário (vale em todos os workers em até AUTORIZACAO_TTL segundos)."""
+    autorizacao.revogar_tokens(_id_usuario(email))
+    click.echo(f'Tokens de {email} revogados.')
+
+
+@usuarios_cli.command('desativar')
+@click.argument('email')
+def usuarios_desativar(email):
+    """Impede o login e revoga os tokens do usuário."""
+    autorizacao.definir_ativo(_id_usuario(email), False)
+    click.echo(f'{email} desativado.')
+
+
+@usuarios_cli.command('ativar')
+@click.argument('email')
+def usuarios_ativar(email):
+    """Permite novamente o login do usuário."""
+    autorizacao.definir_ativo(_id_usuario(email), True)
+    click.echo(f'{email} ativado.')
+
+@bp.cli.group('armazenamento')
+def armazenamento_cli():
+    """Manutenção do armazenamento de documentos."""
+
+
+@armazenamento_cli.command('gc')
+@click.option('--idade-minima', default=24 * 3600, show_default=True,
+              help='Preserva arquivos mais novos que isso (segundos), para não atingir uploads em andamento.')
+def armazenamento_gc(idade_minima):
+    """Remove blobs sem referência, arquivos órfãos e uploads abandonados."""
+    resumo = armazenamento.coletar_lixo(
+        current_app.config['UPLOAD_FOLDER'], idade_minima, camadas.criar(current_app.config)[camadas.ARQUIVO].raiz
+    )
+    click.echo(json.dumps(resumo, indent=2))
+
+
+@armazenamento_cli.command('estatisticas')
+def armazenamento_estatisticas():
+    """Mostra a taxa de deduplicação e a compressão de cada camada do armazenamento."""
+    click.echo(json.dumps(armazenamento.estatisticas(), indent=2))
+
+
+@armazenamento_cli.command('camadas')
+@click.option('--dias-inativos', type=int, default=None,
+              help='Dias sem download para arquivar blobs de servidores inativos (padrão: ARMAZENAMENTO_DIAS_INATIVOS).')
+@click.option('--dias-frios', type=int, default=None,
+              help='Dias sem download para arquivar qualquer blob (padrão: ARMAZENAMENTO_DIAS_FRIOS).')
+@click.option('--limite', type=int, default=None, help='Máximo de blobs movidos em cada sentido.')
+@click.option('--simular', is_flag=True, help='Só conta o que seria movido.')
+def armazenamento_camadas(dias_inativos, dias_frios, limite, simular):
+    """Arquiva (gzip) blobs frios e devolve à camada quente os que voltaram a ser baixados."""
+    resumo = armazenamento.migrar_camadas(
+        camadas.criar(current_app.config),
+        dias_inativos if dias_inativos is not None else current_app.config['ARMAZENAMENTO_DIAS_INATIVOS'],
+        dias_frios if dias_frios is not None else current_app.config['ARMAZENAMENTO_DIAS_FRIOS'],
+        limite,
+        simular
+    )
+    click.echo(json.dumps(resumo, indent=2))
+
+@bp.cli.group('chaves')
+def chaves_cli():
+    """Chaves de assinatura dos tokens JWT."""
+
+
+@chaves_cli.command('listar')
+def chaves_listar():
+    """Mostra as chaves conhecidas e qual assina os novos tokens."""
+    click.echo(json.dumps(chaves.obter().estatisticas(), indent=2))
+
+
+@chaves_cli.command('gerar')
+@click.option('--algoritmo', type=click.Choice(chaves.ALGORITMOS), default=None,
+              help='Padrão: JWT_ALGORITMO.')
+def chaves_gerar(algoritmo):
+    """Cria uma chave privada nova na pasta de chaves; ela passa a assinar os tokens."""
+    kid = chaves.salvar(chaves.pasta_padrao(current_app), chaves.gerar_chave(algoritmo or current_app.config['JWT_ALGORITMO']))
+    click.echo(kid)
+
+
+@chaves_cli.command('rotacionar')
+def chaves_rotacionar():
+    """Cria uma chave nova e aposenta as anteriores (continuam só verificando)."""
+    pasta = chaves.pasta_padrao(current_app)
+    anteriores = [kid for kid, chave in chaves.ler_pasta(pasta).items() if chave[1].privada is not None]
+    kid = chaves.salvar(pasta, chaves.gerar_chave(current_app.config['JWT_ALGORITMO']))
+    for anterior in anteriores:
+        chaves.aposentar(pasta, anterior)
+    click.echo(json.dumps({'ativa': kid, 'aposentadas': anteriores}, indent=2))
+
+
+@chaves_cli.command('remover')
+@click.argument('kid')
+def chaves_remover(kid):
+    """Apaga uma chave aposentada. Tokens assinados por ela deixam de ser aceitos."""
+    caminho = os.path.join(chaves.pasta_padrao(current_app), kid + chaves.SUFIXO_PUBLICA)
+    if not os.path.exists(caminho):
+        raise click.ClickException(f'Chave aposentada {kid} não encontrada (aposente com `flask chaves rotacionar`).')
+    os.remove(caminho)
+    click.echo(kid)
+
+@bp.cli.group('estatisticas')
+def estatisticas_cli():
+    """Tabelas de resumo de /estatisticas."""
+
+
+@estatisticas_cli.command('reconstruir')
+def estatisticas_reconstruir():
+    """Recalcula os resumos a partir de servidores e documentos (corrige divergências)."""
+    click.echo(json.dumps(estatisticas.reconstruir(), indent=2))
+
+@bp.cli.group('mudancas')
+def mudancas_cli():
+    """Registro de mudanças lido por /mudancas."""
+
+
+@mudancas_cli.command('limpar')
+@click.option('--dias', type=int, default=None, help='Retenção em dias (padrão: MUDANCAS_RETENCAO_DIAS).')
+@click.option('--sem-compactar', is_flag=True, help='Só aplica a retenção, sem apagar registros superados.')
+def mudancas_limpar(dias, sem_compactar):
+    """Compacta o registro e apaga o que passou da retenção."""
+    resumo = mudancas.limpar(
+        dias if dias is not None else current_app.config['MUDANCAS_RETENCAO_DIAS'], not sem_compactar
+    )
+    click.echo(json.dumps(resumo, indent=2))
+
+
+@mudancas_cli.command('estatisticas')
+def mudancas_estatisticas():
+    """Tamanho do registro, mudança mais antiga e horizonte da retenção."""
+    click.echo(json.dumps(mudancas.estatisticas(), indent=2))
+
+@bp.cli.group('metricas')
+def metricas_cli():
+    """Perfis gravados com o cabeçalho X-Perfil."""
+
+
+@metricas_cli.command('perfil')
+@click.argument('arquivo')
+@click.option('--ordem', default='cumulative', show_default=True, help='Ordenação do pstats (cumulative, tottime, calls).')
+@click.option('--linhas', default=30, show_default=True, help='Funções mostradas.')
+def metricas_perfil(arquivo, ordem, linhas):
+    """Mostra as funções mais caras de um perfil (nome devolvido em X-Perfil-Arquivo)."""
+    if not os.path.isabs(arquivo) and not os.path.exists(arquivo):
+        arquivo = os.path.join(current_app.config['METRICAS_PERFIL_PASTA'], arquivo)
+    pstats.Stats(arquivo).strip_dirs().sort_stats(ordem).print_stats(linhas)
+
+@bp.cli.group('busca')
+def busca_cli():
+    """Índices de busca."""
+
+
+@busca_cli.command('reindexar')
+@click.option('--processos', type=int, default=None, help='Processos de extração (padrão: número de CPUs).')
+@click.option('--completo', is_flag=True, help='Reextrai todos os documentos, não só os novos ou alterados.')
+def busca_reindexar(processos, completo):
+    """Extrai o texto dos PDFs em paralelo e atualiza o índice de documentos."""
+    click.echo(json.dumps(busca_documentos.reindexar(processos, completo), indent=2, ensure_ascii=False))
+
+
+@busca_cli.command('reconstruir')
+def busca_reconstruir():
+    """Reconstrói os índices de nomes e de documentos a partir das tabelas."""
+    busca.reconstruir_indice()
+    busca_documentos.reconstruir_indice()
+    click.echo('Índices reconstruídos.')
+
+
+@bp.cli.group('tarefas')
+def tarefas_cli():
+    """Fila de processamento de documentos."""
+
+
+@tarefas_cli.command('trabalhar')
+@click.option('--concorrencia', type=int, default=None,
+              help='Documentos processados ao mesmo tempo (padrão: TAREFAS_CONCORRENCIA ou número de CPUs).')
+@click.option('--uma-vez', is_flag=True, help='Processa as tarefas disponíveis e termina.')
+def tarefas_trabalhar(concorrencia, uma_vez):
+    """Processa a fila: validação do PDF, páginas, miniatura e texto."""
+    trabalhador = tarefas.Trabalhador.da_configuracao(current_app.config, concorrencia)
+
+    def parar(*_):
+        trabalhador.parar = True  # Termina as tarefas em andamento e sai
+
+    signal.signal(signal.SIGTERM, parar)
+    signal.signal(signal.SIGINT, parar)
+    click.echo(f'Trabalhador iniciado com {trabalhador.concorrencia} processo(s).')
+    click.echo(f'{trabalhador.executar(uma_vez=uma_vez)} tarefa(s) processada(s).')
+
+
+@tarefas_cli.command('enfileirar-pendentes')
+def tarefas_enfileirar_pendentes():
+    """Enfileira os documentos que ainda não foram processados."""
+    click.echo(f'{tarefas.enfileirar_pendentes()} documento(s) enfileirado(s).')
+
+
+@tarefas_cli.command('estatisticas')
+def tarefas_estatisticas_cli():
+    """Mostra as tarefas por estado."""
+    click.echo(json.dumps(tarefas.estatisticas(), indent=2))
+
+
+@tarefas_cli.command('limpar')
+@click.option('--dias', default=7, show_default=True, help='Remove tarefas concluídas há mais tempo que isso.')
+def tarefas_limpar(dias):
+    """Remove tarefas concluídas antigas."""
+    click.echo(f'{tarefas.limpar(dias)} tarefa(s) removida(s).')
+
+def create_app(config=None):
+    """
+    Monta a aplicação: Config de config.py sobreposto por `config` (dict ou
+    objeto com atributos em maiúsculas).
+
+    Não acessa o banco nem o disco. O esquema é aplicado antes, por
+    `flask db atualizar` (ver migracoes.py); a chave JWT é criada no primeiro
+    token emitido, se não houver nenhuma; e a documentação é servida do
+    openapi.json gerado por `flask openapi gerar` (ver openapi.py).
+    """
+    app = Flask(__name__)
+    CORS(app)  # Habilita o CORS para todas as rotas
+
+    app.config.from_object(Config)  # Banco, pool de conexões, uploads e cache (ver config.py)
+    if config is not None:
+        if not isinstance(config, dict):
+            config = {nome: getattr(config, nome) for nome in dir(config) if nome.isupper()}
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            # As opções do pool dependem do banco (SQLite em memória não aceita pool_size)
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(config['SQLALCHEMY_DATABASE_URI'])
+
+    db.init_app(app)
+    with app.app_context():
+        configurar_sqlite(db.engine)  # WAL, synchronous=NORMAL, busy_timeout e mmap em cada conexão nova
+    cache.iniciar(app)
+    senhas.iniciar(app)
+    serializacao.iniciar(app)  # orjson, se instalado
+    metricas.iniciar(app)  # Antes da compressão: o tamanho medido é o que vai pela rede
+    compressao.iniciar(app)
+
+    # Configuração do JWT: chaves assimétricas persistentes, iguais em todos os workers (ver chaves.py)
+    jwt = JWTManager(app)
+    chaves.iniciar(app, jwt)
+    autorizacao.iniciar(app, jwt)  # Perfis, revogação e limite de requisições
+
+    app.register_blueprint(bp)
+    app.register_blueprint(openapi.bp)  # /apispec_1.json e /apidocs/
+    migracoes.registrar_cli(app)
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,299 @@
+'''Armazenamento de documentos endereçado por conteúdo (SHA-256), com deduplicação.
+
+Layout dentro da pasta de uploads:
+    blobs/ab/cd/abcd...  um arquivo por conteúdo distinto, compartilhado pelos documentos
+    miniaturas/ab/...    PNG da primeira página, também por conteúdo (ver processamento.py)
+    tmp/                 arquivos em gravação (uploads em andamento)
+    arquivo/ab/cd/...gz  camada de arquivo, comprimida (ARMAZENAMENTO_ARQUIVO_PASTA pode apontar para outro disco)
+
+O arquivo chega em tmp/ enquanto o hash é calculado e depois é renomeado para
+blobs/ (mesmo sistema de arquivos, sem cópia). Se o conteúdo já existe, o
+arquivo novo é descartado e só a contagem de referências aumenta.
+
+Blobs frios (sem acesso recente, de servidores inativos) são movidos para a
+camada de arquivo (ver camadas.py e migrar_camadas).
+'''
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+import camadas
+import processamento
+from models import db, Blob, Documento, Servidor, UploadPendente
+
+PASTA_BLOBS = 'blobs'
+PASTA_TEMPORARIA = 'tmp'
+
+
+def caminho_blob(raiz, sha256):
+    """Caminho do conteúdo com dois níveis de diretório para não concentrar milhões de arquivos numa pasta."""
+    return camadas.CamadaQuente(raiz).caminho(sha256)
+
+
+def arquivo_temporario(raiz, nome):
+    """Caminho para um arquivo em gravação, no mesmo sistema de arquivos dos blobs."""
+    pasta = os.path.join(raiz, PASTA_TEMPORARIA)
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, nome)
+
+
+def _incrementar(sha256):
+    resultado = db.session.execute(
+        db.update(Blob).where(Blob.sha256 == sha256).values(referencias=Blob.referencias + 1)
+    )
+    return resultado.rowcount > 0
+
+
+def promocao(sha256, destino, tamanho):
+    """UPDATE que devolve o blob à camada quente (conteúdo arquivado enviado de novo)."""
+    return (
+        db.update(Blob).where(Blob.sha256 == sha256)
+        .values(camada=camadas.QUENTE, caminho_arquivo=destino, tamanho_armazenado=tamanho)
+    )
+
+
+def guardar(raiz, caminho_temporario, sha256, tamanho):
+    """
+    Move o arquivo temporário para o armazenamento e registra mais uma referência.
+
+    Retorna o caminho do blob. Não faz commit: a referência deve ser gravada na
+    mesma transação do Documento que aponta para ela.
+    """
+    destino = caminho_blob(raiz, sha256)
+
+    if _incrementar(sha256):
+        if os.path.exists(destino):
+            os.remove(caminho_temporario)  # Conteúdo duplicado: só metadado
+        else:
+            # Conteúdo estava na camada de arquivo: a cópia recém-enviada volta a ser a principal
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(caminho_temporario, destino)
+            db.session.execute(promocao(sha256, destino, tamanho))
+        return destino
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    os.replace(caminho_temporario, destino)
+    try:
+        with db.session.begin_nested():
+            db.session.add(Blob(
+                sha256=sha256,
+                caminho_arquivo=destino,
+                tamanho=tamanho,
+                referencias=1,
+                criado_em=datetime.now(),
+                camada=camadas.QUENTE,
+                tamanho_armazenado=tamanho
+            ))
+    except IntegrityError:
+        # Upload concorrente do mesmo conteúdo registrou o blob primeiro
+        _incrementar(sha256)
+    return destino
+
+
+def liberar(sha256):
+    """Remove uma referência ao blob. O arquivo só é apagado pela coleta de lixo."""
+    db.session.execute(
+        db.update(Blob).where(Blob.sha256 == sha256, Blob.referencias > 0)
+        .values(referencias=Blob.referencias - 1)
+    )
+
+
+def _remover_orfaos(pasta, conhecidos, limite, resumo):
+    # Arquivos sem registro (ex.: processo interrompido antes do commit, cópia antiga após mudar de camada)
+    for diretorio, _, arquivos in os.walk(pasta):
+        for nome in arquivos:
+            caminho = os.path.join(diretorio, nome)
+            if caminho not in conhecidos and os.path.getmtime(caminho) < limite:
+                resumo['bytes_liberados'] += os.path.getsize(caminho)
+                os.remove(caminho)
+                resumo['orfaos_removidos'] += 1
+
+
+def coletar_lixo(raiz, idade_minima=24 * 3600, raiz_arquivo=None):
+    """
+    Remove blobs sem referência, arquivos órfãos (nas duas camadas) e uploads abandonados.
+
+    As referências são recalculadas a partir de documentos antes da remoção,
+    corrigindo qualquer divergência. Arquivos mais novos que `idade_minima`
+    segundos são preservados para não atingir uploads em andamento.
+    """
+    limite = time.time() - idade_minima
+    resumo = {'blobs_removidos': 0, 'bytes_liberados': 0, 'orfaos_removidos': 0, 'uploads_abandonados': 0}
+
+    contagens = (
+        db.select(db.func.count(Documento.id))
+        .where(Documento.sha256 == Blob.sha256)
+        .scalar_subquery()
+    )
+    db.session.execute(db.update(Blob).values(referencias=contagens))
+    db.session.commit()
+
+    sem_referencia = db.session.execute(
+        db.select(Blob.sha256, Blob.caminho_arquivo, Blob.tamanho).where(Blob.referencias <= 0)
+    ).all()
+    for sha256, caminho, tamanho in sem_referencia:
+        apagado = db.session.execute(
+            db.delete(Blob).where(Blob.sha256 == sha256, Blob.referencias <= 0)
+        ).rowcount
+        db.session.commit()
+        if apagado and os.path.exists(caminho):
+            os.remove(caminho)
+            resumo['blobs_removidos'] += 1
+            resumo['bytes_liberados'] += tamanho
+        miniatura = processamento.caminho_miniatura(raiz, sha256)
+        if apagado and os.path.exists(miniatura):
+            resumo['bytes_liberados'] += os.path.getsize(miniatura)
+            os.remove(miniatura)
+
+    conhecidos = set(db.session.scalars(db.select(Blob.caminho_arquivo)))
+    _remover_orfaos(os.path.join(raiz, PASTA_BLOBS), conhecidos, limite, resumo)
+    if raiz_arquivo:
+        _remover_orfaos(raiz_arquivo, conhecidos, limite, resumo)
+
+    # Uploads em partes iniciados e nunca finalizados
+    abandonados = db.session.scalars(
+        db.select(UploadPendente).where(UploadPendente.criado_em < datetime.fromtimestamp(limite))
+    ).all()
+    for upload in abandonados:
+        if os.path.exists(upload.caminho_arquivo):
+            resumo['bytes_liberados'] += os.path.getsize(upload.caminho_arquivo)
+            os.remove(upload.caminho_arquivo)
+        db.session.delete(upload)
+        resumo['uploads_abandonados'] += 1
+    db.session.commit()
+
+    # Sobras de uploads únicos interrompidos antes de chegar ao blob
+    pendentes = set(db.session.scalars(db.select(UploadPendente.id)))
+    pasta_temporaria = os.path.join(raiz, PASTA_TEMPORARIA)
+    if os.path.isdir(pasta_temporaria):
+        for nome in os.listdir(pasta_temporaria):
+            caminho = os.path.join(pasta_temporaria, nome)
+            if nome not in pendentes and os.path.getmtime(caminho) < limite:
+                resumo['bytes_liberados'] += os.path.getsize(caminho)
+                os.remove(caminho)
+                resumo['orfaos_removidos'] += 1
+
+    return resumo
+
+
+def estatisticas():
+    """Bytes referenciados pelos documentos versus bytes realmente gravados em disco, por camada."""
+    documentos, bytes_logicos = db.session.execute(
+        db.select(db.func.count(Documento.id), db.func.coalesce(db.func.sum(Documento.tamanho), 0))
+        .where(Documento.sha256.is_not(None))
+    ).one()
+    blobs, bytes_fisicos = db.session.execute(
+        db.select(db.func.count(Blob.sha256), db.func.coalesce(db.func.sum(Blob.tamanho), 0))
+    ).one()
+
+    por_camada = {}
+    em_disco = db.func.coalesce(Blob.tamanho_armazenado, Blob.tamanho)
+    linhas = db.session.execute(
+        db.select(Blob.camada, db.func.count(), db.func.sum(Blob.tamanho), db.func.sum(em_disco))
+        .group_by(Blob.camada)
+    )
+    for camada, quantidade, tamanho, armazenado in linhas:
+        por_camada[camada] = {
+            'blobs': quantidade,
+            'bytes': int(tamanho),
+            'bytes_em_disco': int(armazenado),
+            'bytes_economizados_compressao': int(tamanho - armazenado),
+            'taxa_compressao': round(tamanho / armazenado, 2) if armazenado else None,
+        }
+    bytes_em_disco = sum(camada['bytes_em_disco'] for camada in por_camada.values())
+
+    return {
+        'documentos': documentos,
+        'blobs': blobs,
+        'bytes_logicos': int(bytes_logicos),
+        'bytes_fisicos': int(bytes_fisicos),
+        'bytes_economizados': int(bytes_logicos - bytes_fisicos),
+        'taxa_deduplicacao': round(bytes_logicos / bytes_fisicos, 2) if bytes_fisicos else None,
+        'bytes_em_disco': bytes_em_disco,
+        'camadas': por_camada,
+    }
+
+
+def _servidor_ativo():
+    # Algum documento deste conteúdo pertence a servidor ativo
+    return (
+        db.select(Documento.id)
+        .join(Servidor, Servidor.cpf == Documento.cpf_servidor)
+        .where(Documento.sha256 == Blob.sha256, Servidor.ativo.is_(True))
+        .exists()
+    )
+
+
+def mover(sha256, caminho_atual, origem, destino):
+    """
+    Copia o blob de `origem` para a camada `destino` e aponta o registro para a cópia nova.
+
+    O UPDATE só vale se o blob continua onde estava (outro processo pode tê-lo
+    movido ou promovido por um upload); nesse caso a cópia nova é descartada.
+    O arquivo antigo é removido depois do commit: um download em andamento
+    pelo caminho antigo termina normalmente (o arquivo aberto continua legível).
+    Retorna os bytes em disco na camada nova, ou None se não moveu.
+    """
+    with camadas.abrir(caminho_atual) as leitura:
+        caminho_novo, tamanho_armazenado = destino.gravar(leitura, sha256)
+    movido = db.session.execute(
+        db.update(Blob).where(Blob.sha256 == sha256, Blob.caminho_arquivo == caminho_atual)
+        .values(camada=destino.nome, caminho_arquivo=caminho_novo, tamanho_armazenado=tamanho_armazenado)
+    ).rowcount
+    db.session.commit()
+    if not movido:
+        os.remove(caminho_novo)
+        return None
+    if caminho_novo != caminho_atual:
+        os.remove(caminho_atual)
+    return tamanho_armazenado
+
+
+def migrar_camadas(camadas_configuradas, dias_inativos=30, dias_frios=365, limite=None, simular=False):
+    """
+    Move blobs entre as camadas conforme o acesso:
+
+    - quente -> arquivo: sem download há `dias_inativos` dias e nenhum servidor
+      ativo entre os donos, ou sem download há `dias_frios` dias de qualquer forma;
+    - arquivo -> quente: baixado recentemente e com dono ativo.
+
+    Blobs nunca baixados contam a partir de criado_em. Com `simular`, só lista
+    o que seria movido.
+    """
+    agora = datetime.now()
+    ultimo_acesso = db.func.coalesce(Blob.ultimo_acesso, Blob.criado_em)
+    inativo = ultimo_acesso < agora - timedelta(days=dias_inativos)
+    frio = ultimo_acesso < agora - timedelta(days=dias_frios)
+    ativo = _servidor_ativo()
+
+    criterios = (
+        (camadas.QUENTE, camadas.ARQUIVO, db.or_(db.and_(inativo, ~ativo), frio)),
+        (camadas.ARQUIVO, camadas.QUENTE, db.and_(~inativo, ativo)),
+    )
+    resumo = {'arquivados': 0, 'promovidos': 0, 'bytes_economizados': 0, 'erros': []}
+    for de, para, condicao in criterios:
+        consulta = (
+            db.select(Blob.sha256, Blob.caminho_arquivo, Blob.tamanho, Blob.tamanho_armazenado)
+            .where(Blob.camada == de, Blob.referencias > 0, condicao)
+            .order_by(ultimo_acesso)
+        )
+        if limite:
+            consulta = consulta.limit(limite)
+        contador = 'arquivados' if para == camadas.ARQUIVO else 'promovidos'
+        for sha256, caminho, tamanho, armazenado in db.session.execute(consulta).all():
+            if simular:
+                resumo[contador] += 1
+                continue
+            try:
+                novo = mover(sha256, caminho, camadas_configuradas[de], camadas_configuradas[para])
+            except OSError as e:
+                db.session.rollback()
+                resumo['erros'].append({'sha256': sha256, 'erro': f'{type(e).__name__}: {e}'})
+                continue
+            if novo is not None:
+                resumo[contador] += 1
+                resumo['bytes_economizados'] += (armazenado if armazenado is not None else tamanho) - novo
+    return resumo
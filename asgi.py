@@ -0,0 +1,384 @@
+'''Modo de execução assíncrono (ASGI).
+
+/upload e /download/<id> são atendidos por handlers assíncronos: o corpo do
+upload é lido do socket e gravado com aiofiles sem bloquear o event loop, e o
+download é transmitido em blocos. O acesso ao banco nessas rotas usa uma sessão
+assíncrona do SQLAlchemy. Todas as outras rotas continuam sendo a aplicação
+Flask (app.py), executada num pool de threads, com o mesmo contrato JSON.
+
+Dependências extras: pip install -r requirements-asgi.txt
+
+Execução:
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+    gunicorn asgi:app -k uvicorn_worker.UvicornWorker -w 4 -b 0.0.0.0:8000   (requer uvicorn-worker)
+'''
+
+import contextlib
+import hashlib
+import math
+import os
+import secrets
+import uuid
+from datetime import datetime
+
+import aiofiles
+import aiofiles.os
+import anyio
+from a2wsgi import WSGIMiddleware
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import armazenamento
+import autorizacao
+import cache
+import camadas
+import downloads
+import estatisticas
+import metricas
+import tarefas
+import uploads
+from app import create_app
+from config import configurar_sqlite, opcoes_engine
+from models import db, Blob, Documento
+from parametros import ParametroInvalido, ler_cpf
+
+TAMANHO_MAXIMO_CAMPO = 4096  # Campos de texto do formulário (cpf_servidor, tipo_documento)
+THREADS_WSGI = 20  # Requisições Flask simultâneas por worker
+
+flask_app = create_app()
+
+
+def url_assincrona(url):
+    """URL do banco com o driver assíncrono equivalente."""
+    drivers = {
+        'sqlite': 'sqlite+aiosqlite',
+        'postgresql': 'postgresql+asyncpg',
+        'postgresql+psycopg2': 'postgresql+asyncpg',
+        'postgresql+psycopg': 'postgresql+psycopg',  # psycopg 3 já é assíncrono
+    }
+    return url.set(drivername=drivers.get(url.drivername, url.drivername))
+
+
+with flask_app.app_context():
+    # Mesma URL já resolvida pelo Flask-SQLAlchemy (SQLite relativo vai para instance/)
+    _url = db.engine.url
+_opcoes = opcoes_engine(str(_url))
+if 'pool_size' in _opcoes:
+    # O aiosqlite usa NullPool por padrão; o pool mantém as conexões (e seus PRAGMAs) abertas
+    _opcoes['poolclass'] = AsyncAdaptedQueuePool
+engine = create_async_engine(url_assincrona(_url), **_opcoes)
+configurar_sqlite(engine.sync_engine)
+Sessao = async_sessionmaker(engine, expire_on_commit=False)
+
+
+class FormularioUpload:
+    """
+    Parser multipart incremental: o conteúdo do campo 'arquivo' é devolvido
+    bloco a bloco, à medida que chega, sem arquivo temporário intermediário.
+    """
+
+    def __init__(self, content_type):
+        _, parametros = parse_options_header(content_type)
+        fronteira = parametros.get(b'boundary')
+        if not fronteira:
+            raise ValueError('Requisição multipart sem boundary.')
+        self.campos = {}
+        self.recebeu_arquivo = False
+        self._blocos = []
+        self._cabecalhos = {}
+        self._cabecalho = b''
+        self._valor = b''
+        self._nome = None
+        self._eh_arquivo = False
+        self._texto = bytearray()
+        self._parser = MultipartParser(fronteira, {
+            'on_part_begin': self._inicio_parte,
+            'on_header_field': self._campo_cabecalho,
+            'on_header_value': self._valor_cabecalho,
+            'on_header_end': self._fim_cabecalho,
+            'on_headers_finished': self._fim_cabecalhos,
+            'on_part_data': self._dados,
+            'on_part_end': self._fim_parte,
+        })
+
+    def _inicio_parte(self):
+        self._cabecalhos = {}
+        self._texto = bytearray()
+
+    def _campo_cabecalho(self, dados, inicio, fim):
+        self._cabecalho += dados[inicio:fim]
+
+    def _valor_cabecalho(self, dados, inicio, fim):
+        self._valor += dados[inicio:fim]
+
+    def _fim_cabecalho(self):
+        self._cabecalhos[self._cabecalho.decode('latin-1').lower()] = self._valor
+        self._cabecalho, self._valor = b'', b''
+
+    def _fim_cabecalhos(self):
+        _, opcoes = parse_options_header(self._cabecalhos.get('content-disposition', b''))
+        self._nome = opcoes.get(b'name', b'').decode()
+        self._eh_arquivo = self._nome == 'arquivo'
+        self.recebeu_arquivo = self.recebeu_arquivo or self._eh_arquivo
+
+    def _dados(self, dados, inicio, fim):
+        if self._eh_arquivo:
+            self._blocos.append(bytes(dados[inicio:fim]))
+        elif len(self._texto) + (fim - inicio) <= TAMANHO_MAXIMO_CAMPO:
+            self._texto += dados[inicio:fim]
+
+    def _fim_parte(self):
+        if not self._eh_arquivo and self._nome:
+            self.campos[self._nome] = self._texto.decode('utf-8', 'replace')
+
+    def alimentar(self, pedaco):
+        """Processa um pedaço do corpo e retorna os blocos do arquivo contidos nele."""
+        self._parser.write(pedaco)
+        blocos, self._blocos = self._blocos, []
+        return blocos
+
+
+async def _guardar(sessao, raiz, caminho_temporario, sha256, tamanho):
+    """Versão assíncrona de armazenamento.guardar (mesma regra de deduplicação)."""
+    destino = armazenamento.caminho_blob(raiz, sha256)
+    incremento = update(Blob).where(Blob.sha256 == sha256).values(referencias=Blob.referencias + 1)
+
+    if (await sessao.execute(incremento)).rowcount:
+        if await aiofiles.os.path.exists(destino):
+            await aiofiles.os.remove(caminho_temporario)
+            return destino
+        # Conteúdo estava na camada de arquivo: a cópia recém-enviada volta a ser a principal
+        await sessao.execute(armazenamento.promocao(sha256, destino, tamanho))
+    else:
+        try:
+            async with sessao.begin_nested():
+                sessao.add(Blob(
+                    sha256=sha256,
+                    caminho_arquivo=destino,
+                    tamanho=tamanho,
+                    referencias=1,
+                    criado_em=datetime.now(),
+                    camada=camadas.QUENTE,
+                    tamanho_armazenado=tamanho
+                ))
+        except IntegrityError:
+            await sessao.execute(incremento)
+
+    await aiofiles.os.makedirs(os.path.dirname(destino), exist_ok=True)
+    await aiofiles.os.replace(caminho_temporario, destino)
+    return destino
+
+
+async def upload_documento(request):
+    config = flask_app.config
+    limite = config['MAX_TAMANHO_DOCUMENTO']
+    try:
+        formulario = FormularioUpload(request.headers.get('content-type', ''))
+    except ValueError:
+        return JSONResponse({'erro': 'Nenhum arquivo enviado.'}, status_code=400)
+
+    caminho_temporario = armazenamento.arquivo_temporario(config['UPLOAD_FOLDER'], uuid.uuid4().hex)
+    hash_sha256 = hashlib.sha256()
+    tamanho = 0
+    try:
+        async with aiofiles.open(caminho_temporario, 'wb') as destino:
+            async for pedaco in request.stream():
+                for bloco in formulario.alimentar(pedaco):
+                    tamanho += len(bloco)
+                    if tamanho > limite:
+                        raise uploads.TamanhoExcedido(f'O documento excede o tamanho máximo de {limite} bytes.')
+                    hash_sha256.update(bloco)
+                    await destino.write(bloco)
+    except uploads.TamanhoExcedido as e:
+        await aiofiles.os.remove(caminho_temporario)
+        return JSONResponse({'erro': str(e)}, status_code=413)
+
+    cpf_servidor = formulario.campos.get('cpf_servidor')
+    tipo_documento = formulario.campos.get('tipo_documento')
+    if not formulario.recebeu_arquivo:
+        await aiofiles.os.remove(caminho_temporario)
+        return JSONResponse({'erro': 'Nenhum arquivo enviado.'}, status_code=400)
+    if not cpf_servidor or not tipo_documento:
+        await aiofiles.os.remove(caminho_temporario)
+        return JSONResponse({'erro': 'Arquivo, CPF e tipo do documento são obrigatórios.'}, status_code=400)
+    try:
+        cpf_servidor = ler_cpf(cpf_servidor)
+    except ParametroInvalido as e:
+        await aiofiles.os.remove(caminho_temporario)
+        return JSONResponse({'erro': str(e)}, status_code=400)
+
+    sha256 = hash_sha256.hexdigest()
+    async with Sessao() as sessao, sessao.begin():
+        documento = Documento(
+            cpf_servidor=cpf_servidor,
+            hora_cadastro=datetime.now(),
+            tipo=tipo_documento,
+            caminho_arquivo=await _guardar(sessao, config['UPLOAD_FOLDER'], caminho_temporario, sha256, tamanho),
+            sha256=sha256,
+            tamanho=tamanho
+        )
+        sessao.add(documento)
+        await sessao.execute(*estatisticas.incremento_documento(documento, engine.dialect.name))
+        await sessao.flush()
+        sessao.add(tarefas.nova_tarefa(documento.id))  # Processamento em segundo plano
+    flask_app.extensions['cache'].delete(cache.chave('documentos', cpf=cpf_servidor))
+
+    return JSONResponse({
+        'mensagem': 'Documento enviado com sucesso!',
+        'id_documento': documento.id,
+        'sha256': documento.sha256,
+        'tamanho': documento.tamanho,
+        'status_processamento': 'pendente'
+    }, status_code=201)
+
+
+def _buscar_legado(id):
+    # Documento sem hash gravado: o caminho síncrono calcula e persiste uma única vez
+    with flask_app.app_context():
+        return downloads.buscar(id)
+
+
+async def _ler_trecho(arquivo, inicio, fim):
+    await arquivo.seek(inicio)
+    restante = fim - inicio
+    while restante:
+        bloco = await arquivo.read(min(downloads.TAMANHO_BLOCO, restante))
+        if not bloco:
+            return
+        restante -= len(bloco)
+        yield bloco
+
+
+async def _transmitir(caminho, plano):
+    async with aiofiles.open(caminho, 'rb') as arquivo:
+        for item in plano:
+            if isinstance(item, bytes):
+                yield item
+            else:
+                async for bloco in _ler_trecho(arquivo, *item):
+                    yield bloco
+
+
+async def download_documento(request):
+    id = request.path_params['id']
+    async with Sessao() as sessao:
+        documento = (await sessao.execute(downloads.consulta(id))).first()
+        atualizacao = documento and downloads.atualizacao_acesso(documento)
+        if atualizacao is not None:
+            await sessao.execute(atualizacao)
+            await sessao.commit()
+    if documento and documento.sha256 is None:
+        documento = await anyio.to_thread.run_sync(_buscar_legado, id)
+    if not documento:
+        return JSONResponse({'erro': 'Documento não encontrado.'}, status_code=404)
+
+    cabecalhos = downloads.cabecalhos_documento(documento)
+
+    # Cliente já tem esta versão: responde só com o registro do banco, sem tocar no arquivo
+    if downloads.nao_modificado(documento, request.headers):
+        return Response(status_code=304, headers=cabecalhos)
+
+    if not await aiofiles.os.path.exists(documento.caminho_arquivo):
+        return JSONResponse({'erro': 'Arquivo não encontrado no servidor.'}, status_code=404)
+
+    cabecalhos['Content-Disposition'] = downloads.content_disposition(documento)
+    config = flask_app.config
+    arquivado = downloads.arquivado(documento)
+    if config.get('DOWNLOAD_DELEGADO') and not arquivado:
+        nome, valor = downloads.cabecalho_delegacao(documento, config)
+        cabecalhos[nome] = valor
+        return Response(media_type='application/pdf', headers=cabecalhos)
+
+    tamanho = downloads.tamanho_arquivo(documento)
+    pedidos = downloads.intervalos(request.headers, documento, tamanho)
+
+    if pedidos == []:
+        cabecalhos['Content-Range'] = f'bytes */{tamanho}'
+        return Response(status_code=416, headers=cabecalhos)
+
+    # Camada de arquivo: o gzip é descomprimido por um gerador síncrono, que o Starlette roda no pool de threads
+    transmitir = downloads.transmitir if arquivado else _transmitir
+
+    if pedidos and len(pedidos) > 1:
+        fronteira = secrets.token_hex(16)
+        plano = downloads.plano_multipart(pedidos, tamanho, fronteira)
+        return StreamingResponse(
+            transmitir(documento.caminho_arquivo, plano),
+            status_code=206,
+            media_type=f'multipart/byteranges; boundary={fronteira}',
+            headers=cabecalhos
+        )
+
+    trecho, tamanhos = downloads.plano_simples(pedidos, tamanho)
+    cabecalhos.update(tamanhos)
+    return StreamingResponse(
+        transmitir(documento.caminho_arquivo, [trecho]),
+        status_code=206 if pedidos else 200,
+        media_type='application/pdf',
+        headers=cabecalhos
+    )
+
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(_app):
+    yield
+    await engine.dispose()
+
+
+# CORS nas rotas assíncronas; as rotas Flask já recebem os cabeçalhos do Flask-CORS
+_cors = [Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])]
+
+
+class Autorizacao:
+    """Limite por IP e token com o escopo exigido, como o autorizacao.exigir das rotas Flask."""
+
+    def __init__(self, app, escopo):
+        self.app = app
+        self.escopo = escopo
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'OPTIONS':
+            await self.app(scope, receive, send)
+            return
+        cliente = scope.get('client')
+        espera = flask_app.extensions['autorizacao']['limitador'].consumir('ip', cliente[0] if cliente else '-')
+        if espera:
+            erro = (429, 'Muitas requisições. Tente novamente em instantes.', {'Retry-After': str(math.ceil(espera))})
+        else:
+            cabecalho = dict(scope['headers']).get(b'authorization', b'').decode('latin-1')
+            # A situação do usuário pode vir do banco (cache expirado): fora do loop de eventos
+            erro = await anyio.to_thread.run_sync(autorizacao.autorizar_cabecalho, flask_app, cabecalho, self.escopo)
+        if erro is not None:
+            status, mensagem, cabecalhos = erro
+            await JSONResponse({'erro': mensagem}, status_code=status, headers=cabecalhos)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def _autorizacao(escopo):
+    return [Middleware(Autorizacao, escopo=escopo)]
+
+
+def _metricas(rota):
+    # Mesmo rótulo de rota do Flask, para as duas versões somarem na mesma série
+    return [Middleware(metricas.MiddlewareASGI, rota=rota, config=flask_app.config, logger=flask_app.logger)]
+
+
+app = Starlette(
+    routes=[
+        Route('/upload', upload_documento, methods=['POST', 'OPTIONS'],
+              middleware=_cors + _metricas('/upload') + _autorizacao('escrita')),
+        Route('/download/{id:int}', download_documento, methods=['GET', 'HEAD', 'OPTIONS'],
+              middleware=_cors + _metricas('/download/<int:id>') + _autorizacao('leitura')),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=THREADS_WSGI)),
+    ],
+    lifespan=ciclo_de_vida,
+)
@@ -0,0 +1,318 @@
+'''Autorização das rotas por perfil e limite de requisições por usuário e por IP.
+
+O perfil vem da claim 'tipo' do token e define os escopos do usuário, sem
+consulta ao banco:
+    gestor   leitura, escrita, administracao
+    comum    leitura
+
+A cada requisição autenticada o token também é conferido contra a situação do
+usuário (ativo, tipo atual, tokens_revogados_em), guardada num cache com TTL
+de AUTORIZACAO_TTL segundos: desativar um usuário, mudar seu tipo ou revogar
+seus tokens (`flask usuarios ...`) vale em todos os workers em no máximo esse
+tempo, sem ir ao banco em toda requisição.
+
+Limites (balde de fichas): LIMITE_USUARIO_TAXA requisições por segundo por
+usuário e LIMITE_IP_TAXA por IP, com rajadas de até LIMITE_*_RAJADA. Acima
+disso a resposta é 429 com Retry-After. Com LIMITE_URL vazio os baldes ficam
+na memória de cada worker (o limite efetivo multiplica pelo número de
+workers); com LIMITE_URL=redis://... são compartilhados (requer o pacote redis).
+'''
+
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import decode_token, get_jwt, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from cache import CacheLRU
+from models import db, Usuario
+
+ESCOPOS = {
+    'gestor': frozenset({'leitura', 'escrita', 'administracao'}),
+    'comum': frozenset({'leitura'}),
+}
+
+
+class BaldesMemoria:
+    """Baldes de fichas na memória do processo, com limite de chaves. Seguro entre threads."""
+
+    def __init__(self, max_itens=100000):
+        self.max_itens = max_itens
+        self._baldes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, chave, taxa, capacidade):
+        """Retira uma ficha do balde; devolve 0 ou os segundos até haver uma ficha."""
+        agora = time.monotonic()
+        with self._lock:
+            fichas, ultimo = self._baldes.pop(chave, (capacidade, agora))
+            fichas = min(capacidade, fichas + (agora - ultimo) * taxa)
+            espera = 0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = (1 - fichas) / taxa
+            self._baldes[chave] = (fichas, agora)
+            # Despeja os menos usados; um balde despejado volta cheio, o que só favorece o cliente
+            while len(self._baldes) > self.max_itens:
+                self._baldes.popitem(last=False)
+        return espera
+
+
+# Mesmo algoritmo do BaldesMemoria, atômico no Redis e com o relógio do Redis (igual para todos os hosts)
+_SCRIPT_BALDE = '''
+local taxa = tonumber(ARGV[1])
+local capacidade = tonumber(ARGV[2])
+local relogio = redis.call('TIME')
+local agora = tonumber(relogio[1]) + tonumber(relogio[2]) / 1000000
+local estado = redis.call('HMGET', KEYS[1], 'f', 'u')
+local fichas = tonumber(estado[1]) or capacidade
+local ultimo = tonumber(estado[2]) or agora
+fichas = math.min(capacidade, fichas + (agora - ultimo) * taxa)
+local espera = 0
+if fichas >= 1 then
+    fichas = fichas - 1
+else
+    espera = (1 - fichas) / taxa
+end
+redis.call('HSET', KEYS[1], 'f', tostring(fichas), 'u', tostring(agora))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacidade / taxa * 1000) + 1000)
+return tostring(espera)
+'''
+
+
+class BaldesRedis:
+    """Mesma interface do BaldesMemoria sobre um Redis compartilhado entre workers e hosts."""
+
+    def __init__(self, url, prefixo='serpro:limite:'):
+        import redis  # Dependência opcional
+
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_SCRIPT_BALDE)
+        self.prefixo = prefixo
+
+    def consumir(self, chave, taxa, capacidade):
+        return float(self._script(keys=[self.prefixo + chave], args=[taxa, capacidade]))
+
+
+def criar_baldes(url=None, max_itens=100000):
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return BaldesRedis(url)
+    return BaldesMemoria(max_itens)
+
+
+class Limitador:
+    def __init__(self, baldes, limites, ativo=True):
+        self.baldes = baldes
+        self.limites = limites  # {'usuario': (taxa, rajada), 'ip': (taxa, rajada)}
+        self.ativo = ativo
+        self._lock = threading.Lock()
+        self._recusadas = {nome: 0 for nome in limites}
+
+    def consumir(self, tipo, chave):
+        """0 se a requisição pode seguir; senão, segundos até a próxima ficha."""
+        if not self.ativo:
+            return 0
+        taxa, rajada = self.limites[tipo]
+        espera = self.baldes.consumir(f'{tipo}:{chave}', taxa, rajada)
+        if espera:
+            with self._lock:
+                self._recusadas[tipo] += 1
+        return espera
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'ativo': self.ativo,
+                'backend': 'redis' if isinstance(self.baldes, BaldesRedis) else 'memoria',
+                'limites': {nome: {'taxa': taxa, 'rajada': rajada} for nome, (taxa, rajada) in self.limites.items()},
+                'recusadas': dict(self._recusadas),
+            }
+
+
+def _situacoes():
+    return current_app.extensions['autorizacao']['situacoes']
+
+
+def _limitador():
+    return current_app.extensions['autorizacao']['limitador']
+
+
+def situacao_usuario(id_usuario):
+    """(ativo, tipo, revogados_em em segundos Unix ou None) do usuário, em cache por AUTORIZACAO_TTL."""
+    situacoes = _situacoes()
+    chave = str(id_usuario)
+    situacao = situacoes.get(chave)
+    if situacao is None:
+        linha = db.session.execute(
+            db.select(Usuario.ativo, Usuario.tipo, Usuario.tokens_revogados_em).where(Usuario.id == int(id_usuario))
+        ).first()
+        # Usuário inexistente também fica em cache, para tokens de usuários removidos não irem ao banco
+        situacao = (
+            (bool(linha.ativo), linha.tipo, linha.tokens_revogados_em and int(linha.tokens_revogados_em.timestamp()))
+            if linha else (False, None, None)
+        )
+        situacoes.set(chave, situacao)
+    return situacao
+
+
+def token_revogado(claims):
+    """True se o usuário foi desativado, mudou de tipo ou teve os tokens revogados depois da emissão."""
+    ativo, tipo, revogados_em = situacao_usuario(claims['sub'])
+    if not ativo or tipo != claims.get('tipo'):
+        return True
+    # iat tem resolução de segundos: tokens emitidos no mesmo segundo da revogação
+    # valem, para o login logo depois de revogar ou reativar não ser recusado
+    return revogados_em is not None and claims['iat'] < revogados_em
+
+
+def esquecer_usuario(id_usuario):
+    """Descarta a situação em cache (só neste worker; nos demais vale o TTL)."""
+    _situacoes().delete(str(id_usuario))
+
+
+def revogar_tokens(id_usuario):
+    """Invalida todos os tokens já emitidos para o usuário (novo login continua possível). Faz commit."""
+    db.session.execute(
+        db.update(Usuario).where(Usuario.id == id_usuario).values(tokens_revogados_em=datetime.now())
+    )
+    db.session.commit()
+    esquecer_usuario(id_usuario)
+
+
+def definir_ativo(id_usuario, ativo):
+    """Ativa ou desativa o usuário; desativar também revoga os tokens emitidos. Faz commit."""
+    valores = {'ativo': ativo}
+    if not ativo:
+        valores['tokens_revogados_em'] = datetime.now()
+    db.session.execute(db.update(Usuario).where(Usuario.id == id_usuario).values(**valores))
+    db.session.commit()
+    esquecer_usuario(id_usuario)
+
+
+def _muitas_requisicoes(espera):
+    resposta = jsonify({'erro': 'Muitas requisições. Tente novamente em instantes.'})
+    resposta.headers['Retry-After'] = str(math.ceil(espera))
+    return resposta, 429
+
+
+def autorizar(escopo):
+    """
+    Confere token, escopo e limite do usuário na requisição atual. Devolve
+    uma resposta de erro, ou None se a requisição pode seguir.
+    """
+    verify_jwt_in_request()  # 401 pelos handlers registrados em iniciar()
+    claims = get_jwt()
+    if escopo not in ESCOPOS.get(claims.get('tipo'), ()):
+        return jsonify({'erro': 'Permissão insuficiente para esta operação.'}), 403
+    espera = _limitador().consumir('usuario', claims['sub'])
+    if espera:
+        return _muitas_requisicoes(espera)
+    return None
+
+
+def exigir(escopo):
+    """Decorator das rotas: exige token de acesso válido com o escopo informado."""
+    def decorator(funcao):
+        @functools.wraps(funcao)
+        def wrapper(*args, **kwargs):
+            erro = autorizar(escopo)
+            if erro is not None:
+                return erro
+            return funcao(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def autorizar_cabecalho(app, autorizacao, escopo):
+    """
+    Mesma verificação de `autorizar` fora de uma requisição Flask (rotas do
+    asgi.py), a partir do cabeçalho Authorization. Devolve None ou (status,
+    mensagem, cabeçalhos). Pode consultar o banco: chamar fora do loop de eventos.
+    """
+    if not autorizacao or not autorizacao.startswith('Bearer '):
+        return 401, 'Token de acesso ausente.', {}
+    with app.app_context():
+        try:
+            claims = decode_token(autorizacao[len('Bearer '):])
+        except (PyJWTError, JWTExtendedException):
+            return 401, 'Token inválido ou expirado.', {}
+        if claims.get('type') != 'access':
+            return 401, 'Token inválido.', {}
+        try:
+            if token_revogado(claims):
+                return 401, 'Token revogado. Faça login novamente.', {}
+        finally:
+            db.session.remove()
+        if escopo not in ESCOPOS.get(claims.get('tipo'), ()):
+            return 403, 'Permissão insuficiente para esta operação.', {}
+        espera = app.extensions['autorizacao']['limitador'].consumir('usuario', claims['sub'])
+        if espera:
+            return 429, 'Muitas requisições. Tente novamente em instantes.', {'Retry-After': str(math.ceil(espera))}
+    return None
+
+
+def iniciar(app, jwt_manager):
+    """
+    Cria o cache de situação dos usuários e o limitador (AUTORIZACAO_*,
+    LIMITE_*), aplica o limite por IP a todas as rotas e registra no
+    flask_jwt_extended a checagem de revogação e as respostas de erro.
+    """
+    if app.config.get('PROXIES_CONFIAVEIS'):
+        # Atrás de balanceador: o IP do cliente vem do X-Forwarded-For
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXIES_CONFIAVEIS'])
+
+    app.extensions['autorizacao'] = {
+        'situacoes': CacheLRU(
+            max_itens=app.config.get('AUTORIZACAO_MAX_ITENS', 10000),
+            ttl=app.config.get('AUTORIZACAO_TTL', 30)
+        ),
+        'limitador': Limitador(
+            criar_baldes(app.config.get('LIMITE_URL')),
+            {
+                'usuario': (app.config.get('LIMITE_USUARIO_TAXA', 20), app.config.get('LIMITE_USUARIO_RAJADA', 40)),
+                'ip': (app.config.get('LIMITE_IP_TAXA', 50), app.config.get('LIMITE_IP_RAJADA', 100)),
+            },
+            ativo=app.config.get('LIMITE_ATIVO', True)
+        ),
+    }
+
+    @app.before_request
+    def limitar_ip():
+        if request.method == 'OPTIONS':
+            return None
+        espera = _limitador().consumir('ip', request.remote_addr or '-')
+        if espera:
+            return _muitas_requisicoes(espera)
+        return None
+
+    @jwt_manager.token_in_blocklist_loader
+    def verificar_revogacao(_cabecalho, claims):
+        return token_revogado(claims)
+
+    @jwt_manager.unauthorized_loader
+    def token_ausente(_motivo):
+        return jsonify({'erro': 'Token de acesso ausente.'}), 401
+
+    @jwt_manager.invalid_token_loader
+    def token_invalido(_motivo):
+        return jsonify({'erro': 'Token inválido.'}), 401
+
+    @jwt_manager.expired_token_loader
+    def token_expirado(_cabecalho, _claims):
+        return jsonify({'erro': 'Token expirado.'}), 401
+
+    @jwt_manager.revoked_token_loader
+    def token_revogado_resposta(_cabecalho, _claims):
+        return jsonify({'erro': 'Token revogado. Faça login novamente.'}), 401
+
+    @jwt_manager.needs_fresh_token_loader
+    def token_nao_recente(_cabecalho, _claims):
+        return jsonify({'erro': 'É necessário um token recente.'}), 401
@@ -0,0 +1,481 @@
+'''Teste de carga da API: latência (p50/p95/p99), vazão e memória por rota, em JSON.
+
+Cada cenário (uma rota com parâmetros realistas, tirados de amostras.json)
+roda por --segundos com --concorrencia clientes simultâneos, depois de um
+aquecimento. O pico de memória (soma do RSS do processo servidor e dos seus
+workers) é amostrado durante toda a execução.
+
+Base de dados: benchmarks/gerar_dados.py. Com --pasta o servidor é iniciado
+aqui (gunicorn, uvicorn ou o servidor de desenvolvimento) apontando para a
+base da pasta; com --url usa um servidor já em execução (--pid para medir a
+memória dele).
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/gerar_dados.py --pasta /tmp/carga --servidores 100000 --documentos 300000
+    python benchmarks/carga_api.py rodar --pasta /tmp/carga --servidor gunicorn --workers 4 --saida base.json
+    python benchmarks/carga_api.py rodar --pasta /tmp/carga --cenarios consulta_servidor_cpf download --saida atual.json
+    python benchmarks/carga_api.py comparar base.json atual.json --tolerancia 10
+
+`comparar` termina com código 1 se algum cenário piorou além da tolerância
+(p95/p99 ou memória maiores, vazão menor), para uso antes do deploy.
+
+Os clientes são threads de um único processo: em concorrências muito altas o
+próprio cliente pode virar o gargalo (acompanhe o uso de CPU dele).
+'''
+
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVIDORES = {
+    'gunicorn': ['gunicorn', '-w', '{workers}', '-k', 'gthread', '--threads', '8', '-b', '127.0.0.1:{porta}', 'wsgi:app'],
+    'uvicorn': ['uvicorn', 'asgi:app', '--workers', '{workers}', '--host', '127.0.0.1', '--port', '{porta}',
+                '--log-level', 'warning'],
+    'flask': [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', '{porta}', '--with-threads'],
+}
+
+# Métricas usadas em `comparar`: (caminho, sentido ruim)
+INDICADORES = (
+    (('latencia_ms', 'p50'), 'maior'),
+    (('latencia_ms', 'p95'), 'maior'),
+    (('latencia_ms', 'p99'), 'maior'),
+    (('vazao_rps',), 'menor'),
+)
+
+
+# Cenários: função(amostras, aleatorio) -> (método, caminho, kwargs do requests, status esperados)
+
+def _consulta_servidor_cpf(amostras, aleatorio):
+    return 'GET', '/consulta_servidor', {'params': {'cpf': aleatorio.choice(amostras['cpfs'])}}, {200}
+
+
+def _consulta_servidor_matricula(amostras, aleatorio):
+    return 'GET', '/consulta_servidor', {'params': {'matricula': aleatorio.choice(amostras['matriculas'])}}, {200}
+
+
+def _consulta_servidor_orgao(amostras, aleatorio):
+    parametros = {'codigo_orgao': aleatorio.choice(amostras['orgaos']), 'ativo': 'true', 'limit': 50}
+    return 'GET', '/consulta_servidor', {'params': parametros}, {200, 404}
+
+
+def _consulta_servidor_lotacao(amostras, aleatorio):
+    parametros = {'codigo_orgao': aleatorio.choice(amostras['orgaos']),
+                  'lotacao': aleatorio.choice(amostras['lotacoes']), 'limit': 50}
+    return 'GET', '/consulta_servidor', {'params': parametros}, {200, 404}
+
+
+def _consulta_servidor_nome(amostras, aleatorio):
+    nome = f"{aleatorio.choice(amostras['sobrenomes'])[:5]} {aleatorio.choice(amostras['sobrenomes'])}"
+    return 'GET', '/consulta_servidor', {'params': {'nome': nome, 'limit': 20}}, {200, 404}
+
+
+def _consulta_servidor_ndjson(amostras, aleatorio):
+    parametros = {'codigo_orgao': aleatorio.choice(amostras['orgaos']), 'limit': 500, 'formato': 'ndjson'}
+    return 'GET', '/consulta_servidor', {'params': parametros}, {200, 404}
+
+
+def _consulta_servidor_lote(amostras, aleatorio):
+    # Como a integração da folha: centenas de CPFs sem pontuação, parte deles inexistentes
+    cpfs = [cpf.replace('.', '').replace('-', '') for cpf in aleatorio.sample(amostras['cpfs'], min(450, len(amostras['cpfs'])))]
+    cpfs += [f'{aleatorio.randrange(10 ** 11):011d}' for _ in range(50)]
+    return 'POST', '/consulta_servidor/lote', {'json': {'cpfs': cpfs, 'incluir_documentos': True}}, {200}
+
+
+def _consulta_documentos(amostras, aleatorio):
+    return 'GET', '/consulta_documentos', {'params': {'cpf': aleatorio.choice(amostras['cpfs_com_documentos'])}}, {200}
+
+
+def _consulta_documentos_tipo(amostras, aleatorio):
+    parametros = {'tipo': aleatorio.choice(amostras['tipos_documento']), 'limit': 100}
+    return 'GET', '/consulta_documentos_', {'params': parametros}, {200, 404}
+
+
+def _mudancas(amostras, aleatorio):
+    # Sistema que sincroniza a cada ciclo: retoma de um cursor recente e lê uma página do registro
+    ultimo = amostras.get('maior_id_mudanca', 0)
+    cursor = json.dumps({'id': max(0, ultimo - aleatorio.randint(0, 20000))}, separators=(',', ':')).encode()
+    parametros = {'desde': base64.urlsafe_b64encode(cursor).decode().rstrip('='), 'limit': 500}
+    return 'GET', '/mudancas', {'params': parametros}, {200}
+
+
+def _download(amostras, aleatorio):
+    return 'GET', f"/download/{aleatorio.randint(1, amostras['maior_id_documento'])}", {}, {200}
+
+
+def _download_intervalo(amostras, aleatorio):
+    caminho = f"/download/{aleatorio.randint(1, amostras['maior_id_documento'])}"
+    return 'GET', caminho, {'headers': {'Range': 'bytes=0-65535'}}, {206, 200}
+
+
+def _upload(amostras, aleatorio):
+    # Conteúdo novo a cada envio (sem deduplicação), com o tamanho de um PDF do acervo
+    conteudo = amostras['_pdf'] + aleatorio.randbytes(16)
+    dados = {'cpf_servidor': aleatorio.choice(amostras['cpfs']),
+             'tipo_documento': aleatorio.choice(amostras['tipos_documento'])}
+    return 'POST', '/upload', {'data': dados, 'files': {'arquivo': ('carga.pdf', conteudo, 'application/pdf')}}, {201}
+
+
+def _login(amostras, _aleatorio):
+    return 'POST', '/login', {'json': amostras['usuario']}, {200, 503}
+
+
+def _estatisticas(_amostras, _aleatorio):
+    return 'GET', '/estatisticas', {}, {200}
+
+
+CENARIOS = {
+    'login': _login,
+    'consulta_servidor_cpf': _consulta_servidor_cpf,
+    'consulta_servidor_matricula': _consulta_servidor_matricula,
+    'consulta_servidor_orgao': _consulta_servidor_orgao,
+    'consulta_servidor_lotacao': _consulta_servidor_lotacao,
+    'consulta_servidor_nome': _consulta_servidor_nome,
+    'consulta_servidor_ndjson': _consulta_servidor_ndjson,
+    'consulta_servidor_lote': _consulta_servidor_lote,
+    'consulta_documentos': _consulta_documentos,
+    'consulta_documentos_tipo': _consulta_documentos_tipo,
+    'mudancas': _mudancas,
+    'download': _download,
+    'download_intervalo': _download_intervalo,
+    'upload': _upload,
+    'estatisticas': _estatisticas,
+}
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(tipo, pasta, workers, limites=False):
+    porta = porta_livre()
+    ambiente = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(pasta, 'bench.db')}",
+        UPLOAD_FOLDER=os.path.join(pasta, 'documentos'),
+        JWT_CHAVES_PASTA=os.path.join(pasta, 'chaves'),
+        # Todos os clientes usam o mesmo usuário e IP: sem isso o teste mediria o limitador
+        LIMITE_ATIVO='true' if limites else 'false',
+    )
+    # Como numa implantação: migrações antes de subir os workers (bases de versões anteriores)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'atualizar'],
+                   cwd=RAIZ, env=ambiente, check=True, stdout=subprocess.DEVNULL)
+    comando = [parte.format(porta=porta, workers=workers) for parte in SERVIDORES[tipo]]
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{porta}'
+    for _ in range(600):
+        try:
+            requests.get(f'{url}/.well-known/jwks.json', timeout=5)
+            return processo, url
+        except requests.RequestException:
+            if processo.poll() is not None:
+                break
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError(f'Servidor {tipo} não subiu')
+
+
+def _filhos():
+    # ppid de cada processo, lido de /proc (Linux)
+    filhos = {}
+    for nome in os.listdir('/proc'):
+        if nome.isdigit():
+            try:
+                with open(f'/proc/{nome}/stat') as arquivo:
+                    ppid = int(arquivo.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            filhos.setdefault(ppid, []).append(int(nome))
+    return filhos
+
+
+def rss_total(pid):
+    """RSS em bytes do processo e de todos os descendentes (master + workers)."""
+    filhos = _filhos()
+    pendentes, total = [pid], 0
+    while pendentes:
+        atual = pendentes.pop()
+        try:
+            with open(f'/proc/{atual}/status') as arquivo:
+                for linha in arquivo:
+                    if linha.startswith('VmRSS:'):
+                        total += int(linha.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+        pendentes.extend(filhos.get(atual, []))
+    return total
+
+
+class MonitorMemoria(threading.Thread):
+    def __init__(self, pid, intervalo=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico = 0
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico, rss_total(self.pid))
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        return self.pico
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def _cliente(url, cenario, amostras, cabecalhos, semente, ate, resultado, lock):
+    aleatorio = random.Random(semente)
+    latencias, erros, bytes_recebidos, status = [], 0, 0, {}
+    with requests.Session() as sessao:
+        sessao.headers.update(cabecalhos)
+        while time.perf_counter() < ate:
+            metodo, caminho, kwargs, esperados = cenario(amostras, aleatorio)
+            inicio = time.perf_counter()
+            try:
+                resposta = sessao.request(metodo, url + caminho, timeout=60, **kwargs)
+                corpo = resposta.content  # Inclui o tempo de receber o corpo inteiro
+            except requests.RequestException:
+                erros += 1
+                status['erro_conexao'] = status.get('erro_conexao', 0) + 1
+                continue
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            bytes_recebidos += len(corpo)
+            status[str(resposta.status_code)] = status.get(str(resposta.status_code), 0) + 1
+            if resposta.status_code not in esperados:
+                erros += 1
+    with lock:
+        resultado['latencias'].extend(latencias)
+        resultado['erros'] += erros
+        resultado['bytes'] += bytes_recebidos
+        for codigo, quantidade in status.items():
+            resultado['status'][codigo] = resultado['status'].get(codigo, 0) + quantidade
+
+
+def executar_cenario(url, nome, amostras, cabecalhos, concorrencia, segundos, aquecimento, semente):
+    cenario = CENARIOS[nome]
+    for fase, duracao in (('aquecimento', aquecimento), ('medicao', segundos)):
+        resultado = {'latencias': [], 'erros': 0, 'bytes': 0, 'status': {}}
+        lock = threading.Lock()
+        inicio = time.perf_counter()
+        ate = inicio + duracao
+        threads = [
+            threading.Thread(target=_cliente, args=(
+                url, cenario, amostras, cabecalhos, f'{semente}-{nome}-{fase}-{i}', ate, resultado, lock
+            ))
+            for i in range(concorrencia)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        decorrido = time.perf_counter() - inicio
+
+    latencias = resultado['latencias']
+    return {
+        'requisicoes': len(latencias),
+        'erros': resultado['erros'],
+        'status': resultado['status'],
+        'vazao_rps': round(len(latencias) / decorrido, 1),
+        'bytes_recebidos': resultado['bytes'],
+        'latencia_ms': {
+            'p50': round(percentil(latencias, 50), 2),
+            'p95': round(percentil(latencias, 95), 2),
+            'p99': round(percentil(latencias, 99), 2),
+            'max': round(max(latencias), 2),
+            'media': round(sum(latencias) / len(latencias), 2),
+        } if latencias else None,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rodar(args):
+    if not args.pasta and not args.url:
+        raise SystemExit('Informe --pasta (inicia o servidor) ou --url (servidor já em execução).')
+    pasta_amostras = args.pasta or args.amostras
+    if not pasta_amostras:
+        raise SystemExit('Com --url, informe --amostras com a pasta gerada por gerar_dados.py.')
+    with open(os.path.join(pasta_amostras, 'amostras.json')) as arquivo:
+        amostras = json.load(arquivo)
+    with open(os.path.join(pasta_amostras, amostras['pdf_upload']), 'rb') as arquivo:
+        amostras['_pdf'] = arquivo.read()
+
+    processo = None
+    copia = None
+    if args.pasta:
+        # Uploads alteram a base: o servidor roda sobre uma cópia do banco, descartada no fim
+        copia = tempfile.mkdtemp(dir=args.pasta)
+        shutil.copy(os.path.join(args.pasta, 'bench.db'), os.path.join(copia, 'bench.db'))
+        os.symlink(os.path.join(os.path.abspath(args.pasta), 'documentos'), os.path.join(copia, 'documentos'))
+        processo, url = iniciar_servidor(args.servidor, copia, args.workers, args.limites)
+        pid = processo.pid
+    else:
+        url, pid = args.url.rstrip('/'), args.pid
+
+    monitor = MonitorMemoria(pid) if pid else None
+    if monitor:
+        monitor.start()
+    try:
+        resposta = requests.post(f'{url}/login', json=amostras['usuario'], timeout=30)
+        token = resposta.json().get('token') if resposta.ok else None
+        cabecalhos = {'Authorization': f'Bearer {token}'} if token else {}
+
+        resultados = {}
+        for nome in args.cenarios:
+            resultados[nome] = executar_cenario(
+                url, nome, amostras, cabecalhos, args.concorrencia, args.segundos, args.aquecimento, args.semente
+            )
+            print(f"{nome}: {resultados[nome]['vazao_rps']} req/s", file=sys.stderr)
+    finally:
+        pico = monitor.parar() if monitor else None
+        if processo:
+            processo.terminate()
+            processo.wait()
+        if copia:
+            shutil.rmtree(copia, ignore_errors=True)
+
+    relatorio = {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'servidor': args.servidor if args.pasta else url,
+            'workers': args.workers if args.pasta else None,
+            'concorrencia': args.concorrencia,
+            'segundos': args.segundos,
+            'base': {'maior_id_documento': amostras['maior_id_documento']},
+        },
+        'memoria': {'rss_pico_mb': round(pico / 1024 / 1024, 1) if pico else None},
+        'cenarios': resultados,
+    }
+    saida = json.dumps(relatorio, indent=2)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            arquivo.write(saida + '\n')
+    print(saida)
+
+
+def _valor(dados, caminho):
+    for chave in caminho:
+        if dados is None:
+            return None
+        dados = dados.get(chave)
+    return dados
+
+
+def _variacao(base, atual):
+    return round((atual - base) / base * 100, 1) if base else None
+
+
+def comparar(args):
+    with open(args.base) as arquivo:
+        base = json.load(arquivo)
+    with open(args.atual) as arquivo:
+        atual = json.load(arquivo)
+
+    regressoes = []
+    cenarios = {}
+    for nome in sorted(base['cenarios'].keys() & atual['cenarios'].keys()):
+        comparacao = {}
+        for caminho, ruim in INDICADORES:
+            antes = _valor(base['cenarios'][nome], caminho)
+            depois = _valor(atual['cenarios'][nome], caminho)
+            if antes is None or depois is None:
+                continue
+            variacao = _variacao(antes, depois)
+            indicador = '.'.join(caminho)
+            comparacao[indicador] = {'base': antes, 'atual': depois, 'variacao_pct': variacao}
+            piorou = variacao is not None and (variacao > args.tolerancia if ruim == 'maior' else variacao < -args.tolerancia)
+            # Indicadores de latência só contam com p50 acima do ruído (--minimo-ms)
+            if piorou and (ruim == 'menor' or depois >= args.minimo_ms):
+                regressoes.append({'cenario': nome, 'indicador': indicador, 'variacao_pct': variacao})
+        novos_erros = atual['cenarios'][nome]['erros'] - base['cenarios'][nome]['erros']
+        if novos_erros > 0:
+            regressoes.append({'cenario': nome, 'indicador': 'erros', 'variacao': novos_erros})
+        cenarios[nome] = comparacao
+
+    memoria_antes = base['memoria'].get('rss_pico_mb')
+    memoria_depois = atual['memoria'].get('rss_pico_mb')
+    memoria = None
+    if memoria_antes and memoria_depois:
+        memoria = {'base': memoria_antes, 'atual': memoria_depois, 'variacao_pct': _variacao(memoria_antes, memoria_depois)}
+        if memoria['variacao_pct'] > args.tolerancia:
+            regressoes.append({'cenario': None, 'indicador': 'rss_pico_mb', 'variacao_pct': memoria['variacao_pct']})
+
+    print(json.dumps({
+        'base': base['meta'].get('commit'),
+        'atual': atual['meta'].get('commit'),
+        'tolerancia_pct': args.tolerancia,
+        'memoria': memoria,
+        'cenarios': cenarios,
+        'regressoes': regressoes,
+    }, indent=2))
+    return 1 if regressoes else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    parser_rodar = comandos.add_parser('rodar', help='Executa os cenários e gera o relatório JSON')
+    parser_rodar.add_argument('--pasta', help='Pasta gerada por gerar_dados.py; inicia o servidor sobre ela')
+    parser_rodar.add_argument('--servidor', choices=list(SERVIDORES), default='gunicorn')
+    parser_rodar.add_argument('--workers', type=int, default=4)
+    parser_rodar.add_argument('--url', help='Servidor já em execução (em vez de --pasta)')
+    parser_rodar.add_argument('--pid', type=int, help='Com --url: processo principal do servidor, para medir a memória')
+    parser_rodar.add_argument('--amostras', help='Com --url: pasta com amostras.json')
+    parser_rodar.add_argument('--limites', action='store_true',
+                              help='Mantém o limite de requisições por usuário/IP (desligado por padrão)')
+    parser_rodar.add_argument('--cenarios', nargs='+', choices=list(CENARIOS), default=list(CENARIOS))
+    parser_rodar.add_argument('--concorrencia', type=int, default=16)
+    parser_rodar.add_argument('--segundos', type=float, default=10)
+    parser_rodar.add_argument('--aquecimento', type=float, default=2)
+    parser_rodar.add_argument('--semente', type=int, default=42)
+    parser_rodar.add_argument('--saida', help='Arquivo do relatório JSON (também vai para a saída padrão)')
+
+    parser_comparar = comandos.add_parser('comparar', help='Compara dois relatórios e aponta regressões')
+    parser_comparar.add_argument('base')
+    parser_comparar.add_argument('atual')
+    parser_comparar.add_argument('--tolerancia', type=float, default=10, help='Variação máxima aceita, em %%')
+    parser_comparar.add_argument('--minimo-ms', type=float, default=1,
+                                 help='Latências abaixo disso não contam como regressão (ruído)')
+
+    args = parser.parse_args()
+    if args.comando == 'rodar':
+        rodar(args)
+    else:
+        sys.exit(comparar(args))
+
+
+if __name__ == '__main__':
+    main()
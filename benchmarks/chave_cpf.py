@@ -0,0 +1,242 @@
+'''Benchmark: CPF como texto formatado x inteiro, em tamanho de índice e tempo de junção.
+
+Monta duas bases SQLite com os mesmos dados: uma com o esquema anterior à
+migração 0003 (servidores.cpf e documentos.cpf_servidor VARCHAR(14) com
+"XXX.XXX.XXX-XX") e outra com o atual (BIGINT com os 11 dígitos). Mede:
+- tempo de carga e tamanho em disco das tabelas e dos índices de CPF (dbstat);
+- documentos de um CPF (ix_documentos_cpf_id), como /consulta_documentos;
+- página de 500 documentos com dados do servidor (JOIN por CPF), como /consulta_documentos_;
+- lote de 500 CPFs com a contagem de documentos, como /consulta_servidor/lote;
+- junção completa documentos x servidores agrupada por órgão;
+- custo de formatar o CPF na serialização (só na base inteira).
+
+As consultas usam os mesmos CPFs nas duas bases, com o cache já aquecido.
+Relatório em JSON, com a redução percentual de cada medida.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/chave_cpf.py --servidores 1000000 --documentos 5000000
+    python benchmarks/chave_cpf.py --servidores 200000 --documentos 2000000 --saida cpf.json
+'''
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from gerar_dados import bases_cpf, cpf_numero  # noqa: E402
+from serializacao import formatar_cpf  # noqa: E402
+
+LOTE_CARGA = 50000
+ORGAOS = 40
+TIPOS = ['RG', 'CPF', 'Certidão', 'Comprovante de Residência', 'Diploma', 'Contracheque']
+TIPOS_CPF = {'texto': 'VARCHAR(14)', 'inteiro': 'BIGINT'}
+
+# Mesmas colunas e índices de models.py; só o tipo do CPF muda
+ESQUEMA = [
+    """CREATE TABLE servidores (
+        id INTEGER PRIMARY KEY,
+        nome VARCHAR(100) NOT NULL,
+        cpf {tipo} NOT NULL,
+        matricula VARCHAR(50) NOT NULL,
+        codigo_orgao VARCHAR(10) NOT NULL,
+        ativo BOOLEAN NOT NULL,
+        cargo VARCHAR(100) NOT NULL,
+        lotacao VARCHAR(100) NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX ux_servidores_cpf ON servidores (cpf)",
+    "CREATE UNIQUE INDEX ux_servidores_matricula ON servidores (matricula)",
+    """CREATE TABLE documentos (
+        id INTEGER PRIMARY KEY,
+        cpf_servidor {tipo} NOT NULL REFERENCES servidores (cpf),
+        hora_cadastro DATETIME NOT NULL,
+        tipo VARCHAR(50) NOT NULL,
+        caminho_arquivo VARCHAR(255) NOT NULL,
+        tamanho BIGINT
+    )""",
+    "CREATE INDEX ix_documentos_cpf_id ON documentos (cpf_servidor, id)",
+    "CREATE INDEX ix_documentos_tipo_id ON documentos (tipo, id)",
+]
+
+CONSULTAS = {
+    'documentos_por_cpf':
+        "SELECT id, cpf_servidor, hora_cadastro, tipo, caminho_arquivo FROM documentos "
+        "WHERE cpf_servidor = ? ORDER BY id",
+    'pagina_com_servidor':
+        "SELECT d.id, d.cpf_servidor, d.tipo, s.nome, s.matricula, s.codigo_orgao "
+        "FROM documentos d JOIN servidores s ON s.cpf = d.cpf_servidor WHERE d.id > ? ORDER BY d.id LIMIT 500",
+    'lote_500_cpfs':
+        "SELECT cpf_servidor, count(*) FROM documentos WHERE cpf_servidor IN ({marcadores}) GROUP BY cpf_servidor",
+    'juncao_completa':
+        "SELECT s.codigo_orgao, count(*) FROM documentos d JOIN servidores s ON s.cpf = d.cpf_servidor "
+        "GROUP BY s.codigo_orgao",
+}
+
+
+def em_lotes(linhas, tamanho=LOTE_CARGA):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def carregar(caminho, variante, cpfs, documentos, semente):
+    """Cria a base e insere os dados; os documentos chegam em ordem aleatória de CPF, como na produção."""
+    valor = formatar_cpf if variante == 'texto' else int
+    conexao = sqlite3.connect(caminho)
+    conexao.execute('PRAGMA journal_mode=WAL')
+    conexao.execute('PRAGMA synchronous=OFF')
+    for comando in ESQUEMA:
+        conexao.execute(comando.format(tipo=TIPOS_CPF[variante]))
+
+    aleatorio = random.Random(semente)
+    inicio = time.perf_counter()
+    servidores = (
+        (f'Servidor {indice}', valor(cpf), f'M{indice:09d}', f'{indice % ORGAOS:03d}', indice % 7 != 0,
+         'Analista', f'Lotação {indice % 500:04d}')
+        for indice, cpf in enumerate(cpfs)
+    )
+    for lote in em_lotes(servidores):
+        conexao.executemany(
+            'INSERT INTO servidores (nome, cpf, matricula, codigo_orgao, ativo, cargo, lotacao) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            lote
+        )
+        conexao.commit()
+    agora = datetime(2026, 1, 1)
+    docs = (
+        (valor(aleatorio.choice(cpfs)), (agora - timedelta(seconds=aleatorio.randrange(3 * 365 * 86400))).isoformat(' '),
+         aleatorio.choice(TIPOS), f'documentos/blobs/{indice:064x}'[:90], aleatorio.randrange(10 ** 4, 10 ** 7))
+        for indice in range(documentos)
+    )
+    for lote in em_lotes(docs):
+        conexao.executemany(
+            'INSERT INTO documentos (cpf_servidor, hora_cadastro, tipo, caminho_arquivo, tamanho) VALUES (?, ?, ?, ?, ?)',
+            lote
+        )
+        conexao.commit()
+    segundos = time.perf_counter() - inicio
+    conexao.execute('ANALYZE')
+    conexao.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conexao.close()
+    return segundos
+
+
+def tamanhos(conexao):
+    """MB por tabela e índice (páginas ocupadas, via dbstat)."""
+    paginas = dict(conexao.execute('SELECT name, sum(pgsize) FROM dbstat GROUP BY name'))
+    nomes = ('servidores', 'documentos', 'ux_servidores_cpf', 'ix_documentos_cpf_id')
+    return {nome: round(paginas.get(nome, 0) / 1024 / 1024, 2) for nome in nomes}
+
+
+def cronometrar(conexao, sql, parametros_por_execucao):
+    tempos = []
+    for parametros in parametros_por_execucao:
+        inicio = time.perf_counter()
+        conexao.execute(sql, parametros).fetchall()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {'execucoes': len(tempos), 'mediana_ms': round(statistics.median(tempos), 3),
+            'total_ms': round(sum(tempos), 1)}
+
+
+def medir(caminho, variante, amostras, maior_id, consultas, semente):
+    valor = formatar_cpf if variante == 'texto' else int
+    conexao = sqlite3.connect(caminho)
+    conexao.execute('PRAGMA cache_size=-200000')  # ~200 MB: mede comparação e páginas lidas, não o disco
+    aleatorio = random.Random(semente)
+    inicios = [(aleatorio.randrange(max(maior_id - 500, 1)),) for _ in range(max(consultas // 10, 1))]
+    lotes = [[valor(cpf) for cpf in aleatorio.sample(amostras, min(500, len(amostras)))]
+             for _ in range(max(consultas // 20, 1))]
+    execucoes = {
+        'documentos_por_cpf': [(valor(cpf),) for cpf in amostras[:consultas]],
+        'pagina_com_servidor': inicios,
+        'lote_500_cpfs': lotes,
+        'juncao_completa': [()] * 3,
+    }
+
+    resultado = {'tamanho_mb': tamanhos(conexao), 'arquivo_mb': round(os.path.getsize(caminho) / 1024 / 1024, 1)}
+    for nome, parametros in execucoes.items():
+        sql = CONSULTAS[nome].format(marcadores=', '.join('?' * len(parametros[0])))
+        cronometrar(conexao, sql, parametros[:1])  # Aquecimento
+        resultado[nome] = cronometrar(conexao, sql, parametros)
+        resultado[nome]['plano'] = ' | '.join(linha[-1] for linha in conexao.execute('EXPLAIN QUERY PLAN ' + sql, parametros[0]))
+    conexao.close()
+    return resultado
+
+
+def custo_formatacao(amostras, repeticoes=5):
+    """Microssegundos por CPF para montar o texto na serialização."""
+    valores = amostras * max(1, 200000 // max(len(amostras), 1))
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for valor in valores:
+            formatar_cpf(valor)
+        tempos.append(time.perf_counter() - inicio)
+    return round(min(tempos) / len(valores) * 1e6, 3)
+
+
+def reducao(antes, depois):
+    return round((1 - depois / antes) * 100, 1) if antes else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servidores', type=int, default=200000)
+    parser.add_argument('--documentos', type=int, default=2000000)
+    parser.add_argument('--consultas', type=int, default=2000, help='Consultas por CPF (as demais são proporcionais)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--pasta', help='Onde criar as bases (padrão: pasta temporária, apagada no fim)')
+    parser.add_argument('--saida', help='Arquivo do relatório JSON (também vai para a saída padrão)')
+    args = parser.parse_args()
+
+    pasta = args.pasta or tempfile.mkdtemp()
+    os.makedirs(pasta, exist_ok=True)
+    cpfs = [cpf_numero(base) for base in bases_cpf(args.servidores)]
+    amostras = random.Random(args.semente).sample(cpfs, min(args.consultas, len(cpfs)))
+
+    relatorio = {'servidores': args.servidores, 'documentos': args.documentos, 'sqlite': sqlite3.sqlite_version}
+    try:
+        for variante in TIPOS_CPF:
+            caminho = os.path.join(pasta, f'cpf_{variante}.db')
+            for sufixo in ('', '-wal', '-shm'):
+                if os.path.exists(caminho + sufixo):
+                    os.remove(caminho + sufixo)
+            print(f'carregando {variante}...', file=sys.stderr)
+            segundos = carregar(caminho, variante, cpfs, args.documentos, args.semente)
+            relatorio[variante] = {'carga_s': round(segundos, 1)}
+            relatorio[variante].update(medir(caminho, variante, amostras, args.documentos, args.consultas, args.semente))
+    finally:
+        if not args.pasta:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    relatorio['inteiro']['formatacao_us_por_cpf'] = custo_formatacao(amostras)
+    texto, inteiro = relatorio['texto'], relatorio['inteiro']
+    relatorio['reducao_percentual'] = {
+        'carga': reducao(texto['carga_s'], inteiro['carga_s']),
+        'arquivo': reducao(texto['arquivo_mb'], inteiro['arquivo_mb']),
+        **{f'tamanho_{nome}': reducao(texto['tamanho_mb'][nome], inteiro['tamanho_mb'][nome])
+           for nome in texto['tamanho_mb']},
+        **{nome: reducao(texto[nome]['mediana_ms'], inteiro[nome]['mediana_ms']) for nome in CONSULTAS},
+    }
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            arquivo.write(saida + '\n')
+    print(saida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+'''Benchmark: latência de leitura no SQLite enquanto outros processos escrevem.
+
+Compara o modo padrão do SQLite (journal_mode=DELETE, synchronous=FULL) com a
+configuração de config.py (WAL, synchronous=NORMAL, busy_timeout, mmap).
+Cada modo roda com processos escritores (um INSERT + commit por vez, como em
+/cadastro_servidor) e processos leitores (consulta por id, como /consulta_servidor).
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/concorrencia_sqlite.py --segundos 10 --escritores 2 --leitores 4
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+
+from config import configurar_sqlite, pragmas_sqlite  # noqa: E402
+from models import db, Servidor  # noqa: E402
+
+MODOS = {
+    'padrao': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+    'wal': pragmas_sqlite(),
+}
+LINHAS_INICIAIS = 20000
+
+
+def criar_engine(caminho, modo):
+    engine = create_engine(f'sqlite:///{caminho}', connect_args={'timeout': 30})
+    configurar_sqlite(engine, MODOS[modo])
+    return engine
+
+
+def preparar_banco(caminho, modo):
+    engine = criar_engine(caminho, modo)
+    db.metadata.create_all(engine, tables=[Servidor.__table__])
+    with engine.begin() as conexao:
+        conexao.execute(insert(Servidor), [_servidor(f'inicial-{i}', i + 1) for i in range(LINHAS_INICIAIS)])
+    engine.dispose()
+
+
+def _servidor(sufixo, cpf):
+    return {
+        'nome': f'Servidor {sufixo}',
+        'cpf': cpf,
+        'matricula': sufixo,
+        'codigo_orgao': '123',
+        'ativo': True,
+        'cargo': 'Analista',
+        'lotacao': 'TI',
+    }
+
+
+def escritor(caminho, modo, ate, numero, fila):
+    engine = criar_engine(caminho, modo)
+    escritas = 0
+    while time.time() < ate:
+        with engine.begin() as conexao:
+            # CPF único por escritor (não precisa ser válido: não passa pela API)
+            conexao.execute(insert(Servidor), [_servidor(f'e{numero}-{escritas}', (numero + 1) * 10 ** 9 + escritas)])
+        escritas += 1
+    fila.put(('escritas', escritas))
+
+
+def leitor(caminho, modo, ate, numero, fila):
+    engine = criar_engine(caminho, modo)
+    latencias = []
+    i = numero
+    with engine.connect() as conexao:
+        while time.time() < ate:
+            inicio = time.perf_counter()
+            conexao.execute(select(Servidor.nome).where(Servidor.id == (i % LINHAS_INICIAIS) + 1)).first()
+            conexao.commit()  # Encerra a transação de leitura, como ao fim de cada requisição
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            i += 7
+    fila.put(('latencias', latencias))
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def rodar(modo, segundos, escritores, leitores):
+    pasta = tempfile.mkdtemp()
+    caminho = os.path.join(pasta, 'bench.db')
+    preparar_banco(caminho, modo)
+
+    fila = multiprocessing.Queue()
+    ate = time.time() + segundos
+    processos = [multiprocessing.Process(target=escritor, args=(caminho, modo, ate, n, fila)) for n in range(escritores)]
+    processos += [multiprocessing.Process(target=leitor, args=(caminho, modo, ate, n, fila)) for n in range(leitores)]
+    for processo in processos:
+        processo.start()
+
+    escritas, latencias = 0, []
+    for _ in processos:
+        tipo, valor = fila.get()
+        if tipo == 'escritas':
+            escritas += valor
+        else:
+            latencias.extend(valor)
+    for processo in processos:
+        processo.join()
+
+    return {
+        'modo': modo,
+        'escritas_por_segundo': round(escritas / segundos, 1),
+        'leituras_por_segundo': round(len(latencias) / segundos, 1),
+        'leitura_ms': {
+            'p50': round(statistics.median(latencias), 3),
+            'p99': round(percentil(latencias, 99), 3),
+            'max': round(max(latencias), 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--escritores', type=int, default=2)
+    parser.add_argument('--leitores', type=int, default=4)
+    args = parser.parse_args()
+
+    resultados = [rodar(modo, args.segundos, args.escritores, args.leitores) for modo in MODOS]
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+'''Gera uma base sintética para os testes de carga (benchmarks/carga_api.py).
+
+Servidores com CPF válido (dígitos verificadores corretos) e matrícula única,
+distribuídos por órgão, lotação e cargo; documentos apontando para um acervo
+de PDFs de tamanhos variados, gravados no armazenamento por conteúdo
+(armazenamento.py) como um upload faria; um usuário para /login.
+
+A geração é determinística: a mesma --semente produz a mesma base, e os
+valores usados pelos cenários (CPFs, matrículas, órgãos, ids) são gravados em
+<pasta>/amostras.json.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/gerar_dados.py --pasta /tmp/carga --servidores 100000 --documentos 300000
+    python benchmarks/gerar_dados.py --pasta /tmp/carga --servidores 10000000 --documentos 5000000 --pdfs 2000
+
+A pasta recebe o banco (bench.db) e os arquivos (documentos/); o servidor de
+teste deve usar DATABASE_URL=sqlite:///<pasta>/bench.db e UPLOAD_FOLDER=<pasta>/documentos
+(carga_api.py --pasta faz isso sozinho).
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+USUARIO_EMAIL = 'carga@exemplo.gov.br'
+USUARIO_SENHA = 'senha-de-carga'
+TAMANHO_LOTE = 20000
+
+NOMES = ['Ana', 'João', 'Maria', 'José', 'Cláudia', 'Antônio', 'Francisca', 'Carlos', 'Paulo', 'Luíza',
+         'Pedro', 'Fernanda', 'Lucas', 'Juliana', 'Marcos', 'Patrícia', 'Rafael', 'Aline', 'Bruno', 'Camila',
+         'Gabriel', 'Letícia', 'Rodrigo', 'Beatriz', 'Thiago', 'Larissa', 'Felipe', 'Vanessa', 'Márcio', 'Sônia']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima',
+              'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes',
+              'Vieira', 'Barbosa', 'Rocha', 'Dias', 'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques',
+              'Machado', 'Mendes', 'Freitas', 'Cardoso', 'Ramos', 'Gonçalves', 'Araújo', 'Conceição']
+CARGOS = ['Analista', 'Técnico', 'Auditor', 'Assistente Administrativo', 'Especialista', 'Agente',
+          'Contador', 'Engenheiro', 'Médico', 'Professor', 'Pesquisador', 'Economista', 'Arquivista',
+          'Administrador', 'Analista de Sistemas', 'Técnico de Suporte', 'Procurador', 'Enfermeiro']
+TIPOS_DOCUMENTO = ['RG', 'CPF', 'Certidão', 'Comprovante de Residência', 'Diploma', 'Contracheque',
+                   'Portaria', 'Atestado', 'Declaração', 'Título de Eleitor']
+# Peso de cada tipo: poucos tipos concentram a maioria dos documentos
+PESOS_TIPO = [20, 18, 14, 12, 8, 10, 6, 5, 4, 3]
+
+
+def cpf_numero(base):
+    """CPF como gravado no banco (inteiro dos 11 dígitos) a partir de 9 dígitos, com os verificadores calculados."""
+    digitos = [int(d) for d in f'{base:09d}']
+    for tamanho in (9, 10):
+        soma = sum(d * peso for d, peso in zip(digitos, range(tamanho + 1, 1, -1)))
+        resto = soma * 10 % 11
+        digitos.append(0 if resto == 10 else resto)
+    return int(''.join(map(str, digitos)))
+
+
+def bases_cpf(quantidade):
+    """
+    9 dígitos distintos e espalhados: i * 387420489 (3^18, primo com 10^9) mod 10^9 é
+    uma bijeção. Pula bases de dígitos repetidos (111.111.111-11 não é CPF válido).
+    """
+    indice = 1
+    geradas = 0
+    while geradas < quantidade:
+        base = indice * 387420489 % 1_000_000_000
+        indice += 1
+        if len(set(f'{base:09d}')) == 1:
+            continue
+        geradas += 1
+        yield base
+
+
+def gerar_pdf(aleatorio, paginas, tamanho_alvo):
+    """PDF válido com `paginas` páginas de texto e um fluxo de bytes aleatórios até ~tamanho_alvo (como um escaneado)."""
+    objetos = ['<< /Type /Catalog /Pages 2 0 R >>']
+    filhos = ' '.join(f'{3 + 2 * i} 0 R' for i in range(paginas))
+    objetos.append(f'<< /Type /Pages /Kids [{filhos}] /Count {paginas} >>')
+    fonte = 3 + 2 * paginas
+    for i in range(paginas):
+        texto = ' '.join(aleatorio.choice(SOBRENOMES) for _ in range(12))
+        conteudo = f'BT /F1 12 Tf 40 700 Td (Pagina {i + 1} {texto}) Tj ET'
+        objetos.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {4 + 2 * i} 0 R '
+            f'/Resources << /Font << /F1 {fonte} 0 R >> >> >>'
+        )
+        objetos.append(f'<< /Length {len(conteudo)} >>\nstream\n{conteudo}\nendstream')
+    objetos.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    saida = bytearray(b'%PDF-1.4\n')
+    posicoes = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += f'{numero} 0 obj\n{objeto}\nendobj\n'.encode('latin-1', 'replace')
+    preenchimento = max(0, tamanho_alvo - len(saida) - 200)
+    if preenchimento:
+        posicoes.append(len(saida))
+        saida += f'{len(objetos) + 1} 0 obj\n<< /Length {preenchimento} >>\nstream\n'.encode()
+        saida += aleatorio.randbytes(preenchimento)
+        saida += b'\nendstream\nendobj\n'
+    inicio_xref = len(saida)
+    saida += f'xref\n0 {len(posicoes) + 1}\n0000000000 65535 f \n'.encode()
+    for posicao in posicoes:
+        saida += f'{posicao:010d} 00000 n \n'.encode()
+    saida += f'trailer\n<< /Size {len(posicoes) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n'.encode()
+    return bytes(saida)
+
+
+def em_lotes(linhas, tamanho=TAMANHO_LOTE):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pasta', required=True, help='Destino do banco (bench.db) e dos arquivos (documentos/)')
+    parser.add_argument('--servidores', type=int, default=100000)
+    parser.add_argument('--documentos', type=int, default=300000)
+    parser.add_argument('--pdfs', type=int, default=500, help='PDFs distintos no acervo (documentos repetem conteúdo)')
+    parser.add_argument('--tamanho-medio-pdf', type=int, default=200 * 1024, help='bytes (distribuição log-normal)')
+    parser.add_argument('--orgaos', type=int, default=40)
+    parser.add_argument('--lotacoes', type=int, default=300)
+    parser.add_argument('--fracao-ativos', type=float, default=0.85)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    pasta = os.path.abspath(args.pasta)
+    os.makedirs(pasta, exist_ok=True)
+    banco = os.path.join(pasta, 'bench.db')
+    if os.path.exists(banco):
+        parser.error(f'{banco} já existe; use outra pasta ou apague o banco')
+
+    from sqlalchemy import insert, text
+    from werkzeug.security import generate_password_hash
+
+    import armazenamento
+    import estatisticas
+    import migracoes
+    from app import create_app
+    from models import db, Blob, Documento, Servidor, Usuario
+    from serializacao import formatar_cpf
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{banco}',
+        'UPLOAD_FOLDER': os.path.join(pasta, 'documentos'),
+    })
+    migracoes.atualizar(app)  # Esquema criado como numa implantação (`flask db atualizar`)
+
+    aleatorio = random.Random(args.semente)
+    inicio = time.perf_counter()
+    resumo = {'banco': banco, 'semente': args.semente}
+
+    with app.app_context():
+        engine = db.engine
+        raiz = app.config['UPLOAD_FOLDER']
+
+        with engine.begin() as conexao:
+            conexao.execute(insert(Usuario), [{
+                'nome': 'Usuário de carga',
+                'email': USUARIO_EMAIL,
+                'senha_hash': generate_password_hash(USUARIO_SENHA, method=app.config['SENHA_METODO']),
+                'tipo': 'gestor',
+            }])
+
+        # Servidores
+        orgaos = [f'{numero:03d}' for numero in range(1, args.orgaos + 1)]
+        lotacoes = [f'Lotação {numero:04d}' for numero in range(1, args.lotacoes + 1)]
+        cpfs_amostra, matriculas_amostra = [], []
+
+        def servidores():
+            for indice, base in enumerate(bases_cpf(args.servidores)):
+                cpf = cpf_numero(base)
+                matricula = f'M{indice + 1:09d}'
+                if aleatorio.random() < 1000 / max(args.servidores, 1000):
+                    cpfs_amostra.append(formatar_cpf(cpf))  # Como os clientes enviam
+                    matriculas_amostra.append(matricula)
+                nome = f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}'
+                yield {
+                    'nome': nome,
+                    'cpf': cpf,
+                    'matricula': matricula,
+                    'codigo_orgao': aleatorio.choice(orgaos),
+                    'ativo': aleatorio.random() < args.fracao_ativos,
+                    'cargo': aleatorio.choice(CARGOS),
+                    'lotacao': aleatorio.choice(lotacoes),
+                }
+
+        todos_cpfs = []
+        for lote in em_lotes(servidores()):
+            with engine.begin() as conexao:
+                conexao.execute(insert(Servidor), lote)
+            todos_cpfs.extend(servidor['cpf'] for servidor in lote)
+            print(f'servidores: {len(todos_cpfs)}/{args.servidores}', file=sys.stderr, end='\r')
+        print(file=sys.stderr)
+
+        # Acervo de PDFs, gravado como blobs
+        acervo = []
+        for _ in range(args.pdfs):
+            tamanho = int(min(20 * 1024 * 1024, aleatorio.lognormvariate(0, 0.8) * args.tamanho_medio_pdf / 1.377))
+            paginas = aleatorio.randint(1, 12)
+            conteudo = gerar_pdf(aleatorio, paginas, tamanho)
+            sha256 = hashlib.sha256(conteudo).hexdigest()
+            caminho = armazenamento.caminho_blob(raiz, sha256)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(conteudo)
+            acervo.append((sha256, caminho, len(conteudo), paginas))
+
+        # Documentos: 20% vão para poucos servidores (Pareto, como quem tem histórico longo), o resto é uniforme
+        agora = datetime.now().replace(microsecond=0)
+        referencias = dict.fromkeys((sha256 for sha256, _, _, _ in acervo), 0)
+
+        def documentos():
+            for _ in range(args.documentos):
+                if aleatorio.random() < 0.2:
+                    indice = min(len(todos_cpfs) - 1, int(aleatorio.paretovariate(1.2)) - 1)
+                else:
+                    indice = aleatorio.randrange(len(todos_cpfs))
+                sha256, caminho, tamanho, paginas = aleatorio.choice(acervo)
+                referencias[sha256] += 1
+                yield {
+                    'cpf_servidor': todos_cpfs[indice],
+                    'hora_cadastro': agora - timedelta(seconds=aleatorio.randrange(3 * 365 * 86400)),
+                    'tipo': aleatorio.choices(TIPOS_DOCUMENTO, PESOS_TIPO)[0],
+                    'caminho_arquivo': caminho,
+                    'sha256': sha256,
+                    'tamanho': tamanho,
+                    'status_processamento': 'concluido',
+                    'paginas': paginas,
+                }
+
+        inseridos = 0
+        for lote in em_lotes(documentos()):
+            with engine.begin() as conexao:
+                conexao.execute(insert(Documento), lote)
+            inseridos += len(lote)
+            print(f'documentos: {inseridos}/{args.documentos}', file=sys.stderr, end='\r')
+        print(file=sys.stderr)
+
+        with engine.begin() as conexao:
+            conexao.execute(insert(Blob), [
+                {'sha256': sha256, 'caminho_arquivo': caminho, 'tamanho': tamanho,
+                 'referencias': referencias[sha256], 'criado_em': agora, 'tamanho_armazenado': tamanho}
+                for sha256, caminho, tamanho, _ in acervo
+            ])
+
+        # O índice de nomes acompanhou os INSERTs (triggers); os resumos de /estatisticas são recalculados
+        estatisticas.reconstruir()
+        with engine.begin() as conexao:
+            conexao.execute(text('ANALYZE'))
+            maior_id = conexao.execute(text('SELECT max(id) FROM documentos')).scalar()
+            # Os INSERTs também passaram pelo registro de mudanças (uma linha por servidor e documento)
+            maior_id_mudanca = conexao.execute(text('SELECT max(id) FROM mudancas')).scalar()
+            cpf_com_documentos = conexao.execute(text(
+                'SELECT cpf_servidor FROM documentos GROUP BY cpf_servidor ORDER BY count(*) DESC LIMIT 200'
+            )).scalars().all()
+
+    amostras = {
+        'usuario': {'email': USUARIO_EMAIL, 'senha': USUARIO_SENHA},
+        'cpfs': cpfs_amostra,
+        'matriculas': matriculas_amostra,
+        'cpfs_com_documentos': [formatar_cpf(cpf) for cpf in cpf_com_documentos],
+        'orgaos': orgaos,
+        'lotacoes': lotacoes[:50],
+        'tipos_documento': TIPOS_DOCUMENTO,
+        'sobrenomes': SOBRENOMES,
+        'maior_id_documento': maior_id,
+        'maior_id_mudanca': maior_id_mudanca,
+        'pdf_upload': os.path.relpath(acervo[0][1], pasta) if acervo else None,
+    }
+    with open(os.path.join(pasta, 'amostras.json'), 'w') as arquivo:
+        json.dump(amostras, arquivo, ensure_ascii=False, indent=2)
+
+    resumo.update({
+        'servidores': args.servidores,
+        'documentos': args.documentos,
+        'pdfs': len(acervo),
+        'bytes_acervo': sum(tamanho for _, _, tamanho, _ in acervo),
+        'segundos': round(time.perf_counter() - inicio, 1),
+    })
+    print(json.dumps(resumo, indent=2))
+
+
+if __name__ == '__main__':
+    main()
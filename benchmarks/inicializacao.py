@@ -0,0 +1,123 @@
+'''Benchmark: tempo de inicialização de um worker, do import à primeira resposta.
+
+Cada rodada é um processo Python novo (como um worker do gunicorn recém-criado
+ou um teste que monta a aplicação), que importa o alvo, cria a aplicação se o
+alvo for uma fábrica e atende a primeira requisição pelo test_client. Mede
+import, criação, primeira requisição, total e RSS máximo do processo, e
+resume as rodadas (mediana, p95, mínimo e máximo) em JSON.
+
+Antes das rodadas medidas, uma rodada de preparação (não contada) aplica o que
+a implantação faria uma vez: migrações (`flask db atualizar`), se existirem, e
+a primeira chave JWT. Assim cada rodada mede só o custo de um worker.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/inicializacao.py --rodadas 20
+    python benchmarks/inicializacao.py --alvo wsgi:app --rota /apispec_1.json
+    python benchmarks/inicializacao.py --alvo app:app --saida antes.json   # versões sem create_app
+'''
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado em cada processo filho: argv = alvo, rota
+FILHO = '''
+import time
+inicio = time.perf_counter()
+import importlib, json, resource, sys
+modulo, _, atributo = sys.argv[1].partition(':')
+objeto = getattr(importlib.import_module(modulo), atributo or 'app')
+importado = time.perf_counter()
+app = objeto if hasattr(objeto, 'test_client') else objeto()
+criado = time.perf_counter()
+resposta = app.test_client().get(sys.argv[2])
+respondido = time.perf_counter()
+print(json.dumps({
+    'status': resposta.status_code,
+    'importacao_ms': (importado - inicio) * 1000,
+    'criacao_ms': (criado - importado) * 1000,
+    'primeira_requisicao_ms': (respondido - criado) * 1000,
+    'total_ms': (respondido - inicio) * 1000,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+MEDIDAS = ('importacao_ms', 'criacao_ms', 'primeira_requisicao_ms', 'total_ms', 'rss_mb')
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def rodada(alvo, rota, ambiente):
+    processo = subprocess.run(
+        [sys.executable, '-c', FILHO, alvo, rota],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f'Rodada falhou:\n{processo.stderr}')
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+
+def preparar(alvo, rota, ambiente):
+    # Migrações só existem a partir do create_app; versões anteriores criam o esquema no import
+    if os.path.exists(os.path.join(RAIZ, 'migracoes.py')):
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'atualizar'],
+                       cwd=RAIZ, env=ambiente, check=True, stdout=subprocess.DEVNULL)
+    rodada(alvo, rota, ambiente)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alvo', default='app:create_app',
+                        help='módulo:objeto, uma aplicação Flask ou uma fábrica sem argumentos')
+    parser.add_argument('--rota', default='/.well-known/jwks.json', help='Primeira requisição (GET) de cada worker')
+    parser.add_argument('--rodadas', type=int, default=10)
+    parser.add_argument('--saida', help='Arquivo do relatório JSON (também vai para a saída padrão)')
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    ambiente = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(pasta, 'bench.db')}",
+        UPLOAD_FOLDER=os.path.join(pasta, 'documentos'),
+        JWT_CHAVES_PASTA=os.path.join(pasta, 'chaves'),
+    )
+    try:
+        preparar(args.alvo, args.rota, ambiente)
+        rodadas = [rodada(args.alvo, args.rota, ambiente) for _ in range(args.rodadas)]
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    relatorio = {
+        'alvo': args.alvo,
+        'rota': args.rota,
+        'rodadas': args.rodadas,
+        'status': sorted({resultado['status'] for resultado in rodadas}),
+        'python': sys.version.split()[0],
+    }
+    for medida in MEDIDAS:
+        valores = [resultado[medida] for resultado in rodadas]
+        relatorio[medida] = {
+            'mediana': round(statistics.median(valores), 1),
+            'p95': round(percentil(valores, 95), 1),
+            'min': round(min(valores), 1),
+            'max': round(max(valores), 1),
+        }
+    saida = json.dumps(relatorio, indent=2)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            arquivo.write(saida + '\n')
+    print(saida)
+
+
+if __name__ == '__main__':
+    main()
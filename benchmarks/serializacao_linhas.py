@@ -0,0 +1,137 @@
+'''Benchmark: custo por linha para serializar listagens de servidores e documentos.
+
+Compara, com as linhas já carregadas do banco:
+    antes   entidades ORM -> dict por atributo -> jsonify com o provedor padrão (json)
+    mapping Row._mapping -> dict -> jsonify com o provedor padrão
+    depois  SerializadorLinhas (tuplas) -> jsonify com ProvedorOrjson (se orjson estiver instalado)
+e, à parte, o tamanho da resposta com gzip e brotli.
+
+Uso (a partir da raiz do projeto; orjson e brotli em requirements-desempenho.txt):
+    python benchmarks/serializacao_linhas.py --linhas 20000 --repeticoes 5
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import compressao  # noqa: E402
+import serializacao  # noqa: E402
+from models import db, Documento, Servidor  # noqa: E402
+
+COLUNAS_SERVIDOR = tuple(getattr(Servidor, nome) for nome in (
+    'id', 'nome', 'cpf', 'matricula', 'codigo_orgao', 'ativo', 'cargo', 'lotacao'
+))
+COLUNAS_DOCUMENTO = (
+    Documento.id.label('id_documento'),
+    Documento.cpf_servidor,
+    Documento.hora_cadastro.label('hora_cadastro_documento'),
+    Documento.tipo.label('tipo_documento'),
+    Documento.caminho_arquivo,
+)
+
+
+def criar_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    return app
+
+
+def popular(linhas):
+    inicio = datetime(2024, 1, 1)
+    db.session.execute(db.insert(Servidor), [{
+        'nome': f'Servidor Número {i}', 'cpf': i, 'matricula': f'M{i}', 'codigo_orgao': str(i % 40),
+        'ativo': i % 7 != 0, 'cargo': 'Analista', 'lotacao': 'Coordenação de Tecnologia',
+    } for i in range(linhas)])
+    db.session.execute(db.insert(Documento), [{
+        'cpf_servidor': i % 1000, 'tipo': 'Certidão', 'hora_cadastro': inicio + timedelta(minutes=i),
+        'caminho_arquivo': f'uploads/documentos/blobs/{i:064x}'[:90],
+    } for i in range(linhas)])
+    db.session.commit()
+
+
+def antes_servidores(servidores):
+    return [{
+        'id': s.id, 'nome': s.nome, 'cpf': serializacao.formatar_cpf(s.cpf), 'matricula': s.matricula, 'codigo_orgao': s.codigo_orgao,
+        'ativo': s.ativo, 'cargo': s.cargo, 'lotacao': s.lotacao,
+    } for s in servidores]
+
+
+def antes_documentos(documentos):
+    return [{
+        'id_documento': d.id, 'cpf_servidor': serializacao.formatar_cpf(d.cpf_servidor), 'hora_cadastro_documento': d.hora_cadastro,
+        'tipo_documento': d.tipo, 'caminho_arquivo': d.caminho_arquivo,
+    } for d in documentos]
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        corpo = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), corpo
+
+
+def medir(app, nome, entidade, colunas, montar_antes, linhas, repeticoes):
+    padrao = DefaultJSONProvider(app)
+    rapido = serializacao.ProvedorOrjson(app) if serializacao.orjson is not None else padrao
+    query = db.select(*colunas).order_by(colunas[0])
+    tuplas = db.session.execute(query).all()
+    serializador = serializacao.SerializadorLinhas.da_consulta(query)
+
+    def com_provedor(provedor, montar):
+        def serializar():
+            app.json = provedor
+            return jsonify({nome: montar()}).get_data()
+        return serializar
+
+    def carregar_entidades():
+        db.session.expunge_all()
+        return db.session.execute(db.select(entidade).order_by(entidade.id)).scalars().all()
+
+    variantes = {
+        'antes': com_provedor(padrao, lambda: montar_antes(carregar_entidades())),
+        'mapping': com_provedor(padrao, lambda: [dict(linha._mapping) for linha in tuplas]),
+        'depois': com_provedor(rapido, lambda: serializador.lista(tuplas)),
+    }
+    resultado = {'listagem': nome, 'linhas': linhas, 'provedor_depois': type(rapido).__name__}
+    corpos = {}
+    for variante, funcao in variantes.items():
+        segundos, corpos[variante] = cronometrar(funcao, repeticoes)
+        resultado[f'{variante}_us_por_linha'] = round(segundos / linhas * 1e6, 3)
+    assert json.loads(corpos['antes']) == json.loads(corpos['depois'])
+
+    resultado['bytes'] = {'json': len(corpos['depois'])}
+    for codificacao in compressao.codificacoes_disponiveis():
+        resultado['bytes'][codificacao] = len(compressao.comprimir(corpos['depois'], codificacao))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=20000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    app = criar_app()
+    with app.app_context():
+        db.create_all()
+        popular(args.linhas)
+        resultados = [
+            medir(app, 'servidores', Servidor, COLUNAS_SERVIDOR, antes_servidores, args.linhas, args.repeticoes),
+            medir(app, 'documentos', Documento, COLUNAS_DOCUMENTO, antes_documentos, args.linhas, args.repeticoes),
+        ]
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
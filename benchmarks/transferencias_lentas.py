@@ -0,0 +1,181 @@
+'''Benchmark: transferências lentas simultâneas com um único worker.
+
+Compara o modo síncrono (gunicorn, worker sync, wsgi:app) com o modo
+assíncrono (uvicorn, asgi:app), ambos com 1 worker. Clientes lentos baixam
+/download/<id> lendo poucos bytes por vez (como conexões móveis); enquanto
+isso uma sonda mede a latência de /consulta_documentos. No modo síncrono cada
+download lento prende o worker até terminar; no assíncrono as transferências
+se intercalam no event loop.
+
+Uso (a partir da raiz do projeto, com requirements-asgi.txt e gunicorn instalados):
+    python benchmarks/transferencias_lentas.py --clientes 20 --segundos 15
+'''
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CPF = '529.982.247-25'  # Válido: a API confere os dígitos verificadores
+USUARIO = {'nome': 'Benchmark', 'email': 'bench@exemplo.gov.br', 'senha': 'senha-de-bench', 'tipo': 'gestor'}
+
+MODOS = {
+    'sincrono': ['gunicorn', '-w', '1', '-k', 'sync', '-b', '127.0.0.1:{porta}', 'wsgi:app'],
+    'assincrono': ['uvicorn', 'asgi:app', '--workers', '1', '--host', '127.0.0.1', '--port', '{porta}', '--log-level', 'warning'],
+}
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(modo, pasta, porta):
+    ambiente = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(pasta, 'bench.db')}",
+        UPLOAD_FOLDER=os.path.join(pasta, 'documentos'),
+        JWT_CHAVES_PASTA=os.path.join(pasta, 'chaves'),
+        LIMITE_ATIVO='false',  # A sonda e os clientes lentos saem do mesmo IP
+    )
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'atualizar'],
+                   cwd=RAIZ, env=ambiente, check=True, stdout=subprocess.DEVNULL)
+    comando = [parte.format(porta=porta) for parte in MODOS[modo]]
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{porta}'
+    for _ in range(100):
+        try:
+            requests.get(f'{url}/.well-known/jwks.json', timeout=1)
+            return processo, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError(f'Servidor {modo} não subiu')
+
+
+def autenticar(url):
+    # Banco novo: o primeiro cadastro não exige token
+    requests.post(f'{url}/cadastro', json=USUARIO, timeout=10).raise_for_status()
+    resposta = requests.post(f'{url}/login', json={'email': USUARIO['email'], 'senha': USUARIO['senha']}, timeout=10)
+    resposta.raise_for_status()
+    return {'Authorization': f"Bearer {resposta.json()['token']}"}
+
+
+def cliente_lento(url, cabecalhos, id_documento, ate, bytes_por_leitura, pausa, resultado):
+    # Socket cru com buffer pequeno: o servidor só avança quando o cliente lê
+    host, porta = url.removeprefix('http://').split(':')
+    while time.time() < ate:
+        with socket.socket() as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            s.settimeout(60)
+            try:
+                s.connect((host, int(porta)))
+                s.sendall((
+                    f'GET /download/{id_documento} HTTP/1.1\r\nHost: {host}\r\n'
+                    f"Authorization: {cabecalhos['Authorization']}\r\nConnection: close\r\n\r\n"
+                ).encode())
+                while time.time() < ate:
+                    bloco = s.recv(bytes_por_leitura)
+                    if not bloco:
+                        resultado['concluidas'] += 1
+                        break
+                    resultado['bytes'] += len(bloco)
+                    time.sleep(pausa)
+            except OSError:
+                resultado['falhas'] += 1
+
+
+def sonda(url, cabecalhos, ate, latencias, falhas):
+    with requests.Session() as sessao:
+        sessao.headers.update(cabecalhos)
+        while time.time() < ate:
+            inicio = time.perf_counter()
+            try:
+                sessao.get(f'{url}/consulta_documentos', params={'cpf': CPF}, timeout=10).raise_for_status()
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            except requests.RequestException:
+                falhas.append(1)
+            time.sleep(0.05)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def rodar(modo, clientes, segundos, tamanho_arquivo, bytes_por_leitura, pausa):
+    pasta = tempfile.mkdtemp()
+    processo, url = iniciar_servidor(modo, pasta, porta_livre())
+    try:
+        cabecalhos = autenticar(url)
+        resposta = requests.post(
+            f'{url}/upload',
+            headers=cabecalhos,
+            files={'arquivo': ('bench.pdf', os.urandom(tamanho_arquivo), 'application/pdf')},
+            data={'cpf_servidor': CPF, 'tipo_documento': 'Benchmark'},
+        )
+        resposta.raise_for_status()
+        id_documento = resposta.json()['id_documento']
+
+        ate = time.time() + segundos
+        transferencias = {'concluidas': 0, 'falhas': 0, 'bytes': 0}
+        threads = [
+            threading.Thread(target=cliente_lento, args=(url, cabecalhos, id_documento, ate, bytes_por_leitura, pausa, transferencias))
+            for _ in range(clientes)
+        ]
+        latencias, falhas = [], []
+        threads.append(threading.Thread(target=sonda, args=(url, cabecalhos, ate, latencias, falhas)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        processo.terminate()
+        processo.wait()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    return {
+        'modo': modo,
+        'clientes_lentos': clientes,
+        'transferencias_concluidas': transferencias['concluidas'],
+        'vazao_agregada_kib_s': round(transferencias['bytes'] / 1024 / segundos, 1),
+        'sonda': {
+            'respostas': len(latencias),
+            'falhas': len(falhas),
+            'p50_ms': round(statistics.median(latencias), 1) if latencias else None,
+            'p99_ms': round(percentil(latencias, 99), 1) if latencias else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=20)
+    parser.add_argument('--segundos', type=float, default=15)
+    parser.add_argument('--tamanho', type=int, default=32 * 1024 * 1024,
+                        help='bytes do documento; precisa ser maior que os buffers de socket do loopback')
+    parser.add_argument('--bytes-por-leitura', type=int, default=16 * 1024)
+    parser.add_argument('--pausa', type=float, default=0.05, help='segundos entre leituras de cada cliente')
+    parser.add_argument('--modos', nargs='+', choices=list(MODOS), default=list(MODOS))
+    args = parser.parse_args()
+
+    resultados = [
+        rodar(modo, args.clientes, args.segundos, args.tamanho, args.bytes_por_leitura, args.pausa)
+        for modo in args.modos
+    ]
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''Busca de servidores por nome usando índice de texto.
+
+SQLite: tabela virtual FTS5 com conteúdo externo (servidores), sincronizada por
+triggers e com tokenizador que remove acentos ("Claudia" encontra "Cláudia").
+PostgreSQL: índice GIN de trigramas sobre o nome sem acentos.
+Outros bancos: ILIKE sobre o nome (varredura completa).
+
+A tabela virtual, os triggers e o índice de trigramas são criados pelas
+migrações (migrations/versions), não pela aplicação.
+'''
+
+import re
+import unicodedata
+
+from sqlalchemy import Integer, String, cast, column, func, literal_column, table, text
+
+from models import db, Servidor
+
+TABELA_FTS = 'servidores_busca'
+
+_fts = table(TABELA_FTS, column('rowid'), column('rank'), column(TABELA_FTS))
+
+def normalizar_nome(nome):
+    """Remove acentos, pontuação e caixa: 'Cláudia  Santos' -> 'claudia santos'."""
+    decomposto = unicodedata.normalize('NFKD', nome)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', sem_acentos.lower()))
+
+
+def backend():
+    """Identifica qual implementação de busca o banco atual suporta."""
+    dialeto = db.engine.dialect.name
+    if dialeto in ('sqlite', 'postgresql'):
+        return dialeto
+    return 'ilike'
+
+
+def reconstruir_indice():
+    """Reconstrói o índice a partir da tabela servidores (correção de divergências)."""
+    if backend() == 'sqlite':
+        with db.engine.begin() as conexao:
+            conexao.execute(text(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')"))
+
+
+def _consulta_fts(termos):
+    # Cada termo vira um prefixo entre aspas: "claud"* "sant"*
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def aplicar_filtro_nome(query, nome):
+    """
+    Restringe `query` (um select sobre servidores) aos nomes que casam com `nome`.
+
+    Retorna a consulta com a coluna 'relevancia' (menor = mais relevante) e a
+    expressão de relevância, usada na ordenação e na paginação por cursor.
+    Retorna (query, None) se o nome não tiver nenhum termo pesquisável.
+    """
+    termos = normalizar_nome(nome).split()
+    if not termos:
+        return query, None
+
+    atual = backend()
+    if atual == 'sqlite':
+        relevancia = _fts.c.rank
+        query = query.join(_fts, _fts.c.rowid == Servidor.id).where(
+            _fts.c[TABELA_FTS].op('MATCH')(_consulta_fts(termos))
+        )
+    elif atual == 'postgresql':
+        normalizado = func.nome_normalizado(Servidor.nome, type_=String)
+        for termo in termos:
+            # autoescape: '_' sobrevive à normalização e seria curinga no LIKE
+            query = query.where(normalizado.contains(termo, autoescape=True))
+        relevancia = -func.similarity(normalizado, ' '.join(termos))
+    else:
+        for termo in termos:
+            query = query.where(Servidor.nome.icontains(termo, autoescape=True))
+        # Expressão, não a constante: ORDER BY 0 seria lido como posição de coluna
+        relevancia = cast(literal_column('0'), Integer)
+
+    return query.add_columns(relevancia.label('relevancia')), relevancia
+
+
+def contar_candidatos(nome):
+    """
+    Quantas linhas o índice entrega para `nome` antes dos demais filtros.
+
+    É o número de linhas examinadas pela busca: com o índice, cresce com a
+    quantidade de nomes que casam, e não com o tamanho da tabela.
+    """
+    termos = normalizar_nome(nome).split()
+    if not termos:
+        return 0
+
+    atual = backend()
+    if atual == 'sqlite':
+        consulta = db.select(func.count()).select_from(_fts).where(
+            _fts.c[TABELA_FTS].op('MATCH')(_consulta_fts(termos))
+        )
+        return db.session.scalar(consulta)
+    if atual == 'postgresql':
+        # O índice de trigramas filtra pelo primeiro termo; os demais são verificados linha a linha
+        consulta = db.select(func.count()).select_from(Servidor).where(
+            func.nome_normalizado(Servidor.nome, type_=String).contains(termos[0], autoescape=True)
+        )
+        return db.session.scalar(consulta)
+    # Sem índice a tabela inteira é percorrida
+    return db.session.scalar(db.select(func.count()).select_from(Servidor))
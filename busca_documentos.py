@@ -0,0 +1,184 @@
+'''Busca no texto dos documentos (extraído dos PDFs pela fila de processamento).
+
+SQLite: tabela virtual FTS5 com conteúdo externo (documentos_texto), mantida
+por triggers: cada texto gravado ou alterado é indexado na mesma transação, sem
+reprocessar o restante. Ranking por BM25 e trechos com os termos destacados.
+PostgreSQL: índice GIN sobre to_tsvector do texto sem acentos, com ts_rank_cd
+e ts_headline. Outros bancos: ILIKE (varredura completa, sem trecho).
+
+A reindexação offline (flask busca reindexar) reextrai o texto dos PDFs em
+paralelo, só para documentos sem texto ou cujo conteúdo mudou. A tabela
+virtual e os triggers são criados pelas migrações (migrations/versions).
+'''
+
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import column, func, literal, literal_column, table, text
+
+import processamento
+from busca import normalizar_nome
+from models import db, Blob, Documento, TextoDocumento
+
+TABELA_FTS = 'documentos_busca'
+INICIO_DESTAQUE = '<mark>'
+FIM_DESTAQUE = '</mark>'
+PALAVRAS_TRECHO = 16
+
+_fts = table(TABELA_FTS, column('rowid'), column('rank'), column(TABELA_FTS))
+
+def backend():
+    dialeto = db.engine.dialect.name
+    if dialeto in ('sqlite', 'postgresql'):
+        return dialeto
+    return 'ilike'
+
+
+def reconstruir_indice():
+    """Reconstrói o índice a partir de documentos_texto e compacta os segmentos do FTS5."""
+    if backend() == 'sqlite':
+        with db.engine.begin() as conexao:
+            conexao.execute(text(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')"))
+            conexao.execute(text(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('optimize')"))
+
+
+def termos_consulta(consulta):
+    """
+    Separa a consulta em termos e frases ("entre aspas"), sem acentos.
+
+    'certidão "nascimento de maria" matr*' ->
+        [(('certidao',), False), (('nascimento', 'de', 'maria'), False), (('matr',), True)]
+    O segundo item indica busca por prefixo (termo terminado em *).
+    """
+    termos = []
+    for frase, palavra in re.findall(r'"([^"]*)"|(\S+)', consulta):
+        normalizado = normalizar_nome(frase or palavra)
+        if not normalizado:
+            continue
+        prefixo = palavra.endswith('*')
+        termos.append((tuple(normalizado.split()), prefixo))
+    return termos
+
+
+def _consulta_fts(termos):
+    # Todos os termos são obrigatórios; frases entre aspas, prefixos com *
+    return ' '.join(f'"{" ".join(palavras)}"' + ('*' if prefixo else '') for palavras, prefixo in termos)
+
+
+def _consulta_postgres(termos):
+    # Sintaxe de websearch_to_tsquery: frases entre aspas, termos separados por espaço (E)
+    return ' '.join(f'"{" ".join(palavras)}"' if len(palavras) > 1 else palavras[0] for palavras, _ in termos)
+
+
+def consultar(consulta, colunas):
+    """
+    Select sobre os documentos cujo texto casa com `consulta`, com as colunas
+    pedidas mais 'trecho' (texto com os termos destacados) e 'relevancia'
+    (menor = mais relevante). Retorna (query, relevancia), ou (None, None) se
+    a consulta não tiver nenhum termo pesquisável.
+    """
+    termos = termos_consulta(consulta)
+    if not termos:
+        return None, None
+
+    atual = backend()
+    if atual == 'sqlite':
+        relevancia = _fts.c.rank  # BM25
+        trecho = func.snippet(
+            literal_column(TABELA_FTS), 0, INICIO_DESTAQUE, FIM_DESTAQUE, '…', PALAVRAS_TRECHO
+        )
+        query = (
+            db.select(*colunas, trecho.label('trecho'), relevancia.label('relevancia'))
+            .select_from(_fts)
+            .join(Documento, Documento.id == _fts.c.rowid)
+            .where(_fts.c[TABELA_FTS].op('MATCH')(_consulta_fts(termos)))
+        )
+    elif atual == 'postgresql':
+        vetor = func.to_tsvector('simple', func.nome_normalizado(TextoDocumento.texto))
+        tsquery = func.websearch_to_tsquery('simple', _consulta_postgres(termos))
+        relevancia = -func.ts_rank_cd(vetor, tsquery)
+        trecho = func.ts_headline(
+            'simple', TextoDocumento.texto, tsquery,
+            f'StartSel={INICIO_DESTAQUE}, StopSel={FIM_DESTAQUE}, MaxWords={PALAVRAS_TRECHO}, MinWords=5'
+        )
+        query = (
+            db.select(*colunas, trecho.label('trecho'), relevancia.label('relevancia'))
+            .select_from(TextoDocumento)
+            .join(Documento, Documento.id == TextoDocumento.documento_id)
+            .where(vetor.op('@@')(tsquery))
+        )
+    else:
+        relevancia = literal_column('0')
+        query = (
+            db.select(*colunas, literal(None).label('trecho'), relevancia.label('relevancia'))
+            .select_from(TextoDocumento)
+            .join(Documento, Documento.id == TextoDocumento.documento_id)
+        )
+        for palavras, _ in termos:
+            query = query.where(TextoDocumento.texto.ilike(f'%{" ".join(palavras)}%'))
+
+    return query, relevancia
+
+
+def _extrair(caminho):
+    # Roda no pool: erros viram resultado para não interromper o map
+    try:
+        return processamento.extrair_texto(caminho), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+
+def reindexar(processos=None, completo=False, tamanho_lote=200):
+    """
+    Reextrai o texto dos PDFs em `processos` processos e grava em documentos_texto
+    (os triggers atualizam o índice). Sem `completo`, só documentos sem texto ou
+    cujo SHA-256 mudou. Conteúdos iguais são extraídos uma única vez.
+    """
+    inicio = time.perf_counter()
+    consulta = (
+        db.select(
+            Documento.id,
+            db.func.coalesce(Blob.caminho_arquivo, Documento.caminho_arquivo).label('caminho_arquivo'),
+            Documento.sha256
+        )
+        .outerjoin(Blob, Blob.sha256 == Documento.sha256)
+        .outerjoin(TextoDocumento, TextoDocumento.documento_id == Documento.id)
+        .where(db.or_(Documento.status_processamento.is_(None), Documento.status_processamento != 'invalido'))
+    )
+    if not completo:
+        consulta = consulta.where(db.or_(
+            TextoDocumento.documento_id.is_(None),
+            TextoDocumento.sha256.is_(None),
+            TextoDocumento.sha256 != Documento.sha256
+        ))
+
+    # Um caminho por conteúdo; todos os documentos com o mesmo conteúdo recebem o texto
+    por_conteudo = {}
+    for documento in db.session.execute(consulta):
+        chave = documento.sha256 or documento.caminho_arquivo
+        por_conteudo.setdefault(chave, (documento.caminho_arquivo, documento.sha256, []))[2].append(documento.id)
+
+    resumo = {'documentos': sum(len(ids) for _, _, ids in por_conteudo.values()), 'arquivos': len(por_conteudo),
+              'indexados': 0, 'sem_texto': 0, 'erros': []}
+    conteudos = list(por_conteudo.values())
+    gravados = 0
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        resultados = pool.map(_extrair, [caminho for caminho, _, _ in conteudos], chunksize=8)
+        for (caminho, sha256, ids), (texto, erro) in zip(conteudos, resultados):
+            if erro:
+                resumo['erros'].append({'arquivo': caminho, 'documentos': ids, 'erro': erro})
+                continue
+            if texto is None:
+                resumo['sem_texto'] += len(ids)
+                continue
+            for documento_id in ids:
+                db.session.merge(TextoDocumento(documento_id=documento_id, sha256=sha256, texto=texto))
+            resumo['indexados'] += len(ids)
+            gravados += 1
+            if gravados % tamanho_lote == 0:
+                db.session.commit()
+    db.session.commit()
+
+    resumo['segundos'] = round(time.perf_counter() - inicio, 2)
+    return resumo
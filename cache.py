@@ -0,0 +1,209 @@
+'''Cache de respostas das consultas mais frequentes (servidor por CPF/matrícula, documentos por CPF).
+
+Backend padrão: LRU em memória do processo, com TTL e limite de itens. Com
+CACHE_URL=redis://... o cache passa a ser compartilhado entre workers (requer
+o pacote redis). No LRU em memória a invalidação só alcança o próprio worker;
+nos demais a entrada expira pelo TTL.
+'''
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from flask import Response, current_app, request
+
+CABECALHO_IGNORAR = 'X-Cache-Bypass'
+
+
+class CacheLRU:
+    """LRU em memória com expiração por TTL. Seguro para uso entre threads."""
+
+    def __init__(self, max_itens=10000, ttl=300):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self._contadores = {'acertos': 0, 'falhas': 0, 'despejos': 0, 'expirados': 0, 'invalidacoes': 0}
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self._contadores['falhas'] += 1
+                return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                self._contadores['expirados'] += 1
+                self._contadores['falhas'] += 1
+                return None
+            self._itens.move_to_end(chave)
+            self._contadores['acertos'] += 1
+            return valor
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self._contadores['despejos'] += 1
+
+    def delete(self, *chaves):
+        with self._lock:
+            for chave in chaves:
+                if self._itens.pop(chave, None) is not None:
+                    self._contadores['invalidacoes'] += 1
+
+    def delete_prefixo(self, prefixo):
+        with self._lock:
+            for chave in [chave for chave in self._itens if chave.startswith(prefixo)]:
+                del self._itens[chave]
+                self._contadores['invalidacoes'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self._contadores, backend='memoria', itens=len(self._itens), max_itens=self.max_itens, ttl=self.ttl)
+
+
+class CacheRedis:
+    """Mesma interface do CacheLRU sobre um Redis compartilhado. O Redis cuida de TTL e despejo."""
+
+    def __init__(self, url, ttl=300, prefixo='serpro:'):
+        import redis  # Dependência opcional
+
+        self._redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefixo = prefixo
+        self._lock = threading.Lock()
+        self._contadores = {'acertos': 0, 'falhas': 0, 'invalidacoes': 0}
+
+    def _contar(self, nome, quantidade=1):
+        with self._lock:
+            self._contadores[nome] += quantidade
+
+    def get(self, chave):
+        valor = self._redis.get(self.prefixo + chave)
+        self._contar('acertos' if valor is not None else 'falhas')
+        return valor
+
+    def set(self, chave, valor):
+        self._redis.set(self.prefixo + chave, valor, ex=self.ttl)
+
+    def delete(self, *chaves):
+        if chaves:
+            self._contar('invalidacoes', self._redis.delete(*(self.prefixo + chave for chave in chaves)))
+
+    def delete_prefixo(self, prefixo):
+        chaves = list(self._redis.scan_iter(match=self.prefixo + prefixo + '*'))
+        if chaves:
+            self._contar('invalidacoes', self._redis.delete(*chaves))
+
+    def clear(self):
+        self.delete_prefixo('')
+
+    def estatisticas(self):
+        with self._lock:
+            estatisticas = dict(self._contadores, backend='redis', ttl=self.ttl)
+        info = self._redis.info('stats')
+        estatisticas['despejos'] = info.get('evicted_keys')
+        estatisticas['expirados'] = info.get('expired_keys')
+        return estatisticas
+
+
+def criar_cache(url=None, ttl=300, max_itens=10000):
+    """Cache configurado a partir de CACHE_URL: vazio ou 'memoria' -> LRU local; 'redis://...' -> Redis."""
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return CacheRedis(url, ttl=ttl)
+    return CacheLRU(max_itens=max_itens, ttl=ttl)
+
+
+def iniciar(app):
+    """Cria o cache da aplicação a partir de CACHE_URL, CACHE_TTL e CACHE_MAX_ITENS."""
+    app.extensions['cache'] = criar_cache(
+        app.config.get('CACHE_URL'),
+        ttl=app.config.get('CACHE_TTL', 300),
+        max_itens=app.config.get('CACHE_MAX_ITENS', 10000)
+    )
+
+
+def obter():
+    return current_app.extensions['cache']
+
+
+def chave(namespace, **parametros):
+    """Chave estável para a consulta: parâmetros sem espaços extras, em ordem alfabética."""
+    # Valores não textuais (CPF inteiro) entram pelo str()
+    normalizados = sorted(
+        (nome, str(valor).strip()) for nome, valor in parametros.items() if valor and str(valor).strip()
+    )
+    return f'{namespace}:{urlencode(normalizados)}'
+
+
+def _empacotar(resposta):
+    # status, mimetype e corpo num único bytes, para servir tanto ao LRU quanto ao Redis
+    return f'{resposta.status_code} {resposta.mimetype}\n'.encode() + resposta.get_data()
+
+
+def _desempacotar(valor):
+    cabecalho, corpo = valor.split(b'\n', 1)
+    status, mimetype = cabecalho.decode().split(' ', 1)
+    return Response(corpo, status=int(status), mimetype=mimetype)
+
+
+def invalidar_servidor(cpf, matricula):
+    """Chamado nas escritas de servidor: remove as consultas por CPF e por matrícula (inclusive 404)."""
+    obter().delete(chave('servidor', cpf=cpf), chave('servidor', matricula=matricula))
+
+
+def invalidar_servidores():
+    """Remove todas as consultas de servidor em cache (ex.: após uma carga em lote)."""
+    obter().delete_prefixo('servidor:')
+
+
+def invalidar_documentos(cpf):
+    """Chamado nos uploads: remove a listagem de documentos do servidor."""
+    obter().delete(chave('documentos', cpf=cpf))
+
+
+def em_cache(gerar_chave):
+    """
+    Decorator de view: guarda a resposta (200 ou 404) sob gerar_chave(request.args).
+
+    Se gerar_chave retornar None a consulta não é cacheável e a view roda
+    normalmente. O cabeçalho X-Cache-Bypass: 1 ignora o cache (útil para
+    depuração). A resposta informa X-Cache: HIT, MISS ou BYPASS.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = obter()
+            chave_consulta = gerar_chave(request.args)
+            if chave_consulta is None or request.headers.get(CABECALHO_IGNORAR) in ('1', 'true'):
+                resposta = _resposta(view, args, kwargs)
+                resposta.headers['X-Cache'] = 'BYPASS'
+                return resposta
+
+            valor = cache.get(chave_consulta)
+            if valor is not None:
+                resposta = _desempacotar(valor)
+                resposta.headers['X-Cache'] = 'HIT'
+                return resposta
+
+            resposta = _resposta(view, args, kwargs)
+            if resposta.status_code in (200, 404) and not resposta.is_streamed:
+                cache.set(chave_consulta, _empacotar(resposta))
+            resposta.headers['X-Cache'] = 'MISS'
+            return resposta
+        return wrapper
+    return decorator
+
+
+def _resposta(view, args, kwargs):
+    return current_app.make_response(view(*args, **kwargs))
@@ -0,0 +1,93 @@
+'''Camadas de armazenamento dos blobs (ver armazenamento.py).
+
+    quente   pasta de uploads, arquivo sem compressão (servido direto, inclusive por X-Accel/X-Sendfile)
+    arquivo  pasta de arquivamento (pode ser outro disco, mais barato), arquivo comprimido com gzip
+
+As duas expõem a mesma interface: caminho(sha256), abrir(caminho) e
+gravar(origem, sha256). A leitura da camada de arquivo descomprime em
+fluxo, sem gerar cópia temporária; o seek para frente (Range) é feito
+descartando o que vem antes do trecho.
+'''
+
+import gzip
+import os
+import shutil
+import uuid
+
+TAMANHO_BLOCO = 64 * 1024
+QUENTE = 'quente'
+ARQUIVO = 'arquivo'
+EXTENSAO_GZIP = '.gz'
+
+
+def abrir(caminho):
+    """Abre para leitura o blob em qualquer camada, já descomprimido."""
+    if caminho.endswith(EXTENSAO_GZIP):
+        return gzip.open(caminho, 'rb')
+    return open(caminho, 'rb')
+
+
+def _gravar_atomico(pasta, destino, escrever):
+    # Grava ao lado do destino e renomeia: leitores nunca veem um arquivo pela metade
+    os.makedirs(pasta, exist_ok=True)
+    temporario = os.path.join(pasta, f'.{uuid.uuid4().hex}.tmp')
+    try:
+        with open(temporario, 'wb') as arquivo:
+            escrever(arquivo)
+        os.replace(temporario, destino)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return os.path.getsize(destino)
+
+
+class CamadaQuente:
+    nome = QUENTE
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+
+    def caminho(self, sha256):
+        return os.path.join(self.raiz, 'blobs', sha256[:2], sha256[2:4], sha256)
+
+    def gravar(self, origem, sha256):
+        """Copia o conteúdo de `origem` (arquivo aberto) para a camada. Retorna (caminho, bytes_em_disco)."""
+        destino = self.caminho(sha256)
+        tamanho = _gravar_atomico(
+            os.path.dirname(destino), destino, lambda arquivo: shutil.copyfileobj(origem, arquivo, TAMANHO_BLOCO)
+        )
+        return destino, tamanho
+
+
+class CamadaArquivo:
+    nome = ARQUIVO
+
+    def __init__(self, raiz, nivel_compressao=6):
+        self.raiz = raiz
+        self.nivel_compressao = nivel_compressao
+
+    def caminho(self, sha256):
+        return os.path.join(self.raiz, sha256[:2], sha256[2:4], sha256 + EXTENSAO_GZIP)
+
+    def gravar(self, origem, sha256):
+        destino = self.caminho(sha256)
+
+        def comprimir(arquivo):
+            # mtime=0: o mesmo conteúdo gera sempre os mesmos bytes
+            with gzip.GzipFile(fileobj=arquivo, mode='wb', compresslevel=self.nivel_compressao, mtime=0) as saida:
+                shutil.copyfileobj(origem, saida, TAMANHO_BLOCO)
+
+        return destino, _gravar_atomico(os.path.dirname(destino), destino, comprimir)
+
+
+def criar(config):
+    """Camadas configuradas: {'quente': CamadaQuente, 'arquivo': CamadaArquivo}."""
+    raiz = config['UPLOAD_FOLDER']
+    return {
+        QUENTE: CamadaQuente(raiz),
+        ARQUIVO: CamadaArquivo(
+            config.get('ARMAZENAMENTO_ARQUIVO_PASTA') or os.path.join(raiz, 'arquivo'),
+            config.get('ARMAZENAMENTO_NIVEL_COMPRESSAO', 6)
+        ),
+    }
@@ -0,0 +1,146 @@
+'''Carga em lote de servidores (JSON, NDJSON ou CSV), inserida em lotes de tamanho configurável.'''
+
+import csv
+import io
+import json
+
+from sqlalchemy.exc import IntegrityError
+
+import estatisticas
+from models import db, Servidor
+from parametros import ParametroInvalido, ler_booleano, ler_cpf
+from serializacao import formatar_cpf
+
+CAMPOS_SERVIDOR = ['nome', 'cpf', 'matricula', 'codigo_orgao', 'ativo', 'cargo', 'lotacao']
+
+TAMANHO_LOTE_PADRAO = 1000
+TAMANHO_LOTE_MAXIMO = 10000
+
+
+def ler_registros(stream, content_type):
+    """
+    Gera (numero_linha, registro) a partir do corpo da requisição.
+
+    NDJSON e CSV são lidos linha a linha direto do stream; um array JSON
+    precisa ser carregado inteiro antes de começar a inserção.
+    """
+    tipo = (content_type or '').split(';')[0].strip().lower()
+    texto = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    if tipo in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        for numero, linha in enumerate(texto, start=1):
+            if not linha.strip():
+                continue
+            try:
+                yield numero, json.loads(linha)
+            except ValueError:
+                yield numero, None
+    elif tipo in ('text/csv', 'application/csv'):
+        # Linha 1 é o cabeçalho
+        for numero, registro in enumerate(csv.DictReader(texto), start=2):
+            yield numero, registro
+    elif tipo == 'application/json':
+        try:
+            registros = json.load(texto)
+        except ValueError:
+            raise ParametroInvalido('JSON inválido.')
+        if not isinstance(registros, list):
+            raise ParametroInvalido('O corpo JSON deve ser um array de servidores.')
+        yield from enumerate(registros, start=1)
+    else:
+        raise ParametroInvalido(
+            'Content-Type deve ser application/json, application/x-ndjson ou text/csv.'
+        )
+
+
+def validar_registro(registro):
+    """Retorna o registro pronto para inserção, ou lança ParametroInvalido."""
+    if not isinstance(registro, dict):
+        raise ParametroInvalido('Registro malformado.')
+    faltando = [campo for campo in CAMPOS_SERVIDOR if registro.get(campo) in (None, '')]
+    if faltando:
+        raise ParametroInvalido(f"Campos obrigatórios ausentes: {', '.join(faltando)}.")
+
+    ativo = registro['ativo']
+    if not isinstance(ativo, bool):
+        ativo = ler_booleano(str(ativo))
+
+    dados = {campo: str(registro[campo]).strip() for campo in CAMPOS_SERVIDOR}
+    dados['ativo'] = ativo
+    dados['cpf'] = ler_cpf(registro['cpf'])
+    return dados
+
+
+def _existentes(coluna, valores):
+    if not valores:
+        return set()
+    return set(db.session.scalars(db.select(coluna).where(coluna.in_(valores))))
+
+
+def _inserir_lote(lote, erros):
+    """Insere um lote numa única transação; duplicados viram erros por linha."""
+    cpfs = _existentes(Servidor.cpf, [dados['cpf'] for _, dados in lote])
+    matriculas = _existentes(Servidor.matricula, [dados['matricula'] for _, dados in lote])
+
+    validos = []
+    for numero, dados in lote:
+        if dados['cpf'] in cpfs:
+            erros.append({'linha': numero, 'cpf': formatar_cpf(dados['cpf']), 'erro': 'CPF já cadastrado.'})
+        elif dados['matricula'] in matriculas:
+            erros.append({'linha': numero, 'cpf': formatar_cpf(dados['cpf']), 'erro': 'Matrícula já cadastrada.'})
+        else:
+            # Também barra duplicados dentro da própria carga
+            cpfs.add(dados['cpf'])
+            matriculas.add(dados['matricula'])
+            validos.append((numero, dados))
+
+    if not validos:
+        return 0
+
+    try:
+        # executemany: um único INSERT preparado para todas as linhas do lote
+        db.session.execute(db.insert(Servidor), [dados for _, dados in validos])
+        estatisticas.contar_servidores([dados for _, dados in validos])
+        db.session.commit()
+        return len(validos)
+    except IntegrityError:
+        # Outro processo inseriu os mesmos dados no meio do caminho: refaz linha a linha
+        db.session.rollback()
+
+    inseridos = 0
+    for numero, dados in validos:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Servidor), [dados])
+                estatisticas.contar_servidores([dados])
+            inseridos += 1
+        except IntegrityError:
+            erros.append({'linha': numero, 'cpf': formatar_cpf(dados['cpf']), 'erro': 'CPF ou matrícula já cadastrados.'})
+    db.session.commit()
+    return inseridos
+
+
+def inserir_em_lotes(registros, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Consome (numero_linha, registro) e insere em lotes. Retorna o resumo da carga."""
+    inseridos = 0
+    recebidos = 0
+    erros = []
+    lote = []
+
+    for numero, registro in registros:
+        recebidos += 1
+        try:
+            lote.append((numero, validar_registro(registro)))
+        except ParametroInvalido as e:
+            erros.append({'linha': numero, 'erro': str(e)})
+            continue
+
+        if len(lote) >= tamanho_lote:
+            inseridos += _inserir_lote(lote, erros)
+            lote = []
+
+    if lote:
+        inseridos += _inserir_lote(lote, erros)
+
+    erros.sort(key=lambda erro: erro['linha'])
+    return {'recebidos': recebidos, 'inseridos': inseridos, 'erros': erros}
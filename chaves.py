@@ -0,0 +1,316 @@
+'''Chaves de assinatura dos tokens JWT: assimétricas, persistentes e com rotação.
+
+Cada chave tem um identificador (kid) que vai no cabeçalho do token. Com a
+mesma pasta de chaves (ou a mesma JWT_CHAVE_PRIVADA) em todos os workers e
+hosts, um token emitido em qualquer um deles é aceito pelos demais, e um
+restart não derruba as sessões.
+
+Pasta JWT_CHAVES_PASTA (padrão instance/chaves):
+    <kid>.pem       chave privada (PKCS8); a mais nova do algoritmo configurado assina
+    <kid>.pub.pem   só a pública: chave aposentada ou de outro emissor, só verifica
+
+Rotação: `flask chaves rotacionar` cria uma chave nova e aposenta as
+anteriores, que continuam verificando os tokens já emitidos até
+`flask chaves remover <kid>` (depois de vencido o prazo da renovação,
+JWT_RENOVACAO_HORAS).
+
+Só são aceitos tokens em JWT_ALGORITMO (e em JWT_ALGORITMOS_ACEITOS, durante
+uma troca de algoritmo), e o alg do cabeçalho tem de ser o da chave do kid.
+
+As chaves lidas ficam em cache no processo; a pasta só é relida a cada
+JWT_CHAVES_RECARGA segundos ou quando chega um kid desconhecido. Nós que só
+verificam podem usar JWT_JWKS_URL (o /.well-known/jwks.json do emissor).
+'''
+
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from flask import current_app
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+ALGORITMOS = ('EdDSA', 'RS256')
+SUFIXO_PRIVADA = '.pem'
+SUFIXO_PUBLICA = '.pub.pem'
+
+
+class ChaveIndisponivel(RuntimeError):
+    """Não há chave privada para assinar tokens neste nó."""
+
+
+def _algoritmo(chave):
+    if isinstance(chave, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return 'RS256'
+    if isinstance(chave, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return 'EdDSA'
+    raise ValueError(f'Tipo de chave não suportado: {type(chave).__name__}')
+
+
+class Chave:
+    def __init__(self, kid, publica, privada=None):
+        self.kid = kid
+        self.publica = publica
+        self.privada = privada
+        self.algoritmo = _algoritmo(publica)
+
+    def jwk(self):
+        conversor = RSAAlgorithm if self.algoritmo == 'RS256' else OKPAlgorithm
+        return dict(conversor.to_jwk(self.publica, as_dict=True), kid=self.kid, alg=self.algoritmo, use='sig')
+
+
+def gerar_chave(algoritmo='EdDSA'):
+    if algoritmo == 'RS256':
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algoritmo == 'EdDSA':
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Algoritmo deve ser um de {', '.join(ALGORITMOS)}.")
+
+
+def novo_kid():
+    # Ordem alfabética = ordem de criação
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(3)}"
+
+
+def _gravar(caminho, conteudo, modo):
+    # Escrita atômica: outro worker lendo a pasta nunca vê o arquivo pela metade
+    temporario = f'{caminho}.{secrets.token_hex(4)}.tmp'
+    descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_EXCL, modo)
+    with os.fdopen(descritor, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def salvar(pasta, privada, kid=None):
+    """Grava a chave privada como <kid>.pem (modo 0600) e devolve o kid."""
+    kid = kid or novo_kid()
+    os.makedirs(pasta, mode=0o700, exist_ok=True)
+    pem = privada.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    _gravar(os.path.join(pasta, kid + SUFIXO_PRIVADA), pem, 0o600)
+    return kid
+
+
+def aposentar(pasta, kid):
+    """Troca <kid>.pem por <kid>.pub.pem: a chave deixa de assinar, mas continua verificando."""
+    caminho = os.path.join(pasta, kid + SUFIXO_PRIVADA)
+    with open(caminho, 'rb') as arquivo:
+        privada = serialization.load_pem_private_key(arquivo.read(), password=None)
+    pem = privada.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    _gravar(os.path.join(pasta, kid + SUFIXO_PUBLICA), pem, 0o644)
+    os.remove(caminho)
+
+
+def ler_pasta(pasta, anteriores=None):
+    """
+    Chaves da pasta por kid. Arquivos já lidos (mesmo mtime) vêm de
+    `anteriores`, sem refazer o parse do PEM.
+    """
+    anteriores = anteriores or {}
+    chaves = {}
+    try:
+        nomes = sorted(os.listdir(pasta))
+    except FileNotFoundError:
+        return chaves
+    for nome in nomes:
+        if nome.endswith(SUFIXO_PUBLICA):
+            kid, privada = nome[:-len(SUFIXO_PUBLICA)], False
+        elif nome.endswith(SUFIXO_PRIVADA):
+            kid, privada = nome[:-len(SUFIXO_PRIVADA)], True
+        else:
+            continue
+        caminho = os.path.join(pasta, nome)
+        try:
+            mtime = os.stat(caminho).st_mtime_ns
+        except FileNotFoundError:  # Aposentada ou removida entre o listdir e o stat
+            continue
+        anterior = anteriores.get(kid)
+        if anterior is not None and anterior[0] == (nome, mtime):
+            chaves[kid] = anterior
+            continue
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+        if privada:
+            chave_privada = serialization.load_pem_private_key(conteudo, password=None)
+            chave = Chave(kid, chave_privada.public_key(), chave_privada)
+        else:
+            chave = Chave(kid, serialization.load_pem_public_key(conteudo))
+        # Se existirem as duas versões, a privada prevalece
+        if kid not in chaves or privada:
+            chaves[kid] = ((nome, mtime), chave)
+    return chaves
+
+
+class Chaveiro:
+    """Chaves conhecidas por este processo, relidas da pasta sob demanda. Seguro entre threads."""
+
+    def __init__(self, pasta, algoritmo='EdDSA', chave_privada=None, kid_privada=None,
+                 jwks_url=None, recarga=30, gerar=False, logger=None):
+        if algoritmo not in ALGORITMOS:
+            raise ValueError(f"JWT_ALGORITMO deve ser um de {', '.join(ALGORITMOS)}.")
+        self.pasta = pasta
+        self.algoritmo = algoritmo
+        self.recarga = recarga
+        self.gerar = gerar
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._arquivos = {}
+        self._lida_em = None
+        self._fixa = None
+        if chave_privada:
+            privada = serialization.load_pem_private_key(chave_privada.encode(), password=None)
+            self._fixa = Chave(kid_privada or 'env', privada.public_key(), privada)
+        self._jwks = jwt.PyJWKClient(jwks_url, cache_keys=True, lifespan=recarga, timeout=5) if jwks_url else None
+
+    def _recarregar(self, intervalo):
+        with self._lock:
+            agora = time.monotonic()
+            if self._lida_em is not None and agora - self._lida_em < intervalo:
+                return
+            self._arquivos = ler_pasta(self.pasta, self._arquivos)
+            self._lida_em = agora
+
+    def chaves(self):
+        self._recarregar(self.recarga)
+        chaves = {kid: chave for kid, (_arquivo, chave) in self._arquivos.items()}
+        if self._fixa is not None:
+            chaves[self._fixa.kid] = self._fixa
+        return chaves
+
+    def _candidatas(self):
+        return [
+            chave for kid, chave in sorted(self.chaves().items())
+            if chave.privada is not None and chave.algoritmo == self.algoritmo
+        ]
+
+    def _gerar_primeira(self):
+        # Só no primeiro token emitido, não na inicialização do worker
+        self._recarregar(0)
+        if self._candidatas():
+            return
+        kid = salvar(self.pasta, gerar_chave(self.algoritmo))
+        if self.logger is not None:
+            self.logger.warning('Chave de assinatura %s gerada em %s', kid, self.pasta)
+        self._recarregar(0)
+
+    def ativa(self):
+        """A chave que assina: JWT_CHAVE_PRIVADA ou a privada mais nova do algoritmo configurado."""
+        if self._fixa is not None:
+            return self._fixa
+        candidatas = self._candidatas()
+        if not candidatas and self.gerar:
+            self._gerar_primeira()
+            candidatas = self._candidatas()
+        if not candidatas:
+            raise ChaveIndisponivel(
+                f'Nenhuma chave privada {self.algoritmo} em {self.pasta}. Use `flask chaves gerar`.'
+            )
+        return candidatas[-1]
+
+    def verificacao(self, kid):
+        """Chave (pública e algoritmo) do kid; relê a pasta (e consulta o JWKS) antes de desistir."""
+        chave = self.chaves().get(kid)
+        if chave is None:
+            # Kid desconhecido: pode ser uma chave recém-criada; relê a pasta no máximo uma vez por segundo
+            self._recarregar(1)
+            chave = self.chaves().get(kid)
+        if chave is not None:
+            return chave
+        if self._jwks is not None:
+            try:
+                return Chave(kid, self._jwks.get_signing_key(kid).key)
+            except (jwt.PyJWKClientError, ValueError):  # ValueError: tipo de chave não suportado
+                pass
+        raise jwt.InvalidSignatureError(f'Chave de assinatura desconhecida: {kid}')
+
+    def jwks(self):
+        return {'keys': [chave.jwk() for _kid, chave in sorted(self.chaves().items())]}
+
+    def estatisticas(self):
+        chaves = self.chaves()
+        # Sem ativa(): consultar não gera a primeira chave
+        candidatas = [self._fixa] if self._fixa is not None else self._candidatas()
+        return {
+            'algoritmo': self.algoritmo,
+            'ativa': candidatas[-1].kid if candidatas else None,
+            'chaves': [
+                {'kid': kid, 'algoritmo': chave.algoritmo, 'assina': chave.privada is not None}
+                for kid, chave in sorted(chaves.items())
+            ],
+        }
+
+
+def obter():
+    return current_app.extensions['chaves']
+
+
+def algoritmos_aceitos(algoritmo, aceitos=None):
+    """
+    Algoritmos aceitos na verificação: o que assina e os de JWT_ALGORITMOS_ACEITOS
+    (lista ou texto separado por vírgulas), por exemplo o anterior durante uma troca.
+    """
+    if isinstance(aceitos, str):
+        aceitos = aceitos.split(',')
+    resultado = [algoritmo]
+    for nome in aceitos or ():
+        nome = nome.strip()
+        if nome and nome not in resultado:
+            if nome not in ALGORITMOS:
+                raise ValueError(f"JWT_ALGORITMOS_ACEITOS deve conter apenas {', '.join(ALGORITMOS)}.")
+            resultado.append(nome)
+    return resultado
+
+
+def pasta_padrao(app):
+    return app.config.get('JWT_CHAVES_PASTA') or os.path.join(app.instance_path, 'chaves')
+
+
+def iniciar(app, jwt_manager):
+    """
+    Cria o chaveiro a partir de JWT_CHAVES_PASTA, JWT_ALGORITMO,
+    JWT_CHAVE_PRIVADA/JWT_CHAVE_ID, JWT_JWKS_URL e JWT_CHAVES_RECARGA, e liga
+    o flask_jwt_extended a ele, verificando só JWT_ALGORITMO e
+    JWT_ALGORITMOS_ACEITOS. Sem nenhuma chave (e sem JWKS), a primeira é
+    gerada na pasta quando for emitido o primeiro token; criar a aplicação não
+    toca no disco.
+    """
+    chaveiro = Chaveiro(
+        pasta_padrao(app),
+        algoritmo=app.config.get('JWT_ALGORITMO', 'EdDSA'),
+        chave_privada=app.config.get('JWT_CHAVE_PRIVADA'),
+        kid_privada=app.config.get('JWT_CHAVE_ID'),
+        jwks_url=app.config.get('JWT_JWKS_URL'),
+        recarga=app.config.get('JWT_CHAVES_RECARGA', 30),
+        gerar=not app.config.get('JWT_CHAVE_PRIVADA') and not app.config.get('JWT_JWKS_URL'),
+        logger=app.logger,
+    )
+    app.extensions['chaves'] = chaveiro
+    app.config['JWT_ALGORITHM'] = chaveiro.algoritmo
+    app.config['JWT_DECODE_ALGORITHMS'] = algoritmos_aceitos(chaveiro.algoritmo, app.config.get('JWT_ALGORITMOS_ACEITOS'))
+
+    @jwt_manager.encode_key_loader
+    def chave_assinatura(_identidade):
+        return chaveiro.ativa().privada
+
+    @jwt_manager.additional_headers_loader
+    def cabecalho_kid(_identidade):
+        return {'kid': chaveiro.ativa().kid}
+
+    @jwt_manager.decode_key_loader
+    def chave_verificacao(cabecalho, _claims):
+        kid = cabecalho.get('kid')
+        if not kid:
+            raise jwt.InvalidSignatureError('Token sem kid.')
+        chave = chaveiro.verificacao(kid)
+        # O alg do cabeçalho tem de ser o da chave do kid: um token RS256 com o kid de uma
+        # chave Ed25519 chegaria ao PyJWT com o tipo de chave errado
+        if cabecalho.get('alg') != chave.algoritmo:
+            raise jwt.InvalidAlgorithmError(f'Algoritmo {cabecalho.get("alg")} não corresponde à chave {kid}.')
+        return chave.publica
@@ -0,0 +1,62 @@
+'''Compressão das respostas JSON acima de um tamanho mínimo.
+
+Usa brotli quando o cliente aceita e o pacote está instalado; senão gzip.
+Só atua em respostas já montadas em memória (listagens, consultas); downloads,
+respostas parciais e streams (NDJSON) seguem sem compressão.
+'''
+
+import gzip
+
+from flask import request
+
+try:
+    import brotli  # Dependência opcional
+except ImportError:
+    brotli = None
+
+TIPOS_COMPRESSIVEIS = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+
+
+def codificacoes_disponiveis():
+    # Em ordem de preferência do servidor, usada quando o cliente não diferencia
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def comprimir(corpo, codificacao, nivel_gzip=6, qualidade_brotli=4):
+    if codificacao == 'br':
+        return brotli.compress(corpo, quality=qualidade_brotli)
+    return gzip.compress(corpo, compresslevel=nivel_gzip, mtime=0)
+
+
+def _comprimivel(resposta):
+    return (
+        resposta.status_code in (200, 201, 404)
+        and resposta.mimetype in TIPOS_COMPRESSIVEIS
+        and not resposta.direct_passthrough
+        and not resposta.is_streamed
+        and 'Content-Encoding' not in resposta.headers
+    )
+
+
+def iniciar(app):
+    """Registra a compressão conforme COMPRESSAO_ATIVA, COMPRESSAO_TAMANHO_MINIMO e níveis."""
+    if not app.config.get('COMPRESSAO_ATIVA', True):
+        return
+
+    tamanho_minimo = app.config.get('COMPRESSAO_TAMANHO_MINIMO', 1024)
+    nivel_gzip = app.config.get('COMPRESSAO_NIVEL_GZIP', 6)
+    qualidade_brotli = app.config.get('COMPRESSAO_QUALIDADE_BROTLI', 4)
+
+    @app.after_request
+    def comprimir_resposta(resposta):
+        if not _comprimivel(resposta):
+            return resposta
+        resposta.vary.add('Accept-Encoding')
+
+        codificacao = request.accept_encodings.best_match(codificacoes_disponiveis())
+        if codificacao is None or resposta.content_length is None or resposta.content_length < tamanho_minimo:
+            return resposta
+
+        resposta.set_data(comprimir(resposta.get_data(), codificacao, nivel_gzip, qualidade_brotli))
+        resposta.headers['Content-Encoding'] = codificacao
+        return resposta
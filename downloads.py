@@ -0,0 +1,395 @@
+'''Entrega de documentos: ETag pelo SHA-256, GET condicional, Range (inclusive múltiplos intervalos)
+e delegação da transferência ao servidor web (X-Accel-Redirect / X-Sendfile).
+
+Documentos anteriores ao armazenamento por conteúdo têm o hash calculado no
+primeiro acesso (buscar). Sem hash (o arquivo não existe mais) não há ETag:
+If-None-Match nunca casa e If-Range manda o arquivo inteiro.
+
+Blobs na camada de arquivo (gzip, ver camadas.py) são descomprimidos em fluxo
+pela própria aplicação: não há delegação e o Range é atendido lendo até o
+início do trecho.
+
+Lote (/download_lote): vários documentos num ZIP montado enquanto é enviado,
+bloco a bloco, sem arquivo temporário e com memória constante. Os PDFs já são
+comprimidos, então as entradas vão sem compressão (ZIP_STORED).
+'''
+
+import hashlib
+import io
+import logging
+import os
+import secrets
+import unicodedata
+import zipfile
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+from flask import Response, send_file
+from werkzeug.http import (
+    dump_options_header, http_date, parse_date, parse_etags, parse_if_range_header, parse_range_header, quote_etag
+)
+
+import camadas
+from models import db, Blob, Documento
+from serializacao import formatar_cpf
+
+TAMANHO_BLOCO = 64 * 1024
+MAX_INTERVALOS = 20  # Acima disso o pedido de Range é ignorado e o arquivo vai inteiro
+INTERVALO_ACESSO = timedelta(hours=1)  # Resolução de Blob.ultimo_acesso: no máximo uma escrita por hora
+
+# Colunas necessárias para responder; evita carregar o objeto ORM completo.
+# O caminho vem do blob (que muda ao trocar de camada); documentos antigos sem blob usam o próprio.
+COLUNAS_DOWNLOAD = (
+    Documento.id,
+    Documento.cpf_servidor,
+    Documento.tipo,
+    db.func.coalesce(Blob.caminho_arquivo, Documento.caminho_arquivo).label('caminho_arquivo'),
+    Documento.hora_cadastro,
+    Documento.sha256,
+    Documento.tamanho,
+    Blob.camada,
+    Blob.ultimo_acesso,
+)
+
+
+def consulta(id):
+    """Select das COLUNAS_DOWNLOAD de um documento (usado também pelo modo ASGI)."""
+    return (
+        db.select(*COLUNAS_DOWNLOAD)
+        .outerjoin(Blob, Blob.sha256 == Documento.sha256)
+        .where(Documento.id == id)
+    )
+
+
+def consulta_lote(cpf=None, ids=None, tipo=None, desde=None, ate=None, limite=500):
+    """
+    Select das COLUNAS_DOWNLOAD dos documentos de um lote, por CPF e/ou lista
+    de ids, com filtros de tipo e período. Traz até `limite` + 1 linhas, para
+    detectar lotes acima do limite.
+    """
+    query = db.select(*COLUNAS_DOWNLOAD).outerjoin(Blob, Blob.sha256 == Documento.sha256)
+    if cpf:
+        query = query.where(Documento.cpf_servidor == cpf)
+    if ids:
+        query = query.where(Documento.id.in_(ids))
+    if tipo:
+        query = query.where(Documento.tipo == tipo)
+    if desde:
+        query = query.where(Documento.hora_cadastro >= desde)
+    if ate:
+        query = query.where(Documento.hora_cadastro < ate)
+    return query.order_by(Documento.id).limit(limite + 1)
+
+
+def buscar(id):
+    """Linha com os metadados de entrega do documento, ou None."""
+    documento = db.session.execute(consulta(id)).first()
+    if documento and documento.sha256 is None and os.path.exists(documento.caminho_arquivo):
+        documento = _calcular_hash(documento)
+    return documento
+
+
+def _calcular_hash(documento):
+    # Documentos anteriores ao cálculo de hash no upload: calcula uma vez e grava
+    hash_sha256 = hashlib.sha256()
+    with open(documento.caminho_arquivo, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+            hash_sha256.update(bloco)
+    db.session.execute(
+        db.update(Documento).where(Documento.id == documento.id)
+        .values(sha256=hash_sha256.hexdigest(), tamanho=os.path.getsize(documento.caminho_arquivo))
+    )
+    db.session.commit()
+    return db.session.execute(consulta(documento.id)).first()
+
+
+def atualizacao_acesso(documento, agora=None):
+    """
+    UPDATE de Blob.ultimo_acesso (usado por armazenamento.migrar_camadas), ou
+    None se o último acesso registrado tem menos de INTERVALO_ACESSO: downloads
+    repetidos do mesmo conteúdo não geram uma escrita cada.
+    """
+    agora = agora or datetime.now()
+    if documento.sha256 is None or documento.camada is None:
+        return None
+    if documento.ultimo_acesso and agora - documento.ultimo_acesso < INTERVALO_ACESSO:
+        return None
+    return (
+        db.update(Blob)
+        .where(Blob.sha256 == documento.sha256, db.or_(
+            Blob.ultimo_acesso.is_(None), Blob.ultimo_acesso < agora - INTERVALO_ACESSO
+        ))
+        .values(ultimo_acesso=agora)
+    )
+
+
+def registrar_acesso(documento):
+    atualizacao = atualizacao_acesso(documento)
+    if atualizacao is not None:
+        db.session.execute(atualizacao)
+        db.session.commit()
+
+
+def registrar_acessos(documentos, agora=None):
+    """Mesma regra do registrar_acesso para um lote, num único UPDATE."""
+    agora = agora or datetime.now()
+    shas = {
+        documento.sha256 for documento in documentos
+        if documento.sha256 is not None and documento.camada is not None
+        and not (documento.ultimo_acesso and agora - documento.ultimo_acesso < INTERVALO_ACESSO)
+    }
+    if shas:
+        db.session.execute(
+            db.update(Blob)
+            .where(Blob.sha256.in_(shas), db.or_(
+                Blob.ultimo_acesso.is_(None), Blob.ultimo_acesso < agora - INTERVALO_ACESSO
+            ))
+            .values(ultimo_acesso=agora)
+        )
+        db.session.commit()
+
+
+def arquivado(documento):
+    """True se o arquivo está comprimido na camada de arquivo."""
+    return documento.caminho_arquivo.endswith(camadas.EXTENSAO_GZIP)
+
+
+def ultima_modificacao(documento):
+    # hora_cadastro é gravada em horário local sem fuso; HTTP trabalha com segundos inteiros
+    return documento.hora_cadastro.replace(microsecond=0).astimezone(timezone.utc)
+
+
+def nao_modificado(documento, cabecalhos):
+    """True se o cliente já tem a versão atual (If-None-Match / If-Modified-Since), sem ler o arquivo."""
+    if_none_match = cabecalhos.get('If-None-Match')
+    if if_none_match:
+        # Sem hash (documento legado cujo arquivo sumiu) não há versão atual a comparar, nem para "*"
+        return documento.sha256 is not None and parse_etags(if_none_match).contains_weak(documento.sha256)
+    if_modified_since = parse_date(cabecalhos.get('If-Modified-Since'))
+    if if_modified_since:
+        return ultima_modificacao(documento) <= if_modified_since
+    return False
+
+
+def nome_download(documento):
+    return f"{formatar_cpf(documento.cpf_servidor)}_{documento.tipo}_{documento.id}.pdf"
+
+
+def content_disposition(documento):
+    """Valor de Content-Disposition; mesmo tratamento do send_file para nomes com acento ("Certidão")."""
+    nome = nome_download(documento)
+    opcoes = {'filename': nome}
+    try:
+        nome.encode('ascii')
+    except UnicodeEncodeError:
+        opcoes = {
+            'filename': unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii'),
+            'filename*': f"UTF-8''{quote(nome, safe='!#$&+^`|~')}",
+        }
+    return dump_options_header('attachment', opcoes)
+
+
+def cabecalhos_documento(documento):
+    """Cabeçalhos de validação e cache comuns a todas as respostas do documento."""
+    cabecalhos = {
+        'Last-Modified': http_date(ultima_modificacao(documento)),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, no-cache',
+    }
+    if documento.sha256 is not None:
+        cabecalhos['ETag'] = quote_etag(documento.sha256)
+    return cabecalhos
+
+
+def intervalos(cabecalhos, documento, tamanho):
+    """
+    Lista de (inicio, fim_exclusivo) pedidos e satisfatíveis, [] se nenhum for
+    satisfatível, ou None se o arquivo deve ser enviado inteiro.
+    """
+    intervalo = parse_range_header(cabecalhos.get('Range'))
+    if intervalo is None or intervalo.units != 'bytes' or len(intervalo.ranges) > MAX_INTERVALOS:
+        return None
+    # If-Range: se o arquivo mudou desde que o cliente guardou o ETag, manda inteiro
+    if_range = parse_if_range_header(cabecalhos.get('If-Range'))
+    if if_range.etag and if_range.etag != documento.sha256:
+        return None
+    if if_range.date and if_range.date < ultima_modificacao(documento):
+        return None
+
+    resultado = []
+    for inicio, fim in intervalo.ranges:
+        if inicio < 0:  # Sufixo: "bytes=-500" (últimos 500 bytes)
+            inicio, fim = max(0, tamanho + inicio), tamanho
+        else:
+            fim = tamanho if fim is None else min(fim, tamanho)
+        if inicio < fim:
+            resultado.append((inicio, fim))
+    return resultado
+
+
+def tamanho_arquivo(documento):
+    return documento.tamanho if documento.tamanho is not None else os.path.getsize(documento.caminho_arquivo)
+
+
+def plano_multipart(intervalos, tamanho, fronteira):
+    """
+    Sequência do corpo multipart/byteranges: bytes prontos (cabeçalhos das
+    partes) intercalados com (inicio, fim) a serem lidos do arquivo.
+    """
+    for inicio, fim in intervalos:
+        yield (
+            f'\r\n--{fronteira}\r\n'
+            f'Content-Type: application/pdf\r\n'
+            f'Content-Range: bytes {inicio}-{fim - 1}/{tamanho}\r\n\r\n'
+        ).encode()
+        yield (inicio, fim)
+    yield f'\r\n--{fronteira}--\r\n'.encode()
+
+
+def plano_simples(intervalos, tamanho):
+    """Trecho único a enviar e cabeçalhos de tamanho: ((inicio, fim), cabecalhos)."""
+    inicio, fim = intervalos[0] if intervalos else (0, tamanho)
+    cabecalhos = {'Content-Length': str(fim - inicio)}
+    if intervalos:
+        cabecalhos['Content-Range'] = f'bytes {inicio}-{fim - 1}/{tamanho}'
+    return (inicio, fim), cabecalhos
+
+
+def cabecalho_delegacao(documento, config):
+    """(nome, valor) do cabeçalho que entrega a transferência ao nginx (X-Accel-Redirect) ou Apache/lighttpd (X-Sendfile)."""
+    if config['DOWNLOAD_DELEGADO'] == 'x-accel':
+        relativo = os.path.relpath(documento.caminho_arquivo, config['UPLOAD_FOLDER'])
+        return 'X-Accel-Redirect', config['DOWNLOAD_PREFIXO_INTERNO'].rstrip('/') + '/' + relativo
+    return 'X-Sendfile', os.path.abspath(documento.caminho_arquivo)
+
+
+def _ler_trecho(arquivo, inicio, fim):
+    arquivo.seek(inicio)  # No gzip, seek para frente descomprime e descarta até o início
+    restante = fim - inicio
+    while restante:
+        bloco = arquivo.read(min(TAMANHO_BLOCO, restante))
+        if not bloco:
+            return
+        restante -= len(bloco)
+        yield bloco
+
+
+def transmitir(caminho, plano):
+    """Gera os bytes de um plano (bytes prontos e trechos (inicio, fim)), em qualquer camada."""
+    with camadas.abrir(caminho) as arquivo:
+        for item in plano:
+            if isinstance(item, bytes):
+                yield item
+            else:
+                yield from _ler_trecho(arquivo, *item)
+
+
+def _resposta(documento, corpo=None, status=200, mimetype='application/pdf'):
+    resposta = Response(corpo, status=status, mimetype=mimetype)
+    resposta.headers.update(cabecalhos_documento(documento))
+    return resposta
+
+
+def resposta_304(documento):
+    return _resposta(documento, status=304, mimetype=None)
+
+
+def responder(documento, cabecalhos, config):
+    """Resposta completa, parcial (206) ou delegada para um documento cujo arquivo existe."""
+    if config.get('DOWNLOAD_DELEGADO') and not arquivado(documento):
+        # O servidor web trata Range e If-Range por conta própria
+        resposta = _resposta(documento)
+        resposta.headers['Content-Disposition'] = content_disposition(documento)
+        resposta.headers.set(*cabecalho_delegacao(documento, config))
+        return resposta
+
+    tamanho = tamanho_arquivo(documento)
+    pedidos = intervalos(cabecalhos, documento, tamanho)
+
+    if pedidos == []:
+        resposta = _resposta(documento, status=416, mimetype=None)
+        resposta.headers['Content-Range'] = f'bytes */{tamanho}'
+        return resposta
+
+    if pedidos and len(pedidos) > 1:
+        fronteira = secrets.token_hex(16)
+
+        plano = plano_multipart(pedidos, tamanho, fronteira)
+        resposta = _resposta(
+            documento, transmitir(documento.caminho_arquivo, plano),
+            status=206, mimetype=f'multipart/byteranges; boundary={fronteira}'
+        )
+        resposta.headers['Content-Disposition'] = content_disposition(documento)
+        return resposta
+
+    if arquivado(documento):
+        # send_file faria seek/len sobre o arquivo comprimido: o trecho é transmitido descomprimindo
+        trecho, cabecalhos = plano_simples(pedidos, tamanho)
+        resposta = _resposta(documento, transmitir(documento.caminho_arquivo, [trecho]), status=206 if pedidos else 200)
+        resposta.headers.update(cabecalhos)
+        resposta.headers['Content-Disposition'] = content_disposition(documento)
+        return resposta
+
+    # Arquivo inteiro ou um único intervalo: o Werkzeug trata o Range e usa wsgi.file_wrapper
+    resposta = send_file(
+        documento.caminho_arquivo,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=nome_download(documento),
+        conditional=pedidos is not None,
+        etag=documento.sha256,
+        last_modified=ultima_modificacao(documento)
+    )
+    resposta.headers.update(cabecalhos_documento(documento))
+    return resposta
+
+
+class _SaidaZip(io.RawIOBase):
+    """Destino do ZipFile que só acumula o que foi escrito até ser retirado. Sem seek: o zipfile usa data descriptors."""
+
+    def __init__(self):
+        self._pedacos = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._pedacos.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def retirar(self):
+        pedacos, self._pedacos = self._pedacos, []
+        return pedacos
+
+
+def gerar_zip(documentos, logger=None):
+    """
+    Gera os bytes de um ZIP com os arquivos dos `documentos` (linhas de
+    consulta_lote), um bloco por vez. Arquivos que sumiram do disco (ou
+    mudaram de camada depois da consulta) ficam de fora, com aviso no log.
+    """
+    logger = logger or logging.getLogger(__name__)
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as pacote:
+        for documento in documentos:
+            try:
+                origem = camadas.abrir(documento.caminho_arquivo)
+            except FileNotFoundError:
+                logger.warning('Documento %s fora do lote: arquivo %s não encontrado', documento.id, documento.caminho_arquivo)
+                continue
+            with origem:
+                entrada = zipfile.ZipInfo(nome_download(documento), date_time=documento.hora_cadastro.timetuple()[:6])
+                entrada.compress_type = zipfile.ZIP_STORED
+                # Tamanho conhecido de antemão: o zipfile decide sozinho se a entrada precisa de ZIP64
+                entrada.file_size = tamanho_arquivo(documento)
+                with pacote.open(entrada, 'w') as destino:
+                    for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b''):
+                        destino.write(bloco)
+                        yield from saida.retirar()
+            yield from saida.retirar()
+    yield from saida.retirar()  # Diretório central
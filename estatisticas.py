@@ -0,0 +1,262 @@
+'''Estatísticas agregadas de servidores e documentos para os painéis.
+
+As contagens ficam em tabelas de resumo (resumo_servidores, resumo_documentos)
+somadas na mesma transação de cada cadastro e upload, com INSERT ... ON
+CONFLICT DO UPDATE (SQLite e PostgreSQL; nos demais bancos, UPDATE do grupo
+seguido de INSERT quando ele ainda não existe). A leitura de /estatisticas percorre
+só os grupos dessas tabelas, nunca servidores nem documentos: o custo não cresce
+com o número de registros.
+
+Se os resumos divergirem das tabelas (alteração direta no banco, carga por
+fora da aplicação), `flask estatisticas reconstruir` recalcula tudo.
+'''
+
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Documento, ResumoDocumentos, ResumoServidores, Servidor
+from parametros import ParametroInvalido
+
+DIAS_PADRAO = 30  # Série diária de documentos quando 'desde' não é informado
+DIAS_MAXIMO = 366
+
+_inserts = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+CHAVES_SERVIDORES = ['codigo_orgao', 'lotacao', 'cargo', 'ativo']
+CHAVES_DOCUMENTOS = ['tipo', 'dia']
+
+
+def _somar(dialeto, modelo, chaves, somas):
+    """INSERT que cria o grupo ou soma às colunas `somas` do existente (um statement para executemany)."""
+    insert = _inserts[dialeto](modelo)
+    return insert.on_conflict_do_update(
+        index_elements=chaves,
+        set_={coluna: getattr(modelo, coluna) + insert.excluded[coluna] for coluna in somas}
+    )
+
+
+def _somar_sem_upsert(modelo, chaves, somas, parametros):
+    # Bancos sem ON CONFLICT: soma ao grupo existente e só o cria se o UPDATE não achou linha.
+    # Dois cadastros simultâneos do mesmo grupo novo podem colidir na chave única; a transação
+    # falha como qualquer outro conflito e `flask estatisticas reconstruir` recalcula se preciso
+    for linha in parametros:
+        atualizado = db.session.execute(
+            db.update(modelo)
+            .where(*(getattr(modelo, chave) == linha[chave] for chave in chaves))
+            .values({coluna: getattr(modelo, coluna) + linha[coluna] for coluna in somas})
+        )
+        if atualizado.rowcount == 0:
+            db.session.execute(db.insert(modelo).values(**linha))
+
+
+def _dialeto():
+    return db.session.get_bind().dialect.name
+
+
+def _grupos_servidores(servidores):
+    grupos = Counter(
+        (servidor['codigo_orgao'], servidor['lotacao'], servidor['cargo'], bool(servidor['ativo']))
+        for servidor in servidores
+    )
+    return [
+        {'codigo_orgao': orgao, 'lotacao': lotacao, 'cargo': cargo, 'ativo': ativo, 'quantidade': quantidade}
+        for (orgao, lotacao, cargo, ativo), quantidade in grupos.items()
+    ]
+
+
+def _grupo_documento(documento):
+    return [{
+        'tipo': documento.tipo,
+        'dia': documento.hora_cadastro.date(),
+        'quantidade': 1,
+        'bytes': documento.tamanho or 0,
+    }]
+
+
+def incremento_servidores(servidores, dialeto):
+    """
+    (statement, parâmetros) que somam `servidores` (dicts com codigo_orgao,
+    lotacao, cargo e ativo) aos resumos, um parâmetro por grupo distinto.
+    Só para dialetos com upsert (SQLite e PostgreSQL).
+    """
+    return _somar(dialeto, ResumoServidores, CHAVES_SERVIDORES, ['quantidade']), _grupos_servidores(servidores)
+
+
+def incremento_documento(documento, dialeto):
+    """(statement, parâmetros) que somam um documento recém-criado ao resumo do seu tipo e dia."""
+    return _somar(dialeto, ResumoDocumentos, CHAVES_DOCUMENTOS, ['quantidade', 'bytes']), _grupo_documento(documento)
+
+
+def contar_servidores(servidores):
+    """Soma servidores inseridos aos resumos. Não faz commit: vai na transação do cadastro."""
+    dialeto = _dialeto()
+    if dialeto not in _inserts:
+        _somar_sem_upsert(ResumoServidores, CHAVES_SERVIDORES, ['quantidade'], _grupos_servidores(servidores))
+        return
+    statement, parametros = incremento_servidores(servidores, dialeto)
+    if parametros:
+        db.session.execute(statement, parametros)
+
+
+def contar_documento(documento):
+    """Soma um documento inserido ao resumo. Não faz commit: vai na transação do upload."""
+    dialeto = _dialeto()
+    if dialeto not in _inserts:
+        _somar_sem_upsert(ResumoDocumentos, CHAVES_DOCUMENTOS, ['quantidade', 'bytes'], _grupo_documento(documento))
+        return
+    db.session.execute(*incremento_documento(documento, dialeto))
+
+
+def _dia(coluna):
+    # CAST(... AS DATE) no SQLite vira número; date() devolve 'AAAA-MM-DD'
+    if _dialeto() == 'sqlite':
+        return db.func.date(coluna)
+    return db.cast(coluna, db.Date)
+
+
+def _como_data(valor):
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def _servidores_atuais():
+    return {
+        (linha.codigo_orgao, linha.lotacao, linha.cargo, bool(linha.ativo)): linha.quantidade
+        for linha in db.session.execute(db.select(
+            ResumoServidores.codigo_orgao, ResumoServidores.lotacao, ResumoServidores.cargo,
+            ResumoServidores.ativo, ResumoServidores.quantidade
+        ))
+    }
+
+
+def _documentos_atuais():
+    return {
+        (linha.tipo, _como_data(linha.dia)): (linha.quantidade, int(linha.bytes))
+        for linha in db.session.execute(db.select(
+            ResumoDocumentos.tipo, ResumoDocumentos.dia, ResumoDocumentos.quantidade, ResumoDocumentos.bytes
+        ))
+    }
+
+
+def reconstruir():
+    """
+    Recalcula os resumos a partir de servidores e documentos, numa única
+    transação. Retorna quantos grupos existem e quantos estavam divergentes.
+    """
+    anteriores_servidores = _servidores_atuais()
+    anteriores_documentos = _documentos_atuais()
+
+    servidores = {
+        (orgao, lotacao, cargo, bool(ativo)): quantidade
+        for orgao, lotacao, cargo, ativo, quantidade in db.session.execute(
+            db.select(Servidor.codigo_orgao, Servidor.lotacao, Servidor.cargo, Servidor.ativo, db.func.count())
+            .group_by(Servidor.codigo_orgao, Servidor.lotacao, Servidor.cargo, Servidor.ativo)
+        )
+    }
+    dia = _dia(Documento.hora_cadastro)
+    documentos = {
+        (tipo, _como_data(dia_cadastro)): (quantidade, int(bytes_))
+        for tipo, dia_cadastro, quantidade, bytes_ in db.session.execute(
+            db.select(Documento.tipo, dia, db.func.count(), db.func.coalesce(db.func.sum(Documento.tamanho), 0))
+            .group_by(Documento.tipo, dia)
+        )
+    }
+
+    db.session.execute(db.delete(ResumoServidores))
+    db.session.execute(db.delete(ResumoDocumentos))
+    if servidores:
+        db.session.execute(db.insert(ResumoServidores), [
+            {'codigo_orgao': orgao, 'lotacao': lotacao, 'cargo': cargo, 'ativo': ativo, 'quantidade': quantidade}
+            for (orgao, lotacao, cargo, ativo), quantidade in servidores.items()
+        ])
+    if documentos:
+        db.session.execute(db.insert(ResumoDocumentos), [
+            {'tipo': tipo, 'dia': dia_cadastro, 'quantidade': quantidade, 'bytes': bytes_}
+            for (tipo, dia_cadastro), (quantidade, bytes_) in documentos.items()
+        ])
+    db.session.commit()
+
+    def divergentes(anterior, atual):
+        return sum(1 for chave in anterior.keys() | atual.keys() if anterior.get(chave) != atual.get(chave))
+
+    return {
+        'grupos_servidores': len(servidores),
+        'grupos_documentos': len(documentos),
+        'divergencias_servidores': divergentes(anteriores_servidores, servidores),
+        'divergencias_documentos': divergentes(anteriores_documentos, documentos),
+    }
+
+
+def _agrupar(coluna, codigo_orgao):
+    ativos = db.func.sum(db.case((ResumoServidores.ativo.is_(True), ResumoServidores.quantidade), else_=0))
+    query = (
+        db.select(coluna.label('valor'), db.func.sum(ResumoServidores.quantidade).label('total'), ativos.label('ativos'))
+        .group_by(coluna)
+        .order_by(coluna)
+    )
+    if codigo_orgao:
+        query = query.where(ResumoServidores.codigo_orgao == codigo_orgao)
+    return [
+        {'valor': valor, 'total': int(total), 'ativos': int(ativos), 'inativos': int(total - ativos)}
+        for valor, total, ativos in db.session.execute(query)
+    ]
+
+
+def servidores(codigo_orgao=None):
+    """Servidores por órgão, lotação e cargo, com ativos e inativos."""
+    por_orgao = _agrupar(ResumoServidores.codigo_orgao, codigo_orgao)
+    total = sum(grupo['total'] for grupo in por_orgao)
+    ativos = sum(grupo['ativos'] for grupo in por_orgao)
+    return {
+        'total': total,
+        'ativos': ativos,
+        'inativos': total - ativos,
+        'por_orgao': [{'codigo_orgao': grupo.pop('valor'), **grupo} for grupo in por_orgao],
+        'por_lotacao': [{'lotacao': grupo.pop('valor'), **grupo} for grupo in _agrupar(ResumoServidores.lotacao, codigo_orgao)],
+        'por_cargo': [{'cargo': grupo.pop('valor'), **grupo} for grupo in _agrupar(ResumoServidores.cargo, codigo_orgao)],
+    }
+
+
+def documentos(desde=None, ate=None, tipo=None):
+    """
+    Documentos por tipo (todo o período) e série diária por tipo entre `desde`
+    e `ate` (datas inclusivas; padrão: últimos DIAS_PADRAO dias). A série é
+    limitada a DIAS_MAXIMO dias para que a resposta tenha tamanho limitado.
+    """
+    ate = ate or date.today()
+    desde = desde or ate - timedelta(days=DIAS_PADRAO - 1)
+    if desde > ate:
+        raise ParametroInvalido("'desde' deve ser anterior a 'ate'.")
+    if (ate - desde).days >= DIAS_MAXIMO:
+        raise ParametroInvalido(f'O período deve ter no máximo {DIAS_MAXIMO} dias.')
+
+    por_tipo = (
+        db.select(ResumoDocumentos.tipo, db.func.sum(ResumoDocumentos.quantidade), db.func.sum(ResumoDocumentos.bytes))
+        .group_by(ResumoDocumentos.tipo)
+        .order_by(ResumoDocumentos.tipo)
+    )
+    por_dia = (
+        db.select(ResumoDocumentos.dia, ResumoDocumentos.tipo, ResumoDocumentos.quantidade, ResumoDocumentos.bytes)
+        .where(ResumoDocumentos.dia.between(desde, ate))
+        .order_by(ResumoDocumentos.dia, ResumoDocumentos.tipo)
+    )
+    if tipo:
+        por_tipo = por_tipo.where(ResumoDocumentos.tipo == tipo)
+        por_dia = por_dia.where(ResumoDocumentos.tipo == tipo)
+
+    tipos = [
+        {'tipo': tipo_documento, 'quantidade': int(quantidade), 'bytes': int(bytes_)}
+        for tipo_documento, quantidade, bytes_ in db.session.execute(por_tipo)
+    ]
+    return {
+        'total': sum(item['quantidade'] for item in tipos),
+        'bytes': sum(item['bytes'] for item in tipos),
+        'por_tipo': tipos,
+        'desde': desde.isoformat(),
+        'ate': ate.isoformat(),
+        'por_dia': [
+            {'dia': _como_data(dia).isoformat(), 'tipo': tipo_documento, 'quantidade': quantidade, 'bytes': int(bytes_)}
+            for dia, tipo_documento, quantidade, bytes_ in db.session.execute(por_dia)
+        ],
+    }
@@ -1,16 +1,33 @@
-'''FIZ ESTE ARQUIVO PARA INSERIR SERVIDORES FAKES NO SISTEMA'''
+'''FIZ ESTE ARQUIVO PARA INSERIR SERVIDORES FAKES NO SISTEMA
 
-import requests
+Envia servidores para o endpoint /cadastro_servidor/lote da API.
+
+Uso:
+    python inserir_Servidores.py                          # servidores de exemplo
+    python inserir_Servidores.py servidores.csv           # CSV com cabeçalho
+    python inserir_Servidores.py servidores.ndjson --tamanho-lote 5000
+    python inserir_Servidores.py servidores.json --url http://api:5000/cadastro_servidor/lote
+
+O arquivo é lido em streaming e enviado como NDJSON em requisições de até
+--registros-por-requisicao servidores, reaproveitando as conexões da sessão.
+'''
+
+import argparse
+import csv
 import json
+import sys
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # URL da API (ajuste conforme necessário)
-url = 'http://localhost:5000/cadastro_servidor'
+URL_PADRAO = 'http://localhost:5000/cadastro_servidor/lote'
 
-# Dados do servidor a ser cadastrado
-servidores = [
+# Servidores de exemplo, usados quando nenhum arquivo é informado
+SERVIDORES_EXEMPLO = [
     {
   "nome": "João Silva",
-  "cpf": "123.456.789-00",
+  "cpf": "123.456.789-09",
   "matricula": "12345",
   "codigo_orgao": "123",
   "ativo": True,
@@ -19,7 +36,7 @@ servidores = [
 },
 {
   "nome": "Maria Oliveira",
-  "cpf": "234.567.890-11",
+  "cpf": "234.567.890-92",
   "matricula": "67890",
   "codigo_orgao": "456",
   "ativo": True,
@@ -28,7 +45,7 @@ servidores = [
 },
 {
   "nome": "Carlos Pereira",
-  "cpf": "345.678.901-22",
+  "cpf": "345.678.901-75",
   "matricula": "11223",
   "codigo_orgao": "789",
   "ativo": True,
@@ -37,7 +54,7 @@ servidores = [
 },
 {
   "nome": "Ana Souza",
-  "cpf": "456.789.012-33",
+  "cpf": "456.789.012-49",
   "matricula": "44556",
   "codigo_orgao": "012",
   "ativo": False,
@@ -47,7 +64,7 @@ servidores = [
 
 {
   "nome": "Felipe Santos",
-  "cpf": "567.890.123-44",
+  "cpf": "567.890.123-03",
   "matricula": "78901",
   "codigo_orgao": "321",
   "ativo": True,
@@ -57,7 +74,7 @@ servidores = [
 ,
 {
   "nome": "Lucas Almeida",
-  "cpf": "678.901.234-55",
+  "cpf": "678.901.234-69",
   "matricula": "12367",
   "codigo_orgao": "987",
   "ativo": True,
@@ -67,7 +84,7 @@ servidores = [
 ,
 {
   "nome": "Patrícia Costa",
-  "cpf": "789.012.345-66",
+  "cpf": "789.012.345-05",
   "matricula": "23478",
   "codigo_orgao": "654",
   "ativo": False,
@@ -77,7 +94,7 @@ servidores = [
 ,
 {
   "nome": "Ricardo Gomes",
-  "cpf": "890.123.456-77",
+  "cpf": "890.123.456-42",
   "matricula": "34589",
   "codigo_orgao": "321",
   "ativo": True,
@@ -88,7 +105,7 @@ servidores = [
 
 {
   "nome": "Fernanda Martins",
-  "cpf": "901.234.567-88",
+  "cpf": "901.234.567-70",
   "matricula": "45690",
   "codigo_orgao": "123",
   "ativo": False,
@@ -98,7 +115,7 @@ servidores = [
 ,
 {
   "nome": "Juliana Ferreira",
-  "cpf": "123.345.678-99",
+  "cpf": "123.345.678-41",
   "matricula": "56701",
   "codigo_orgao": "234",
   "ativo": True,
@@ -108,7 +125,7 @@ servidores = [
 ,
 {
   "nome": "Eduardo Souza",
-  "cpf": "234.456.789-10",
+  "cpf": "234.456.789-52",
   "matricula": "67812",
   "codigo_orgao": "876",
   "ativo": False,
@@ -118,7 +135,7 @@ servidores = [
 ,
 {
   "nome": "Gustavo Lima",
-  "cpf": "345.567.890-21",
+  "cpf": "345.567.890-44",
   "matricula": "78923",
   "codigo_orgao": "432",
   "ativo": True,
@@ -128,7 +145,7 @@ servidores = [
 ,
 {
   "nome": "Mariana Rocha",
-  "cpf": "456.678.901-32",
+  "cpf": "456.678.901-27",
   "matricula": "89034",
   "codigo_orgao": "654",
   "ativo": False,
@@ -138,7 +155,7 @@ servidores = [
 ,
 {
   "nome": "Roberto Oliveira",
-  "cpf": "567.789.012-43",
+  "cpf": "567.789.012-09",
   "matricula": "90145",
   "codigo_orgao": "210",
   "ativo": True,
@@ -148,7 +165,7 @@ servidores = [
 ,
 {
   "nome": "Cláudia Santos",
-  "cpf": "678.890.123-54",
+  "cpf": "678.890.123-65",
   "matricula": "11256",
   "codigo_orgao": "321",
   "ativo": False,
@@ -157,7 +174,7 @@ servidores = [
 },
 {
   "nome": "Cláudia Rodrigues",
-  "cpf": "679.450.124-64",
+  "cpf": "679.450.124-42",
   "matricula": "45789",
   "codigo_orgao": "321",
   "ativo": False,
@@ -166,18 +183,89 @@ servidores = [
 }
 ]
 
-# Enviar a requisição POST para a API
-def inserir_servidores():
-    for servidor in servidores:
-        response = requests.post(url, json=servidor)
-
-        # Verificar a resposta da API
-        if response.status_code == 201:
-            print("Servidor cadastrado com sucesso!")
-            print("Resposta:", response.json())
-        elif response.status_code == 400:
-            print("Erro de cadastro:", response.json())
+def ler_arquivo(caminho):
+    """Gera os servidores de um arquivo JSON (array), NDJSON ou CSV, conforme a extensão."""
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        if caminho.endswith('.csv'):
+            yield from csv.DictReader(arquivo)
+        elif caminho.endswith(('.ndjson', '.jsonl')):
+            for linha in arquivo:
+                if linha.strip():
+                    yield json.loads(linha)
         else:
-            print("Erro inesperado:", response.status_code, response.text)
+            yield from json.load(arquivo)
+
+
+def em_blocos(servidores, tamanho):
+    """Agrupa os servidores em blocos de até `tamanho` itens."""
+    bloco = []
+    for servidor in servidores:
+        bloco.append(servidor)
+        if len(bloco) >= tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def corpo_ndjson(bloco):
+    """Corpo da requisição gerado sob demanda (enviado com Transfer-Encoding: chunked)."""
+    for servidor in bloco:
+        yield (json.dumps(servidor, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def criar_sessao(conexoes):
+    """Sessão HTTP com pool de conexões keep-alive."""
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=conexoes, max_retries=3)
+    sessao.mount('http://', adaptador)
+    sessao.mount('https://', adaptador)
+    return sessao
+
+
+# Enviar as requisições POST para a API
+def inserir_servidores(servidores, url=URL_PADRAO, tamanho_lote=1000, registros_por_requisicao=5000):
+    inseridos = 0
+    erros = 0
+    with criar_sessao(conexoes=1) as sessao:
+        for bloco in em_blocos(servidores, registros_por_requisicao):
+            response = sessao.post(
+                url,
+                params={'tamanho_lote': tamanho_lote},
+                data=corpo_ndjson(bloco),
+                headers={'Content-Type': 'application/x-ndjson'}
+            )
+
+            # Verificar a resposta da API
+            if response.status_code == 200:
+                resumo = response.json()
+                inseridos += resumo['inseridos']
+                erros += len(resumo['erros'])
+                for erro in resumo['erros']:
+                    print("Erro de cadastro:", erro, file=sys.stderr)
+            elif response.status_code == 400:
+                print("Erro de cadastro:", response.json(), file=sys.stderr)
+                erros += len(bloco)
+            else:
+                print("Erro inesperado:", response.status_code, response.text, file=sys.stderr)
+                erros += len(bloco)
+
+    print(f"Servidores cadastrados: {inseridos}. Rejeitados: {erros}.")
+    return inseridos, erros
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cadastra servidores em lote na API.')
+    parser.add_argument('arquivo', nargs='?', help='Arquivo .json, .ndjson/.jsonl ou .csv (padrão: servidores de exemplo)')
+    parser.add_argument('--url', default=URL_PADRAO, help='URL do endpoint de carga em lote')
+    parser.add_argument('--tamanho-lote', type=int, default=1000, help='Servidores por transação no banco')
+    parser.add_argument('--registros-por-requisicao', type=int, default=5000, help='Servidores por requisição HTTP')
+    args = parser.parse_args(argv)
+
+    servidores = ler_arquivo(args.arquivo) if args.arquivo else SERVIDORES_EXEMPLO
+    _, erros = inserir_servidores(servidores, args.url, args.tamanho_lote, args.registros_por_requisicao)
+    return 1 if erros else 0
+
 
-inserir_servidores()
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
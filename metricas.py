@@ -0,0 +1,332 @@
+'''Métricas de desempenho por rota, no formato texto do Prometheus (GET /metrics).
+
+Por requisição: latência, tamanho da resposta, status, quantidade de comandos
+SQL e tempo gasto no banco (eventos do SQLAlchemy). Requisições acima dos
+limites METRICAS_LIMITE_* são contadas à parte e registradas no log, com a
+rota e o número de consultas: um N+1 (ex.: Servidor.documentos carregado
+servidor a servidor) aparece como uma rota que passou a fazer dezenas de
+consultas.
+
+As métricas ficam na memória do processo, como o cache LRU: com vários
+workers, cada coleta do Prometheus vê um worker (use um alvo por worker ou
+agregue por instância).
+
+Acesso a /metrics: token de acesso de gestor (escopo administracao) ou, para
+o Prometheus, o token de coleta METRICAS_TOKEN em "Authorization: Bearer
+<token>" (bearer_token na configuração do scrape).
+
+Perfil sob demanda: com METRICAS_PERFIL_TOKEN configurado, uma requisição
+com o cabeçalho "X-Perfil: <token>" roda sob cProfile e grava o resultado em
+METRICAS_PERFIL_PASTA (nome devolvido em X-Perfil-Arquivo). Para ler:
+flask metricas perfil <arquivo>.
+'''
+
+import cProfile
+import contextvars
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PREFIXO = 'serpro_'
+CABECALHO_PERFIL = 'X-Perfil'
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+BUCKETS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_TAMANHO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Consultas e tempo de banco da requisição atual. O valor é um dict mutável:
+# threads (WSGI) e tarefas (ASGI) somam no mesmo objeto que a requisição criou.
+_requisicao_sql = contextvars.ContextVar('metricas_sql', default=None)
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for indice, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[indice] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, contagem in zip(self.buckets, self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{_rotulos(rotulos, le=_numero(limite))} {acumulado}'
+        yield f'{nome}_bucket{_rotulos(rotulos, le="+Inf")} {self.total}'
+        yield f'{nome}_sum{_rotulos(rotulos)} {_numero(self.soma)}'
+        yield f'{nome}_count{_rotulos(rotulos)} {self.total}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _rotulos(rotulos, **extras):
+    pares = list(rotulos) + list(extras.items())
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+class Registro:
+    """Contadores, medidores e histogramas por conjunto de rótulos. Seguro entre threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._descricoes = {}  # nome -> (tipo, ajuda, buckets)
+        self._valores = {}  # nome -> {rotulos: valor ou Histograma}
+
+    def declarar(self, nome, tipo, ajuda, buckets=None):
+        self._descricoes[PREFIXO + nome] = (tipo, ajuda, buckets)
+        self._valores.setdefault(PREFIXO + nome, {})
+
+    def somar(self, nome, valor=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            serie = self._valores[PREFIXO + nome]
+            serie[chave] = serie.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            serie = self._valores[PREFIXO + nome]
+            histograma = serie.get(chave)
+            if histograma is None:
+                histograma = serie[chave] = Histograma(self._descricoes[PREFIXO + nome][2])
+            histograma.observar(valor)
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (0.0.4)."""
+        linhas = []
+        with self._lock:
+            for nome, (tipo, ajuda, _) in self._descricoes.items():
+                linhas.append(f'# HELP {nome} {ajuda}')
+                linhas.append(f'# TYPE {nome} {tipo}')
+                for rotulos, valor in sorted(self._valores[nome].items()):
+                    if isinstance(valor, Histograma):
+                        linhas.extend(valor.linhas(nome, rotulos))
+                    else:
+                        linhas.append(f'{nome}{_rotulos(rotulos)} {_numero(valor)}')
+        return '\n'.join(linhas) + '\n'
+
+
+def criar_registro():
+    registro = Registro()
+    registro.declarar('requisicoes_total', 'counter', 'Requisições atendidas, por rota, método e status.')
+    registro.declarar('requisicoes_em_andamento', 'gauge', 'Requisições sendo atendidas agora.')
+    registro.declarar('requisicao_duracao_segundos', 'histogram',
+                      'Tempo até o fim da resposta (inclui o envio de streams).', BUCKETS_DURACAO)
+    registro.declarar('resposta_tamanho_bytes', 'histogram',
+                      'Tamanho do corpo das respostas com tamanho conhecido.', BUCKETS_TAMANHO)
+    registro.declarar('requisicao_consultas_sql', 'histogram', 'Comandos SQL executados por requisição.',
+                      BUCKETS_CONSULTAS)
+    registro.declarar('requisicao_sql_segundos', 'histogram', 'Tempo no banco por requisição.', BUCKETS_DURACAO)
+    registro.declarar('requisicoes_sinalizadas_total', 'counter',
+                      'Requisições acima dos limites (motivo: consultas, sql_segundos ou duracao).')
+    registro.declarar('perfis_total', 'counter', 'Requisições executadas sob cProfile.')
+    return registro
+
+
+# Um registro por processo: também recebe as rotas nativas do modo ASGI (asgi.py)
+registro = criar_registro()
+
+
+def _antes_do_comando(_conexao, _cursor, _sql, _parametros, contexto, _executemany):
+    if _requisicao_sql.get() is not None:
+        contexto._metricas_inicio = time.perf_counter()
+
+
+def _depois_do_comando(_conexao, _cursor, _sql, _parametros, contexto, _executemany):
+    atual = _requisicao_sql.get()
+    inicio = getattr(contexto, '_metricas_inicio', None)
+    if atual is not None and inicio is not None:
+        atual['consultas'] += 1
+        atual['segundos'] += time.perf_counter() - inicio
+
+
+def instrumentar_sql():
+    """Conta comandos e tempo de banco de todos os engines (inclusive o assíncrono do asgi.py)."""
+    if not event.contains(Engine, 'before_cursor_execute', _antes_do_comando):
+        event.listen(Engine, 'before_cursor_execute', _antes_do_comando)
+        event.listen(Engine, 'after_cursor_execute', _depois_do_comando)
+
+
+def iniciar_medicao():
+    """Começa a contar o SQL da requisição atual. Retorna (token, contadores)."""
+    contadores = {'consultas': 0, 'segundos': 0.0}
+    return _requisicao_sql.set(contadores), contadores
+
+
+def finalizar_medicao(token):
+    _requisicao_sql.reset(token)
+
+
+def registrar(rota, metodo, status, duracao, tamanho, sql, limites, logger=None):
+    """Grava as métricas de uma requisição concluída e sinaliza as que passaram dos limites."""
+    registro.somar('requisicoes_total', rota=rota, metodo=metodo, status=str(status))
+    registro.observar('requisicao_duracao_segundos', duracao, rota=rota, metodo=metodo)
+    if tamanho is not None:
+        registro.observar('resposta_tamanho_bytes', tamanho, rota=rota)
+    registro.observar('requisicao_consultas_sql', sql['consultas'], rota=rota)
+    registro.observar('requisicao_sql_segundos', sql['segundos'], rota=rota)
+
+    motivos = []
+    if limites.get('consultas') and sql['consultas'] > limites['consultas']:
+        motivos.append('consultas')
+    if limites.get('sql_segundos') and sql['segundos'] > limites['sql_segundos']:
+        motivos.append('sql_segundos')
+    if limites.get('duracao') and duracao > limites['duracao']:
+        motivos.append('duracao')
+    for motivo in motivos:
+        registro.somar('requisicoes_sinalizadas_total', rota=rota, motivo=motivo)
+    if motivos and logger is not None:
+        logger.warning(
+            'Requisição lenta (%s): %s %s -> %s em %.3fs, %d consultas SQL em %.3fs',
+            ', '.join(motivos), metodo, rota, status, duracao, sql['consultas'], sql['segundos']
+        )
+
+
+def limites(config):
+    return {
+        'consultas': config.get('METRICAS_LIMITE_CONSULTAS'),
+        'sql_segundos': config.get('METRICAS_LIMITE_SEGUNDOS_SQL'),
+        'duracao': config.get('METRICAS_LIMITE_SEGUNDOS'),
+    }
+
+
+def _rota():
+    # A regra da rota ('/download/<int:id>'), não a URL: mantém a cardinalidade dos rótulos limitada
+    return request.url_rule.rule if request.url_rule is not None else 'nao_encontrada'
+
+
+# cProfile não aceita dois perfis ativos ao mesmo tempo em todas as versões do Python
+_lock_perfil = threading.Lock()
+
+
+def coleta_autorizada(config):
+    """True se a requisição traz o token de coleta (METRICAS_TOKEN) configurado."""
+    token = config.get('METRICAS_TOKEN')
+    valor = request.headers.get('Authorization', '')
+    return bool(token and valor.startswith('Bearer ')
+                and secrets.compare_digest(valor[len('Bearer '):], token))
+
+
+def _perfil_pedido(config):
+    token = config.get('METRICAS_PERFIL_TOKEN')
+    valor = request.headers.get(CABECALHO_PERFIL)
+    return bool(token and valor and secrets.compare_digest(valor, token))
+
+
+def _gravar_perfil(perfil, pasta):
+    os.makedirs(pasta, exist_ok=True)
+    rota = _rota().strip('/').replace('/', '_').replace('<', '').replace('>', '').replace(':', '-') or 'raiz'
+    nome = f"{datetime.now():%Y%m%dT%H%M%S%f}_{request.method}_{rota}.prof"
+    perfil.dump_stats(os.path.join(pasta, nome))
+    return nome
+
+
+def iniciar(app):
+    """Registra a medição por requisição, o perfil sob demanda e os eventos SQL, conforme METRICAS_*."""
+    app.extensions['metricas'] = registro
+    if not app.config.get('METRICAS_ATIVAS', True):
+        return
+    instrumentar_sql()
+    limites_app = limites(app.config)
+
+    @app.before_request
+    def comecar_medicao():
+        g.metricas_inicio = time.perf_counter()
+        # Sem reset no fim: o SQL de respostas em stream ainda conta, e a próxima requisição da thread troca o valor
+        _, g.metricas_sql = iniciar_medicao()
+        registro.somar('requisicoes_em_andamento', 1)
+        if _perfil_pedido(app.config) and _lock_perfil.acquire(blocking=False):
+            g.metricas_perfil = cProfile.Profile()
+            g.metricas_perfil.enable()
+
+    @app.after_request
+    def encerrar_perfil(resposta):
+        perfil = g.pop('metricas_perfil', None)
+        if perfil is not None:
+            perfil.disable()
+            _lock_perfil.release()
+            resposta.headers['X-Perfil-Arquivo'] = _gravar_perfil(perfil, app.config['METRICAS_PERFIL_PASTA'])
+            registro.somar('perfis_total', rota=_rota())
+        elif _perfil_pedido(app.config):
+            resposta.headers['X-Perfil-Arquivo'] = 'ocupado'  # Outro perfil em andamento
+
+        # Streams terminam depois do after_request: as métricas são gravadas quando o servidor fecha a resposta
+        inicio, sql = g.metricas_inicio, g.metricas_sql
+        rota, metodo = _rota(), request.method
+
+        def gravar():
+            registro.somar('requisicoes_em_andamento', -1)
+            registrar(rota, metodo, resposta.status_code, time.perf_counter() - inicio,
+                      resposta.content_length, sql, limites_app, app.logger)
+
+        resposta.call_on_close(gravar)
+        return resposta
+
+    @app.teardown_request
+    def perfil_interrompido(_erro):
+        # Exceção antes do after_request: o perfil precisa ser desligado e o lock liberado
+        perfil = g.pop('metricas_perfil', None)
+        if perfil is not None:
+            perfil.disable()
+            _lock_perfil.release()
+
+
+def resposta_metricas():
+    return Response(current_app.extensions['metricas'].exportar(), content_type=TIPO_CONTEUDO)
+
+
+class MiddlewareASGI:
+    """Mesmas métricas para uma rota assíncrona do asgi.py (as rotas Flask já são medidas pelo app)."""
+
+    def __init__(self, app, rota, config, logger=None):
+        self.app = app
+        self.rota = rota
+        self.config = config
+        self.logger = logger
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.config.get('METRICAS_ATIVAS', True):
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        token, sql = iniciar_medicao()
+        estado = {'status': 500, 'tamanho': 0}
+        registro.somar('requisicoes_em_andamento', 1)
+
+        async def enviar(mensagem):
+            if mensagem['type'] == 'http.response.start':
+                estado['status'] = mensagem['status']
+            elif mensagem['type'] == 'http.response.body':
+                estado['tamanho'] += len(mensagem.get('body', b''))
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            finalizar_medicao(token)
+            registro.somar('requisicoes_em_andamento', -1)
+            registrar(self.rota, scope['method'], estado['status'], time.perf_counter() - inicio,
+                      estado['tamanho'], sql, limites(self.config), self.logger)
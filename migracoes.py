@@ -0,0 +1,75 @@
+'''Migrações do esquema do banco (Alembic).
+
+A aplicação não cria nem altera tabelas ao iniciar: o esquema é aplicado por
+um comando explícito, uma vez por implantação, antes de subir os workers:
+
+    flask --app app db atualizar          # aplica as migrações pendentes
+    flask --app app db revisao -m "..." --autogerar
+
+Os scripts ficam em migrations/versions. O `alembic` direto (com alembic.ini)
+também funciona e cria a aplicação por create_app().
+'''
+
+import os
+
+import click
+
+PASTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def configuracao(app):
+    from alembic.config import Config as ConfigAlembic  # Só nos comandos: os workers não carregam o Alembic
+
+    config = ConfigAlembic()
+    config.set_main_option('script_location', PASTA)
+    config.attributes['app'] = app  # env.py usa o engine desta aplicação
+    return config
+
+
+def atualizar(app, revisao='head'):
+    """Aplica as migrações até `revisao` no banco de `app`."""
+    from alembic import command
+
+    command.upgrade(configuracao(app), revisao)
+
+
+def _comando(nome):
+    from alembic import command
+
+    return getattr(command, nome)
+
+
+def registrar_cli(app):
+    @app.cli.group('db')
+    def db_cli():
+        """Migrações do esquema do banco."""
+
+    @db_cli.command('atualizar')
+    @click.argument('revisao', default='head')
+    def db_atualizar(revisao):
+        """Aplica as migrações pendentes (padrão: até a mais recente)."""
+        atualizar(app, revisao)
+        click.echo('Migrações aplicadas.')
+
+    @db_cli.command('reverter')
+    @click.argument('revisao', default='-1')
+    def db_reverter(revisao):
+        """Desfaz migrações (padrão: a última)."""
+        _comando('downgrade')(configuracao(app), revisao)
+
+    @db_cli.command('revisao')
+    @click.option('-m', '--mensagem', required=True, help='Descrição da migração.')
+    @click.option('--autogerar', is_flag=True, help='Compara models.py com o banco e preenche as operações.')
+    def db_revisao(mensagem, autogerar):
+        """Cria um script de migração em migrations/versions."""
+        _comando('revision')(configuracao(app), message=mensagem, autogenerate=autogerar)
+
+    @db_cli.command('atual')
+    def db_atual():
+        """Mostra a revisão aplicada no banco."""
+        _comando('current')(configuracao(app), verbose=True)
+
+    @db_cli.command('historico')
+    def db_historico():
+        """Lista as migrações existentes."""
+        _comando('history')(configuracao(app))
@@ -0,0 +1,55 @@
+'''Ambiente do Alembic: usa o engine da aplicação (mesmos PRAGMAs do SQLite) e os modelos de models.py.'''
+
+import logging.config
+
+from alembic import context
+
+from models import db
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get('app') is None:
+    logging.config.fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+
+def _aplicacao():
+    # `flask db ...` passa a aplicação; `alembic ...` direto cria uma a partir do ambiente
+    app = config.attributes.get('app')
+    if app is None:
+        from app import create_app
+        app = create_app()
+    return app
+
+
+def incluir_objeto(objeto, nome, tipo, refletido, comparado):
+    # Tabelas que só existem no banco (FTS5 e suas tabelas internas) não são modelos: o autogerar as ignora
+    return not (tipo == 'table' and refletido and comparado is None)
+
+
+def _configurar(**opcoes):
+    context.configure(
+        target_metadata=db.metadata,
+        include_object=incluir_objeto,
+        render_as_batch=True,  # ALTER TABLE do SQLite é limitado: alterações viram cópia da tabela
+        compare_type=True,
+        **opcoes
+    )
+
+
+def rodar_offline():
+    _configurar(url=_aplicacao().config['SQLALCHEMY_DATABASE_URI'], literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def rodar_online():
+    app = _aplicacao()
+    with app.app_context(), db.engine.connect() as conexao:
+        _configurar(connection=conexao)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    rodar_offline()
+else:
+    rodar_online()
@@ -0,0 +1,253 @@
+"""Esquema inicial: tabelas, índices, busca por texto e resumos de /estatisticas
+
+Até aqui o esquema era criado pela aplicação ao ser importada (create_all e
+ALTERs manuais). Esta migração é idempotente: cria só o que faltar, então
+vale tanto para um banco vazio quanto para um banco de versões anteriores,
+inclusive sem as colunas acrescentadas depois da criação das tabelas.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tabelas():
+    # Retrato dos modelos nesta revisão (não importa models.py, que continua mudando)
+    metadata = sa.MetaData()
+    sa.Table(
+        'usuarios', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('nome', sa.String(100), nullable=False),
+        sa.Column('email', sa.String(100), nullable=False, unique=True),
+        sa.Column('senha_hash', sa.String(255), nullable=False),
+        sa.Column('tipo', sa.String(50), nullable=False),
+        sa.Column('ativo', sa.Boolean, nullable=False, server_default=sa.true()),
+        sa.Column('tokens_revogados_em', sa.DateTime),
+    )
+    sa.Table(
+        'servidores', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('nome', sa.String(100), nullable=False),
+        sa.Column('cpf', sa.String(14), nullable=False, unique=True),
+        sa.Column('matricula', sa.String(50), nullable=False, unique=True),
+        sa.Column('codigo_orgao', sa.String(10), nullable=False),
+        sa.Column('ativo', sa.Boolean, nullable=False),
+        sa.Column('cargo', sa.String(100), nullable=False),
+        sa.Column('lotacao', sa.String(100), nullable=False),
+        sa.Index('ix_servidores_orgao_id', 'codigo_orgao', 'id'),
+        sa.Index('ix_servidores_orgao_ativo_lotacao_id', 'codigo_orgao', 'ativo', 'lotacao', 'id'),
+    )
+    sa.Table(
+        'documentos', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('cpf_servidor', sa.String(14), sa.ForeignKey('servidores.cpf'), nullable=False),
+        sa.Column('hora_cadastro', sa.DateTime, nullable=False),
+        sa.Column('tipo', sa.String(50), nullable=False),
+        sa.Column('caminho_arquivo', sa.String(255), nullable=False),
+        sa.Column('sha256', sa.String(64), index=True),
+        sa.Column('tamanho', sa.BigInteger),
+        sa.Column('status_processamento', sa.String(20)),
+        sa.Column('paginas', sa.Integer),
+        sa.Column('caminho_miniatura', sa.String(255)),
+        sa.Index('ix_documentos_cpf_id', 'cpf_servidor', 'id'),
+        sa.Index('ix_documentos_tipo_id', 'tipo', 'id'),
+        sa.Index('ix_documentos_hora_cadastro', 'hora_cadastro'),
+    )
+    sa.Table(
+        'documentos_texto', metadata,
+        sa.Column('documento_id', sa.Integer, sa.ForeignKey('documentos.id'), primary_key=True),
+        sa.Column('sha256', sa.String(64)),
+        sa.Column('texto', sa.Text, nullable=False),
+    )
+    sa.Table(
+        'tarefas', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('tipo', sa.String(50), nullable=False),
+        sa.Column('documento_id', sa.Integer, sa.ForeignKey('documentos.id'), nullable=False, index=True),
+        sa.Column('estado', sa.String(20), nullable=False),
+        sa.Column('tentativas', sa.Integer, nullable=False),
+        sa.Column('disponivel_em', sa.DateTime, nullable=False),
+        sa.Column('expira_em', sa.DateTime),
+        sa.Column('erro', sa.Text),
+        sa.Column('criada_em', sa.DateTime, nullable=False),
+        sa.Column('concluida_em', sa.DateTime),
+        sa.Index('ix_tarefas_estado_disponivel_em', 'estado', 'disponivel_em'),
+    )
+    sa.Table(
+        'blobs', metadata,
+        sa.Column('sha256', sa.String(64), primary_key=True),
+        sa.Column('caminho_arquivo', sa.String(255), nullable=False),
+        sa.Column('tamanho', sa.BigInteger, nullable=False),
+        sa.Column('referencias', sa.Integer, nullable=False),
+        sa.Column('criado_em', sa.DateTime, nullable=False),
+        sa.Column('camada', sa.String(20), nullable=False, server_default='quente'),
+        sa.Column('tamanho_armazenado', sa.BigInteger),
+        sa.Column('ultimo_acesso', sa.DateTime),
+    )
+    sa.Table(
+        'uploads_pendentes', metadata,
+        sa.Column('id', sa.String(32), primary_key=True),
+        sa.Column('cpf_servidor', sa.String(14), nullable=False),
+        sa.Column('tipo', sa.String(50), nullable=False),
+        sa.Column('caminho_arquivo', sa.String(255), nullable=False),
+        sa.Column('recebido', sa.BigInteger, nullable=False),
+        sa.Column('proxima_parte', sa.Integer, nullable=False),
+        sa.Column('criado_em', sa.DateTime, nullable=False),
+    )
+    sa.Table(
+        'resumo_servidores', metadata,
+        sa.Column('codigo_orgao', sa.String(10), primary_key=True),
+        sa.Column('lotacao', sa.String(100), primary_key=True),
+        sa.Column('cargo', sa.String(100), primary_key=True),
+        sa.Column('ativo', sa.Boolean, primary_key=True),
+        sa.Column('quantidade', sa.Integer, nullable=False),
+    )
+    sa.Table(
+        'resumo_documentos', metadata,
+        sa.Column('tipo', sa.String(50), primary_key=True),
+        sa.Column('dia', sa.Date, primary_key=True),
+        sa.Column('quantidade', sa.Integer, nullable=False),
+        sa.Column('bytes', sa.BigInteger, nullable=False),
+        sa.Index('ix_resumo_documentos_dia', 'dia'),
+    )
+    return metadata
+
+
+# Busca por nome (servidores) e no texto dos documentos; ver busca.py e busca_documentos.py
+DDL_SQLITE = {
+    'servidores_busca': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS servidores_busca USING fts5(
+            nome,
+            content='servidores',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS servidores_busca_ai AFTER INSERT ON servidores BEGIN
+            INSERT INTO servidores_busca(rowid, nome) VALUES (new.id, new.nome);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS servidores_busca_ad AFTER DELETE ON servidores BEGIN
+            INSERT INTO servidores_busca(servidores_busca, rowid, nome) VALUES ('delete', old.id, old.nome);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS servidores_busca_au AFTER UPDATE OF nome ON servidores BEGIN
+            INSERT INTO servidores_busca(servidores_busca, rowid, nome) VALUES ('delete', old.id, old.nome);
+            INSERT INTO servidores_busca(rowid, nome) VALUES (new.id, new.nome);
+        END""",
+    ],
+    'documentos_busca': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS documentos_busca USING fts5(
+            texto,
+            content='documentos_texto',
+            content_rowid='documento_id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS documentos_busca_ai AFTER INSERT ON documentos_texto BEGIN
+            INSERT INTO documentos_busca(rowid, texto) VALUES (new.documento_id, new.texto);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS documentos_busca_ad AFTER DELETE ON documentos_texto BEGIN
+            INSERT INTO documentos_busca(documentos_busca, rowid, texto) VALUES ('delete', old.documento_id, old.texto);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS documentos_busca_au AFTER UPDATE OF texto ON documentos_texto BEGIN
+            INSERT INTO documentos_busca(documentos_busca, rowid, texto) VALUES ('delete', old.documento_id, old.texto);
+            INSERT INTO documentos_busca(rowid, texto) VALUES (new.documento_id, new.texto);
+        END""",
+    ],
+}
+
+DDL_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() não é IMMUTABLE; o wrapper permite usá-lo em índice de expressão
+    """CREATE OR REPLACE FUNCTION nome_normalizado(text) RETURNS text AS
+        $$ SELECT lower(public.unaccent('public.unaccent', $1)) $$
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT""",
+    """CREATE INDEX IF NOT EXISTS ix_servidores_nome_trgm
+        ON servidores USING gin (nome_normalizado(nome) gin_trgm_ops)""",
+    """CREATE INDEX IF NOT EXISTS ix_documentos_texto_tsv
+        ON documentos_texto USING gin (to_tsvector('simple', nome_normalizado(texto)))""",
+]
+
+
+def _coluna_nova(coluna):
+    # Coluna avulsa para o ALTER TABLE, com os mesmos atributos do retrato (a do retrato já pertence à tabela)
+    padrao = coluna.server_default.arg if coluna.server_default is not None else None
+    return sa.Column(coluna.name, coluna.type, nullable=coluna.nullable, server_default=padrao)
+
+
+def _criar_tabelas(conexao):
+    """Cria tabelas, colunas e índices ausentes. Devolve os nomes das tabelas criadas agora."""
+    inspetor = sa.inspect(conexao)
+    existentes = set(inspetor.get_table_names())
+    criadas = []
+    for tabela in _tabelas().sorted_tables:
+        if tabela.name not in existentes:
+            tabela.create(conexao)
+            criadas.append(tabela.name)
+            continue
+        colunas = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name not in colunas:
+                op.add_column(tabela.name, _coluna_nova(coluna))
+        indices = {indice['name'] for indice in inspetor.get_indexes(tabela.name)}
+        for indice in tabela.indexes:
+            if indice.name not in indices:
+                indice.create(conexao)
+    return criadas
+
+
+def _criar_busca(conexao):
+    if conexao.dialect.name == 'sqlite':
+        for tabela, comandos in DDL_SQLITE.items():
+            existia = conexao.execute(
+                sa.text("SELECT 1 FROM sqlite_master WHERE name = :nome"), {'nome': tabela}
+            ).first()
+            for comando in comandos:
+                conexao.execute(sa.text(comando))
+            if not existia:
+                # Conteúdo externo: indexa as linhas que já existem
+                conexao.execute(sa.text(f"INSERT INTO {tabela}({tabela}) VALUES ('rebuild')"))
+    elif conexao.dialect.name == 'postgresql':
+        for comando in DDL_POSTGRES:
+            conexao.execute(sa.text(comando))
+
+
+def _popular_resumos(conexao, criadas):
+    # Bancos anteriores aos resumos já têm servidores e documentos: as contagens partem deles
+    if 'resumo_servidores' in criadas:
+        conexao.execute(sa.text(
+            "INSERT INTO resumo_servidores (codigo_orgao, lotacao, cargo, ativo, quantidade) "
+            "SELECT codigo_orgao, lotacao, cargo, ativo, count(*) FROM servidores "
+            "GROUP BY codigo_orgao, lotacao, cargo, ativo"
+        ))
+    if 'resumo_documentos' in criadas:
+        dia = 'date(hora_cadastro)' if conexao.dialect.name == 'sqlite' else 'CAST(hora_cadastro AS DATE)'
+        conexao.execute(sa.text(
+            "INSERT INTO resumo_documentos (tipo, dia, quantidade, bytes) "
+            f"SELECT tipo, {dia}, count(*), coalesce(sum(tamanho), 0) FROM documentos GROUP BY tipo, {dia}"
+        ))
+
+
+def upgrade():
+    conexao = op.get_bind()
+    criadas = _criar_tabelas(conexao)
+    _criar_busca(conexao)
+    _popular_resumos(conexao, criadas)
+
+
+def downgrade():
+    conexao = op.get_bind()
+    if conexao.dialect.name == 'sqlite':
+        for tabela in DDL_SQLITE:
+            conexao.execute(sa.text(f'DROP TABLE IF EXISTS {tabela}'))  # Os triggers saem junto com as tabelas
+    elif conexao.dialect.name == 'postgresql':
+        conexao.execute(sa.text('DROP INDEX IF EXISTS ix_documentos_texto_tsv'))
+        conexao.execute(sa.text('DROP INDEX IF EXISTS ix_servidores_nome_trgm'))
+    _tabelas().drop_all(conexao, checkfirst=True)
@@ -0,0 +1,113 @@
+"""Registro de mudanças de servidores e documentos (/mudancas)
+
+Acrescenta atualizado_em às duas tabelas, cria o registro (mudancas) e o
+histórico da retenção (mudancas_limpezas), e os triggers que gravam uma linha
+no registro a cada INSERT, UPDATE e DELETE, na mesma transação da escrita.
+Triggers valem para todos os caminhos de gravação (rotas, carga em lote,
+trabalhadores de tarefas, ASGI) sem que cada um precise lembrar do registro.
+
+As colunas novas entram com ADD COLUMN, sem recriar as tabelas: a recriação
+(modo batch do SQLite) apagaria os triggers da busca em servidores.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+ENTIDADES = {'servidores': 'servidor', 'documentos': 'documento'}
+OPERACOES = {'INSERT': ('insercao', 'new'), 'UPDATE': ('atualizacao', 'new'), 'DELETE': ('remocao', 'old')}
+
+
+def _triggers_sqlite():
+    for tabela, entidade in ENTIDADES.items():
+        for evento, (operacao, linha) in OPERACOES.items():
+            yield f"""CREATE TRIGGER IF NOT EXISTS {tabela}_mudancas_{operacao} AFTER {evento} ON {tabela} BEGIN
+                INSERT INTO mudancas (entidade, entidade_id, operacao, registrado_em)
+                VALUES ('{entidade}', {linha}.id, '{operacao}', strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'));
+            END"""
+
+
+DDL_POSTGRES = [
+    # TG_ARGV[0] = nome da entidade no registro
+    """CREATE OR REPLACE FUNCTION registrar_mudanca() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO mudancas (entidade, entidade_id, operacao, registrado_em)
+            VALUES (TG_ARGV[0], OLD.id, 'remocao', localtimestamp);
+            RETURN OLD;
+        END IF;
+        INSERT INTO mudancas (entidade, entidade_id, operacao, registrado_em)
+        VALUES (TG_ARGV[0], NEW.id, CASE TG_OP WHEN 'INSERT' THEN 'insercao' ELSE 'atualizacao' END, localtimestamp);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+]
+for _tabela, _entidade in ENTIDADES.items():
+    DDL_POSTGRES += [
+        f"DROP TRIGGER IF EXISTS {_tabela}_mudancas ON {_tabela}",
+        f"""CREATE TRIGGER {_tabela}_mudancas AFTER INSERT OR UPDATE OR DELETE ON {_tabela}
+            FOR EACH ROW EXECUTE FUNCTION registrar_mudanca('{_entidade}')""",
+    ]
+
+
+def upgrade():
+    conexao = op.get_bind()
+    for tabela in ENTIDADES:
+        op.add_column(tabela, sa.Column('atualizado_em', sa.DateTime))
+
+    # Antes dos triggers: o preenchimento não deve virar uma mudança por linha
+    op.execute(sa.text('UPDATE servidores SET atualizado_em = :agora').bindparams(agora=datetime.now()))
+    op.execute('UPDATE documentos SET atualizado_em = hora_cadastro')
+
+    op.create_table(
+        'mudancas',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('entidade', sa.String(20), nullable=False),
+        sa.Column('entidade_id', sa.Integer, nullable=False),
+        sa.Column('operacao', sa.String(20), nullable=False),
+        sa.Column('registrado_em', sa.DateTime, nullable=False),
+        sqlite_autoincrement=True,
+    )
+    op.create_index('ix_mudancas_entidade_entidade_id', 'mudancas', ['entidade', 'entidade_id'])
+    op.create_table(
+        'mudancas_limpezas',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('removidas_ate', sa.Integer, nullable=False),
+        sa.Column('executada_em', sa.DateTime, nullable=False),
+    )
+
+    if conexao.dialect.name == 'sqlite':
+        for comando in _triggers_sqlite():
+            op.execute(comando)
+    elif conexao.dialect.name == 'postgresql':
+        for comando in DDL_POSTGRES:
+            op.execute(comando)
+
+
+def downgrade():
+    conexao = op.get_bind()
+    if conexao.dialect.name == 'sqlite':
+        for tabela in ENTIDADES:
+            for operacao, _ in OPERACOES.values():
+                op.execute(f'DROP TRIGGER IF EXISTS {tabela}_mudancas_{operacao}')
+    elif conexao.dialect.name == 'postgresql':
+        for tabela in ENTIDADES:
+            op.execute(f'DROP TRIGGER IF EXISTS {tabela}_mudancas ON {tabela}')
+        op.execute('DROP FUNCTION IF EXISTS registrar_mudanca()')
+
+    op.drop_table('mudancas_limpezas')
+    op.drop_index('ix_mudancas_entidade_entidade_id', table_name='mudancas')
+    op.drop_table('mudancas')
+    for tabela in ENTIDADES:
+        # ALTER TABLE ... DROP COLUMN direto (SQLite >= 3.35), sem recriar a tabela
+        op.execute(f'ALTER TABLE {tabela} DROP COLUMN atualizado_em')
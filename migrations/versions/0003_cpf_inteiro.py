@@ -0,0 +1,110 @@
+"""CPF como inteiro em servidores, documentos e uploads_pendentes
+
+servidores.cpf, documentos.cpf_servidor e uploads_pendentes.cpf_servidor
+deixam de ser texto formatado ("XXX.XXX.XXX-XX", 14 caracteres) e passam a
+BIGINT com os 11 dígitos (models.CPF). Valores que não tenham 11 dígitos
+depois de tirar a pontuação interrompem a migração: precisam de correção
+manual antes. Os dígitos verificadores não são conferidos aqui, só na API.
+
+No SQLite a troca de tipo recria as tabelas (modo batch), e os triggers de
+servidores e documentos (busca por nome e registro de mudanças) somem com a
+tabela antiga: são removidos antes e recriados depois a partir do próprio
+sqlite_master. A conversão não passa por eles, então não gera entradas em
+/mudancas nem reindexa os nomes.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+COLUNAS = {'servidores': 'cpf', 'documentos': 'cpf_servidor', 'uploads_pendentes': 'cpf_servidor'}
+
+
+def _digitos(coluna):
+    return f"replace(replace(replace({coluna}, '.', ''), '-', ''), ' ', '')"
+
+
+def _formatado(coluna, dialeto):
+    digitos = f"printf('%011d', {coluna})" if dialeto == 'sqlite' else f"lpad({coluna}::text, 11, '0')"
+    return (
+        f"substr({digitos}, 1, 3) || '.' || substr({digitos}, 4, 3) || '.' || "
+        f"substr({digitos}, 7, 3) || '-' || substr({digitos}, 10, 2)"
+    )
+
+
+def _verificar(conexao):
+    for tabela, coluna in COLUNAS.items():
+        digitos = _digitos(coluna)
+        if conexao.dialect.name == 'sqlite':
+            invalido = f"length({digitos}) != 11 OR {digitos} GLOB '*[^0-9]*'"
+        else:
+            invalido = f"{digitos} !~ '^[0-9]{{11}}$'"
+        exemplos = conexao.execute(
+            sa.text(f'SELECT DISTINCT {coluna} FROM {tabela} WHERE {invalido} LIMIT 5')
+        ).scalars().all()
+        if exemplos:
+            raise RuntimeError(
+                f'{tabela}.{coluna} tem valores que não são CPFs de 11 dígitos (ex.: {exemplos}); corrija antes de migrar.'
+            )
+
+
+def _remover_triggers(conexao):
+    """Remove os triggers de servidores e documentos e devolve o SQL para recriá-los."""
+    triggers = conexao.execute(sa.text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ('servidores', 'documentos')"
+    )).all()
+    for nome, _ in triggers:
+        op.execute(f'DROP TRIGGER {nome}')
+    return [sql for _, sql in triggers]
+
+
+def _chave_estrangeira(conexao):
+    for chave in sa.inspect(conexao).get_foreign_keys('documentos'):
+        if chave['referred_table'] == 'servidores':
+            return chave['name']
+    return None
+
+
+def _trocar_tipo(conexao, de, para, expressao):
+    """Troca o tipo das colunas de CPF; `expressao(coluna)` converte o valor atual."""
+    if conexao.dialect.name == 'sqlite':
+        triggers = _remover_triggers(conexao)
+        for tabela, coluna in COLUNAS.items():
+            op.execute(f'UPDATE {tabela} SET {coluna} = {expressao(coluna)}')
+            # A cópia da tabela faz CAST para o tipo novo
+            with op.batch_alter_table(tabela, recreate='always') as batch:
+                batch.alter_column(coluna, existing_type=de, type_=para, existing_nullable=False)
+        for sql in triggers:
+            op.execute(sql)
+    else:
+        # Coluna referenciada não muda de tipo com a chave estrangeira no lugar
+        chave = _chave_estrangeira(conexao)
+        if chave:
+            op.drop_constraint(chave, 'documentos', type_='foreignkey')
+        for tabela, coluna in COLUNAS.items():
+            op.alter_column(
+                tabela, coluna, existing_type=de, type_=para, existing_nullable=False,
+                postgresql_using=f'({expressao(coluna)})::{para.compile(dialect=conexao.dialect)}'
+            )
+        if chave:
+            op.create_foreign_key(chave, 'documentos', 'servidores', ['cpf_servidor'], ['cpf'])
+
+
+def upgrade():
+    conexao = op.get_bind()
+    _verificar(conexao)
+    _trocar_tipo(conexao, sa.String(14), sa.BigInteger(), _digitos)
+
+
+def downgrade():
+    conexao = op.get_bind()
+    dialeto = conexao.dialect.name
+    _trocar_tipo(conexao, sa.BigInteger(), sa.String(14), lambda coluna: _formatado(coluna, dialeto))
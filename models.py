@@ -1,8 +1,26 @@
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+class CPF(db.TypeDecorator):
+    """
+    CPF gravado como inteiro de 64 bits (os 11 dígitos, sem pontuação): índices e
+    junções comparam inteiros em vez de texto de 14 caracteres. A entrada é
+    convertida por parametros.ler_cpf e o texto "XXX.XXX.XXX-XX" só é montado na
+    serialização (serializacao.formatar_cpf).
+    """
+    impl = db.BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, valor, dialeto):
+        # Texto aqui é um CPF que não passou por ler_cpf; gravá-lo ou compará-lo daria resultado errado
+        if valor is not None and not isinstance(valor, int):
+            raise TypeError(f'CPF deve ser inteiro (use parametros.ler_cpf): {valor!r}')
+        return valor
+
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
     
@@ -11,6 +29,8 @@ class Usuario(db.Model):
     email = db.Column(db.String(100), unique=True, nullable=False)
     senha_hash = db.Column(db.String(255), nullable=False)
     tipo = db.Column(db.String(50), nullable=False)  # Valores possíveis: 'gestor' ou 'comum'
+    ativo = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())  # Inativo não faz login
+    tokens_revogados_em = db.Column(db.DateTime)  # Tokens emitidos até este instante não são mais aceitos
 
     def set_senha(self, senha):
         """Define o hash da senha."""
@@ -25,12 +45,20 @@ class Servidor(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
-    cpf = db.Column(db.String(14), unique=True, nullable=False)  # CPF formatado como "XXX.XXX.XXX-XX"
+    cpf = db.Column(CPF, unique=True, nullable=False)  # Os 11 dígitos; formatado só nas respostas
     matricula = db.Column(db.String(50), unique=True, nullable=False)
     codigo_orgao = db.Column(db.String(10), nullable=False)
     ativo = db.Column(db.Boolean, nullable=False, default=True)  # True = Ativo, False = Inativo
     cargo = db.Column(db.String(100), nullable=False)
     lotacao = db.Column(db.String(100), nullable=False)
+    atualizado_em = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)  # Última gravação (cadastro ou alteração)
+
+    # Índices compostos terminando em id: a paginação por cursor (id > ultimo_id)
+    # vira uma varredura de intervalo no índice, sem ordenar a tabela inteira
+    __table_args__ = (
+        db.Index('ix_servidores_orgao_id', 'codigo_orgao', 'id'),
+        db.Index('ix_servidores_orgao_ativo_lotacao_id', 'codigo_orgao', 'ativo', 'lotacao', 'id'),
+    )
 
     # Relacionamento com documentos (um servidor pode ter vários documentos)
     documentos = db.relationship('Documento', backref='servidor', lazy=True)
@@ -39,7 +67,119 @@ class Documento(db.Model):
     __tablename__ = 'documentos'
 
     id = db.Column(db.Integer, primary_key=True)  # ID único do documento
-    cpf_servidor = db.Column(db.String(14), db.ForeignKey('servidores.cpf'), nullable=False)
+    cpf_servidor = db.Column(CPF, db.ForeignKey('servidores.cpf'), nullable=False)
     hora_cadastro = db.Column(db.DateTime, nullable=False)  # Hora em que o documento foi cadastrado
     tipo = db.Column(db.String(50), nullable=False)  # Tipo do documento (exemplo: "RG", "Certidão")
-    caminho_arquivo = db.Column(db.String(255), nullable=False)  # Caminho para o arquivo armazenado no servidor
\ No newline at end of file
+    caminho_arquivo = db.Column(db.String(255), nullable=False)  # Caminho para o arquivo armazenado no servidor
+    sha256 = db.Column(db.String(64), index=True)  # Hash SHA-256 do conteúdo; aponta para o Blob
+    tamanho = db.Column(db.BigInteger)  # Tamanho do arquivo em bytes
+    # Processamento em segundo plano (ver tarefas.py): 'pendente', 'processando', 'concluido', 'invalido' ou 'falhou'
+    status_processamento = db.Column(db.String(20), default='pendente')
+    paginas = db.Column(db.Integer)  # Número de páginas do PDF
+    caminho_miniatura = db.Column(db.String(255))  # PNG da primeira página
+    atualizado_em = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)  # Última gravação (cadastro ou alteração)
+
+    # Consultas por CPF e por tipo paginam por id; o filtro por período usa hora_cadastro
+    __table_args__ = (
+        db.Index('ix_documentos_cpf_id', 'cpf_servidor', 'id'),
+        db.Index('ix_documentos_tipo_id', 'tipo', 'id'),
+        db.Index('ix_documentos_hora_cadastro', 'hora_cadastro'),
+    )
+
+class TextoDocumento(db.Model):
+    __tablename__ = 'documentos_texto'
+
+    # Texto extraído do PDF, fora de documentos para não pesar nas listagens
+    documento_id = db.Column(db.Integer, db.ForeignKey('documentos.id'), primary_key=True)
+    sha256 = db.Column(db.String(64))  # Conteúdo de onde o texto saiu; se o documento mudar, é reextraído
+    texto = db.Column(db.Text, nullable=False)
+
+class Tarefa(db.Model):
+    __tablename__ = 'tarefas'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)  # Ex.: 'processar_documento'
+    documento_id = db.Column(db.Integer, db.ForeignKey('documentos.id'), nullable=False, index=True)
+    estado = db.Column(db.String(20), nullable=False, default='pendente')  # 'pendente', 'executando', 'concluida' ou 'falhou'
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    disponivel_em = db.Column(db.DateTime, nullable=False)  # Próxima tentativa (backoff)
+    expira_em = db.Column(db.DateTime)  # Fim da reserva de um trabalhador; depois disso a tarefa volta para a fila
+    erro = db.Column(db.Text)  # Último erro
+    criada_em = db.Column(db.DateTime, nullable=False)
+    concluida_em = db.Column(db.DateTime)
+
+    # Os trabalhadores buscam a próxima tarefa por estado e horário
+    __table_args__ = (
+        db.Index('ix_tarefas_estado_disponivel_em', 'estado', 'disponivel_em'),
+    )
+
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)  # Endereço do conteúdo
+    caminho_arquivo = db.Column(db.String(255), nullable=False)
+    tamanho = db.Column(db.BigInteger, nullable=False)
+    referencias = db.Column(db.Integer, nullable=False, default=0)  # Quantos documentos apontam para este arquivo
+    criado_em = db.Column(db.DateTime, nullable=False)
+    camada = db.Column(db.String(20), nullable=False, default='quente', server_default='quente')  # 'quente' ou 'arquivo' (ver camadas.py)
+    tamanho_armazenado = db.Column(db.BigInteger)  # Bytes em disco (menor que tamanho se comprimido)
+    ultimo_acesso = db.Column(db.DateTime)  # Último download (atualizado no máximo uma vez por hora)
+
+class UploadPendente(db.Model):
+    __tablename__ = 'uploads_pendentes'
+
+    id = db.Column(db.String(32), primary_key=True)  # Identificador devolvido ao cliente
+    cpf_servidor = db.Column(CPF, nullable=False)
+    tipo = db.Column(db.String(50), nullable=False)
+    caminho_arquivo = db.Column(db.String(255), nullable=False)  # Arquivo parcial dentro do armazenamento
+    recebido = db.Column(db.BigInteger, nullable=False, default=0)  # Bytes já gravados
+    proxima_parte = db.Column(db.Integer, nullable=False, default=0)  # Número da próxima parte esperada
+    criado_em = db.Column(db.DateTime, nullable=False)
+
+class ResumoServidores(db.Model):
+    __tablename__ = 'resumo_servidores'
+
+    # Contagem de servidores por grupo, atualizada junto com cada cadastro (ver estatisticas.py)
+    codigo_orgao = db.Column(db.String(10), primary_key=True)
+    lotacao = db.Column(db.String(100), primary_key=True)
+    cargo = db.Column(db.String(100), primary_key=True)
+    ativo = db.Column(db.Boolean, primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+class ResumoDocumentos(db.Model):
+    __tablename__ = 'resumo_documentos'
+
+    # Documentos e bytes enviados por tipo e dia (data de hora_cadastro)
+    tipo = db.Column(db.String(50), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_resumo_documentos_dia', 'dia'),
+    )
+
+class Mudanca(db.Model):
+    __tablename__ = 'mudancas'
+
+    # Registro só de inclusão das gravações em servidores e documentos, preenchido
+    # por triggers na mesma transação (ver mudancas.py e a migração 0002)
+    id = db.Column(db.Integer, primary_key=True)  # Ordem das mudanças; é a chave do cursor de /mudancas
+    entidade = db.Column(db.String(20), nullable=False)  # 'servidor' ou 'documento'
+    entidade_id = db.Column(db.Integer, nullable=False)
+    operacao = db.Column(db.String(20), nullable=False)  # 'insercao', 'atualizacao' ou 'remocao'
+    registrado_em = db.Column(db.DateTime, nullable=False)
+
+    # AUTOINCREMENT no SQLite: ids nunca são reaproveitados depois da limpeza, senão cursores pulariam mudanças
+    __table_args__ = (
+        db.Index('ix_mudancas_entidade_entidade_id', 'entidade', 'entidade_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+class LimpezaMudancas(db.Model):
+    __tablename__ = 'mudancas_limpezas'
+
+    # Cada execução da retenção; cursores até removidas_ate não podem mais ser retomados
+    id = db.Column(db.Integer, primary_key=True)
+    removidas_ate = db.Column(db.Integer, nullable=False)  # Maior id de mudança removido
+    executada_em = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,161 @@
+'''Registro de mudanças de servidores e documentos, lido por /mudancas.
+
+Sistemas que mantêm uma cópia dos dados (RH, folha) faziam a carga completa a
+cada ciclo. Com o registro, fazem a carga uma vez e depois pedem só o que mudou
+desde o último cursor: o custo acompanha o volume de alterações, não o tamanho
+das tabelas.
+
+Cada INSERT, UPDATE e DELETE em servidores e documentos acrescenta uma linha
+em mudancas, gravada por trigger na mesma transação da escrita (migração
+0002); se a escrita é desfeita, o registro também é. O cursor é o id da última
+mudança entregue. Cada página traz o estado atual das linhas, não o de cada
+mudança: várias alterações da mesma linha na página viram uma só, e uma linha
+que já não existe sai como 'remocao'.
+
+Manutenção (`flask mudancas limpar`, agendada como `armazenamento gc`):
+- compactação: apaga registros superados por outro mais novo da mesma linha.
+  Quem retoma de qualquer cursor continua vendo o estado final; não há perda.
+- retenção: apaga registros com mais de MUDANCAS_RETENCAO_DIAS. Cursores
+  anteriores ao que foi apagado recebem 410 e o cliente refaz a carga completa.
+
+No PostgreSQL, ids são reservados antes do commit: uma transação longa pode
+tornar visível um id menor que outro já entregue. MUDANCAS_ATRASO (segundos)
+retém nas páginas as mudanças mais recentes que isso. No SQLite as escritas
+são serializadas e o atraso pode ficar em 0.
+'''
+
+from datetime import datetime, timedelta
+
+from models import db, Documento, LimpezaMudancas, Mudanca, Servidor
+import serializacao
+
+LIMITE_PADRAO = 500
+LIMITE_MAXIMO = 5000
+BLOCO = 500  # ids por IN (...) ao buscar o estado atual
+
+# Colunas devolvidas em 'dados', por entidade
+COLUNAS = {
+    'servidor': (
+        Servidor.id, Servidor.nome, Servidor.cpf, Servidor.matricula, Servidor.codigo_orgao,
+        Servidor.ativo, Servidor.cargo, Servidor.lotacao, Servidor.atualizado_em,
+    ),
+    'documento': (
+        Documento.id, Documento.cpf_servidor, Documento.hora_cadastro, Documento.tipo, Documento.sha256,
+        Documento.tamanho, Documento.status_processamento, Documento.paginas, Documento.atualizado_em,
+    ),
+}
+ENTIDADES = tuple(COLUNAS)
+
+
+class CursorExpirado(Exception):
+    """O cursor é anterior a mudanças já removidas pela retenção."""
+
+
+def ultimo_id():
+    """Id da mudança mais recente (0 se o registro estiver vazio): ponto de partida depois de uma carga completa."""
+    # Com o registro todo expirado, o horizonte guarda a posição
+    return max(db.session.scalar(db.select(db.func.max(Mudanca.id))) or 0, horizonte())
+
+
+def horizonte():
+    """Maior id de mudança removido pela retenção; cursores menores que isso expiraram."""
+    return db.session.scalar(db.select(db.func.max(LimpezaMudancas.removidas_ate))) or 0
+
+
+def _estados(entidade, ids):
+    """Linhas atuais da entidade, por id, já prontas para JSON."""
+    colunas = COLUNAS[entidade]
+    chave = colunas[0]
+    estados = {}
+    for inicio in range(0, len(ids), BLOCO):
+        query = db.select(*colunas).where(chave.in_(ids[inicio:inicio + BLOCO]))
+        serializador = serializacao.SerializadorLinhas.da_consulta(query)
+        for linha in db.session.execute(query):
+            estados[linha.id] = serializador.dicionario(linha)
+    return estados
+
+
+def listar(desde, limite=LIMITE_PADRAO, entidade=None, atraso=0):
+    """
+    Mudanças com id maior que `desde`, em ordem. Retorna (mudancas, ultimo_id_lido, tem_mais);
+    o próximo cursor é ultimo_id_lido, mesmo que a página filtrada por entidade venha vazia.
+    Lança CursorExpirado se a retenção já apagou mudanças depois de `desde`.
+    """
+    if desde < horizonte():
+        raise CursorExpirado('Cursor expirado: as mudanças seguintes já foram removidas pela retenção.')
+
+    query = (
+        db.select(Mudanca.id, Mudanca.entidade, Mudanca.entidade_id, Mudanca.operacao, Mudanca.registrado_em)
+        .where(Mudanca.id > desde)
+    )
+    if entidade:
+        query = query.where(Mudanca.entidade == entidade)
+    if atraso:
+        query = query.where(Mudanca.registrado_em <= datetime.now() - timedelta(seconds=atraso))
+    linhas = db.session.execute(query.order_by(Mudanca.id).limit(limite + 1)).all()
+    tem_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    if not linhas:
+        return [], desde, False
+
+    # O estado é o atual: de várias mudanças da mesma linha na página, vale a última
+    ultimas = {}
+    for linha in linhas:
+        ultimas[(linha.entidade, linha.entidade_id)] = linha
+    ids = {}
+    for nome, entidade_id in ultimas:
+        ids.setdefault(nome, []).append(entidade_id)
+    estados = {nome: _estados(nome, ids_entidade) for nome, ids_entidade in ids.items() if nome in COLUNAS}
+
+    mudancas = []
+    for linha in sorted(ultimas.values(), key=lambda linha: linha.id):
+        dados = estados.get(linha.entidade, {}).get(linha.entidade_id)
+        mudancas.append({
+            'entidade': linha.entidade,
+            'id': linha.entidade_id,
+            # Inserida ou alterada e depois removida: a remoção também está no registro, mais adiante
+            'operacao': linha.operacao if dados is not None else 'remocao',
+            'registrado_em': serializacao.data_http(linha.registrado_em),
+            'dados': dados,
+        })
+    return mudancas, linhas[-1].id, tem_mais
+
+
+def compactar():
+    """Apaga registros superados por um mais novo da mesma linha. Retorna quantos foram apagados."""
+    ultimas = db.select(db.func.max(Mudanca.id)).group_by(Mudanca.entidade, Mudanca.entidade_id)
+    return db.session.execute(db.delete(Mudanca).where(Mudanca.id.not_in(ultimas))).rowcount
+
+
+def expirar(dias):
+    """Apaga os registros com mais de `dias` e guarda até onde apagou. Retorna quantos foram apagados."""
+    limite = datetime.now() - timedelta(days=dias)
+    ultimo = db.session.scalar(db.select(db.func.max(Mudanca.id)).where(Mudanca.registrado_em < limite))
+    if ultimo is None:
+        return 0
+    removidas = db.session.execute(db.delete(Mudanca).where(Mudanca.id <= ultimo)).rowcount
+    db.session.add(LimpezaMudancas(removidas_ate=ultimo, executada_em=datetime.now()))
+    return removidas
+
+
+def limpar(dias, compactando=True):
+    """Compactação e retenção numa transação só."""
+    resumo = {
+        'compactadas': compactar() if compactando else 0,
+        'expiradas': expirar(dias),
+    }
+    db.session.commit()
+    resumo.update(estatisticas())
+    return resumo
+
+
+def estatisticas():
+    registros, mais_antigo = db.session.execute(
+        db.select(db.func.count(), db.func.min(Mudanca.registrado_em))
+    ).one()
+    return {
+        'registros': registros,
+        'mais_antigo': mais_antigo.isoformat() if mais_antigo else None,
+        'ultimo_id': ultimo_id(),
+        'horizonte': horizonte(),
+    }
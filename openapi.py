@@ -0,0 +1,125 @@
+'''Especificação OpenAPI gerada uma vez e servida como arquivo estático.
+
+O flasgger monta a especificação relendo o YAML da docstring de cada rota. Isso
+passa a acontecer só em `flask openapi gerar`, que grava openapi.json (versionado
+junto com o código); os workers não importam o flasgger e servem o arquivo com
+ETag e Cache-Control. /apidocs/ usa os arquivos do Swagger UI que vêm com o
+pacote flasgger.
+
+Depois de alterar a docstring de uma rota, rode `flask openapi gerar`;
+`flask openapi gerar --verificar` falha se o arquivo estiver desatualizado (CI).
+'''
+
+import importlib.util
+import json
+import os
+
+import click
+from flask import Blueprint, Flask, current_app, jsonify, send_file, url_for
+
+ARQUIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openapi.json')
+CACHE_SEGUNDOS = 3600
+
+# Token de acesso no cabeçalho Authorization em todas as rotas da documentação
+TEMPLATE = {
+    'securityDefinitions': {
+        'Bearer': {'type': 'apiKey', 'name': 'Authorization', 'in': 'header', 'description': 'Bearer <token>'}
+    },
+    'security': [{'Bearer': []}],
+}
+
+PAGINA = '''<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+  <meta charset="utf-8">
+  <title>Documentação da API</title>
+  <link rel="stylesheet" href="{css}">
+</head>
+<body>
+  <div id="swagger-ui"></div>
+  <script src="{bundle}"></script>
+  <script src="{preset}"></script>
+  <script>
+    window.onload = function () {{
+      SwaggerUIBundle({{
+        url: '{especificacao}',
+        dom_id: '#swagger-ui',
+        deepLinking: true,
+        presets: [SwaggerUIBundle.presets.apis, SwaggerUIStandalonePreset],
+        layout: 'StandaloneLayout'
+      }});
+    }};
+  </script>
+</body>
+</html>
+'''
+
+
+def _estaticos_swagger_ui():
+    # Localiza o pacote sem importá-lo (o import do flasgger carrega jsonschema, yaml, mistune...)
+    spec = importlib.util.find_spec('flasgger')
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return os.path.join(spec.submodule_search_locations[0], 'ui3', 'static')
+
+
+bp = Blueprint('openapi', __name__, static_folder=_estaticos_swagger_ui(), static_url_path='/flasgger_static')
+
+
+def gerar(app):
+    """Monta a especificação a partir das docstrings das rotas de `app`."""
+    from flasgger import Swagger
+
+    # Aplicação só com as rotas da API: o flasgger registra as dele e lê as docstrings, sem extensões nem banco
+    documentada = Flask(app.import_name)
+    swagger = Swagger(documentada, template=TEMPLATE)
+    for nome, blueprint in app.blueprints.items():
+        if nome != bp.name:
+            documentada.register_blueprint(blueprint)
+    with documentada.test_request_context():
+        return swagger.get_apispecs()
+
+
+def serializar(especificacao):
+    # Ordenado e indentado: o diff do arquivo versionado mostra só o que mudou
+    return json.dumps(especificacao, indent=2, sort_keys=True, ensure_ascii=False) + '\n'
+
+
+@bp.route('/apispec_1.json', methods=['GET'])
+def especificacao():
+    if not os.path.exists(ARQUIVO):
+        return jsonify({'erro': 'Especificação não gerada. Use `flask openapi gerar`.'}), 404
+    return send_file(ARQUIVO, mimetype='application/json', max_age=CACHE_SEGUNDOS, conditional=True, etag=True)
+
+
+@bp.route('/apidocs/', methods=['GET'])
+def documentacao():
+    if bp.static_folder is None:
+        return jsonify({'erro': 'Swagger UI indisponível (pacote flasgger não instalado).'}), 404
+    pagina = PAGINA.format(
+        css=url_for('openapi.static', filename='swagger-ui.css'),
+        bundle=url_for('openapi.static', filename='swagger-ui-bundle.js'),
+        preset=url_for('openapi.static', filename='swagger-ui-standalone-preset.js'),
+        especificacao=url_for('openapi.especificacao'),
+    )
+    return pagina, 200, {'Content-Type': 'text/html; charset=utf-8', 'Cache-Control': f'public, max-age={CACHE_SEGUNDOS}'}
+
+
+@bp.cli.command('gerar')
+@click.option('--verificar', is_flag=True, help='Não grava; termina com erro se openapi.json estiver desatualizado.')
+def gerar_cli(verificar):
+    """Gera openapi.json a partir das docstrings das rotas."""
+    conteudo = serializar(gerar(current_app))
+    atual = None
+    if os.path.exists(ARQUIVO):
+        with open(ARQUIVO, encoding='utf-8') as arquivo:
+            atual = arquivo.read()
+    if verificar:
+        if atual != conteudo:
+            raise click.ClickException('openapi.json desatualizado. Rode `flask openapi gerar`.')
+        click.echo('openapi.json atualizado.')
+        return
+    if atual != conteudo:
+        with open(ARQUIVO, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+    click.echo(ARQUIVO)
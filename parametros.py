@@ -0,0 +1,105 @@
+import base64
+import json
+import re
+from datetime import datetime
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+
+class ParametroInvalido(ValueError):
+    """Erro de validação de parâmetros recebidos na query string."""
+
+
+def codificar_cursor(**chave):
+    """Gera um cursor opaco a partir da chave do último registro retornado."""
+    bruto = json.dumps(chave, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Recupera a chave gravada no cursor. Lança ParametroInvalido se o cursor for inválido."""
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        chave = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+    except (ValueError, TypeError):
+        raise ParametroInvalido('Cursor inválido.')
+    if not isinstance(chave, dict) or not isinstance(chave.get('id'), int):
+        raise ParametroInvalido('Cursor inválido.')
+    if not isinstance(chave.get('relevancia', 0), (int, float)):
+        raise ParametroInvalido('Cursor inválido.')
+    return chave
+
+
+def ler_limite(valor, padrao=LIMITE_PADRAO, maximo=LIMITE_MAXIMO, nome='limit'):
+    """Converte um parâmetro inteiro positivo da query string, respeitando o máximo permitido."""
+    if valor is None or valor == '':
+        return padrao
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ParametroInvalido(f"O parâmetro '{nome}' deve ser um número inteiro.")
+    if limite < 1:
+        raise ParametroInvalido(f"O parâmetro '{nome}' deve ser maior que zero.")
+    return min(limite, maximo)
+
+
+def ler_booleano(valor):
+    """Interpreta parâmetros booleanos da query string ('true', '1', 'false', '0')."""
+    if valor is None or valor == '':
+        return None
+    valor = valor.strip().lower()
+    if valor in ('true', '1', 'sim'):
+        return True
+    if valor in ('false', '0', 'nao', 'não'):
+        return False
+    raise ParametroInvalido(f"Valor booleano inválido: '{valor}'.")
+
+
+def ler_data(valor, nome):
+    """Converte uma data/hora ISO 8601 da query string ('2024-01-31' ou '2024-01-31T08:00:00')."""
+    if valor is None or valor == '':
+        return None
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        raise ParametroInvalido(f"O parâmetro '{nome}' deve ser uma data ISO 8601.")
+
+
+def ler_campos(valor, permitidos, padrao):
+    """Lista de campos pedidos em 'campos' (separados por vírgula), validada contra `permitidos`."""
+    if valor is None or valor == '':
+        return list(padrao)
+    campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in permitidos]
+    if invalidos:
+        raise ParametroInvalido(f"Campos inválidos: {', '.join(invalidos)}.")
+    return campos
+
+
+def digitos_verificadores(base):
+    """Os dois dígitos verificadores do CPF cujos 9 primeiros dígitos são `base` (texto)."""
+    digitos = [int(digito) for digito in base]
+    for tamanho in (9, 10):
+        soma = sum(digito * peso for digito, peso in zip(digitos, range(tamanho + 1, 1, -1)))
+        digitos.append(soma * 10 % 11 % 10)
+    return f'{digitos[9]}{digitos[10]}'
+
+
+def ler_cpf(valor):
+    """
+    Converte um CPF recebido pela API no inteiro gravado no banco (os 11 dígitos, ver models.CPF).
+    Aceita só dígitos, com ou sem pontuação, ou um número (zeros à esquerda perdidos).
+    Confere os dígitos verificadores; lança ParametroInvalido se o CPF não for válido.
+    """
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        digitos = f'{valor:011d}'
+    elif isinstance(valor, str):
+        digitos = re.sub(r'[\s./-]', '', valor)
+    else:
+        digitos = ''
+    # 111.111.111-11 e afins passam na conta dos verificadores, mas não são CPFs
+    if (not re.fullmatch(r'[0-9]{11}', digitos) or digitos == digitos[0] * 11
+            or digitos[9:] != digitos_verificadores(digitos[:9])):
+        raise ParametroInvalido(f"CPF inválido: '{valor}'.")
+    return int(digitos)
@@ -0,0 +1,114 @@
+'''Processamento do conteúdo de um documento: validação do PDF, páginas, miniatura e texto.
+
+Funções puras sobre o arquivo, sem acesso ao banco: rodam nos processos do
+trabalhador (ver tarefas.py). Contagem de páginas, miniatura e texto usam o
+pacote pypdfium2 (e Pillow para gravar o PNG); sem eles só a assinatura do
+arquivo é verificada. Aceitam blobs de qualquer camada (ver camadas.py).
+'''
+
+import os
+
+import camadas
+
+try:
+    import pypdfium2 as pdfium  # Dependência opcional
+except ImportError:
+    pdfium = None
+
+PASTA_MINIATURAS = 'miniaturas'
+ASSINATURA_PDF = b'%PDF-'
+MAX_CARACTERES_TEXTO = 1_000_000  # Texto extraído guardado por documento
+
+
+class DocumentoInvalido(ValueError):
+    """O arquivo não é um PDF legível. Não adianta tentar de novo."""
+
+
+def caminho_miniatura(raiz, sha256):
+    """Miniatura endereçada pelo conteúdo: documentos duplicados compartilham o mesmo PNG."""
+    return os.path.join(raiz, PASTA_MINIATURAS, sha256[:2], sha256 + '.png')
+
+
+def validar_assinatura(caminho):
+    # A especificação tolera lixo antes do cabeçalho, desde que nos primeiros 1024 bytes
+    with camadas.abrir(caminho) as arquivo:
+        inicio = arquivo.read(1024)
+    if ASSINATURA_PDF not in inicio:
+        raise DocumentoInvalido('O arquivo não é um PDF.')
+
+
+def _gravar_miniatura(pagina, destino, largura):
+    imagem = pagina.render(scale=largura / pagina.get_width()).to_pil()
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = f'{destino}.{os.getpid()}.tmp'
+    imagem.save(temporario, format='PNG', optimize=True)
+    os.replace(temporario, destino)
+
+
+def _abrir(caminho):
+    if caminho.endswith(camadas.EXTENSAO_GZIP):
+        # O pdfium precisa de acesso aleatório: o conteúdo arquivado é descomprimido em memória
+        with camadas.abrir(caminho) as arquivo:
+            caminho = arquivo.read()
+    try:
+        return pdfium.PdfDocument(caminho)
+    except pdfium.PdfiumError as e:
+        raise DocumentoInvalido(f'PDF ilegível: {e}') from e
+
+
+def _texto(pdf):
+    partes, caracteres = [], 0
+    for numero in range(len(pdf)):
+        if caracteres >= MAX_CARACTERES_TEXTO:
+            break
+        pagina = pdf[numero]
+        try:
+            pagina_texto = pagina.get_textpage()
+            texto = pagina_texto.get_text_bounded()
+            pagina_texto.close()
+        finally:
+            pagina.close()
+        partes.append(texto)
+        caracteres += len(texto)
+    return '\n'.join(partes)[:MAX_CARACTERES_TEXTO]
+
+
+def extrair_texto(caminho):
+    """Só o texto do PDF (reindexação da busca), ou None sem pypdfium2."""
+    validar_assinatura(caminho)
+    if pdfium is None:
+        return None
+    pdf = _abrir(caminho)
+    try:
+        return _texto(pdf)
+    finally:
+        pdf.close()
+
+
+def processar_arquivo(caminho, destino_miniatura, largura_miniatura=200):
+    """
+    Valida o PDF e extrai {'paginas', 'texto', 'miniatura'}.
+
+    Lança DocumentoInvalido para conteúdo que não é PDF ou não pode ser aberto;
+    outros erros (disco, memória) são transitórios e a tarefa é repetida.
+    """
+    validar_assinatura(caminho)
+    if pdfium is None:
+        return {'paginas': None, 'texto': None, 'miniatura': None}
+
+    pdf = _abrir(caminho)
+    try:
+        paginas = len(pdf)
+        miniatura = None
+        if paginas:
+            pagina = pdf[0]
+            try:
+                _gravar_miniatura(pagina, destino_miniatura, largura_miniatura)
+                miniatura = destino_miniatura
+            finally:
+                pagina.close()
+        texto = _texto(pdf)
+    finally:
+        pdf.close()
+
+    return {'paginas': paginas, 'texto': texto, 'miniatura': miniatura}
@@ -0,0 +1,107 @@
+'''Hash e verificação de senhas fora da thread da requisição.
+
+scrypt/pbkdf2 custam dezenas de milissegundos de CPU por chamada. O cálculo
+roda num pool de processos limitado; quando a fila enche, novas tentativas são
+recusadas na hora (SobrecargaSenhas) em vez de ocupar todos os workers. Um
+cálculo que passa de `timeout` segundos também vira SobrecargaSenhas.
+'''
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotado
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+METODO_PADRAO = 'scrypt:32768:8:1'
+
+
+class SobrecargaSenhas(RuntimeError):
+    """A fila de verificações de senha está cheia."""
+
+
+class PoolSenhas:
+    def __init__(self, processos=None, fila_maxima=None, metodo=METODO_PADRAO, timeout=10):
+        self.processos = processos or os.cpu_count() or 1
+        self.fila_maxima = fila_maxima or 4 * self.processos
+        self.metodo = metodo
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._em_andamento = 0
+        self._contadores = {'verificacoes': 0, 'hashes': 0, 'rehashes': 0, 'recusadas': 0, 'expiradas': 0}
+        self._prefixo = None
+
+    def _pool(self):
+        # Criado sob demanda e recriado após fork (cada worker do gunicorn tem o seu)
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.processos)
+            self._pid = os.getpid()
+        return self._executor
+
+    def _executar(self, funcao, *args):
+        with self._lock:
+            if self._em_andamento >= self.fila_maxima:
+                self._contadores['recusadas'] += 1
+                raise SobrecargaSenhas('Servidor ocupado. Tente novamente em instantes.')
+            self._em_andamento += 1
+            executor = self._pool()
+        try:
+            futuro = executor.submit(funcao, *args)
+            return futuro.result(timeout=self.timeout)
+        except TempoEsgotado:
+            futuro.cancel()  # Só tem efeito se ainda não começou
+            with self._lock:
+                self._contadores['expiradas'] += 1
+            raise SobrecargaSenhas('Servidor ocupado. Tente novamente em instantes.') from None
+        finally:
+            with self._lock:
+                self._em_andamento -= 1
+
+    def verificar(self, senha_hash, senha):
+        resultado = self._executar(check_password_hash, senha_hash, senha)
+        with self._lock:
+            self._contadores['verificacoes'] += 1
+        return resultado
+
+    def gerar(self, senha):
+        resultado = self._executar(generate_password_hash, senha, self.metodo)
+        with self._lock:
+            self._contadores['hashes'] += 1
+        return resultado
+
+    def prefixo(self):
+        """
+        Método e custo como o Werkzeug grava no hash: 'scrypt' vira
+        'scrypt:32768:8:1'. Calculado uma vez, com um hash de teste no pool.
+        """
+        if self._prefixo is None:
+            self._prefixo = self._executar(generate_password_hash, '', self.metodo).split('$', 1)[0]
+        return self._prefixo
+
+    def precisa_rehash(self, senha_hash):
+        """True se o hash foi gerado com método/custo diferente do configurado."""
+        return senha_hash.split('$', 1)[0] != self.prefixo()
+
+    def rehash_realizado(self):
+        with self._lock:
+            self._contadores['rehashes'] += 1
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(
+                self._contadores,
+                em_andamento=self._em_andamento,
+                fila_maxima=self.fila_maxima,
+                processos=self.processos,
+                metodo=self.metodo
+            )
+
+
+def iniciar(app):
+    """Cria o pool a partir de SENHA_PROCESSOS, SENHA_FILA_MAXIMA e SENHA_METODO."""
+    app.extensions['senhas'] = PoolSenhas(
+        processos=app.config.get('SENHA_PROCESSOS'),
+        fila_maxima=app.config.get('SENHA_FILA_MAXIMA'),
+        metodo=app.config.get('SENHA_METODO', METODO_PADRAO)
+    )
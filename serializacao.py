@@ -0,0 +1,149 @@
+'''Serialização JSON das respostas.
+
+ProvedorOrjson substitui o provedor padrão do Flask quando o pacote orjson
+está instalado (JSON_BIBLIOTECA=auto ou orjson); sem ele, ou com
+JSON_BIBLIOTECA=json, fica o json da biblioteca padrão. A saída é a mesma nos
+dois casos: datas no formato HTTP (RFC 822), chaves ordenadas.
+
+SerializadorLinhas monta a resposta direto das tuplas (Row) de um select com
+colunas explícitas, sem instanciar entidades ORM nem passar por Row._mapping.
+CPFs são gravados como inteiros (models.CPF) e formatados só aqui.
+'''
+
+import json
+from datetime import date, datetime, timezone
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Date, DateTime
+
+from models import CPF
+
+try:
+    import orjson  # Dependência opcional
+except ImportError:
+    orjson = None
+
+DIAS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MESES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def data_http(valor):
+    """Mesmo resultado de werkzeug.http.http_date (datas sem fuso são tratadas como UTC), sem passar por email.utils."""
+    if not isinstance(valor, datetime):
+        valor = datetime(valor.year, valor.month, valor.day)
+    elif valor.tzinfo is not None and valor.utcoffset():
+        valor = valor.astimezone(timezone.utc)
+    return (
+        f'{DIAS[valor.weekday()]}, {valor.day:02d} {MESES[valor.month - 1]} {valor.year:04d} '
+        f'{valor.hour:02d}:{valor.minute:02d}:{valor.second:02d} GMT'
+    )
+
+
+def formatar_cpf(numero):
+    """'123.456.789-09' a partir do inteiro gravado no banco."""
+    digitos = f'{numero:011d}'
+    return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
+
+
+def _padrao(objeto):
+    if isinstance(objeto, date):
+        return data_http(objeto)
+    return DefaultJSONProvider.default(objeto)
+
+
+class ProvedorOrjson(DefaultJSONProvider):
+    """Provedor JSON do Flask sobre orjson, compatível com o DefaultJSONProvider."""
+
+    default = staticmethod(_padrao)
+
+    def _opcoes(self, indentar=False):
+        # Datas passam pelo default para manter o formato HTTP do provedor padrão
+        opcoes = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        if indentar:
+            opcoes |= orjson.OPT_INDENT_2
+        return opcoes
+
+    def dumps(self, obj, **kwargs):
+        indentar = kwargs.pop('indent', None) is not None
+        kwargs.pop('separators', None)
+        if kwargs:
+            # Opções específicas do json (cls, allow_nan...): usa o provedor padrão
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._opcoes(indentar)).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indentar = (self.compact is None and self._app.debug) or self.compact is False
+        corpo = orjson.dumps(obj, default=self.default, option=self._opcoes(indentar))
+        return self._app.response_class(corpo + b'\n', mimetype=self.mimetype)
+
+
+def biblioteca_disponivel(preferida='auto'):
+    """'orjson' se pedido (ou auto) e instalado; senão 'json'."""
+    if preferida in ('auto', 'orjson') and orjson is not None:
+        return 'orjson'
+    return 'json'
+
+
+def iniciar(app):
+    """Registra o provedor JSON conforme JSON_BIBLIOTECA ('auto', 'orjson' ou 'json')."""
+    if biblioteca_disponivel(app.config.get('JSON_BIBLIOTECA', 'auto')) == 'orjson':
+        app.json = ProvedorOrjson(app)
+
+
+def dumps_bytes(objeto):
+    """JSON compacto em UTF-8, para corpos montados fora do jsonify (ex.: NDJSON)."""
+    if orjson is not None:
+        return orjson.dumps(objeto, default=_padrao)
+    return json.dumps(objeto, default=_padrao, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class SerializadorLinhas:
+    """
+    Converte as linhas de um select em dicts prontos para JSON.
+
+    Os nomes das colunas e as posições das datas e dos CPFs são resolvidos uma
+    vez; por linha resta um zip com a tupla, e datas e CPFs já saem como texto.
+    """
+
+    def __init__(self, nomes, datas=(), cpfs=()):
+        self.nomes = tuple(nomes)
+        self._conversoes = tuple(
+            (i, data_http if nome in datas else formatar_cpf)
+            for i, nome in enumerate(self.nomes) if nome in datas or nome in cpfs
+        )
+
+    @classmethod
+    def da_consulta(cls, query):
+        colunas = query.selected_columns
+        return cls(
+            [coluna.key for coluna in colunas],
+            [coluna.key for coluna in colunas if isinstance(coluna.type, (Date, DateTime))],
+            [coluna.key for coluna in colunas if isinstance(coluna.type, CPF)]
+        )
+
+    def dicionario(self, linha):
+        if self._conversoes:
+            linha = list(linha)
+            for posicao, converter in self._conversoes:
+                if linha[posicao] is not None:
+                    linha[posicao] = converter(linha[posicao])
+        return dict(zip(self.nomes, linha))
+
+    def lista(self, linhas):
+        if not self._conversoes:
+            nomes = self.nomes
+            return [dict(zip(nomes, linha)) for linha in linhas]
+        return [self.dicionario(linha) for linha in linhas]
+
+    def ndjson(self, linhas):
+        """Uma linha JSON (bytes) por registro."""
+        for linha in linhas:
+            yield dumps_bytes(self.dicionario(linha)) + b'\n'
@@ -0,0 +1,111 @@
+'''Consulta de servidores em lote, por CPF ou por matrícula.
+
+Integrações (folha de pagamento) conferem milhares de servidores por execução.
+Em vez de uma requisição e uma consulta por identificador, os valores
+distintos são resolvidos em blocos de IN (...) sobre os índices únicos de cpf
+e matricula; as quantidades de documentos, se pedidas, vêm de um GROUP BY por
+bloco sobre ix_documentos_cpf_id. O resultado segue a ordem da entrada, com
+encontrado=false para o que não existe.
+'''
+
+from models import db, Documento, Servidor
+from parametros import ParametroInvalido, ler_cpf
+import serializacao
+
+BLOCO = 500  # Valores por IN (...), abaixo do limite de parâmetros por comando do SQLite
+
+COLUNAS = (
+    Servidor.id,
+    Servidor.nome,
+    Servidor.cpf,
+    Servidor.matricula,
+    Servidor.codigo_orgao,
+    Servidor.ativo,
+    Servidor.cargo,
+    Servidor.lotacao,
+)
+CAMPOS = {'cpfs': Servidor.cpf, 'matriculas': Servidor.matricula}
+
+
+def ler_pedido(dados, maximo):
+    """Valida {'cpfs': [...]} ou {'matriculas': [...]} e 'incluir_documentos'. Retorna (campo, valores, documentos)."""
+    if not isinstance(dados, dict):
+        raise ParametroInvalido('O corpo deve ser um objeto JSON.')
+    campos = [campo for campo in CAMPOS if campo in dados]
+    if len(campos) != 1:
+        raise ParametroInvalido("Informe 'cpfs' ou 'matriculas' (apenas um dos dois).")
+    campo = campos[0]
+    valores = dados[campo]
+    if not isinstance(valores, list) or not valores:
+        raise ParametroInvalido(f"'{campo}' deve ser uma lista não vazia.")
+    if len(valores) > maximo:
+        raise ParametroInvalido(f'No máximo {maximo} identificadores por requisição.')
+    documentos = dados.get('incluir_documentos', False)
+    if not isinstance(documentos, bool):
+        raise ParametroInvalido("'incluir_documentos' deve ser true ou false.")
+    return campo, valores, documentos
+
+
+def _normalizar(campo, valor):
+    """Valor como está gravado no banco, ou None se for inválido."""
+    if campo == 'cpfs':
+        try:
+            return ler_cpf(valor)
+        except ParametroInvalido:
+            return None
+    if isinstance(valor, (str, int)) and not isinstance(valor, bool):
+        return str(valor).strip() or None
+    return None
+
+
+def _blocos(valores):
+    for inicio in range(0, len(valores), BLOCO):
+        yield valores[inicio:inicio + BLOCO]
+
+
+def _quantidades_documentos(cpfs):
+    quantidades = {}
+    for bloco in _blocos(cpfs):
+        quantidades.update(db.session.execute(
+            db.select(Documento.cpf_servidor, db.func.count())
+            .where(Documento.cpf_servidor.in_(bloco))
+            .group_by(Documento.cpf_servidor)
+        ).all())
+    return quantidades
+
+
+def resolver(campo, valores, incluir_documentos=False):
+    """
+    Um resultado por valor recebido, na mesma ordem: {'entrada', 'encontrado'}
+    e, conforme o caso, 'servidor' (com 'quantidade_documentos' se pedido) ou 'erro'.
+    Valores repetidos são consultados uma vez só.
+    """
+    coluna = CAMPOS[campo]
+    normalizados = [_normalizar(campo, valor) for valor in valores]
+    distintos = list(dict.fromkeys(valor for valor in normalizados if valor is not None))
+
+    query = db.select(*COLUNAS)
+    serializador = serializacao.SerializadorLinhas.da_consulta(query)
+    posicao = serializador.nomes.index(coluna.key)
+    servidores, cpfs = {}, {}
+    for bloco in _blocos(distintos):
+        for linha in db.session.execute(query.where(coluna.in_(bloco))):
+            servidores[linha[posicao]] = serializador.dicionario(linha)
+            cpfs[linha[posicao]] = linha.cpf  # Inteiro, para a contagem de documentos
+
+    if incluir_documentos and servidores:
+        quantidades = _quantidades_documentos(list(cpfs.values()))
+        for chave, servidor in servidores.items():
+            servidor['quantidade_documentos'] = quantidades.get(cpfs[chave], 0)
+
+    erro = 'CPF inválido.' if campo == 'cpfs' else 'Matrícula inválida.'
+    resultados = []
+    for valor, normalizado in zip(valores, normalizados):
+        servidor = servidores.get(normalizado)
+        resultado = {'entrada': valor, 'encontrado': servidor is not None}
+        if servidor is not None:
+            resultado['servidor'] = servidor
+        elif normalizado is None:
+            resultado['erro'] = erro
+        resultados.append(resultado)
+    return resultados
@@ -0,0 +1,316 @@
+'''Fila de tarefas em segundo plano, guardada no próprio banco (tabela tarefas).
+
+O upload só registra a tarefa na mesma transação do Documento e responde. Um
+trabalhador separado (flask tarefas trabalhar) reserva as tarefas disponíveis
+e processa os arquivos num pool de processos de tamanho fixo (concorrência
+limitada). Falhas transitórias voltam para a fila com espera exponencial;
+arquivos inválidos são marcados na hora, sem nova tentativa.
+
+A reserva tem prazo (expira_em): se o trabalhador morrer no meio, a tarefa
+volta a ficar disponível quando o prazo vencer.
+'''
+
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import processamento
+from models import db, Blob, Documento, Tarefa, TextoDocumento
+import serializacao
+
+TIPO_PROCESSAR_DOCUMENTO = 'processar_documento'
+
+
+def nova_tarefa(documento_id, tipo=TIPO_PROCESSAR_DOCUMENTO):
+    agora = datetime.now()
+    return Tarefa(
+        tipo=tipo,
+        documento_id=documento_id,
+        estado='pendente',
+        tentativas=0,
+        disponivel_em=agora,
+        criada_em=agora
+    )
+
+
+def enfileirar(documento):
+    """Adiciona a tarefa de processamento do documento à sessão. Não faz commit: vai junto com o upload."""
+    db.session.flush()  # Atribui documento.id
+    db.session.add(nova_tarefa(documento.id))
+
+
+def enfileirar_pendentes():
+    """Enfileira documentos ainda não processados que não têm tarefa aberta (ex.: anteriores à fila)."""
+    abertas = db.select(Tarefa.documento_id).where(Tarefa.estado.in_(('pendente', 'executando')))
+    ids = db.session.scalars(
+        db.select(Documento.id)
+        .where(db.or_(Documento.status_processamento.is_(None), Documento.status_processamento == 'pendente'))
+        .where(Documento.id.not_in(abertas))
+    ).all()
+    db.session.add_all(nova_tarefa(id) for id in ids)
+    db.session.execute(
+        db.update(Documento).where(Documento.id.in_(ids)).values(status_processamento='pendente')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return len(ids)
+
+
+def atraso(tentativas, base, maximo):
+    """Espera exponencial com jitter antes da próxima tentativa, em segundos."""
+    return min(maximo, base * 2 ** (tentativas - 1)) * random.uniform(0.5, 1)
+
+
+def reservar(quantidade, duracao):
+    """
+    Reserva até `quantidade` tarefas disponíveis por `duracao` segundos.
+
+    Um único UPDATE marca as tarefas como 'executando', de modo que dois
+    trabalhadores nunca pegam a mesma (no PostgreSQL com SKIP LOCKED).
+    """
+    agora = datetime.now()
+    disponiveis = (
+        db.select(Tarefa.id)
+        .where(db.or_(
+            db.and_(Tarefa.estado == 'pendente', Tarefa.disponivel_em <= agora),
+            db.and_(Tarefa.estado == 'executando', Tarefa.expira_em < agora),  # Reserva vencida
+        ))
+        .order_by(Tarefa.disponivel_em, Tarefa.id)
+        .limit(quantidade)
+        .with_for_update(skip_locked=True)
+    )
+    ids = db.session.scalars(
+        db.update(Tarefa)
+        .where(Tarefa.id.in_(disponiveis))
+        .values(estado='executando', tentativas=Tarefa.tentativas + 1, expira_em=agora + timedelta(seconds=duracao))
+        .returning(Tarefa.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not ids:
+        db.session.commit()
+        return []
+
+    reservadas = db.session.execute(
+        db.select(
+            Tarefa.id, Tarefa.documento_id, Tarefa.tentativas,
+            # Caminho atual do conteúdo, que pode estar na camada de arquivo (ver camadas.py)
+            db.func.coalesce(Blob.caminho_arquivo, Documento.caminho_arquivo).label('caminho_arquivo'),
+            Documento.sha256
+        )
+        .join(Documento, Documento.id == Tarefa.documento_id)
+        .outerjoin(Blob, Blob.sha256 == Documento.sha256)
+        .where(Tarefa.id.in_(ids))
+        .order_by(Tarefa.id)
+    ).all()
+    db.session.execute(
+        db.update(Documento).where(Documento.id.in_([tarefa.documento_id for tarefa in reservadas]))
+        .values(status_processamento='processando')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return reservadas
+
+
+def concluir(tarefa, resultado):
+    """Grava páginas, miniatura e texto no documento e encerra a tarefa."""
+    db.session.execute(
+        db.update(Documento).where(Documento.id == tarefa.documento_id)
+        .values(
+            status_processamento='concluido',
+            paginas=resultado.get('paginas'),
+            caminho_miniatura=resultado.get('miniatura')
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.get('texto') is not None:
+        db.session.merge(TextoDocumento(documento_id=tarefa.documento_id, sha256=tarefa.sha256, texto=resultado['texto']))
+    _encerrar(tarefa.id, 'concluida')
+    db.session.commit()
+
+
+def falhar(tarefa, erro, definitivo, max_tentativas, atraso_base, atraso_maximo):
+    """Devolve a tarefa à fila com espera, ou a encerra se o erro é definitivo ou as tentativas acabaram."""
+    if definitivo or tarefa.tentativas >= max_tentativas:
+        status = 'invalido' if definitivo else 'falhou'
+        _encerrar(tarefa.id, 'falhou', erro)
+    else:
+        status = 'pendente'
+        db.session.execute(
+            db.update(Tarefa).where(Tarefa.id == tarefa.id)
+            .values(
+                estado='pendente',
+                erro=erro,
+                expira_em=None,
+                disponivel_em=datetime.now() + timedelta(seconds=atraso(tarefa.tentativas, atraso_base, atraso_maximo))
+            )
+            .execution_options(synchronize_session=False)
+        )
+    db.session.execute(
+        db.update(Documento).where(Documento.id == tarefa.documento_id).values(status_processamento=status)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _encerrar(tarefa_id, estado, erro=None):
+    db.session.execute(
+        db.update(Tarefa).where(Tarefa.id == tarefa_id)
+        .values(estado=estado, erro=erro, expira_em=None, concluida_em=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reaproveitar(tarefa):
+    """
+    Conteúdo já processado em outro documento (mesmo SHA-256): copia o resultado
+    em vez de processar de novo. Retorna True se reaproveitou.
+    """
+    if tarefa.sha256 is None:
+        return False
+    anterior = db.session.execute(
+        db.select(Documento.id, Documento.status_processamento, Documento.paginas, Documento.caminho_miniatura)
+        .where(
+            Documento.sha256 == tarefa.sha256,
+            Documento.id != tarefa.documento_id,
+            Documento.status_processamento.in_(('concluido', 'invalido'))
+        )
+        .limit(1)
+    ).first()
+    if anterior is None:
+        return False
+
+    if anterior.status_processamento == 'invalido':
+        falhar(tarefa, f'Mesmo conteúdo do documento {anterior.id}, que é inválido.', True, 0, 0, 0)
+        return True
+    texto = db.session.scalar(db.select(TextoDocumento.texto).where(TextoDocumento.documento_id == anterior.id))
+    concluir(tarefa, {'paginas': anterior.paginas, 'miniatura': anterior.caminho_miniatura, 'texto': texto})
+    return True
+
+
+def situacao(documento_id):
+    """Status de processamento do documento e da sua última tarefa, ou None se o documento não existe."""
+    documento = db.session.execute(
+        db.select(Documento.id, Documento.status_processamento, Documento.paginas, Documento.caminho_miniatura)
+        .where(Documento.id == documento_id)
+    ).first()
+    if documento is None:
+        return None
+    tarefa = db.session.execute(
+        db.select(Tarefa.estado, Tarefa.tentativas, Tarefa.erro, Tarefa.disponivel_em)
+        .where(Tarefa.documento_id == documento_id)
+        .order_by(Tarefa.id.desc())
+        .limit(1)
+    ).first()
+    pendente = tarefa is not None and tarefa.estado == 'pendente'
+    return {
+        'id_documento': documento.id,
+        'status': documento.status_processamento or 'pendente',
+        'paginas': documento.paginas,
+        'miniatura_disponivel': documento.caminho_miniatura is not None,
+        'tentativas': tarefa.tentativas if tarefa else 0,
+        'erro': tarefa.erro if tarefa else None,
+        'proxima_tentativa': serializacao.data_http(tarefa.disponivel_em) if pendente else None,
+    }
+
+
+def estatisticas():
+    """Tarefas por estado e há quanto tempo a tarefa disponível mais antiga espera."""
+    contagens = dict(db.session.execute(db.select(Tarefa.estado, db.func.count()).group_by(Tarefa.estado)).all())
+    mais_antiga = db.session.scalar(
+        db.select(db.func.min(Tarefa.disponivel_em))
+        .where(Tarefa.estado == 'pendente', Tarefa.disponivel_em <= datetime.now())
+    )
+    return {
+        'pendente': contagens.get('pendente', 0),
+        'executando': contagens.get('executando', 0),
+        'concluida': contagens.get('concluida', 0),
+        'falhou': contagens.get('falhou', 0),
+        'espera_segundos': round((datetime.now() - mais_antiga).total_seconds(), 1) if mais_antiga else 0,
+    }
+
+
+def limpar(dias):
+    """Remove tarefas concluídas há mais de `dias` dias (as que falharam ficam para análise)."""
+    removidas = db.session.execute(
+        db.delete(Tarefa)
+        .where(Tarefa.estado == 'concluida', Tarefa.concluida_em < datetime.now() - timedelta(days=dias))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return removidas
+
+
+class Trabalhador:
+    """Reserva tarefas e as processa num pool de `concorrencia` processos."""
+
+    def __init__(self, raiz, concorrencia=None, intervalo=1.0, max_tentativas=5, atraso_base=30,
+                 atraso_maximo=3600, tempo_limite=600, largura_miniatura=200):
+        self.raiz = raiz
+        self.concorrencia = concorrencia or os.cpu_count() or 1
+        self.intervalo = intervalo
+        self.max_tentativas = max_tentativas
+        self.atraso_base = atraso_base
+        self.atraso_maximo = atraso_maximo
+        self.tempo_limite = tempo_limite
+        self.largura_miniatura = largura_miniatura
+        self.parar = False
+        self.processadas = 0
+
+    @classmethod
+    def da_configuracao(cls, config, concorrencia=None):
+        return cls(
+            config['UPLOAD_FOLDER'],
+            concorrencia=concorrencia or config.get('TAREFAS_CONCORRENCIA'),
+            intervalo=config.get('TAREFAS_INTERVALO', 1.0),
+            max_tentativas=config.get('TAREFAS_MAX_TENTATIVAS', 5),
+            atraso_base=config.get('TAREFAS_ATRASO_BASE', 30),
+            atraso_maximo=config.get('TAREFAS_ATRASO_MAXIMO', 3600),
+            tempo_limite=config.get('TAREFAS_TEMPO_LIMITE', 600),
+            largura_miniatura=config.get('MINIATURA_LARGURA', 200)
+        )
+
+    def executar(self, uma_vez=False):
+        """
+        Loop principal; roda dentro de um app context. Com uma_vez=True termina
+        quando não houver mais tarefas disponíveis. `parar = True` encerra após
+        as tarefas em andamento.
+        """
+        em_andamento = {}
+        with ProcessPoolExecutor(max_workers=self.concorrencia) as pool:
+            while True:
+                livres = self.concorrencia - len(em_andamento)
+                if livres and not self.parar:
+                    for tarefa in reservar(livres, self.tempo_limite):
+                        if reaproveitar(tarefa):
+                            self.processadas += 1
+                            continue
+                        futuro = pool.submit(
+                            processamento.processar_arquivo,
+                            tarefa.caminho_arquivo,
+                            processamento.caminho_miniatura(self.raiz, tarefa.sha256 or f'documento-{tarefa.documento_id}'),
+                            self.largura_miniatura
+                        )
+                        em_andamento[futuro] = tarefa
+
+                if not em_andamento:
+                    if uma_vez or self.parar:
+                        return self.processadas
+                    time.sleep(self.intervalo)
+                    continue
+
+                prontos, _ = wait(em_andamento, timeout=self.intervalo, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    self._registrar(em_andamento.pop(futuro), futuro)
+
+    def _registrar(self, tarefa, futuro):
+        self.processadas += 1
+        try:
+            resultado = futuro.result()
+        except processamento.DocumentoInvalido as e:
+            falhar(tarefa, str(e), True, self.max_tentativas, self.atraso_base, self.atraso_maximo)
+        except Exception as e:
+            falhar(tarefa, f'{type(e).__name__}: {e}', False, self.max_tentativas, self.atraso_base, self.atraso_maximo)
+        else:
+            concluir(tarefa, resultado)
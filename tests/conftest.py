@@ -0,0 +1,141 @@
+'''Fixtures dos testes: aplicação sobre um SQLite temporário com as migrações aplicadas.
+
+Cada teste recebe banco, pasta de uploads e pasta de chaves próprios. O hash
+de senha usa poucas iterações (SENHA_METODO) e o limite de requisições fica
+desligado, exceto nos testes que o configuram.
+'''
+
+import io
+import itertools
+
+import pytest
+
+import migracoes
+from app import create_app
+from parametros import digitos_verificadores
+
+
+def config_teste(pasta, **extras):
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{pasta / 'teste.db'}",
+        'UPLOAD_FOLDER': str(pasta / 'documentos'),
+        'JWT_CHAVES_PASTA': str(pasta / 'chaves'),
+        'METRICAS_PERFIL_PASTA': str(pasta / 'perfis'),
+        'SENHA_METODO': 'pbkdf2:sha256:1000',
+        'SENHA_PROCESSOS': 1,
+        'LIMITE_ATIVO': False,
+    }
+    config.update(extras)
+    return config
+
+
+def encerrar(app):
+    # O pool de senhas não é encerrado pela aplicação; sem isso cada teste deixaria um processo vivo
+    executor = app.extensions['senhas']._executor
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+
+
+@pytest.fixture
+def criar_app(tmp_path):
+    """Fábrica de aplicações: criar_app(migrar=True, **config) sobre o banco temporário do teste."""
+    aplicacoes = []
+
+    def criar(migrar=True, **extras):
+        app = create_app(config_teste(tmp_path, **extras))
+        if migrar:
+            migracoes.atualizar(app)
+        aplicacoes.append(app)
+        return app
+
+    yield criar
+    for app in aplicacoes:
+        encerrar(app)
+
+
+@pytest.fixture
+def app(criar_app):
+    return criar_app()
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+def cabecalho(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def entrar(cliente, email, senha='senha'):
+    resposta = cliente.post('/login', json={'email': email, 'senha': senha})
+    assert resposta.status_code == 200, resposta.json
+    return resposta.json
+
+
+@pytest.fixture
+def gestor(cliente):
+    """Cabeçalho Authorization do primeiro usuário (gestor), cadastrado sem token."""
+    resposta = cliente.post('/cadastro', json={'nome': 'Gestor', 'email': 'gestor@teste', 'senha': 'senha', 'tipo': 'gestor'})
+    assert resposta.status_code == 201, resposta.json
+    return cabecalho(entrar(cliente, 'gestor@teste')['token'])
+
+
+@pytest.fixture
+def comum(cliente, gestor):
+    """Cabeçalho Authorization de um usuário comum (só leitura)."""
+    resposta = cliente.post('/cadastro', headers=gestor,
+                            json={'nome': 'Comum', 'email': 'comum@teste', 'senha': 'senha', 'tipo': 'comum'})
+    assert resposta.status_code == 201, resposta.json
+    return cabecalho(entrar(cliente, 'comum@teste')['token'])
+
+
+_bases_cpf = itertools.count(100000001)
+
+
+def novo_cpf():
+    """CPF válido e ainda não usado, formatado."""
+    base = str(next(_bases_cpf))
+    digitos = base + digitos_verificadores(base)
+    return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
+
+
+def dados_servidor(cpf=None, **campos):
+    cpf = cpf or novo_cpf()
+    dados = {
+        'nome': 'Servidor Teste',
+        'cpf': cpf,
+        'matricula': 'M' + cpf.replace('.', '').replace('-', ''),
+        'codigo_orgao': '001',
+        'ativo': True,
+        'cargo': 'Analista',
+        'lotacao': 'Sede',
+    }
+    dados.update(campos)
+    return dados
+
+
+@pytest.fixture
+def cadastrar_servidor(cliente, gestor):
+    """cadastrar_servidor(**campos) -> dados enviados; falha o teste se a API não responder 201."""
+    def cadastrar(**campos):
+        dados = dados_servidor(**campos)
+        resposta = cliente.post('/cadastro_servidor', headers=gestor, json=dados)
+        assert resposta.status_code == 201, resposta.json
+        return dados
+    return cadastrar
+
+
+@pytest.fixture
+def enviar_documento(cliente, gestor):
+    """enviar_documento(cpf, conteudo, tipo) -> JSON da resposta de /upload."""
+    def enviar(cpf, conteudo=b'%PDF-1.4 teste', tipo='Certidao'):
+        resposta = cliente.post('/upload', headers=gestor, data={
+            'cpf_servidor': cpf,
+            'tipo_documento': tipo,
+            'arquivo': (io.BytesIO(conteudo), 'documento.pdf'),
+        })
+        assert resposta.status_code == 201, resposta.json
+        return resposta.json
+    return enviar
@@ -0,0 +1,78 @@
+import os
+
+import armazenamento
+from models import db, Blob, Documento
+
+
+def _blob(app, sha256):
+    with app.app_context():
+        return db.session.get(Blob, sha256)
+
+
+def _remover_documento(app, documento_id):
+    with app.app_context():
+        db.session.execute(db.delete(Documento).where(Documento.id == documento_id))
+        db.session.commit()
+
+
+def _coletar(app):
+    with app.app_context():
+        return armazenamento.coletar_lixo(app.config['UPLOAD_FOLDER'], idade_minima=0)
+
+
+def test_conteudo_repetido_vira_uma_referencia_a_mais(app, cadastrar_servidor, enviar_documento):
+    primeiro = enviar_documento(cadastrar_servidor()['cpf'], b'%PDF-1.4 mesmo conteudo')
+    segundo = enviar_documento(cadastrar_servidor()['cpf'], b'%PDF-1.4 mesmo conteudo')
+    assert primeiro['sha256'] == segundo['sha256']
+
+    blob = _blob(app, primeiro['sha256'])
+    assert blob.referencias == 2
+    with app.app_context():
+        caminhos = set(db.session.scalars(db.select(Documento.caminho_arquivo)))
+        estatisticas = armazenamento.estatisticas()
+    assert caminhos == {blob.caminho_arquivo}
+    assert os.path.exists(blob.caminho_arquivo)
+    assert estatisticas['documentos'] == 2
+    assert estatisticas['blobs'] == 1
+
+
+def test_coleta_remove_blob_so_sem_referencias(app, cadastrar_servidor, enviar_documento):
+    cpf = cadastrar_servidor()['cpf']
+    primeiro = enviar_documento(cpf, b'%PDF-1.4 compartilhado')
+    segundo = enviar_documento(cpf, b'%PDF-1.4 compartilhado')
+    caminho = _blob(app, primeiro['sha256']).caminho_arquivo
+
+    _remover_documento(app, primeiro['id_documento'])
+    resumo = _coletar(app)
+    assert resumo['blobs_removidos'] == 0
+    assert _blob(app, primeiro['sha256']).referencias == 1
+    assert os.path.exists(caminho)
+
+    _remover_documento(app, segundo['id_documento'])
+    resumo = _coletar(app)
+    assert resumo['blobs_removidos'] == 1
+    assert resumo['bytes_liberados'] >= len(b'%PDF-1.4 compartilhado')
+    assert _blob(app, primeiro['sha256']) is None
+    assert not os.path.exists(caminho)
+
+
+def test_coleta_corrige_contagem_e_remove_sobras(app, cliente, gestor, cadastrar_servidor, enviar_documento):
+    cpf = cadastrar_servidor()['cpf']
+    documento = enviar_documento(cpf, b'%PDF-1.4 unico')
+    with app.app_context():
+        db.session.execute(db.update(Blob).values(referencias=7))
+        db.session.commit()
+    upload_id = cliente.post('/upload/iniciar', headers=gestor,
+                             json={'cpf_servidor': cpf, 'tipo_documento': 'X'}).json['upload_id']
+    orfao = os.path.join(app.config['UPLOAD_FOLDER'], armazenamento.PASTA_BLOBS, 'ab', 'orfao')
+    os.makedirs(os.path.dirname(orfao), exist_ok=True)
+    with open(orfao, 'wb') as arquivo:
+        arquivo.write(b'sem registro')
+
+    resumo = _coletar(app)
+    assert _blob(app, documento['sha256']).referencias == 1
+    assert resumo['uploads_abandonados'] == 1
+    assert resumo['orfaos_removidos'] == 1
+    assert not os.path.exists(orfao)
+    assert cliente.get(f'/upload/{upload_id}', headers=gestor).status_code == 404
+    assert cliente.get(f"/download/{documento['id_documento']}", headers=gestor).status_code == 200
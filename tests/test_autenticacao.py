@@ -0,0 +1,146 @@
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from conftest import cabecalho, entrar
+
+
+def _kid(token):
+    return jwt.get_unverified_header(token)['kid']
+
+
+def _proximo_segundo():
+    # iat tem resolução de segundos: separa a emissão do token da revogação
+    time.sleep(1 - time.time() % 1 + 0.01)
+
+
+def test_login_e_renovacao(cliente, gestor):
+    assert cliente.post('/login', json={'email': 'gestor@teste', 'senha': 'errada'}).status_code == 401
+    assert cliente.post('/login', json={'email': 'ninguem@teste', 'senha': 'senha'}).status_code == 401
+    assert cliente.post('/login', json={'email': 'gestor@teste'}).status_code == 400
+    assert cliente.get('/consulta_servidor?codigo_orgao=001').status_code == 401
+    assert cliente.get('/consulta_servidor?codigo_orgao=001', headers=cabecalho('x.y.z')).status_code == 401
+
+    tokens = entrar(cliente, 'gestor@teste')
+    # O token de renovação não serve como token de acesso, e vice-versa
+    assert cliente.get('/estatisticas', headers=cabecalho(tokens['token_renovacao'])).status_code == 401
+    assert cliente.post('/token/renovar', headers=cabecalho(tokens['token'])).status_code == 401
+    renovado = cliente.post('/token/renovar', headers=cabecalho(tokens['token_renovacao']))
+    assert renovado.status_code == 200
+    assert cliente.get('/estatisticas', headers=cabecalho(renovado.json['token'])).status_code == 200
+
+
+def test_jwks_publica_a_chave_que_assina(cliente, gestor):
+    token = gestor['Authorization'].split()[1]
+    chaves = cliente.get('/.well-known/jwks.json').json['keys']
+    assert [chave['kid'] for chave in chaves] == [_kid(token)]
+    assert 'd' not in chaves[0]  # Só a parte pública
+
+
+def test_rotacao_de_chaves(criar_app):
+    app = criar_app(JWT_CHAVES_RECARGA=0)
+    cliente, cli = app.test_client(), app.test_cli_runner()
+    cliente.post('/cadastro', json={'nome': 'G', 'email': 'g@teste', 'senha': 'senha', 'tipo': 'gestor'})
+    antigo = entrar(cliente, 'g@teste')['token']
+
+    resultado = cli.invoke(args=['chaves', 'rotacionar'])
+    assert resultado.exit_code == 0, resultado.output
+    novo = entrar(cliente, 'g@teste')['token']
+    assert _kid(novo) != _kid(antigo)
+    assert {chave['kid'] for chave in cliente.get('/.well-known/jwks.json').json['keys']} == {_kid(antigo), _kid(novo)}
+
+    # A chave aposentada continua verificando os tokens já emitidos
+    assert cliente.get('/estatisticas', headers=cabecalho(antigo)).status_code == 200
+    assert cliente.get('/estatisticas', headers=cabecalho(novo)).status_code == 200
+
+    resultado = cli.invoke(args=['chaves', 'remover', _kid(antigo)])
+    assert resultado.exit_code == 0, resultado.output
+    assert cliente.get('/estatisticas', headers=cabecalho(antigo)).status_code == 401
+    assert cliente.get('/estatisticas', headers=cabecalho(novo)).status_code == 200
+    # A chave ativa não pode ser removida sem ser aposentada antes
+    assert cli.invoke(args=['chaves', 'remover', _kid(novo)]).exit_code != 0
+
+
+def test_token_de_chave_desconhecida(cliente, gestor):
+    token = gestor['Authorization'].split()[1]
+    forjado = jwt.encode(jwt.decode(token, options={'verify_signature': False}), 'segredo',
+                         algorithm='HS256', headers={'kid': 'desconhecida'})
+    assert cliente.get('/estatisticas', headers=cabecalho(forjado)).status_code == 401
+
+
+def test_algoritmo_diferente_do_da_chave(cliente, gestor):
+    token = gestor['Authorization'].split()[1]
+    claims = jwt.decode(token, options={'verify_signature': False})
+    cabecalhos = {'kid': _kid(token)}
+    forjados = [
+        jwt.encode(claims, rsa.generate_private_key(public_exponent=65537, key_size=2048), algorithm='RS256',
+                   headers=cabecalhos),
+        jwt.encode(claims, 'segredo', algorithm='HS256', headers=cabecalhos),
+    ]
+    for forjado in forjados:
+        resposta = cliente.get('/estatisticas', headers=cabecalho(forjado))
+        assert resposta.status_code == 401, resposta.get_data(as_text=True)
+
+
+def test_troca_de_algoritmo(criar_app):
+    anterior = criar_app(JWT_ALGORITMO='RS256').test_client()
+    anterior.post('/cadastro', json={'nome': 'G', 'email': 'g@teste', 'senha': 'senha', 'tipo': 'gestor'})
+    token = entrar(anterior, 'g@teste')['token']
+    assert jwt.get_unverified_header(token)['alg'] == 'RS256'
+
+    # Mesma pasta de chaves: a chave RS256 continua lá, mas só vale se o algoritmo for aceito
+    assert criar_app().test_client().get('/estatisticas', headers=cabecalho(token)).status_code == 401
+    cliente = criar_app(JWT_ALGORITMOS_ACEITOS='RS256').test_client()
+    assert cliente.get('/estatisticas', headers=cabecalho(token)).status_code == 200
+    assert jwt.get_unverified_header(entrar(cliente, 'g@teste')['token'])['alg'] == 'EdDSA'
+
+    with pytest.raises(ValueError, match='JWT_ALGORITMOS_ACEITOS'):
+        criar_app(JWT_ALGORITMOS_ACEITOS='HS256')
+
+
+@pytest.mark.parametrize('metodo, url', [
+    ('post', '/cadastro_servidor'),
+    ('post', '/upload/iniciar'),
+    ('post', '/cadastro'),
+    ('get', '/cache/estatisticas'),
+    ('get', '/tarefas/estatisticas'),
+])
+def test_usuario_comum_so_le(cliente, comum, metodo, url):
+    resposta = getattr(cliente, metodo)(url, headers=comum, json={})
+    assert resposta.status_code == 403
+
+
+def test_usuario_comum_consulta(cliente, comum, cadastrar_servidor):
+    cpf = cadastrar_servidor()['cpf']
+    assert cliente.get(f'/consulta_servidor?cpf={cpf}', headers=comum).status_code == 200
+    assert cliente.get('/estatisticas', headers=comum).status_code == 200
+
+
+def test_revogacao_de_tokens(app, cliente, gestor):
+    tokens = entrar(cliente, 'gestor@teste')
+    _proximo_segundo()
+
+    resultado = app.test_cli_runner().invoke(args=['usuarios', 'revogar', 'gestor@teste'])
+    assert resultado.exit_code == 0, resultado.output
+    for token in (gestor['Authorization'].split()[1], tokens['token']):
+        resposta = cliente.get('/estatisticas', headers=cabecalho(token))
+        assert resposta.status_code == 401
+        assert 'revogado' in resposta.json['erro']
+    assert cliente.post('/token/renovar', headers=cabecalho(tokens['token_renovacao'])).status_code == 401
+
+    # Login logo depois da revogação, ainda no mesmo segundo
+    novo = entrar(cliente, 'gestor@teste')['token']
+    assert cliente.get('/estatisticas', headers=cabecalho(novo)).status_code == 200
+
+
+def test_desativacao_e_reativacao(app, cliente, gestor, comum):
+    cli = app.test_cli_runner()
+    assert cli.invoke(args=['usuarios', 'desativar', 'comum@teste']).exit_code == 0
+    assert cliente.get('/estatisticas', headers=comum).status_code == 401
+    assert cliente.post('/login', json={'email': 'comum@teste', 'senha': 'senha'}).status_code == 403
+
+    assert cli.invoke(args=['usuarios', 'ativar', 'comum@teste']).exit_code == 0
+    novo = entrar(cliente, 'comum@teste')['token']
+    assert cliente.get('/estatisticas', headers=cabecalho(novo)).status_code == 200
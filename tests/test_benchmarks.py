@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import carga_api
+from conftest import cabecalho, entrar
+
+GERAR_DADOS = os.path.join(carga_api.RAIZ, 'benchmarks', 'gerar_dados.py')
+
+
+def _gerar(pasta):
+    subprocess.run(
+        [sys.executable, GERAR_DADOS, '--pasta', str(pasta), '--servidores', '60', '--documentos', '150',
+         '--pdfs', '3', '--tamanho-medio-pdf', '4000'],
+        check=True, capture_output=True,
+    )
+    with open(pasta / 'amostras.json') as arquivo:
+        return json.load(arquivo)
+
+
+@pytest.fixture(scope='module')
+def base_carga(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp('carga')
+    return pasta, _gerar(pasta)
+
+
+def _requisicao(cliente, metodo, caminho, kwargs, cabecalhos):
+    # Argumentos do requests (como em carga_api._cliente) traduzidos para o cliente de testes do Flask
+    dados = dict(kwargs.get('data', {}))
+    for campo, (nome, conteudo, tipo) in kwargs.get('files', {}).items():
+        dados[campo] = (io.BytesIO(conteudo), nome, tipo)
+    return cliente.open(
+        caminho, method=metodo, query_string=kwargs.get('params'), json=kwargs.get('json'),
+        data=dados or None, headers={**cabecalhos, **kwargs.get('headers', {})},
+    )
+
+
+def test_geracao_deterministica(base_carga, tmp_path):
+    pasta, amostras = base_carga
+    assert _gerar(tmp_path) == amostras
+    assert len(amostras['cpfs']) == 60 and amostras['maior_id_documento'] == 150
+    assert os.path.exists(pasta / amostras['pdf_upload'])
+
+
+def test_cenarios_contra_a_base_gerada(base_carga, criar_app):
+    pasta, amostras = base_carga
+    app = criar_app(migrar=False, SQLALCHEMY_DATABASE_URI=f"sqlite:///{pasta / 'bench.db'}",
+                    UPLOAD_FOLDER=str(pasta / 'documentos'))
+    cliente = app.test_client()
+    amostras = {**amostras, '_pdf': (pasta / amostras['pdf_upload']).read_bytes()}
+    cabecalhos = cabecalho(entrar(cliente, **amostras['usuario'])['token'])
+
+    aleatorio = random.Random(42)
+    for nome, cenario in carga_api.CENARIOS.items():
+        for _ in range(3):
+            metodo, caminho, kwargs, esperados = cenario(amostras, aleatorio)
+            with _requisicao(cliente, metodo, caminho, kwargs, cabecalhos) as resposta:
+                corpo = resposta.get_data()  # Como o harness: o corpo inteiro, também nos streams
+            assert resposta.status_code in esperados, (nome, resposta.status_code, corpo[:200])
+
+
+def _relatorio(pasta, nome, p95, erros=0):
+    caminho = pasta / nome
+    caminho.write_text(json.dumps({
+        'meta': {'commit': nome},
+        'memoria': {'rss_pico_mb': 100},
+        'cenarios': {'login': {'erros': erros, 'vazao_rps': 200, 'latencia_ms': {'p50': 10, 'p95': p95, 'p99': 40}}},
+    }))
+    return str(caminho)
+
+
+def test_comparar_aponta_regressoes(tmp_path, capsys):
+    base = _relatorio(tmp_path, 'base', 20)
+
+    def comparar(atual):
+        codigo = carga_api.comparar(SimpleNamespace(base=base, atual=atual, tolerancia=10, minimo_ms=1))
+        return codigo, [regressao['indicador'] for regressao in json.loads(capsys.readouterr().out)['regressoes']]
+
+    assert comparar(_relatorio(tmp_path, 'igual', 21)) == (0, [])
+    assert comparar(_relatorio(tmp_path, 'lento', 30)) == (1, ['latencia_ms.p95'])
+    assert comparar(_relatorio(tmp_path, 'com_erros', 20, erros=3)) == (1, ['erros'])
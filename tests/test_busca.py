@@ -0,0 +1,90 @@
+from sqlalchemy.dialects import postgresql
+
+import busca
+from models import db, Servidor, TextoDocumento
+from parametros import ler_cpf
+
+
+def _nomes(cliente, cabecalhos, nome):
+    resposta = cliente.get(f'/consulta_servidor?nome={nome}', headers=cabecalhos)
+    if resposta.status_code == 404:
+        return []
+    assert resposta.status_code == 200
+    return [servidor['nome'] for servidor in resposta.json['servidores']]
+
+
+def test_busca_por_nome_sem_acentos_e_por_prefixo(cliente, gestor, cadastrar_servidor):
+    cadastrar_servidor(nome='Cláudia Santos')
+    cadastrar_servidor(nome='Claudio Souza')
+    cadastrar_servidor(nome='Maria Santos')
+
+    assert _nomes(cliente, gestor, 'claud sant') == ['Cláudia Santos']
+    assert sorted(_nomes(cliente, gestor, 'CLAUDIA')) == ['Cláudia Santos']
+    assert sorted(_nomes(cliente, gestor, 'santos')) == ['Cláudia Santos', 'Maria Santos']
+
+
+def test_triggers_mantem_o_indice_de_nomes(app, cliente, gestor, cadastrar_servidor):
+    cpf = cadastrar_servidor(nome='Cláudia Santos')['cpf']
+    with app.app_context():
+        servidor = db.session.scalar(db.select(Servidor).where(Servidor.cpf == ler_cpf(cpf)))
+        servidor.nome = 'Joana Prado'
+        db.session.commit()
+
+    assert _nomes(cliente, gestor, 'claudia') == []
+    assert _nomes(cliente, gestor, 'joana') == ['Joana Prado']
+
+    with app.app_context():
+        db.session.execute(db.delete(Servidor).where(Servidor.cpf == ler_cpf(cpf)))
+        db.session.commit()
+    assert _nomes(cliente, gestor, 'joana') == []
+
+
+def test_sublinhado_no_nome_nao_e_curinga(app, cliente, gestor, cadastrar_servidor, monkeypatch):
+    cadastrar_servidor(nome='Ana_Paula Lima')
+    cadastrar_servidor(nome='Anaxpaula Lima')
+
+    # Bancos sem índice: ILIKE com o '_' escapado
+    monkeypatch.setattr(busca, 'backend', lambda: 'ilike')
+    assert _nomes(cliente, gestor, 'ana_p') == ['Ana_Paula Lima']
+
+    # PostgreSQL: o termo vai escapado para o LIKE sobre o índice de trigramas
+    monkeypatch.setattr(busca, 'backend', lambda: 'postgresql')
+    with app.app_context():
+        query, _ = busca.aplicar_filtro_nome(db.select(Servidor.id), 'ana_p')
+    compilada = query.compile(dialect=postgresql.dialect())
+    assert "ESCAPE '/'" in str(compilada)
+    assert 'ana/_p' in compilada.params.values()
+
+
+def _gravar_texto(app, documento_id, texto):
+    with app.app_context():
+        db.session.merge(TextoDocumento(documento_id=documento_id, texto=texto))
+        db.session.commit()
+
+
+def test_busca_no_texto_dos_documentos(app, cliente, gestor, cadastrar_servidor, enviar_documento):
+    cpf = cadastrar_servidor()['cpf']
+    certidao = enviar_documento(cpf, b'%PDF-1.4 a', tipo='Certidao')['id_documento']
+    contrato = enviar_documento(cpf, b'%PDF-1.4 b', tipo='Contrato')['id_documento']
+    _gravar_texto(app, certidao, 'Certidão de nascimento de Maria da Silva, matrícula 123')
+    _gravar_texto(app, contrato, 'Contrato de prestação de serviços')
+
+    resposta = cliente.get('/busca_documentos?q=nascimento "maria da silva"', headers=gestor)
+    assert resposta.status_code == 200
+    documentos = resposta.json['documentos']
+    assert [documento['id_documento'] for documento in documentos] == [certidao]
+    assert '<mark>nascimento</mark>' in documentos[0]['trecho']
+
+    assert cliente.get('/busca_documentos?q=certidao', headers=gestor).json['documentos'][0]['id_documento'] == certidao
+    assert cliente.get('/busca_documentos?q=matr*', headers=gestor).status_code == 200
+    assert cliente.get('/busca_documentos?q=servicos&tipo=Certidao', headers=gestor).status_code == 404
+
+    # Texto reextraído: o trigger troca a entrada do índice
+    _gravar_texto(app, certidao, 'Certidão de casamento')
+    assert cliente.get('/busca_documentos?q=nascimento', headers=gestor).status_code == 404
+    assert cliente.get('/busca_documentos?q=casamento', headers=gestor).status_code == 200
+
+
+def test_busca_sem_termos(cliente, gestor):
+    assert cliente.get('/busca_documentos', headers=gestor).status_code == 400
+    assert cliente.get('/busca_documentos?q=" "', headers=gestor).status_code == 400
@@ -0,0 +1,91 @@
+import json
+
+from conftest import novo_cpf
+
+
+def _paginas(cliente, cabecalhos, url, cursor=None):
+    ids = []
+    while True:
+        resposta = cliente.get(url + (f'&cursor={cursor}' if cursor else ''), headers=cabecalhos)
+        assert resposta.status_code == 200
+        ids.extend(servidor['id'] for servidor in resposta.json['servidores'])
+        cursor = resposta.json['proximo_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_paginacao_por_cursor_percorre_todos_sem_repetir(cliente, gestor, cadastrar_servidor):
+    for _ in range(5):
+        cadastrar_servidor()
+
+    primeira = cliente.get('/consulta_servidor?codigo_orgao=001&limit=2', headers=gestor).json
+    assert len(primeira['servidores']) == 2
+    assert primeira['proximo_cursor']
+
+    ids = _paginas(cliente, gestor, '/consulta_servidor?codigo_orgao=001&limit=2')
+    assert len(ids) == 5
+    assert ids == sorted(set(ids))
+
+
+def test_insercao_durante_a_paginacao_nao_repete_nem_pula(cliente, gestor, cadastrar_servidor):
+    for _ in range(4):
+        cadastrar_servidor()
+    primeira = cliente.get('/consulta_servidor?codigo_orgao=001&limit=2', headers=gestor).json
+
+    cadastrar_servidor()  # Entra no fim: o cursor é o id, não um deslocamento
+    resto = _paginas(cliente, gestor, '/consulta_servidor?codigo_orgao=001&limit=2', primeira['proximo_cursor'])
+    ids = [servidor['id'] for servidor in primeira['servidores']] + resto
+    assert len(ids) == 5
+    assert ids == sorted(set(ids))
+
+
+def test_cursor_e_limite_invalidos(cliente, gestor):
+    assert cliente.get('/consulta_servidor?codigo_orgao=001&cursor=nao-e-cursor', headers=gestor).status_code == 400
+    assert cliente.get('/consulta_servidor?codigo_orgao=001&limit=0', headers=gestor).status_code == 400
+
+
+def test_ndjson_transmite_um_servidor_por_linha(cliente, gestor, cadastrar_servidor):
+    cpfs = [cadastrar_servidor()['cpf'] for _ in range(3)]
+
+    resposta = cliente.get('/consulta_servidor?codigo_orgao=001&formato=ndjson', headers=gestor)
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'application/x-ndjson'
+    linhas = [json.loads(linha) for linha in resposta.get_data(as_text=True).splitlines()]
+    assert [linha['cpf'] for linha in linhas] == cpfs
+
+
+def test_consulta_por_cpf_usa_cache_e_invalida_no_cadastro(cliente, gestor, cadastrar_servidor):
+    cpf = novo_cpf()
+    digitos = cpf.replace('.', '').replace('-', '')
+
+    ausente = cliente.get(f'/consulta_servidor?cpf={cpf}', headers=gestor)
+    assert (ausente.status_code, ausente.headers['X-Cache']) == (404, 'MISS')
+    # Com ou sem pontuação, a mesma entrada
+    assert cliente.get(f'/consulta_servidor?cpf={digitos}', headers=gestor).headers['X-Cache'] == 'HIT'
+
+    cadastrar_servidor(cpf=cpf)
+    resposta = cliente.get(f'/consulta_servidor?cpf={cpf}', headers=gestor)
+    assert (resposta.status_code, resposta.headers['X-Cache']) == (200, 'MISS')
+    assert resposta.json['servidores'][0]['cpf'] == cpf
+    assert cliente.get(f'/consulta_servidor?cpf={cpf}', headers=gestor).headers['X-Cache'] == 'HIT'
+
+
+def test_cpf_invalido(cliente, gestor):
+    assert cliente.get('/consulta_servidor?cpf=111.444.777-36', headers=gestor).status_code == 400
+    resposta = cliente.post('/cadastro_servidor', headers=gestor, json={
+        'nome': 'X', 'cpf': '111.111.111-11', 'matricula': 'X', 'codigo_orgao': '001',
+        'ativo': True, 'cargo': 'A', 'lotacao': 'L',
+    })
+    assert resposta.status_code == 400
+
+
+def test_consulta_documentos_por_cursor(cliente, gestor, cadastrar_servidor, enviar_documento):
+    cpf = cadastrar_servidor()['cpf']
+    ids = [enviar_documento(cpf, f'%PDF-1.4 {numero}'.encode())['id_documento'] for numero in range(3)]
+
+    primeira = cliente.get(f'/consulta_documentos_?cpf={cpf}&limit=2', headers=gestor).json
+    segunda = cliente.get(f"/consulta_documentos_?cpf={cpf}&limit=2&cursor={primeira['proximo_cursor']}",
+                          headers=gestor).json
+    recebidos = [documento['id_documento'] for documento in primeira['documentos'] + segunda['documentos']]
+    assert recebidos == ids
+    assert segunda['proximo_cursor'] is None
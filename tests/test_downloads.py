@@ -0,0 +1,118 @@
+import io
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from models import db, Documento
+from parametros import ler_cpf
+
+CONTEUDO = b'%PDF-1.4\n' + bytes(range(256)) * 4
+
+
+@pytest.fixture
+def documento(cadastrar_servidor, enviar_documento):
+    return enviar_documento(cadastrar_servidor()['cpf'], CONTEUDO)
+
+
+def test_download_completo_com_etag(cliente, gestor, documento):
+    resposta = cliente.get(f"/download/{documento['id_documento']}", headers=gestor)
+    assert resposta.status_code == 200
+    assert resposta.data == CONTEUDO
+    assert resposta.headers['ETag'] == f'"{documento["sha256"]}"'
+    assert resposta.headers['Accept-Ranges'] == 'bytes'
+    assert resposta.headers['Content-Disposition'].startswith('attachment;')
+
+
+def test_validacao_condicional(cliente, gestor, documento):
+    url = f"/download/{documento['id_documento']}"
+    etag = cliente.get(url, headers=gestor).headers['ETag']
+    ultima = cliente.get(url, headers=gestor).headers['Last-Modified']
+
+    resposta = cliente.get(url, headers={**gestor, 'If-None-Match': etag})
+    assert resposta.status_code == 304
+    assert resposta.data == b''
+    assert resposta.headers['ETag'] == etag
+    assert cliente.get(url, headers={**gestor, 'If-Modified-Since': ultima}).status_code == 304
+    assert cliente.get(url, headers={**gestor, 'If-None-Match': '"outro"'}).status_code == 200
+
+
+def test_intervalo_unico(cliente, gestor, documento):
+    url = f"/download/{documento['id_documento']}"
+    resposta = cliente.get(url, headers={**gestor, 'Range': 'bytes=0-9'})
+    assert resposta.status_code == 206
+    assert resposta.data == CONTEUDO[:10]
+    assert resposta.headers['Content-Range'] == f'bytes 0-9/{len(CONTEUDO)}'
+
+    sufixo = cliente.get(url, headers={**gestor, 'Range': 'bytes=-5'})
+    assert (sufixo.status_code, sufixo.data) == (206, CONTEUDO[-5:])
+
+
+def test_varios_intervalos_em_multipart(cliente, gestor, documento):
+    resposta = cliente.get(f"/download/{documento['id_documento']}", headers={**gestor, 'Range': 'bytes=0-4,100-109'})
+    assert resposta.status_code == 206
+    assert resposta.mimetype == 'multipart/byteranges'
+    fronteira = resposta.mimetype_params['boundary'].encode()
+    partes = [parte for parte in resposta.data.split(b'--' + fronteira) if parte.strip(b'\r\n-')]
+    assert len(partes) == 2
+    assert partes[0].endswith(b'\r\n\r\n' + CONTEUDO[:5] + b'\r\n')
+    assert f'Content-Range: bytes 100-109/{len(CONTEUDO)}'.encode() in partes[1]
+    assert partes[1].endswith(b'\r\n\r\n' + CONTEUDO[100:110] + b'\r\n')
+
+
+def test_intervalo_fora_do_arquivo_e_if_range(cliente, gestor, documento):
+    url = f"/download/{documento['id_documento']}"
+    fora = cliente.get(url, headers={**gestor, 'Range': f'bytes={len(CONTEUDO) + 10}-'})
+    assert fora.status_code == 416
+    assert fora.headers['Content-Range'] == f'bytes */{len(CONTEUDO)}'
+
+    # If-Range com ETag antigo: o arquivo mudou para o cliente, vai inteiro
+    inteiro = cliente.get(url, headers={**gestor, 'Range': 'bytes=0-9', 'If-Range': '"antigo"'})
+    assert (inteiro.status_code, inteiro.data) == (200, CONTEUDO)
+
+
+def test_documento_inexistente(cliente, gestor):
+    assert cliente.get('/download/999', headers=gestor).status_code == 404
+
+
+def _documento_legado(app, cpf, caminho):
+    # Linha anterior ao armazenamento por conteúdo: sem sha256 nem tamanho
+    with app.app_context():
+        documento = Documento(cpf_servidor=ler_cpf(cpf), hora_cadastro=datetime(2020, 1, 2, 10, 0),
+                              tipo='RG', caminho_arquivo=str(caminho))
+        db.session.add(documento)
+        db.session.commit()
+        return documento.id
+
+
+def test_documento_legado_sem_hash(app, cliente, gestor, cadastrar_servidor, tmp_path):
+    cpf = cadastrar_servidor()['cpf']
+    ausente = f"/download/{_documento_legado(app, cpf, tmp_path / 'sumiu.pdf')}"
+    # Sem hash nem arquivo não há validador: nada de ETag, 304 ou Range, só o 404
+    for cabecalhos in ({}, {'If-None-Match': '*'}, {'If-None-Match': '"abc"'}, {'Range': 'bytes=0-9', 'If-Range': '"abc"'}):
+        resposta = cliente.get(ausente, headers={**gestor, **cabecalhos})
+        assert resposta.status_code == 404, cabecalhos
+        assert 'ETag' not in resposta.headers
+
+    arquivo = tmp_path / 'legado.pdf'
+    arquivo.write_bytes(CONTEUDO)
+    url = f"/download/{_documento_legado(app, cpf, arquivo)}"
+    # Com o arquivo no disco o hash é calculado no primeiro acesso e passa a valer como ETag
+    intervalo = cliente.get(url, headers={**gestor, 'Range': 'bytes=0-9', 'If-Range': '"abc"'})
+    assert (intervalo.status_code, intervalo.data) == (200, CONTEUDO)
+    etag = intervalo.headers['ETag']
+    assert cliente.get(url, headers={**gestor, 'If-None-Match': etag}).status_code == 304
+    assert cliente.get(url, headers={**gestor, 'Range': 'bytes=0-9', 'If-Range': etag}).status_code == 206
+
+
+def test_download_lote_em_zip(cliente, gestor, cadastrar_servidor, enviar_documento):
+    cpf = cadastrar_servidor()['cpf']
+    enviar_documento(cpf, b'%PDF-1.4 um', tipo='RG')
+    enviar_documento(cpf, b'%PDF-1.4 dois', tipo='Certidao')
+
+    resposta = cliente.get(f'/download_lote?cpf={cpf}', headers=gestor)
+    assert resposta.status_code == 200
+    assert resposta.headers['X-Documentos'] == '2'
+    with zipfile.ZipFile(io.BytesIO(resposta.data)) as pacote:
+        conteudos = sorted(pacote.read(nome) for nome in pacote.namelist())
+    assert conteudos == [b'%PDF-1.4 dois', b'%PDF-1.4 um']
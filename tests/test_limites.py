@@ -0,0 +1,32 @@
+from conftest import cabecalho, entrar
+
+
+def test_limite_por_usuario(criar_app):
+    app = criar_app(LIMITE_ATIVO=True, LIMITE_USUARIO_TAXA=0.01, LIMITE_USUARIO_RAJADA=3,
+                    LIMITE_IP_TAXA=1000, LIMITE_IP_RAJADA=1000)
+    cliente = app.test_client()
+    cliente.post('/cadastro', json={'nome': 'G', 'email': 'g@teste', 'senha': 'senha', 'tipo': 'gestor'})
+    cliente.post('/cadastro', headers=cabecalho(entrar(cliente, 'g@teste')['token']),
+                 json={'nome': 'C', 'email': 'c@teste', 'senha': 'senha', 'tipo': 'comum'})
+    gestor = cabecalho(entrar(cliente, 'g@teste')['token'])
+    comum = cabecalho(entrar(cliente, 'c@teste')['token'])
+
+    # O cadastro acima já gastou uma ficha do gestor
+    assert [cliente.get('/estatisticas', headers=gestor).status_code for _ in range(3)] == [200, 200, 429]
+    recusada = cliente.get('/estatisticas', headers=gestor)
+    assert recusada.status_code == 429
+    assert int(recusada.headers['Retry-After']) >= 1
+    # Cada usuário tem o seu balde
+    assert cliente.get('/estatisticas', headers=comum).status_code == 200
+
+    with app.app_context():
+        assert app.extensions['autorizacao']['limitador'].estatisticas()['recusadas']['usuario'] == 2
+
+
+def test_limite_por_ip(criar_app):
+    app = criar_app(LIMITE_ATIVO=True, LIMITE_IP_TAXA=0.01, LIMITE_IP_RAJADA=2)
+    cliente = app.test_client()
+
+    assert [cliente.get('/.well-known/jwks.json').status_code for _ in range(3)] == [200, 200, 429]
+    outro_ip = cliente.get('/.well-known/jwks.json', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert outro_ip.status_code == 200
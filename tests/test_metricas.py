@@ -0,0 +1,18 @@
+from conftest import cabecalho
+
+
+def test_metricas_exigem_gestor(cliente, gestor, comum):
+    assert cliente.get('/metrics').status_code == 401
+    assert cliente.get('/metrics', headers=comum).status_code == 403
+
+    resposta = cliente.get('/metrics', headers=gestor)
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'text/plain'
+    assert 'serpro_' in resposta.get_data(as_text=True)
+
+
+def test_token_de_coleta(criar_app):
+    cliente = criar_app(METRICAS_TOKEN='segredo').test_client()
+    assert cliente.get('/metrics', headers=cabecalho('segredo')).status_code == 200
+    assert cliente.get('/metrics', headers=cabecalho('outro')).status_code == 401
+    assert cliente.get('/metrics').status_code == 401
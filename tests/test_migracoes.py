@@ -0,0 +1,135 @@
+import pytest
+from alembic import command
+
+import migracoes
+from conftest import cabecalho, entrar
+from models import db
+from parametros import digitos_verificadores
+
+# Esquema criado pelo create_all das versões anteriores às migrações
+ESQUEMA_ORIGINAL = [
+    '''CREATE TABLE usuarios (
+        id INTEGER PRIMARY KEY, nome VARCHAR(100) NOT NULL, email VARCHAR(100) NOT NULL UNIQUE,
+        senha_hash VARCHAR(255) NOT NULL, tipo VARCHAR(50) NOT NULL)''',
+    '''CREATE TABLE servidores (
+        id INTEGER PRIMARY KEY, nome VARCHAR(100) NOT NULL, cpf VARCHAR(14) NOT NULL UNIQUE,
+        matricula VARCHAR(50) NOT NULL UNIQUE, codigo_orgao VARCHAR(10) NOT NULL, ativo BOOLEAN NOT NULL,
+        cargo VARCHAR(100) NOT NULL, lotacao VARCHAR(100) NOT NULL)''',
+    '''CREATE TABLE documentos (
+        id INTEGER PRIMARY KEY, cpf_servidor VARCHAR(14) NOT NULL REFERENCES servidores (cpf),
+        hora_cadastro DATETIME NOT NULL, tipo VARCHAR(50) NOT NULL, caminho_arquivo VARCHAR(255) NOT NULL)''',
+]
+
+
+def _cpf(base):
+    digitos = base + digitos_verificadores(base)
+    return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
+
+
+def _inteiro(cpf):
+    return int(cpf.replace('.', '').replace('-', ''))
+
+
+CPF = _cpf('529982247')
+CPF_ZERO = _cpf('012345678')  # Zero à esquerda: some no inteiro e volta na formatação
+
+
+def _executar(app, *comandos, parametros=None):
+    with app.app_context():
+        resultados = [db.session.execute(db.text(comando), parametros or {}) for comando in comandos]
+        linhas = resultados[-1].all() if resultados[-1].returns_rows else None
+        db.session.commit()
+        return linhas
+
+
+def _triggers(app):
+    return _executar(app, "SELECT name FROM sqlite_master WHERE type = 'trigger' ORDER BY name")
+
+
+def _inserir_servidores(app, *cpfs):
+    for numero, cpf in enumerate(cpfs):
+        _executar(
+            app,
+            "INSERT INTO servidores (nome, cpf, matricula, codigo_orgao, ativo, cargo, lotacao) "
+            "VALUES (:nome, :cpf, :matricula, '001', 1, 'Analista', 'Sede')",
+            parametros={'nome': f'Cláudia {numero}', 'cpf': cpf, 'matricula': f'M{numero}'},
+        )
+        _executar(
+            app,
+            "INSERT INTO documentos (cpf_servidor, hora_cadastro, tipo, caminho_arquivo) "
+            "VALUES (:cpf, '2024-01-02 10:00:00', 'RG', '/tmp/inexistente.pdf')",
+            parametros={'cpf': cpf},
+        )
+
+
+@pytest.mark.filterwarnings('error::sqlalchemy.exc.SADeprecationWarning')
+def test_banco_anterior_as_migracoes(criar_app):
+    app = criar_app(migrar=False)
+    _executar(app, *ESQUEMA_ORIGINAL)
+    _executar(app, "INSERT INTO usuarios (nome, email, senha_hash, tipo) VALUES ('G', 'g@teste', :hash, 'gestor')",
+              parametros={'hash': app.extensions['senhas'].gerar('senha')})
+    _inserir_servidores(app, CPF)
+
+    migracoes.atualizar(app)
+
+    assert _executar(app, 'SELECT version_num FROM alembic_version') == [('0003',)]
+    assert _executar(app, 'SELECT typeof(cpf), cpf FROM servidores') == [('integer', _inteiro(CPF))]
+    cliente = app.test_client()
+    gestor = cabecalho(entrar(cliente, 'g@teste')['token'])
+    # Dados anteriores entram no índice de nomes e nos resumos
+    assert cliente.get('/consulta_servidor?nome=claudia', headers=gestor).json['servidores'][0]['cpf'] == CPF
+    estatisticas = cliente.get('/estatisticas?desde=2024-01-01&ate=2024-01-31', headers=gestor).json
+    assert estatisticas['servidores']['total'] == 1
+    assert estatisticas['documentos']['total'] == 1
+    assert cliente.get(f'/consulta_documentos?cpf={CPF}', headers=gestor).status_code == 200
+
+
+def test_cpf_vira_inteiro_e_volta_a_texto(criar_app):
+    app = criar_app(migrar=False)
+    migracoes.atualizar(app, '0002')
+    _inserir_servidores(app, CPF, CPF_ZERO)
+    _executar(app, "INSERT INTO uploads_pendentes (id, cpf_servidor, tipo, caminho_arquivo, recebido, proxima_parte, criado_em) "
+                   "VALUES ('u1', :cpf, 'RG', '/tmp/parcial', 0, 0, '2024-01-02 10:00:00')", parametros={'cpf': CPF_ZERO})
+    triggers = _triggers(app)
+    mudancas = _executar(app, 'SELECT count(*) FROM mudancas')
+
+    migracoes.atualizar(app)
+    for tabela, coluna in (('servidores', 'cpf'), ('documentos', 'cpf_servidor'), ('uploads_pendentes', 'cpf_servidor')):
+        assert {tipo for tipo, in _executar(app, f'SELECT typeof({coluna}) FROM {tabela}')} == {'integer'}
+    assert _executar(app, 'SELECT cpf FROM servidores ORDER BY id') == [(_inteiro(CPF),), (_inteiro(CPF_ZERO),)]
+    # Triggers recriados, e a conversão em si não entra no registro de mudanças
+    assert _triggers(app) == triggers
+    assert _executar(app, 'SELECT count(*) FROM mudancas') == mudancas
+
+    cliente = app.test_client()
+    cliente.post('/cadastro', json={'nome': 'G', 'email': 'g@teste', 'senha': 'senha', 'tipo': 'gestor'})
+    gestor = cabecalho(entrar(cliente, 'g@teste')['token'])
+    assert cliente.get(f'/consulta_servidor?cpf={CPF_ZERO}', headers=gestor).json['servidores'][0]['cpf'] == CPF_ZERO
+    assert cliente.get('/consulta_servidor?nome=claudia', headers=gestor).status_code == 200
+
+    command.downgrade(migracoes.configuracao(app), '0002')
+    assert _executar(app, 'SELECT typeof(cpf), cpf FROM servidores ORDER BY id') == [('text', CPF), ('text', CPF_ZERO)]
+    assert _executar(app, 'SELECT cpf_servidor FROM uploads_pendentes') == [(CPF_ZERO,)]
+    assert _triggers(app) == triggers
+
+
+def test_cpf_fora_do_formato_interrompe_a_migracao(criar_app):
+    app = criar_app(migrar=False)
+    migracoes.atualizar(app, '0002')
+    _inserir_servidores(app, '123.456')
+
+    with pytest.raises(RuntimeError, match='servidores.cpf'):
+        migracoes.atualizar(app)
+    assert _executar(app, 'SELECT version_num FROM alembic_version') == [('0002',)]
+    assert _executar(app, 'SELECT cpf FROM servidores') == [('123.456',)]
+
+
+def test_reverter_tudo_e_aplicar_de_novo(criar_app):
+    app = criar_app()
+    triggers = _triggers(app)
+    command.downgrade(migracoes.configuracao(app), 'base')
+    assert _executar(app, "SELECT name FROM sqlite_master WHERE name IN ('servidores', 'mudancas', 'servidores_busca')") == []
+
+    migracoes.atualizar(app)
+    assert _executar(app, 'SELECT version_num FROM alembic_version') == [('0003',)]
+    assert _triggers(app) == triggers
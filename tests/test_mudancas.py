@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from models import db, Mudanca, Servidor
+from parametros import codificar_cursor, ler_cpf
+
+
+def _cursor_atual(cliente, cabecalhos):
+    resposta = cliente.get('/mudancas', headers=cabecalhos)
+    assert resposta.status_code == 200
+    assert resposta.json['mudancas'] == []
+    return resposta.json['proximo_cursor']
+
+
+def test_mudancas_depois_do_cursor(app, cliente, gestor, cadastrar_servidor, enviar_documento):
+    antigo = cadastrar_servidor()['cpf']  # Antes da carga completa: fora do feed
+    cursor = _cursor_atual(cliente, gestor)
+
+    cpf = cadastrar_servidor(nome='Nome Antigo')['cpf']
+    documento = enviar_documento(cpf)
+    with app.app_context():
+        servidor = db.session.scalar(db.select(Servidor).where(Servidor.cpf == ler_cpf(cpf)))
+        servidor.nome = 'Nome Novo'
+        db.session.execute(db.delete(Servidor).where(Servidor.cpf == ler_cpf(antigo)))
+        db.session.commit()
+
+    resposta = cliente.get(f'/mudancas?desde={cursor}', headers=gestor).json
+    mudancas = resposta['mudancas']
+    # Inserção e alteração do mesmo servidor viram uma entrada, com o estado atual
+    assert [(mudanca['entidade'], mudanca['operacao']) for mudanca in mudancas] == [
+        ('documento', 'insercao'), ('servidor', 'atualizacao'), ('servidor', 'remocao'),
+    ]
+    assert mudancas[0]['id'] == documento['id_documento']
+    assert mudancas[0]['dados']['cpf_servidor'] == cpf
+    assert (mudancas[1]['dados']['nome'], mudancas[1]['dados']['cpf']) == ('Nome Novo', cpf)
+    assert mudancas[2]['dados'] is None
+    assert resposta['tem_mais'] is False
+
+    # Sem mudanças novas: página vazia e o mesmo cursor
+    seguinte = cliente.get(f"/mudancas?desde={resposta['proximo_cursor']}", headers=gestor).json
+    assert (seguinte['mudancas'], seguinte['proximo_cursor']) == ([], resposta['proximo_cursor'])
+
+
+def test_filtro_por_entidade_e_paginas(cliente, gestor, cadastrar_servidor, enviar_documento):
+    cursor = _cursor_atual(cliente, gestor)
+    cpfs = [cadastrar_servidor()['cpf'] for _ in range(3)]
+    enviar_documento(cpfs[0])
+
+    documentos = cliente.get(f'/mudancas?desde={cursor}&entidade=documento', headers=gestor).json
+    assert [mudanca['entidade'] for mudanca in documentos['mudancas']] == ['documento']
+
+    recebidos = []
+    while True:
+        pagina = cliente.get(f'/mudancas?desde={cursor}&entidade=servidor&limit=2', headers=gestor).json
+        recebidos.extend(mudanca['dados']['cpf'] for mudanca in pagina['mudancas'])
+        cursor = pagina['proximo_cursor']
+        if not pagina['tem_mais']:
+            break
+    assert recebidos == cpfs
+
+
+def test_parametros_invalidos(cliente, gestor):
+    assert cliente.get('/mudancas?desde=invalido', headers=gestor).status_code == 400
+    assert cliente.get(f'/mudancas?desde={codificar_cursor(id=0)}&entidade=usuario', headers=gestor).status_code == 400
+
+
+def test_cursor_expirado_pela_retencao(app, cliente, gestor, cadastrar_servidor):
+    inicio = _cursor_atual(cliente, gestor)
+    cadastrar_servidor()
+    cadastrar_servidor()
+    with app.app_context():
+        db.session.execute(db.update(Mudanca).values(registrado_em=datetime.now() - timedelta(days=40)))
+        db.session.commit()
+    recente = cadastrar_servidor()['cpf']
+
+    resultado = app.test_cli_runner().invoke(args=['mudancas', 'limpar', '--dias', '30'])
+    assert resultado.exit_code == 0, resultado.output
+
+    assert cliente.get(f'/mudancas?desde={inicio}', headers=gestor).status_code == 410
+    # O cursor atual continua válido, e o horizonte impede que volte a um id já apagado
+    atual = _cursor_atual(cliente, gestor)
+    assert cliente.get(f'/mudancas?desde={atual}', headers=gestor).status_code == 200
+    with app.app_context():
+        horizonte = db.session.scalar(db.select(db.func.min(Mudanca.id))) - 1
+    pagina = cliente.get(f'/mudancas?desde={codificar_cursor(id=horizonte)}', headers=gestor).json
+    assert [mudanca['dados']['cpf'] for mudanca in pagina['mudancas']] == [recente]
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import senhas
+from models import db, Usuario
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def criar(**opcoes):
+        pool = senhas.PoolSenhas(processos=1, **opcoes)
+        pools.append(pool)
+        return pool
+
+    yield criar
+    for pool in pools:
+        if pool._executor is not None:
+            pool._executor.shutdown(cancel_futures=True)
+
+
+def test_rehash_compara_metodo_e_custo_completos(pool):
+    # Método sem custo explícito: o Werkzeug grava o custo padrão no hash
+    padrao = pool(metodo='pbkdf2:sha256')
+    assert not padrao.precisa_rehash(padrao.gerar('senha'))
+    assert padrao.prefixo().startswith('pbkdf2:sha256:')
+
+    barato = pool(metodo='pbkdf2:sha256:1000')
+    assert not barato.precisa_rehash(barato.gerar('senha'))
+    assert barato.precisa_rehash(generate_password_hash('senha', 'pbkdf2:sha256:2000'))
+    assert barato.precisa_rehash(generate_password_hash('senha', 'scrypt:16384:8:1'))
+
+
+def test_fila_cheia_e_tempo_esgotado_viram_sobrecarga(pool):
+    lento = pool(timeout=0.2)
+    with pytest.raises(senhas.SobrecargaSenhas):
+        lento._executar(time.sleep, 1)
+    estatisticas = lento.estatisticas()
+    assert (estatisticas['expiradas'], estatisticas['em_andamento']) == (1, 0)
+
+    cheio = pool(fila_maxima=1)
+    cheio._em_andamento = 1  # Uma verificação já em andamento
+    with pytest.raises(senhas.SobrecargaSenhas):
+        cheio.verificar('hash', 'senha')
+    assert cheio.estatisticas()['recusadas'] == 1
+
+
+def test_login_regrava_hash_antigo(criar_app):
+    app = criar_app(SENHA_METODO='pbkdf2:sha256:2000')
+    with app.app_context():
+        db.session.add(Usuario(nome='G', email='g@teste', tipo='gestor',
+                               senha_hash=generate_password_hash('senha', 'pbkdf2:sha256:1000')))
+        db.session.commit()
+    cliente = app.test_client()
+
+    assert cliente.post('/login', json={'email': 'g@teste', 'senha': 'senha'}).status_code == 200
+    with app.app_context():
+        senha_hash = db.session.scalar(db.select(Usuario.senha_hash))
+    assert senha_hash.startswith('pbkdf2:sha256:2000$')
+    assert app.extensions['senhas'].estatisticas()['rehashes'] == 1
+    # O hash novo continua valendo, e não é regravado de novo
+    assert cliente.post('/login', json={'email': 'g@teste', 'senha': 'senha'}).status_code == 200
+    assert app.extensions['senhas'].estatisticas()['rehashes'] == 1
@@ -0,0 +1,113 @@
+import estatisticas
+from conftest import dados_servidor, novo_cpf
+from models import db, ResumoServidores
+
+
+def _totais(cliente, cabecalhos):
+    return cliente.get('/estatisticas', headers=cabecalhos).json['servidores']
+
+
+def test_cadastro_atualiza_os_resumos(cliente, gestor, cadastrar_servidor):
+    cadastrar_servidor(codigo_orgao='001', lotacao='Sede', ativo=True)
+    cadastrar_servidor(codigo_orgao='001', lotacao='Sede', ativo=False)
+    cadastrar_servidor(codigo_orgao='002', lotacao='Filial', ativo=True)
+
+    totais = _totais(cliente, gestor)
+    assert (totais['total'], totais['ativos'], totais['inativos']) == (3, 2, 1)
+    assert cliente.get('/estatisticas?codigo_orgao=002', headers=gestor).json['servidores']['total'] == 1
+
+
+def test_cadastro_normaliza_como_a_carga(app, cliente, gestor):
+    # Mesmos valores que a carga em lote aceita: texto com espaços e ativo como texto ou número
+    for ativo in ('false', 'sim', 0):
+        dados = dados_servidor(lotacao=' Sede ', cargo='Analista ', ativo=ativo)
+        assert cliente.post('/cadastro_servidor', headers=gestor, json=dados).status_code == 201
+
+    assert [(linha['lotacao'], linha['ativos'], linha['inativos']) for linha in
+            cliente.get('/estatisticas', headers=gestor).json['servidores']['por_lotacao']] == [('Sede', 1, 2)]
+    # Os resumos batem com as linhas gravadas
+    with app.app_context():
+        assert estatisticas.reconstruir()['divergencias_servidores'] == 0
+
+
+def test_resumos_em_banco_sem_upsert(app, cadastrar_servidor, monkeypatch):
+    cadastrar_servidor(ativo=True)
+    # Outros bancos: UPDATE do grupo e INSERT só quando ele ainda não existe
+    monkeypatch.setattr(estatisticas, '_dialeto', lambda: 'mysql')
+    cadastrar_servidor(ativo=True)
+    cadastrar_servidor(ativo=False)
+    with app.app_context():
+        estatisticas.contar_servidores([dados_servidor(ativo=False)])
+        db.session.rollback()  # Nada gravado fora da transação do chamador
+        assert estatisticas.reconstruir()['divergencias_servidores'] == 0
+        assert sorted(linha.quantidade for linha in db.session.scalars(db.select(ResumoServidores))) == [1, 2]
+
+
+def test_cadastro_com_campos_ausentes(cliente, gestor):
+    dados = dados_servidor()
+    del dados['lotacao']
+    assert cliente.post('/cadastro_servidor', headers=gestor, json=dados).status_code == 400
+
+
+def test_carga_em_lote_csv_e_json(cliente, gestor, cadastrar_servidor):
+    existente = cadastrar_servidor()['cpf']
+    novos = [novo_cpf(), novo_cpf()]
+    csv = 'nome,cpf,matricula,codigo_orgao,ativo,cargo,lotacao\n' + ''.join(
+        f'Servidor {numero},{cpf},L{numero},001,true,Analista,Sede\n'
+        for numero, cpf in enumerate(novos + [existente, '123'])
+    )
+
+    resposta = cliente.post('/cadastro_servidor/lote', headers={**gestor, 'Content-Type': 'text/csv'}, data=csv)
+    assert resposta.status_code == 200
+    assert (resposta.json['recebidos'], resposta.json['inseridos']) == (4, 2)
+    # Linhas do arquivo, contando o cabeçalho
+    assert sorted(erro['linha'] for erro in resposta.json['erros']) == [4, 5]
+
+    lote = [dados_servidor(), dados_servidor()]
+    resposta = cliente.post('/cadastro_servidor/lote', headers=gestor, json=lote)
+    assert (resposta.status_code, resposta.json['inseridos']) == (200, 2)
+    assert _totais(cliente, gestor)['total'] == 5
+
+
+def test_consulta_em_lote(cliente, gestor, cadastrar_servidor, enviar_documento):
+    servidor = cadastrar_servidor()
+    enviar_documento(servidor['cpf'])
+    digitos = servidor['cpf'].replace('.', '').replace('-', '')
+
+    resposta = cliente.post('/consulta_servidor/lote', headers=gestor,
+                            json={'cpfs': [digitos, '529.982.247-25'], 'incluir_documentos': True})
+    assert resposta.status_code == 200
+    assert (resposta.json['recebidos'], resposta.json['encontrados']) == (2, 1)
+    # Um resultado por entrada, na ordem recebida
+    encontrado, ausente = resposta.json['resultados']
+    assert (encontrado['entrada'], encontrado['servidor']['cpf']) == (digitos, servidor['cpf'])
+    assert encontrado['servidor']['quantidade_documentos'] == 1
+    assert ausente == {'entrada': '529.982.247-25', 'encontrado': False}
+
+    por_matricula = cliente.post('/consulta_servidor/lote', headers=gestor, json={'matriculas': [servidor['matricula']]})
+    assert por_matricula.json['resultados'][0]['servidor']['cpf'] == servidor['cpf']
+    ambos = cliente.post('/consulta_servidor/lote', headers=gestor, json={'cpfs': [digitos], 'matriculas': ['X']})
+    assert ambos.status_code == 400
+
+
+def _resumo(app):
+    with app.app_context():
+        return db.session.execute(db.select(ResumoServidores.__table__).order_by(*ResumoServidores.__table__.c)).all()
+
+
+def test_cadastro_duplicado_nao_altera_os_resumos(app, cliente, gestor, cadastrar_servidor):
+    existente = cadastrar_servidor()
+    resumo = _resumo(app)
+
+    repetido = cliente.post('/cadastro_servidor', headers=gestor, json=dados_servidor(cpf=existente['cpf'], matricula='OUTRA'))
+    assert (repetido.status_code, repetido.json) == (409, {'erro': 'CPF já cadastrado.'})
+    repetida = cliente.post('/cadastro_servidor', headers=gestor, json=dados_servidor(matricula=existente['matricula']))
+    assert (repetida.status_code, repetida.json) == (409, {'erro': 'Matrícula já cadastrada.'})
+    nulo = cliente.post('/cadastro_servidor', headers=gestor, json=dados_servidor(nome=None))
+    assert nulo.status_code == 400
+
+    assert _resumo(app) == resumo
+    assert _totais(cliente, gestor)['total'] == 1
+    # A sessão foi desfeita: o próximo cadastro segue normalmente
+    cadastrar_servidor()
+    assert _totais(cliente, gestor)['total'] == 2
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from werkzeug.http import parse_date
+
+import tarefas
+
+
+def test_situacao_do_processamento_com_nova_tentativa(app, cliente, gestor, cadastrar_servidor, enviar_documento):
+    documento_id = enviar_documento(cadastrar_servidor()['cpf'])['id_documento']
+    url = f'/documento/{documento_id}/processamento'
+
+    situacao = cliente.get(url, headers=gestor).json
+    assert (situacao['status'], situacao['tentativas']) == ('pendente', 0)
+
+    with app.app_context():
+        tarefa, = tarefas.reservar(1, 60)
+        assert cliente.get(url, headers=gestor).json['status'] == 'processando'
+        tarefas.falhar(tarefa, 'Erro temporário', False, max_tentativas=5, atraso_base=30, atraso_maximo=3600)
+
+    situacao = cliente.get(url, headers=gestor).json
+    assert (situacao['status'], situacao['tentativas'], situacao['erro']) == ('pendente', 1, 'Erro temporário')
+    # Mesmo formato de data das demais respostas (RFC 822, como em /mudancas)
+    proxima = parse_date(situacao['proxima_tentativa'])
+    assert proxima is not None and situacao['proxima_tentativa'].endswith(' GMT')
+    espera = (proxima.replace(tzinfo=None) - datetime.now().replace(microsecond=0)).total_seconds()
+    assert 0 < espera <= 31
+
+    with app.app_context():
+        assert tarefas.estatisticas()['pendente'] == 1
+
+
+def test_falha_definitiva(app, cliente, gestor, cadastrar_servidor, enviar_documento):
+    documento_id = enviar_documento(cadastrar_servidor()['cpf'])['id_documento']
+    with app.app_context():
+        tarefa, = tarefas.reservar(1, 60)
+        tarefas.falhar(tarefa, 'Não é um PDF', True, max_tentativas=5, atraso_base=30, atraso_maximo=3600)
+
+    situacao = cliente.get(f'/documento/{documento_id}/processamento', headers=gestor).json
+    assert (situacao['status'], situacao['proxima_tentativa']) == ('invalido', None)
+    assert cliente.get('/documento/999/processamento', headers=gestor).status_code == 404
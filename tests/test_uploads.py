@@ -0,0 +1,77 @@
+import hashlib
+
+import uploads
+from conftest import cabecalho, dados_servidor, entrar, novo_cpf
+
+
+def _iniciar(cliente, cabecalhos, cpf, **extras):
+    resposta = cliente.post('/upload/iniciar', headers=cabecalhos,
+                            json={'cpf_servidor': cpf, 'tipo_documento': 'Certidao', **extras})
+    assert resposta.status_code == 201, resposta.json
+    return resposta.json['upload_id']
+
+
+def _parte(cliente, cabecalhos, upload_id, numero, conteudo):
+    return cliente.put(f'/upload/{upload_id}/partes/{numero}', headers=cabecalhos, data=conteudo,
+                       content_type='application/octet-stream')
+
+
+def test_upload_em_partes_retomado(cliente, gestor, cadastrar_servidor):
+    cpf = cadastrar_servidor()['cpf']
+    partes = [b'%PDF-1.4 ', b'parte dois ', b'parte tres']
+    conteudo = b''.join(partes)
+    upload_id = _iniciar(cliente, gestor, cpf, tamanho=len(conteudo))
+
+    assert _parte(cliente, gestor, upload_id, 0, partes[0]).json['proxima_parte'] == 1
+    # Reenvio da última parte (resposta perdida): aceito sem gravar de novo
+    repetida = _parte(cliente, gestor, upload_id, 0, partes[0])
+    assert (repetida.status_code, repetida.json['recebido']) == (200, len(partes[0]))
+    # Parte pulada: 409 com a parte esperada
+    fora_de_ordem = _parte(cliente, gestor, upload_id, 2, partes[2])
+    assert (fora_de_ordem.status_code, fora_de_ordem.json['proxima_parte']) == (409, 1)
+
+    # Outro worker (ou processo reiniciado): o hash parcial é refeito a partir do arquivo
+    uploads._hashes.clear()
+    situacao = cliente.get(f'/upload/{upload_id}', headers=gestor).json
+    assert situacao['proxima_parte'] == 1
+    assert _parte(cliente, gestor, upload_id, 1, partes[1]).status_code == 200
+    assert _parte(cliente, gestor, upload_id, 2, partes[2]).status_code == 200
+
+    errado = cliente.post(f'/upload/{upload_id}/finalizar', headers=gestor, json={'sha256': '0' * 64})
+    assert errado.status_code == 422
+
+    sha256 = hashlib.sha256(conteudo).hexdigest()
+    resposta = cliente.post(f'/upload/{upload_id}/finalizar', headers=gestor, json={'sha256': sha256})
+    assert resposta.status_code == 201
+    assert (resposta.json['sha256'], resposta.json['tamanho']) == (sha256, len(conteudo))
+
+    assert cliente.get(f'/upload/{upload_id}', headers=gestor).status_code == 404
+    download = cliente.get(f"/download/{resposta.json['id_documento']}", headers=gestor)
+    assert download.data == conteudo
+
+
+def test_upload_em_partes_respeita_tamanho_maximo(criar_app):
+    app = criar_app(MAX_TAMANHO_DOCUMENTO=10)
+    cliente = app.test_client()
+    cliente.post('/cadastro', json={'nome': 'G', 'email': 'g@teste', 'senha': 'senha', 'tipo': 'gestor'})
+    cabecalhos = cabecalho(entrar(cliente, 'g@teste')['token'])
+    cpf = novo_cpf()
+    assert cliente.post('/cadastro_servidor', headers=cabecalhos, json=dados_servidor(cpf)).status_code == 201
+
+    previsto = cliente.post('/upload/iniciar', headers=cabecalhos,
+                            json={'cpf_servidor': cpf, 'tipo_documento': 'X', 'tamanho': 11})
+    assert previsto.status_code == 413
+
+    upload_id = _iniciar(cliente, cabecalhos, cpf)
+    assert _parte(cliente, cabecalhos, upload_id, 0, b'123456').status_code == 200
+    assert _parte(cliente, cabecalhos, upload_id, 1, b'123456').status_code == 413
+    # A parte recusada não conta: o upload continua de onde estava
+    assert cliente.get(f'/upload/{upload_id}', headers=cabecalhos).json == {
+        'upload_id': upload_id, 'proxima_parte': 1, 'recebido': 6
+    }
+
+
+def test_upload_inexistente(cliente, gestor):
+    assert cliente.get('/upload/naoexiste', headers=gestor).status_code == 404
+    assert _parte(cliente, gestor, 'naoexiste', 0, b'x').status_code == 404
+    assert cliente.post('/upload/naoexiste/finalizar', headers=gestor, json={}).status_code == 404
@@ -0,0 +1,201 @@
+'''Upload de documentos em partes, com retomada e SHA-256 calculado na mesma passada da gravação.
+
+Protocolo:
+    POST /upload/iniciar                      -> upload_id
+    PUT  /upload/<upload_id>/partes/<numero>  -> partes enviadas em ordem (0, 1, 2, ...)
+    GET  /upload/<upload_id>                  -> próxima parte esperada (para retomar)
+    POST /upload/<upload_id>/finalizar        -> cria o Documento
+
+As partes são gravadas em sequência num único arquivo dentro do armazenamento;
+na finalização ele é renomeado para o blob do seu conteúdo (ver armazenamento.py).
+'''
+
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import armazenamento
+import estatisticas
+import tarefas
+from models import db, Documento, UploadPendente
+
+TAMANHO_BLOCO = 64 * 1024
+MAX_TAMANHO_PADRAO = 50 * 1024 * 1024  # 50 MB
+
+
+class UploadNaoEncontrado(LookupError):
+    """O upload_id não existe (nunca foi iniciado ou já foi finalizado)."""
+
+
+class ParteForaDeOrdem(ValueError):
+    """A parte recebida não é a próxima esperada."""
+
+
+class TamanhoExcedido(ValueError):
+    """O documento ultrapassou o tamanho máximo configurado."""
+
+
+# Estado do hash por upload neste processo: {upload_id: (bytes_hasheados, objeto_hash)}.
+# Se a parte seguinte cair em outro worker, o hash é refeito a partir do arquivo gravado.
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+def copiar_com_hash(origem, destino, hash_sha256, limite, ja_gravado=0):
+    """
+    Copia `origem` para `destino` em blocos, atualizando o hash na mesma passada.
+
+    Retorna o número de bytes copiados. Lança TamanhoExcedido se
+    ja_gravado + copiado ultrapassar `limite`.
+    """
+    copiado = 0
+    while True:
+        bloco = origem.read(TAMANHO_BLOCO)
+        if not bloco:
+            return copiado
+        copiado += len(bloco)
+        if ja_gravado + copiado > limite:
+            raise TamanhoExcedido(f'O documento excede o tamanho máximo de {limite} bytes.')
+        hash_sha256.update(bloco)
+        destino.write(bloco)
+
+
+def salvar_documento(stream, pasta, cpf_servidor, tipo_documento, limite=MAX_TAMANHO_PADRAO):
+    """Grava um upload de uma vez só, calculando SHA-256 e tamanho durante a cópia."""
+    caminho_temporario = armazenamento.arquivo_temporario(pasta, uuid.uuid4().hex)
+    hash_sha256 = hashlib.sha256()
+    try:
+        with open(caminho_temporario, 'wb') as destino:
+            tamanho = copiar_com_hash(stream, destino, hash_sha256, limite)
+    except TamanhoExcedido:
+        os.remove(caminho_temporario)
+        raise
+
+    sha256 = hash_sha256.hexdigest()
+    documento = Documento(
+        cpf_servidor=cpf_servidor,
+        hora_cadastro=datetime.now(),
+        tipo=tipo_documento,
+        caminho_arquivo=armazenamento.guardar(pasta, caminho_temporario, sha256, tamanho),
+        sha256=sha256,
+        tamanho=tamanho
+    )
+    db.session.add(documento)
+    estatisticas.contar_documento(documento)
+    tarefas.enfileirar(documento)  # Validação, páginas, miniatura e texto em segundo plano
+    db.session.commit()
+    return documento
+
+
+def iniciar(pasta, cpf_servidor, tipo_documento, tamanho_previsto=None, limite=MAX_TAMANHO_PADRAO):
+    """Registra um upload em partes e cria o arquivo parcial vazio."""
+    if tamanho_previsto is not None and tamanho_previsto > limite:
+        raise TamanhoExcedido(f'O documento excede o tamanho máximo de {limite} bytes.')
+
+    upload_id = uuid.uuid4().hex
+    upload = UploadPendente(
+        id=upload_id,
+        cpf_servidor=cpf_servidor,
+        tipo=tipo_documento,
+        caminho_arquivo=armazenamento.arquivo_temporario(pasta, upload_id),
+        recebido=0,
+        proxima_parte=0,
+        criado_em=datetime.now()
+    )
+    open(upload.caminho_arquivo, 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+
+    with _hashes_lock:
+        _hashes[upload.id] = (0, hashlib.sha256())
+    return upload
+
+
+def buscar(upload_id):
+    upload = db.session.get(UploadPendente, upload_id)
+    if not upload:
+        raise UploadNaoEncontrado('Upload não encontrado.')
+    return upload
+
+
+def _hash_ate(upload):
+    """Objeto hash correspondente aos `upload.recebido` primeiros bytes do arquivo."""
+    with _hashes_lock:
+        estado = _hashes.pop(upload.id, None)
+    if estado and estado[0] == upload.recebido:
+        return estado[1]
+
+    # Worker diferente ou processo reiniciado: refaz o hash do que já foi gravado
+    hash_sha256 = hashlib.sha256()
+    restante = upload.recebido
+    with open(upload.caminho_arquivo, 'rb') as arquivo:
+        while restante:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            hash_sha256.update(bloco)
+            restante -= len(bloco)
+    return hash_sha256
+
+
+def gravar_parte(upload_id, numero, stream, limite=MAX_TAMANHO_PADRAO):
+    """
+    Grava a parte `numero` no arquivo parcial, na posição já confirmada.
+
+    Partes repetidas (numero < próxima esperada) são aceitas sem regravar,
+    para que o cliente possa reenviar a última parte depois de uma queda.
+    """
+    upload = buscar(upload_id)
+    if numero < upload.proxima_parte:
+        return upload
+    if numero > upload.proxima_parte:
+        raise ParteForaDeOrdem(f'Parte esperada: {upload.proxima_parte}.')
+
+    hash_sha256 = _hash_ate(upload)
+    with open(upload.caminho_arquivo, 'r+b') as destino:
+        # Descarta restos de uma tentativa anterior interrompida no meio da parte
+        destino.seek(upload.recebido)
+        destino.truncate()
+        try:
+            copiado = copiar_com_hash(stream, destino, hash_sha256, limite, upload.recebido)
+        except TamanhoExcedido:
+            destino.truncate(upload.recebido)
+            raise
+
+    upload.recebido += copiado
+    upload.proxima_parte += 1
+    db.session.commit()
+
+    with _hashes_lock:
+        _hashes[upload.id] = (upload.recebido, hash_sha256)
+    return upload
+
+
+def finalizar(upload_id, pasta, sha256_esperado=None):
+    """Move o arquivo para o armazenamento, cria o Documento e remove o registro pendente."""
+    upload = buscar(upload_id)
+    hash_sha256 = _hash_ate(upload)
+    digest = hash_sha256.hexdigest()
+
+    if sha256_esperado and sha256_esperado.lower() != digest:
+        # Devolve o estado para que o cliente possa reenviar a partir do ponto atual
+        with _hashes_lock:
+            _hashes[upload.id] = (upload.recebido, hash_sha256)
+        raise ValueError('O SHA-256 informado não confere com o conteúdo recebido.')
+
+    documento = Documento(
+        cpf_servidor=upload.cpf_servidor,
+        hora_cadastro=datetime.now(),
+        tipo=upload.tipo,
+        caminho_arquivo=armazenamento.guardar(pasta, upload.caminho_arquivo, digest, upload.recebido),
+        sha256=digest,
+        tamanho=upload.recebido
+    )
+    db.session.add(documento)
+    db.session.delete(upload)
+    estatisticas.contar_documento(documento)
+    tarefas.enfileirar(documento)
+    db.session.commit()
+    return documento
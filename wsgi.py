@@ -0,0 +1,10 @@
+'''Ponto de entrada WSGI.
+
+Execução:
+    flask --app app db atualizar          # uma vez por implantação, antes dos workers
+    gunicorn wsgi:app -w 4 -k gthread --threads 8 -b 0.0.0.0:8000
+'''
+
+from app import create_app
+
+app = create_app()